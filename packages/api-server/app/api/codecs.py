@@ -0,0 +1,282 @@
+# packages/api-server/app/api/codecs.py
+# リクエストとレスポンスのボディのエンコード方式（コーデック）を Content-Type / Accept で切り替えます。
+#
+#   application/json     orjson（インストールされていなければ標準の json）
+#   application/msgpack  MessagePack（msgpack がインストールされている場合のみ）。GameState はテンプレートIDを
+#                        小さな整数にし、カードを試合のカード表へのインデックスの配列にした詰めた形式で送ります。
+#
+# 状態を返すエンドポイントは encode_response に CompactState を直接渡すことで、GameState の組み立てと
+# 応答モデルでの再検証を省略します（内部状態は整合性が保証されているため）。
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+from ..game.models import GameState
+from ..game.state import PHASE_INDEX, PHASES, CompactState
+
+try:
+    import orjson
+except ImportError: # pragma: no cover - orjson が無い環境では標準の json を使います
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # pragma: no cover - msgpack は任意の依存関係です
+    msgpack = None
+
+MEDIA_JSON = 'application/json'
+MEDIA_MSGPACK = 'application/msgpack'
+MSGPACK_ALIASES = (MEDIA_MSGPACK, 'application/x-msgpack', 'application/vnd.msgpack')
+
+# MessagePack で詰めた形式の GameState を表す拡張型のコードです。
+EXT_GAME_STATE = 1
+
+
+def _to_primitive(value: Any) -> Any:
+    # orjson / json が直接扱えない値を変換します。
+    if isinstance(value, CompactState):
+        return value.to_dict()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+# --- 詰めた形式の GameState ---
+# [matchId, turn, phase, templates, cardIds, cardTemplates, players, lastActions, log, logCursor, version]
+# templates はこの状態に登場するテンプレートIDの表、cardIds / cardTemplates は試合のカード表（IDと templates の
+# インデックス）です。players は [playerId, funds, properties, hand, deck, discard] の配列で、各ゾーンはカード表の
+# インデックスの配列です。lastActions は [playerId, templates のインデックス] の配列です。
+
+def pack_state(state: Any) -> list:
+    """CompactState、GameState、または GameState の形の辞書を詰めた形式に変換します。"""
+    if isinstance(state, CompactState):
+        return _pack_compact(state)
+    if isinstance(state, BaseModel):
+        state = state.model_dump()
+    return _pack_dict(state)
+
+
+def _interner() -> Tuple[List[str], Callable[[str], int]]:
+    # テンプレートIDを登場順に小さな整数にする関数と、その表を返します。
+    templates: List[str] = []
+    index: Dict[str, int] = {}
+
+    def intern(tid: str) -> int:
+        i = index.get(tid)
+        if i is None:
+            i = index[tid] = len(templates)
+            templates.append(tid)
+        return i
+    return templates, intern
+
+
+def _pack_compact(core: CompactState) -> list:
+    # 内部状態のゾーンは既にカード表のインデックスなので、そのまま使えます。
+    templates, intern = _interner()
+    card_templates = [intern(tid) for tid in core.cards.template_ids]
+    players = [[p.player_id, p.funds, p.properties, p.hand, p.deck, p.discard] for p in core.players]
+    last_actions = [[pid, intern(tid)] for pid, tid in core.last_actions]
+    return [core.match_id, core.turn, core.phase, templates, core.cards.ids, card_templates, players,
+            last_actions, core.log.window(), core.log.window_start, core.version]
+
+
+def _pack_dict(state: Dict[str, Any]) -> list:
+    templates, intern = _interner()
+    card_ids: List[str] = []
+    card_templates: List[int] = []
+
+    def zone(cards: Sequence[Dict[str, str]]) -> List[int]:
+        indices = []
+        for card in cards:
+            indices.append(len(card_ids))
+            card_ids.append(card['id'])
+            card_templates.append(intern(card['templateId']))
+        return indices
+
+    players = [[p['playerId'], p['funds'], p['properties'], zone(p['hand']), zone(p['deck']), zone(p['discard'])]
+               for p in state['players']]
+    last_actions = [[a['playerId'], intern(a['cardTemplateId'])] for a in state.get('lastActions', [])]
+    return [state['matchId'], state['turn'], PHASE_INDEX[state['phase']], templates, card_ids, card_templates,
+            players, last_actions, state.get('log', []), state.get('logCursor', 0), state.get('version', 0)]
+
+
+def unpack_state(packed: Sequence[Any]) -> Dict[str, Any]:
+    """詰めた形式を GameState の形の辞書に戻します（検証は行いません）。"""
+    match_id, turn, phase, templates, card_ids, card_templates, players, last_actions, log, log_cursor, version = packed
+    cards = [{'id': cid, 'templateId': templates[t]} for cid, t in zip(card_ids, card_templates)]
+
+    def convert(player: Sequence[Any]) -> Dict[str, Any]:
+        player_id, funds, properties, hand, deck, discard = player
+        return {
+            'playerId': player_id,
+            'funds': funds,
+            'properties': properties,
+            'hand': [dict(cards[i]) for i in hand],
+            'deck': [dict(cards[i]) for i in deck],
+            'discard': [dict(cards[i]) for i in discard],
+        }
+
+    return {
+        'matchId': match_id,
+        'turn': turn,
+        'players': [convert(p) for p in players],
+        'phase': PHASES[phase],
+        'lastActions': [{'playerId': pid, 'cardTemplateId': templates[t]} for pid, t in last_actions],
+        'log': list(log),
+        'logCursor': log_cursor,
+        'version': version,
+    }
+
+
+# --- コーデック ---
+
+class Codec:
+    media_type = ''
+
+    def dumps(self, content: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, body: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    media_type = MEDIA_JSON
+
+    def dumps(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_to_primitive)
+        return json.dumps(content, default=_to_primitive, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, body: bytes) -> Any:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+class MsgpackCodec(Codec):
+    """GameState（CompactState を含む）は拡張型 EXT_GAME_STATE の詰めた形式で、それ以外はそのまま送ります。"""
+    media_type = MEDIA_MSGPACK
+
+    def dumps(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=self._default, use_bin_type=True)
+
+    def loads(self, body: bytes) -> Any:
+        return msgpack.unpackb(body, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+    @staticmethod
+    def _default(value: Any) -> Any:
+        if isinstance(value, (CompactState, GameState)):
+            return msgpack.ExtType(EXT_GAME_STATE, msgpack.packb(pack_state(value), use_bin_type=True))
+        return _to_primitive(value)
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes) -> Any:
+        if code == EXT_GAME_STATE:
+            return unpack_state(msgpack.unpackb(data, raw=False))
+        return msgpack.ExtType(code, data)
+
+
+json_codec = JsonCodec()
+msgpack_codec: Optional[MsgpackCodec] = MsgpackCodec() if msgpack is not None else None
+
+
+def _media_types(header: str) -> List[Tuple[str, float]]:
+    # "a/b;q=0.5, c/d" を q の大きい順の (メディアタイプ, q) のリストにします。
+    entries = []
+    for position, part in enumerate(header.split(',')):
+        media, *params = [item.strip() for item in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media:
+            entries.append((media.lower(), q, position))
+    entries.sort(key=lambda e: (-e[1], e[2]))
+    return [(media, q) for media, q, _ in entries]
+
+
+def codec_for_accept(accept: Optional[str]) -> Codec:
+    """Accept ヘッダーから応答のコーデックを選びます。対応する形式が無ければ JSON を使います。"""
+    if accept:
+        for media, q in _media_types(accept):
+            if q <= 0:
+                continue
+            if media in MSGPACK_ALIASES and msgpack_codec is not None:
+                return msgpack_codec
+            if media == MEDIA_JSON or media.endswith('+json') or media in ('*/*', 'application/*'):
+                return json_codec
+    return json_codec
+
+
+def codec_for_content_type(content_type: Optional[str]) -> Optional[Codec]:
+    """Content-Type からリクエストのボディのコーデックを選びます。対応しない形式なら None を返します。"""
+    media = (content_type or MEDIA_JSON).split(';')[0].strip().lower()
+    if media in MSGPACK_ALIASES:
+        return msgpack_codec
+    if media == MEDIA_JSON or media.endswith('+json'):
+        return json_codec
+    return None
+
+
+def encode_response(request: Request, content: Any, status_code: int = status.HTTP_200_OK,
+                    headers: Optional[Dict[str, str]] = None) -> Response:
+    """Accept で選んだコーデックで content をエンコードした応答を返します（応答モデルでの検証は行いません）。"""
+    codec = codec_for_accept(request.headers.get('accept'))
+    return Response(codec.dumps(content), status_code=status_code, media_type=codec.media_type, headers=headers)
+
+
+class CodecRequest(Request):
+    """ボディを Content-Type のコーデックで読み込むリクエストです（FastAPI は json() でボディを読み込みます）。"""
+
+    def __init__(self, scope, receive, codec: Codec):
+        super().__init__(scope, receive)
+        self.codec = codec
+
+    async def json(self) -> Any:
+        if not hasattr(self, '_json'):
+            body = await self.body()
+            try:
+                self._json = self.codec.loads(body)
+            except Exception as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Malformed {self.codec.media_type} body") from e
+        return self._json
+
+
+class CodecRoute(APIRoute):
+    """
+    リクエストのボディを Content-Type に応じて読み込み、Accept に応じて応答をエンコードするルートです。
+    encode_response でエンコード済みの応答はそのまま返し、FastAPI が JSON でエンコードした応答は、
+    MessagePack が要求されていれば変換し直します。
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            content_type = request.headers.get('content-type')
+            if content_type is not None and request.method not in ('GET', 'HEAD', 'DELETE'):
+                codec = codec_for_content_type(content_type)
+                if codec is None:
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                        detail=f"Unsupported Content-Type: {content_type}")
+                # FastAPI が json() でボディを読み込むよう、Content-Type を JSON として渡します。
+                scope = dict(request.scope)
+                scope['headers'] = [(k, v) for k, v in request.scope['headers'] if k != b'content-type'] \
+                    + [(b'content-type', MEDIA_JSON.encode())]
+                request = CodecRequest(scope, request.receive, codec)
+            response = await handler(request)
+            codec = codec_for_accept(request.headers.get('accept'))
+            if codec is not json_codec and response.media_type == MEDIA_JSON and response.body:
+                body = codec.dumps(json_codec.loads(response.body))
+                response = Response(body, status_code=response.status_code, media_type=codec.media_type,
+                                    headers={k: v for k, v in response.headers.items()
+                                             if k not in ('content-length', 'content-type')})
+            return response
+
+        return route_handler
@@ -0,0 +1,153 @@
+# packages/api-server/app/api/concurrency.py
+# 試合を変更するリクエストの同時実行の制御です。
+#
+#   MatchLocks        matchId ごとの asyncio.Lock です。1つのプロセス内で、同じ試合への変更（バージョンの確認から
+#                     変更・永続化の登録まで）を直列化します。WebSocket のハブ（match_channel.py）と共有します。
+#   If-Match          クライアントが持っている状態のバージョン（応答の ETag）を指定すると、現在のバージョンと
+#                     異なる場合は変更せずに 409 を返します。
+#   Idempotency-Key   同じキーで再送されたリクエストには、最初の成功した応答をそのまま返します（リトライや
+#                     ダブルクリックで同じ操作が2回適用されないようにするため）。キーはプロセス内に保持します。
+#
+# プロセスをまたいだ同時の書き込みは、永続化の際にバージョンを比較して検出します（db/match_store.py）。
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+
+# 既定の設定値です。環境変数で上書きできます。
+DEFAULT_IDEMPOTENCY_MAX_KEYS = 10000
+DEFAULT_IDEMPOTENCY_TTL_SECONDS = 10 * 60
+
+# 保存した応答を返したことを示す応答ヘッダーです。
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class MatchLocks:
+    """キー（matchId など）ごとの asyncio.Lock です。待っている呼び出しが無くなったロックは破棄します。"""
+
+    def __init__(self) -> None:
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+def etag(version: int) -> str:
+    """状態のバージョンを表す ETag です。"""
+    return f'"{version}"'
+
+
+def check_if_match(if_match: Optional[str], version: int) -> None:
+    """
+    If-Match ヘッダーのバージョンと現在のバージョンを比較し、一致しなければ 409 を送出します。
+    ヘッダーが無いか * の場合は比較しません。ETag（"12"、W/"12"）と数値（12）のどちらでも指定できます。
+    """
+    if if_match is None or if_match.strip() == '*':
+        return
+    expected = []
+    for tag in if_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        try:
+            expected.append(int(tag.strip('"')))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid If-Match: {if_match}")
+    if version not in expected:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail={'message': "Match state has changed", 'currentVersion': version},
+                            headers={'ETag': etag(version)})
+
+
+class _Stored(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: bytes
+    media_type: Optional[str]
+    headers: Dict[str, str]
+    expires_at: float
+
+
+class IdempotencyCache:
+    """
+    (スコープ, Idempotency-Key) ごとに成功した応答を保存する LRU キャッシュです。保存から ttl_seconds 秒で失効します。
+    同じキーを別の内容のリクエストに使った場合は 422 を返します。
+    """
+
+    def __init__(self, max_keys: int = DEFAULT_IDEMPOTENCY_MAX_KEYS,
+                 ttl_seconds: float = DEFAULT_IDEMPOTENCY_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: 'OrderedDict[Tuple[str, str], _Stored]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    @classmethod
+    def from_env(cls) -> 'IdempotencyCache':
+        return cls(
+            max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", DEFAULT_IDEMPOTENCY_MAX_KEYS)),
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", DEFAULT_IDEMPOTENCY_TTL_SECONDS)),
+        )
+
+    @staticmethod
+    async def fingerprint(request: Request) -> str:
+        # 同じ操作かどうかを、メソッド・パス・クエリ・ボディで判定します。
+        digest = hashlib.sha256()
+        for part in (request.method, request.url.path, request.url.query):
+            digest.update(part.encode('utf-8') + b'\0')
+        digest.update(await request.body())
+        return digest.hexdigest()
+
+    def replay(self, scope: str, key: str, fingerprint: str) -> Optional[Response]:
+        """保存した応答があれば、それを返します。"""
+        with self._lock:
+            stored = self._entries.get((scope, key))
+            if stored is not None and stored.expires_at <= self._clock():
+                del self._entries[(scope, key)]
+                stored = None
+            if stored is None:
+                return None
+            if stored.fingerprint != fingerprint:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail="Idempotency-Key was already used for a different request")
+            self.replays += 1
+        return Response(stored.body, status_code=stored.status_code, media_type=stored.media_type,
+                        headers={**stored.headers, REPLAYED_HEADER: 'true'})
+
+    def store(self, scope: str, key: str, fingerprint: str, response: Response) -> None:
+        headers = {k: v for k, v in response.headers.items() if k not in ('content-length', 'content-type')}
+        with self._lock:
+            self._entries[(scope, key)] = _Stored(fingerprint, response.status_code, bytes(response.body),
+                                                  response.media_type, headers, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# アプリケーション全体で共有するロックと、Idempotency-Key の応答のキャッシュです。
+match_locks = MatchLocks()
+idempotency_cache = IdempotencyCache.from_env()
@@ -1,44 +1,74 @@
 from fastapi import APIRouter, Header, HTTPException, status
-from typing import List, Optional, Dict
+from typing import List, Literal, Optional, Dict
 from ..game.models import Deck # Import Deck from models.py
 from pydantic import BaseModel, Field
 
-from ..db.database import (
-    create_deck_in_db,
-    get_deck_from_db,
-    get_decks_by_client_id_from_db,
-    update_deck_in_db,
-    delete_deck_from_db,
-)
+from ..db.deck_cache import DeckCacheStats
+from ..db.deck_store import DeckStoreTimeout, deck_store
 
 router = APIRouter()
 
 # Pydantic Models are imported from app.game.models
 
+# 一括操作の1リクエストあたりの上限件数です。
+MAX_BATCH_OPERATIONS = 500
+
+class DeckBatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    deckId: Optional[str] = None # update・delete で必須です。create ではサーバーがキーを生成します。
+    deck: Optional[Deck] = None # create・update で必須です。
+
+class DeckBatchRequest(BaseModel):
+    operations: List[DeckBatchOperation] = Field(..., max_length=MAX_BATCH_OPERATIONS)
+
+class DeckBatchResult(BaseModel):
+    index: int
+    op: str
+    status: Literal['ok', 'error']
+    deckId: Optional[str] = None
+    deck: Optional[Deck] = None
+    error: Optional[str] = None
+
+class DeckBatchResponse(BaseModel):
+    results: List[DeckBatchResult]
+
+# デッキストアの呼び出しを待ち、タイムアウトした場合は 504 を返します。
+# Firebase への同期的な呼び出しはデッキストアのスレッドプールで実行されるため、イベントループは止まりません。
+async def _await_store(call):
+    try:
+        return await call
+    except DeckStoreTimeout as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+
+# デバッグ用に "X-Deck-Cache: bypass" ヘッダーを付けると、キャッシュを使わずにデータベースから読み込みます。
+def _bypass_cache(x_deck_cache: Optional[str]) -> bool:
+    return (x_deck_cache or '').lower() == 'bypass'
+
 # API Endpoints
 
 @router.post("/decks/", response_model=Deck, status_code=status.HTTP_201_CREATED)
 async def create_new_deck(deck: Deck, x_client_id: Optional[str] = Header(None)):
     if not x_client_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
-    created_deck = create_deck_in_db(x_client_id, deck.dict(exclude_unset=True)) # exclude_unset for optional id
+    created_deck = await _await_store(deck_store.create_deck(x_client_id, deck.dict(exclude_unset=True))) # exclude_unset for optional id
     return created_deck
 
 @router.get("/decks/", response_model=List[Deck])
-async def get_all_decks(x_client_id: Optional[str] = Header(None)):
+async def get_all_decks(x_client_id: Optional[str] = Header(None), x_deck_cache: Optional[str] = Header(None)):
     if not x_client_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
-    decks_dict = get_decks_by_client_id_from_db(x_client_id)
+    decks_dict = await _await_store(deck_store.get_decks(x_client_id, _bypass_cache(x_deck_cache)))
     if not decks_dict:
         return []
     # Convert dictionary of decks to a list
     return list(decks_dict.values())
 
 @router.get("/decks/{deck_id}", response_model=Deck)
-async def get_single_deck(deck_id: str, x_client_id: Optional[str] = Header(None)):
+async def get_single_deck(deck_id: str, x_client_id: Optional[str] = Header(None),
+                          x_deck_cache: Optional[str] = Header(None)):
     if not x_client_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
-    deck = get_deck_from_db(x_client_id, deck_id)
+    deck = await _await_store(deck_store.get_deck(x_client_id, deck_id, _bypass_cache(x_deck_cache)))
     if deck is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deck not found")
     return deck
@@ -47,7 +77,8 @@ async def get_single_deck(deck_id: str, x_client_id: Optional[str] = Header(None
 async def update_existing_deck(deck_id: str, deck: Deck, x_client_id: Optional[str] = Header(None)):
     if not x_client_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
-    updated_deck = update_deck_in_db(x_client_id, deck_id, deck.dict())
+    # id を省略したリクエストで保存済みの id が消えないよう、パスの deck_id を書き込みます。
+    updated_deck = await _await_store(deck_store.update_deck(x_client_id, deck_id, {**deck.dict(), 'id': deck_id}))
     if updated_deck is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deck not found")
     return updated_deck
@@ -56,7 +87,49 @@ async def update_existing_deck(deck_id: str, deck: Deck, x_client_id: Optional[s
 async def delete_existing_deck(deck_id: str, x_client_id: Optional[str] = Header(None)):
     if not x_client_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
-    result = delete_deck_from_db(x_client_id, deck_id)
+    result = await _await_store(deck_store.delete_deck(x_client_id, deck_id))
     if result is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deck not found")
     return {"message": f"Deck {deck_id} deleted successfully"}
+
+# 作成・更新・削除をまとめて受け付け、1回の複数パスの書き込みで保存します。
+# 不正な操作はその操作だけをエラーとして結果に含め、残りの操作は書き込みます。
+@router.post("/decks:batch", response_model=DeckBatchResponse)
+async def batch_decks(request: DeckBatchRequest, x_client_id: Optional[str] = Header(None)):
+    if not x_client_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="X-Client-Id header is required")
+    results: List[Optional[DeckBatchResult]] = [None] * len(request.operations)
+    accepted = []
+    seen_ids = set()
+    for index, operation in enumerate(request.operations):
+        error = None
+        if operation.op != 'create' and not operation.deckId:
+            error = f"deckId is required for {operation.op}"
+        elif operation.op != 'delete' and operation.deck is None:
+            error = f"deck is required for {operation.op}"
+        elif operation.deckId in seen_ids:
+            error = f"Deck {operation.deckId} appears more than once in the batch"
+        if error is not None:
+            results[index] = DeckBatchResult(index=index, op=operation.op, status='error',
+                                             deckId=operation.deckId, error=error)
+            continue
+        deck_data = None
+        if operation.op == 'create':
+            deck_data = operation.deck.dict(exclude={'id'})
+        elif operation.op == 'update':
+            deck_data = {**operation.deck.dict(), 'id': operation.deckId}
+        if operation.deckId:
+            seen_ids.add(operation.deckId)
+        accepted.append((index, (operation.op, operation.deckId, deck_data)))
+
+    written = await _await_store(deck_store.batch(x_client_id, [op for _, op in accepted]))
+    for (index, (op, _, _)), result in zip(accepted, written):
+        results[index] = DeckBatchResult(index=index, op=op, status='ok', deckId=result['id'],
+                                         deck=None if op == 'delete' else result)
+    return DeckBatchResponse(results=results)
+
+@router.get("/decks/cache/stats", response_model=DeckCacheStats)
+async def get_deck_cache_stats():
+    if deck_store.cache is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deck cache is disabled")
+    return deck_store.cache.stats()
@@ -1,25 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+import random
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
 
 from ..game.models import GameState, Action, PlayerState, Card, CardTemplate
+from ..game.decks import validate_deck
 from ..game.engine import GameEngine
+from ..game.match_registry import RegistryStats, match_registry
+from ..game.replay import replay
+from ..game.equilibrium import EquilibriumResult, solver_for
+from ..game.event_log import EVENT_CODES
+from ..game.search import search_npc
+from ..game.state import PHASE_ACTION
+from ..game.simulation import POLICIES
+from ..game.templates import card_template_registry
+from ..db.match_store import MatchStoreStats, match_writer
+from .codecs import CodecRoute, codec_for_accept, encode_response
+from .concurrency import check_if_match, etag, idempotency_cache, match_locks
+from .match_tokens import match_tokens
 
-router = APIRouter()
+# ボディは Content-Type（JSON / MessagePack）に応じて読み込み、応答は Accept に応じてエンコードします（codecs.py）。
+router = APIRouter(route_class=CodecRoute)
+
+# GameState をリクエストごとに受け取り、1回の操作の結果を返すエンドポイントです。
+# カードテンプレートはレジストリの共有された集合を使い、変更セットやジャーナルは記録しません。
+# 結果はエンジンの内部状態から直接エンコードし、GameState の組み立てと応答での再検証を省略します。
+
+def _stateless_engine(game_state: GameState) -> GameEngine:
+    return GameEngine(game_state, card_template_registry.current, record_changes=False, record_journal=False,
+                      instrumented=True)
 
 class ApplyActionRequest(BaseModel):
     game_state: GameState
     action: Action
 
 @router.post("/game/apply_action", response_model=GameState)
-async def apply_game_action(request: ApplyActionRequest):
-    engine = GameEngine(initial_game_state=request.game_state)
-    
-    # Assuming apply_action modifies the game_state in place or returns a new one
-    # Based on engine.py, it seems to return a new GameState
-    updated_game_state = engine.apply_action(request.game_state, request.action)
-    
-    return updated_game_state
+async def apply_game_action(request: ApplyActionRequest, http_request: Request):
+    # 1人分のアクションだけを解決します（相手は何もプレイしません）。
+    engine = _stateless_engine(request.game_state)
+    engine.play_actions(request.action, None)
+    return encode_response(http_request, engine.core)
 
 class ResolveTurnRequest(BaseModel):
     game_state: GameState
@@ -27,26 +49,324 @@ class ResolveTurnRequest(BaseModel):
     npc_action: Action
 
 @router.post("/game/resolve_turn", response_model=GameState)
-async def resolve_game_turn(request: ResolveTurnRequest):
-    engine = GameEngine(initial_game_state=request.game_state)
-    
-    # Assuming resolve_actions takes the current state and both actions
-    updated_game_state = engine.resolve_actions(
-        current_state=request.game_state,
-        player_action=request.player_action,
-        npc_action=request.npc_action
-    )
-    
-    return updated_game_state
+async def resolve_game_turn(request: ResolveTurnRequest, http_request: Request):
+    engine = _stateless_engine(request.game_state)
+    engine.play_actions(request.player_action, request.npc_action)
+    return encode_response(http_request, engine.core)
 
 class AdvanceTurnRequest(BaseModel):
     game_state: GameState
 
 @router.post("/game/advance_turn", response_model=GameState)
-async def advance_game_turn(request: AdvanceTurnRequest):
-    engine = GameEngine(initial_game_state=request.game_state)
-    
-    # Assuming advance_turn returns a new GameState
-    updated_game_state = engine.advance_turn(request.game_state)
-    
-    return updated_game_state
\ No newline at end of file
+async def advance_game_turn(request: AdvanceTurnRequest, http_request: Request):
+    engine = _stateless_engine(request.game_state)
+    engine.start_turn()
+    return encode_response(http_request, engine.core)
+
+# --- matchId で試合を参照するエンドポイント ---
+# 試合の状態はサーバー側のレジストリに保持されるため、リクエストには GameState を含めません。
+# sinceVersion にクライアントが持っている状態のバージョンを指定すると、そこからの差分（JSON Patch）を返します。
+# 差分を作れない場合（履歴に無い、またはバージョンが一致しない場合）は、state に全体のスナップショットを返します。
+#
+# 応答の ETag は状態のバージョンです。試合を変更するリクエストに If-Match で指定すると、その間に他のリクエストが
+# 試合を変更していた場合は変更せずに 409 を返します。Idempotency-Key を指定したリクエストの再送には、
+# 最初の応答をそのまま返します（concurrency.py）。同じ試合への変更は matchId ごとのロックで直列化します。
+#
+# 試合の作成時にホストとプレイヤーごとのトークンを返します（match_tokens.py）。状態全体を返すエンドポイントと
+# 両プレイヤーのアクションを送るエンドポイントには X-Match-Token にホストのトークンが、プレイヤーから見た
+# ビューと NPC の助言にはホストまたはそのプレイヤーのトークンが必要です。
+
+class CreateMatchRequest(BaseModel):
+    player1Id: str
+    player2Id: str
+    player1Deck: Optional[Dict[str, int]] = None # Deck.cards と同じ形式
+    player2Deck: Optional[Dict[str, int]] = None
+    seed: Optional[int] = None # 省略するとサーバーがシードを生成します
+
+class MatchActionRequest(BaseModel):
+    player1Action: Optional[Action] = None
+    player2Action: Optional[Action] = None
+    # 指定すると、player2Action を省略した場合にサーバー側の NPC（simulation.POLICIES のポリシー）がプレイヤー2の手を選びます。
+    npcPolicy: Optional[str] = None
+
+class MatchUpdate(BaseModel):
+    matchId: str
+    version: int
+    baseVersion: Optional[int] = None # patch の適用元のバージョン
+    patch: Optional[List[Dict[str, Any]]] = None
+    state: Optional[GameState] = None
+    hostToken: Optional[str] = None # 試合の作成時のみ
+    playerTokens: Optional[List[str]] = None # 試合の作成時のみ（プレイヤーの位置の順）
+
+# NPC の確定化と手の選択に使う乱数です。試合の乱数とは分け、試合の再現性に影響しないようにします。
+_npc_rng = random.Random()
+
+def _get_engine(match_id: str) -> GameEngine:
+    engine = match_registry.get(match_id)
+    if engine is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Match not found")
+    return engine
+
+# 状態を変更した試合を登録し直し、永続化が有効な場合は次回の書き込みの対象にします。
+async def _commit(match_id: str, engine: GameEngine) -> None:
+    match_registry.touch(match_id)
+    if match_writer is not None:
+        await match_writer.mark_dirty(match_id, engine)
+
+# MatchUpdate の形の辞書を返します（None の項目は含めません）。state には内部状態をそのまま入れ、コーデックでエンコードします。
+def _match_update(match_id: str, engine: GameEngine, since_version: Optional[int]) -> Dict[str, Any]:
+    if since_version is not None:
+        patch = engine.changes_since(since_version)
+        if patch is not None:
+            return {'matchId': match_id, 'version': engine.version, 'baseVersion': since_version, 'patch': patch}
+    return {'matchId': match_id, 'version': engine.version, 'state': engine.core}
+
+# 試合を変更するリクエストの共通部分です。matchId のロックを取り、Idempotency-Key の応答があればそれを返します。
+# 無ければ If-Match のバージョンを確認してから apply で試合を変更し、応答を Idempotency-Key に保存します。
+async def _mutate(match_id: str, http_request: Request, token: Optional[str], if_match: Optional[str],
+                  idempotency_key: Optional[str], since_version: Optional[int],
+                  apply: Callable[[GameEngine], Awaitable[None]]) -> Response:
+    _get_engine(match_id)
+    match_tokens.require_host(match_id, token)
+    async with match_locks.hold(match_id):
+        if idempotency_key is not None:
+            fingerprint = await idempotency_cache.fingerprint(http_request)
+            replayed = idempotency_cache.replay(match_id, idempotency_key, fingerprint)
+            if replayed is not None:
+                return replayed
+        engine = _get_engine(match_id)
+        check_if_match(if_match, engine.version)
+        await apply(engine)
+        await _commit(match_id, engine)
+        response = encode_response(http_request, _match_update(match_id, engine, since_version),
+                                   headers={'ETag': etag(engine.version)})
+        if idempotency_key is not None:
+            idempotency_cache.store(match_id, idempotency_key, fingerprint, response)
+        return response
+
+@router.post("/matches", response_model=MatchUpdate, response_model_exclude_none=True,
+             status_code=status.HTTP_201_CREATED)
+async def create_match(request: CreateMatchRequest, http_request: Request,
+                       idempotency_key: Optional[str] = Header(None)):
+    card_templates = card_template_registry.current
+    # 枚数の上限を超えるデッキからエンジンを作らないよう、作成する前にデッキの規定を確認します。
+    for deck in (request.player1Deck, request.player2Deck):
+        if deck is not None:
+            try:
+                validate_deck(deck, card_templates)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # 再送で試合が2つ作られないよう、同じキーのリクエストは直列化して最初の応答を返します。
+    async with match_locks.hold(f'create:{idempotency_key}') if idempotency_key is not None else nullcontext():
+        if idempotency_key is not None:
+            fingerprint = await idempotency_cache.fingerprint(http_request)
+            replayed = idempotency_cache.replay('', idempotency_key, fingerprint)
+            if replayed is not None:
+                return replayed
+        engine = GameEngine.new_match(
+            request.player1Id, request.player2Id, card_templates, request.player1Deck, request.player2Deck,
+            seed=request.seed, instrumented=True
+        )
+        match_id = engine.core.match_id
+        match_registry.put(match_id, engine)
+        host_token, player_tokens = match_tokens.issue(match_id)
+        if match_writer is not None:
+            await match_writer.mark_dirty(match_id, engine)
+        content = {**_match_update(match_id, engine, None), 'hostToken': host_token, 'playerTokens': player_tokens}
+        response = encode_response(http_request, content, status.HTTP_201_CREATED,
+                                   headers={'ETag': etag(engine.version)})
+        if idempotency_key is not None:
+            idempotency_cache.store('', idempotency_key, fingerprint, response)
+        return response
+
+@router.get("/matches/{match_id}", response_model=MatchUpdate, response_model_exclude_none=True)
+async def get_match(match_id: str, http_request: Request, sinceVersion: Optional[int] = None,
+                    x_match_token: Optional[str] = Header(None)):
+    engine = _get_engine(match_id)
+    match_tokens.require_host(match_id, x_match_token)
+    return encode_response(http_request, _match_update(match_id, engine, sinceVersion),
+                           headers={'ETag': etag(engine.version)})
+
+@router.post("/matches/{match_id}/advance", response_model=MatchUpdate, response_model_exclude_none=True)
+async def advance_match(match_id: str, http_request: Request, sinceVersion: Optional[int] = None,
+                        x_match_token: Optional[str] = Header(None), if_match: Optional[str] = Header(None),
+                        idempotency_key: Optional[str] = Header(None)):
+    async def apply(engine: GameEngine) -> None:
+        engine.start_turn()
+
+    return await _mutate(match_id, http_request, x_match_token, if_match, idempotency_key, sinceVersion, apply)
+
+@router.post("/matches/{match_id}/actions", response_model=MatchUpdate, response_model_exclude_none=True)
+async def submit_match_actions(match_id: str, request: MatchActionRequest, http_request: Request,
+                               sinceVersion: Optional[int] = None, x_match_token: Optional[str] = Header(None),
+                               if_match: Optional[str] = Header(None), idempotency_key: Optional[str] = Header(None)):
+    if request.npcPolicy is not None and request.npcPolicy not in POLICIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown policy: {request.npcPolicy}")
+
+    async def apply(engine: GameEngine) -> None:
+        player2_action = request.player2Action
+        if request.npcPolicy is not None and player2_action is None:
+            player1, player2 = engine.core.players
+            # NPC のポリシーは時間がかかる場合があるため、イベントループを止めないようにスレッドで実行します。
+            card = await run_in_threadpool(POLICIES[request.npcPolicy], engine, player2, player1, _npc_rng)
+            if card >= 0:
+                player2_action = Action(playerId=player2.player_id, cardId=engine.core.cards.ids[card])
+        engine.play_actions(request.player1Action, player2_action)
+
+    return await _mutate(match_id, http_request, x_match_token, if_match, idempotency_key, sinceVersion, apply)
+
+# 指定したプレイヤーから見た試合の状態（ビュー）を返します。相手の手札と山札は枚数だけ、自分の山札は
+# 順番を伏せた構成だけを返します。ビューとエンコード済みのボディは状態のバージョンごとにキャッシュされ、
+# 同じ試合を見ているリクエストで共有されます（game/views.py）。
+
+class PlayerView(BaseModel):
+    playerId: str
+    funds: int
+    properties: int
+    handCount: int
+    deckCount: int
+    discard: List[Card]
+    hand: Optional[List[Card]] = None # 本人のみ
+    deckComposition: Optional[Dict[str, int]] = None # 本人のみ（テンプレートIDごとの枚数）
+
+class GameView(BaseModel):
+    matchId: str
+    version: int
+    viewerId: str
+    turn: int
+    phase: str
+    players: List[PlayerView]
+    lastActions: List[Dict[str, str]]
+    log: List[str]
+    logCursor: int
+
+@router.get("/matches/{match_id}/view", response_model=GameView, response_model_exclude_none=True)
+async def get_match_view(match_id: str, playerId: str, http_request: Request,
+                         x_match_token: Optional[str] = Header(None)):
+    engine = _get_engine(match_id)
+    player = engine.core.player_by_id(playerId)
+    if player is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player not found in match")
+    index = engine.core.players.index(player)
+    match_tokens.require_seat(match_id, x_match_token, index)
+    codec = codec_for_accept(http_request.headers.get('accept'))
+    body = engine.encoded_view(index, codec.media_type, codec.dumps)
+    return Response(body, media_type=codec.media_type, headers={'ETag': etag(engine.version)})
+
+# サーバー側の探索 NPC が、指定したプレイヤーの立場で選ぶ手を返します（状態は変更しません）。
+# 相手の手札と山札の順番は参照せず、budgetMs ミリ秒以内に探索を打ち切ります。
+# 探索はイベントループを止めないようにスレッドで行い、その間に試合が変更されないよう matchId のロックを保持します。
+
+class NpcDecision(BaseModel):
+    cardId: Optional[str] = None # 出さない場合は None
+    value: float
+    depth: int
+    nodes: int
+    tableHits: int
+    elapsedMs: float
+
+@router.get("/matches/{match_id}/npc-decision", response_model=NpcDecision)
+async def get_npc_decision(match_id: str, playerId: str, budgetMs: float = Query(5.0, gt=0, le=50),
+                           x_match_token: Optional[str] = Header(None)):
+    engine = _get_engine(match_id)
+    player = engine.core.player_by_id(playerId)
+    if player is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player not found in match")
+    match_tokens.require_seat(match_id, x_match_token, engine.core.players.index(player))
+    async with match_locks.hold(match_id):
+        engine = _get_engine(match_id)
+        player = engine.core.player_by_id(playerId)
+        result = await run_in_threadpool(search_npc.search, engine, player, _npc_rng, time_budget_ms=budgetMs)
+        card_id = engine.core.cards.ids[result.cardIndex] if result.cardIndex >= 0 else None
+    return NpcDecision(
+        cardId=card_id,
+        value=result.value,
+        depth=result.depth,
+        nodes=result.nodes,
+        tableHits=result.tableHits,
+        elapsedMs=result.elapsedMs,
+    )
+
+# アクションフェーズの試合について、指定したプレイヤーから見た均衡戦略と局面の値を返します。
+# 初めての局面は解くのに時間がかかるため、スレッドで計算します。
+# 相手の手札を含む完全な情報で解くため、ホストのトークンが必要です。
+@router.get("/matches/{match_id}/equilibrium", response_model=EquilibriumResult)
+async def get_match_equilibrium(match_id: str, playerId: str, x_match_token: Optional[str] = Header(None)):
+    engine = _get_engine(match_id)
+    match_tokens.require_host(match_id, x_match_token)
+    player = engine.core.player_by_id(playerId)
+    if player is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player not found in match")
+    if engine.core.phase != PHASE_ACTION:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Match is not in the ACTION phase")
+    solver = solver_for(engine.card_templates)
+    return await run_in_threadpool(solver.solve, engine.core.clone(), engine.core.players.index(player))
+
+# 試合のログを通し番号 cursor から最大 limit 件返します。GameState.log に載っていない古い行の取得に使います。
+# イベントはコードとパラメーターで返し、text には表示用の文字列を入れます。
+
+class GameEvent(BaseModel):
+    seq: int
+    code: str
+    params: List[Any]
+    text: str
+
+class LogPage(BaseModel):
+    events: List[GameEvent]
+    start: int # 取得できる最も古いイベントの通し番号
+    total: int # 試合の最初からのイベント数
+    nextCursor: Optional[int] = None # 続きが無い場合は None
+
+@router.get("/matches/{match_id}/log", response_model=LogPage)
+async def get_match_log(match_id: str, cursor: int = Query(0, ge=0), limit: int = Query(100, gt=0, le=1000)):
+    log = _get_engine(match_id).core.log
+    events = [GameEvent(seq=seq, code=EVENT_CODES[code], params=list(params), text=text)
+              for seq, (code, params, text) in log.page(cursor, limit)]
+    next_cursor = events[-1].seq + 1 if events else None
+    return LogPage(events=events, start=log.base, total=len(log),
+                   nextCursor=next_cursor if next_cursor is not None and next_cursor < len(log) else None)
+
+# ジャーナルから指定したターンの終了時点の状態を再現して返します（障害調査用）。
+# turn を省略すると最新の状態まで再現します。
+@router.get("/matches/{match_id}/replay", response_model=GameState)
+async def replay_match(match_id: str, http_request: Request, turn: Optional[int] = None,
+                       x_match_token: Optional[str] = Header(None)):
+    engine = _get_engine(match_id)
+    match_tokens.require_host(match_id, x_match_token)
+    if engine.journal is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Replay not available for this match")
+    if turn is not None and not 0 <= turn <= engine.core.turn:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Turn out of range")
+    return encode_response(http_request, replay(engine.journal, engine.card_templates, turn).core)
+
+@router.delete("/matches/{match_id}", response_model=Dict[str, str])
+async def delete_match(match_id: str, if_match: Optional[str] = Header(None),
+                       x_match_token: Optional[str] = Header(None)):
+    _get_engine(match_id)
+    match_tokens.require_host(match_id, x_match_token)
+    async with match_locks.hold(match_id):
+        check_if_match(if_match, _get_engine(match_id).version)
+        if not match_registry.remove(match_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Match not found")
+        if match_writer is not None:
+            match_writer.forget(match_id)
+    return {"message": f"Match {match_id} deleted successfully"}
+
+@router.get("/registry/stats", response_model=RegistryStats)
+async def get_registry_stats():
+    return match_registry.stats()
+
+@router.get("/store/stats", response_model=MatchStoreStats)
+async def get_match_store_stats():
+    if match_writer is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Match persistence is disabled")
+    return match_writer.stats()
+
+class TemplatesInfo(BaseModel):
+    version: str
+    templateIds: List[str]
+
+@router.get("/templates", response_model=TemplatesInfo)
+async def get_templates_info():
+    card_templates = card_template_registry.current
+    return TemplatesInfo(version=card_templates.version, templateIds=list(card_templates))
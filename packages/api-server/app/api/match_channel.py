@@ -0,0 +1,304 @@
+# packages/api-server/app/api/match_channel.py
+# WebSocket (/ws/match/{matchId}) でつながった2人のプレイヤーの間で、同時に出すアクションを取りまとめるハブです。
+# 両プレイヤーのアクションがそろうか、最初のアクションから turn_timeout 秒が経過した時点でターンを解決し
+# （出さなかったプレイヤーはパス扱い）、次のターンを開始してから、両プレイヤーに変更を送信します。
+# 各プレイヤーには、接続した位置から見たビュー（game/views.py）とその差分だけを送り、相手の手札や山札の順番は送りません。
+# tokens を指定したハブは、接続時にその位置のプレイヤーのトークン（match_tokens.py）を確認します。
+# 試合の状態はレジストリのエンジンをそのまま使い、HTTP のエンドポイントと同じく登録し直しと永続化の対象にします。
+# 試合の変更は HTTP のエンドポイントと共有する matchId ごとのロック（concurrency.py）の中で行います。
+# 試合がレジストリから破棄（削除・期限切れなど）されるとルームも破棄し、以降はターンの解決も永続化も行いません。
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..db.match_store import MatchWriteBehind, match_writer
+from ..game.engine import GameEngine
+from ..game.match_registry import MatchRegistry, match_registry
+from ..game.models import Action
+from ..game.simulation import Policy
+from ..game.state import PHASE_ACTION, PHASES
+from ..game.views import view_patch
+from .concurrency import MatchLocks, match_locks
+from .match_tokens import MatchTokens, match_tokens
+
+logger = logging.getLogger(__name__)
+
+# 最初のアクションを受け取ってから、相手のアクションを待つ秒数の既定値です。環境変数で上書きできます。
+DEFAULT_TURN_TIMEOUT_SECONDS = 30.0
+
+Message = Dict[str, Any]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class MatchChannelError(Exception):
+    """接続を受け付けられない場合に発生します。code は WebSocket を閉じる際のコードです。"""
+
+    def __init__(self, code: int, reason: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class _Room:
+    """1つの試合の接続と、解決待ちのアクションです。"""
+    __slots__ = ('match_id', 'engine', 'senders', 'views', 'actions', 'submitted', 'deadline', 'npc')
+
+    def __init__(self, match_id: str, engine: GameEngine, npc: Optional[Tuple[int, Policy]] = None):
+        self.match_id = match_id
+        self.engine = engine
+        self.npc = npc # NPC が担当する場合の (プレイヤーの位置, ポリシー)
+        self.senders: List[Optional[Send]] = [None, None]
+        self.views: List[Optional[Message]] = [None, None] # 各プレイヤーに最後に送ったビュー
+        self.actions: List[Optional[Action]] = [None, None]
+        self.submitted = [False, False]
+        self.deadline: Optional[asyncio.TimerHandle] = None
+
+    def ready(self) -> bool:
+        # NPC が担当するプレイヤーは常に接続しているものとして扱います。
+        return all(sender is not None or (self.npc is not None and self.npc[0] == i)
+                   for i, sender in enumerate(self.senders))
+
+    def reset_turn(self) -> None:
+        self.actions = [None, None]
+        self.submitted = [False, False]
+        if self.deadline is not None:
+            self.deadline.cancel()
+            self.deadline = None
+
+
+class MatchHub:
+    """matchId ごとの _Room を管理し、アクションの受け付け・ターンの解決・送信を行います。"""
+
+    def __init__(self, registry: MatchRegistry, writer: Optional[MatchWriteBehind] = None,
+                 turn_timeout: float = DEFAULT_TURN_TIMEOUT_SECONDS, locks: MatchLocks = match_locks,
+                 tokens: Optional[MatchTokens] = None):
+        self.registry = registry
+        self.writer = writer
+        self.turn_timeout = turn_timeout
+        self.locks = locks
+        self.tokens = tokens
+        self._rooms: Dict[str, _Room] = {}
+        self._npcs: Dict[str, Tuple[int, Policy]] = {}
+        self._tasks: Set[asyncio.Task] = set() # 期限切れで開始した解決のタスク（完了まで参照を保持します）
+        self._rng = random.Random()
+        self.turns_resolved = 0
+        self.timeouts = 0
+        registry.on_remove(self.retire)
+
+    @classmethod
+    def from_env(cls) -> 'MatchHub':
+        return cls(match_registry, match_writer,
+                   turn_timeout=float(os.getenv("MATCH_TURN_TIMEOUT_SECONDS", DEFAULT_TURN_TIMEOUT_SECONDS)),
+                   tokens=match_tokens)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def register_npc(self, match_id: str, index: int, policy: Policy) -> None:
+        """試合のプレイヤー index を NPC が担当するようにします。NPC は各ターンの開始時にすぐアクションを出します。"""
+        self._npcs[match_id] = (index, policy)
+        room = self._rooms.get(match_id)
+        if room is not None:
+            room.npc = self._npcs[match_id]
+
+    async def join(self, match_id: str, player_id: str, send: Send, token: Optional[str] = None) -> int:
+        """
+        プレイヤーの接続を登録し、プレイヤーの位置（0 または 1）を返します。同じプレイヤーの再接続は古い接続を置き換えます。
+        tokens を指定したハブでは、token がその位置のプレイヤーのトークンでなければ接続を拒否します。
+        """
+        room = self._rooms.get(match_id)
+        if room is None:
+            engine = self.registry.get(match_id)
+            if engine is None:
+                raise MatchChannelError(4404, "Match not found")
+            room = self._rooms[match_id] = _Room(match_id, engine, self._npcs.get(match_id))
+            async with self.locks.hold(match_id):
+                await self._npc_move(room)
+        player_ids = [p.player_id for p in room.engine.core.players]
+        index = player_ids.index(player_id) if player_id in player_ids else None
+        if index is None or (self.tokens is not None and self.tokens.seat(match_id, token) != index):
+            if not any(room.senders):
+                del self._rooms[match_id]
+            raise MatchChannelError(4403, "Player is not in this match" if index is None else "Invalid match token")
+        room.senders[index] = send
+        room.views[index] = None
+        # 両プレイヤーがそろった時点でターンが始まっていなければ、最初のターンを開始します。
+        if room.ready() and room.engine.core.turn == 0:
+            await self._start_turn(room)
+        else:
+            await self._send_update(room, index)
+        return index
+
+    def leave(self, match_id: str, index: int, send: Send) -> None:
+        """接続を解除します。両プレイヤーとも切断した試合は、解決待ちのアクションを破棄します。"""
+        room = self._rooms.get(match_id)
+        if room is None or room.senders[index] is not send:
+            return
+        room.senders[index] = None
+        if not any(room.senders):
+            room.reset_turn()
+            del self._rooms[match_id]
+
+    async def submit(self, match_id: str, index: int, card_id: Optional[str]) -> None:
+        """
+        アクションを受け付けます。card_id が None の場合はパスです。同じターンに再送した場合は後のアクションで置き換えます。
+        手札に無いカードは受け付けず、エラーを返します。
+        """
+        room = self._rooms.get(match_id)
+        if room is None:
+            return
+        sender = room.senders[index]
+        if not self._current(room):
+            await sender({'type': 'error', 'detail': "Match not found"})
+            return
+        core = room.engine.core
+        if core.phase != PHASE_ACTION:
+            await sender({'type': 'error', 'detail': f"Actions are not accepted in phase {PHASES[core.phase]}"})
+            return
+        player = core.players[index]
+        if card_id is not None and not any(core.cards.ids[c] == card_id for c in player.hand):
+            await sender({'type': 'error', 'detail': f"Card {card_id} is not in hand"})
+            return
+        room.actions[index] = Action(playerId=player.player_id, cardId=card_id) if card_id is not None else None
+        room.submitted[index] = True
+        if all(room.submitted):
+            await self._resolve(room)
+            return
+        await sender({'type': 'accepted', 'turn': core.turn})
+        if room.deadline is None:
+            room.deadline = asyncio.get_running_loop().call_later(self.turn_timeout, self._on_deadline, room)
+
+    def _on_deadline(self, room: _Room) -> None:
+        room.deadline = None
+        if self._rooms.get(room.match_id) is room and any(room.submitted):
+            self.timeouts += 1
+            task = asyncio.ensure_future(self._resolve(room))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to resolve a timed-out turn", exc_info=task.exception())
+
+    async def close(self) -> None:
+        """実行中の期限切れの解決をキャンセルし、ターンの期限のタイマーを止めます（アプリケーションの終了時に呼び出します）。"""
+        for room in self._rooms.values():
+            if room.deadline is not None:
+                room.deadline.cancel()
+                room.deadline = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def expire(self, match_id: str, engine: GameEngine) -> None:
+        """
+        ターンの期限切れとして、出されたアクションだけでターンを解決します（スケジューラーから呼び出します）。
+        最初のターンが始まっていない場合は開始し、誰も接続していない試合は両プレイヤーともパスとして進めます。
+        """
+        room = self._rooms.get(match_id)
+        if room is None:
+            async with self.locks.hold(match_id):
+                if self.registry.get(match_id) is not engine:
+                    return
+                if engine.core.turn > 0:
+                    engine.play_actions(None, None)
+                engine.start_turn()
+                self.registry.touch(match_id)
+                if self.writer is not None:
+                    await self.writer.mark_dirty(match_id, engine)
+        elif room.engine.core.turn == 0:
+            await self._start_turn(room)
+        else:
+            self.timeouts += 1
+            await self._resolve(room)
+
+    def retire(self, match_id: str) -> None:
+        """終了した試合の解決待ちのアクションと NPC の登録を破棄します。以降のアクションは無視されます。"""
+        self._npcs.pop(match_id, None)
+        room = self._rooms.pop(match_id, None)
+        if room is not None:
+            room.reset_turn()
+
+    async def _resolve(self, room: _Room) -> None:
+        # ロックを待つ間に同じターンが解決された場合（期限切れと2人目のアクションが重なった場合など）は何もしません。
+        turn = room.engine.core.turn
+        async with self.locks.hold(room.match_id):
+            if room.engine.core.turn != turn or room.engine.core.phase != PHASE_ACTION or not self._current(room):
+                return
+            actions = room.actions
+            room.reset_turn()
+            room.engine.play_actions(*actions)
+            self.turns_resolved += 1
+            await self._begin_turn(room)
+        await self._broadcast(room)
+
+    async def _start_turn(self, room: _Room) -> None:
+        # 最初のターンを開始します。
+        async with self.locks.hold(room.match_id):
+            if room.engine.core.turn != 0 or not self._current(room):
+                return
+            await self._begin_turn(room)
+        await self._broadcast(room)
+
+    async def _begin_turn(self, room: _Room) -> None:
+        room.engine.start_turn()
+        await self._npc_move(room)
+        await self._commit(room)
+
+    async def _npc_move(self, room: _Room) -> None:
+        # NPC のアクションは期限のタイマーを開始せず、相手のアクションを待ちます。
+        # ポリシーは探索や均衡の計算に時間がかかる場合があるため、イベントループを止めないようにスレッドで実行します
+        # （呼び出し側が matchId のロックを保持しているため、その間に試合は変更されません）。
+        if room.npc is None or room.engine.core.phase != PHASE_ACTION:
+            return
+        index, policy = room.npc
+        players = room.engine.core.players
+        card = await asyncio.get_running_loop().run_in_executor(
+            None, policy, room.engine, players[index], players[1 - index], self._rng)
+        if card >= 0:
+            room.actions[index] = Action(playerId=players[index].player_id, cardId=room.engine.core.cards.ids[card])
+        room.submitted[index] = True
+
+    def _current(self, room: _Room) -> bool:
+        # ルームのエンジンがレジストリの試合のままかを確認し、破棄・置き換えられていればルームを破棄します。
+        if self.registry.get(room.match_id) is room.engine:
+            return True
+        if self._rooms.get(room.match_id) is room:
+            self.retire(room.match_id)
+        return False
+
+    async def _commit(self, room: _Room) -> None:
+        if not self._current(room):
+            return
+        self.registry.touch(room.match_id)
+        if self.writer is not None:
+            await self.writer.mark_dirty(room.match_id, room.engine)
+
+    async def _broadcast(self, room: _Room) -> None:
+        await asyncio.gather(*(self._send_update(room, i) for i, sender in enumerate(room.senders) if sender))
+
+    async def _send_update(self, room: _Room, index: int) -> None:
+        # 前回送ったビューからの差分を送り、初回（または再接続後）はビュー全体を送ります。
+        engine = room.engine
+        sender = room.senders[index]
+        message: Message = {'type': 'update', 'matchId': room.match_id, 'version': engine.version}
+        view = engine.view(index)
+        base = room.views[index]
+        if base is not None:
+            message.update(baseVersion=base['version'], patch=view_patch(base, view))
+        else:
+            message['view'] = view
+        room.views[index] = view
+        try:
+            await sender(message)
+        except Exception:
+            # 送信できない接続は受信側のループで切断として処理されます。
+            room.views[index] = None
+
+
+# アプリケーション全体で共有するハブです。
+match_hub = MatchHub.from_env()
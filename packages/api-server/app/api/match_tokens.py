@@ -0,0 +1,80 @@
+# packages/api-server/app/api/match_tokens.py
+# 試合ごとのアクセス用のトークンです。試合の作成時に発行し、X-Match-Token ヘッダー（WebSocket は ?token=）で受け取ります。
+#
+#   ホストのトークン        試合を作成したクライアントに返します。状態全体（両プレイヤーの手札と山札の順番を含む）を
+#                           返すエンドポイントと、両プレイヤーのアクションをまとめて送るエンドポイントに必要です。
+#   プレイヤーのトークン    プレイヤーの位置ごとに発行します。そのプレイヤーのビュー・WebSocket の接続・NPC の助言に使います。
+#
+# トークンはプロセス内に保持し、試合がレジストリから破棄されると一緒に破棄します。
+import hmac
+import secrets
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.game.match_registry import MatchRegistry, match_registry
+
+
+class _Issued(NamedTuple):
+    host: str
+    players: Tuple[str, ...]
+
+
+def _matches(token: Optional[str], expected: str) -> bool:
+    return token is not None and hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+
+class MatchTokens:
+    """matchId ごとのホストとプレイヤーのトークンです。トークンを発行していない試合には、どのトークンでもアクセスできません。"""
+
+    def __init__(self, registry: MatchRegistry):
+        self._issued: Dict[str, _Issued] = {}
+        self._lock = threading.Lock()
+        registry.on_remove(self.discard)
+
+    def issue(self, match_id: str, players: int = 2) -> Tuple[str, List[str]]:
+        """試合のトークンを発行し、(ホストのトークン, プレイヤーの位置ごとのトークン) を返します。"""
+        issued = _Issued(secrets.token_urlsafe(24), tuple(secrets.token_urlsafe(24) for _ in range(players)))
+        with self._lock:
+            self._issued[match_id] = issued
+        return issued.host, list(issued.players)
+
+    def discard(self, match_id: str) -> None:
+        with self._lock:
+            self._issued.pop(match_id, None)
+
+    def is_host(self, match_id: str, token: Optional[str]) -> bool:
+        issued = self._issued.get(match_id)
+        return issued is not None and _matches(token, issued.host)
+
+    def seat(self, match_id: str, token: Optional[str]) -> Optional[int]:
+        """token がプレイヤーのトークンであれば、そのプレイヤーの位置を返します。"""
+        issued = self._issued.get(match_id)
+        if issued is None:
+            return None
+        return next((i for i, expected in enumerate(issued.players) if _matches(token, expected)), None)
+
+    def require_host(self, match_id: str, token: Optional[str]) -> None:
+        """token がホストのトークンでなければ 401 または 403 を送出します。"""
+        _require(token)
+        if not self.is_host(match_id, token):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Match token does not grant this access")
+
+    def require_seat(self, match_id: str, token: Optional[str], index: int) -> None:
+        """token がホストまたは位置 index のプレイヤーのトークンでなければ 401 または 403 を送出します。"""
+        _require(token)
+        if not self.is_host(match_id, token) and self.seat(match_id, token) != index:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Match token does not grant this access")
+
+    def __len__(self) -> int:
+        return len(self._issued)
+
+
+def _require(token: Optional[str]) -> None:
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-Match-Token header is required")
+
+
+# アプリケーション全体で共有するトークンです。
+match_tokens = MatchTokens(match_registry)
@@ -0,0 +1,443 @@
+# packages/api-server/app/api/matchmaking.py
+# サーバー側でプレイヤーを組み合わせるマッチメイキングと、進行中の試合を管理するスケジューラーです。
+# 参加したプレイヤーはレーティング帯（bucket_width ごと）の待ち行列に入り、同じ帯の相手と先着順に組み合わされます。
+# 待ち時間が widen_after 秒を超えるごとに隣の帯まで相手を探し、npc_after 秒を超えると NPC（既定は探索 NPC）と対戦させます。
+# 作成した試合はレジストリとスケジューラーに登録され、スケジューラーがターンの期限と終了した試合の破棄を担当します。
+import argparse
+import asyncio
+import heapq
+import hmac
+import itertools
+import os
+import random
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from ..game.engine import GameEngine
+from ..game.match_registry import MatchRegistry, match_registry
+from ..game.simulation import POLICIES, Policy
+from ..game.state import PHASE_GAME_OVER
+from ..game.templates import card_template_registry
+from .match_channel import MatchHub, match_hub
+
+# 既定の設定値です。環境変数で上書きできます。
+DEFAULT_BUCKET_WIDTH = 100
+DEFAULT_WIDEN_AFTER_SECONDS = 5.0
+DEFAULT_NPC_AFTER_SECONDS = 20.0
+DEFAULT_TICK_SECONDS = 0.1
+DEFAULT_TURN_TIMEOUT_SECONDS = 45.0
+DEFAULT_MAX_IDLE_TURNS = 3
+DEFAULT_RETIRE_AFTER_SECONDS = 60.0
+DEFAULT_NPC_POLICY = 'search'
+
+# NPC のプレイヤーIDです。
+NPC_PLAYER_ID = 'npc'
+
+# 待ち時間の統計に使う、直近の組み合わせの件数です。
+_WAIT_SAMPLES = 1024
+# 組み合わせが決まったがまだ受け取られていないチケットを保持する件数の上限です。
+_MAX_UNCLAIMED = 10000
+
+
+class MatchAssignment(BaseModel):
+    matchId: str
+    playerId: str
+    opponentId: str
+    npc: bool
+    waitedSeconds: float
+    token: Optional[str] = None # WebSocket の接続に使うプレイヤーのトークン（ハブが確認する場合のみ）
+
+
+class MatchmakingStats(BaseModel):
+    queued: int
+    buckets: int
+    activeMatches: int
+    matchesCreated: int
+    npcMatches: int
+    cancelled: int
+    timeToMatchMean: float
+    timeToMatchP95: float
+    turnTimeouts: int
+    retired: int
+    abandoned: int
+
+
+class Ticket:
+    """
+    待ち行列の1件です。matched は組み合わせが決まると MatchAssignment で完了します。
+    secret は最初の参加時にだけプレイヤーに返し、同じチケットの再参加（結果の受け取り）と待ち行列からの離脱に必要です。
+    """
+    __slots__ = ('player_id', 'rating', 'deck', 'bucket', 'enqueued_at', 'matched', 'cancelled', 'secret')
+
+    def __init__(self, player_id: str, rating: Optional[int], deck: Optional[Dict[str, int]],
+                 bucket: Optional[int], enqueued_at: float, matched: 'asyncio.Future[MatchAssignment]'):
+        self.player_id = player_id
+        self.rating = rating
+        self.deck = deck
+        self.bucket = bucket
+        self.enqueued_at = enqueued_at
+        self.matched = matched
+        self.cancelled = False
+        self.secret = secrets.token_urlsafe(24)
+
+    def owned_by(self, secret: Optional[str]) -> bool:
+        return secret is not None and hmac.compare_digest(secret.encode('utf-8'), self.secret.encode('utf-8'))
+
+
+class _Live:
+    __slots__ = ('engine', 'version', 'deadline', 'idle_turns', 'finished')
+
+    def __init__(self, engine: GameEngine, deadline: float):
+        self.engine = engine
+        self.version = engine.version
+        self.deadline = deadline
+        self.idle_turns = 0
+        self.finished = False
+
+
+class MatchScheduler:
+    """
+    進行中の試合を期限の順に並べたヒープで管理します。
+    turn_timeout 秒の間に状態が進まなかった試合はハブ経由でターンを期限切れにし、それが max_idle_turns 回続くと放棄された試合として破棄します。
+    終了した試合は retire_after 秒後（結果を取得する猶予の後）にレジストリから破棄します。
+    削除や期限切れでレジストリから破棄された試合は、その時点で管理の対象から外します。
+    """
+
+    def __init__(self, registry: MatchRegistry, hub: MatchHub, turn_timeout: float = DEFAULT_TURN_TIMEOUT_SECONDS,
+                 max_idle_turns: int = DEFAULT_MAX_IDLE_TURNS, retire_after: float = DEFAULT_RETIRE_AFTER_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.registry = registry
+        self.hub = hub
+        self.turn_timeout = turn_timeout
+        self.max_idle_turns = max_idle_turns
+        self.retire_after = retire_after
+        self._clock = clock
+        self._live: Dict[str, _Live] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self.turn_timeouts = 0
+        self.retired = 0
+        self.abandoned = 0
+        registry.on_remove(self._forget)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, match_id: str, engine: GameEngine) -> None:
+        live = self._live[match_id] = _Live(engine, self._clock() + self.turn_timeout)
+        self._push(match_id, live)
+
+    def _push(self, match_id: str, live: _Live) -> None:
+        heapq.heappush(self._heap, (live.deadline, next(self._seq), match_id))
+
+    async def tick(self) -> None:
+        """期限を過ぎた試合を処理します。"""
+        now = self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, match_id = heapq.heappop(self._heap)
+            live = self._live.get(match_id)
+            if live is None or live.deadline != deadline:
+                continue
+            if live.finished:
+                self._retire(match_id)
+                self.retired += 1
+                continue
+            if live.engine.core.phase == PHASE_GAME_OVER:
+                live.finished = True
+                live.deadline = now + self.retire_after
+            elif live.engine.version != live.version:
+                # 期限内に状態が進んでいれば、次のターンの期限を設定し直します。
+                live.idle_turns = 0
+                live.version = live.engine.version
+                live.deadline = now + self.turn_timeout
+            elif live.idle_turns >= self.max_idle_turns:
+                self._retire(match_id)
+                self.abandoned += 1
+                continue
+            else:
+                self.turn_timeouts += 1
+                live.idle_turns += 1
+                await self.hub.expire(match_id, live.engine)
+                live.version = live.engine.version
+                live.deadline = now + (self.retire_after if live.engine.core.phase == PHASE_GAME_OVER
+                                       else self.turn_timeout)
+                live.finished = live.engine.core.phase == PHASE_GAME_OVER
+            self._push(match_id, live)
+
+    def _forget(self, match_id: str) -> None:
+        # ヒープに残った期限は、取り出す際に読み飛ばします。
+        self._live.pop(match_id, None)
+
+    def _retire(self, match_id: str) -> None:
+        del self._live[match_id]
+        self.hub.retire(match_id)
+        self.registry.remove(match_id)
+
+
+class MatchmakingService:
+    """
+    レーティング帯ごとの FIFO の待ち行列です。各帯の先頭が最も長く待っているプレイヤーなので、
+    帯の拡大と NPC との対戦の判定は各帯の先頭だけを調べれば済みます。取り消された参加は取り出す際に読み飛ばします。
+    rating を指定しないプレイヤーは専用の帯で組み合わされます。
+    """
+
+    def __init__(self, registry: MatchRegistry, scheduler: MatchScheduler,
+                 card_templates: Callable = lambda: card_template_registry.current,
+                 bucket_width: int = DEFAULT_BUCKET_WIDTH, widen_after: float = DEFAULT_WIDEN_AFTER_SECONDS,
+                 npc_after: Optional[float] = DEFAULT_NPC_AFTER_SECONDS, tick: float = DEFAULT_TICK_SECONDS,
+                 npc_policy: Policy = POLICIES[DEFAULT_NPC_POLICY], clock: Callable[[], float] = time.monotonic):
+        self.registry = registry
+        self.scheduler = scheduler
+        self.card_templates = card_templates
+        self.bucket_width = bucket_width
+        self.widen_after = widen_after
+        self.npc_after = npc_after
+        self.npc_policy = npc_policy
+        self.tick_seconds = tick
+        self._clock = clock
+        self._buckets: Dict[Optional[int], Deque[Ticket]] = {}
+        self._tickets: Dict[str, Ticket] = {}
+        self._unclaimed: 'OrderedDict[str, Ticket]' = OrderedDict()
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._task: Optional[asyncio.Task] = None
+        self.matches_created = 0
+        self.npc_matches = 0
+        self.cancelled = 0
+
+    @classmethod
+    def from_env(cls) -> 'MatchmakingService':
+        npc_after = float(os.getenv("MATCHMAKING_NPC_AFTER_SECONDS", DEFAULT_NPC_AFTER_SECONDS))
+        scheduler = MatchScheduler(
+            match_registry, match_hub,
+            turn_timeout=float(os.getenv("MATCH_SCHEDULER_TURN_TIMEOUT_SECONDS", DEFAULT_TURN_TIMEOUT_SECONDS)),
+            max_idle_turns=int(os.getenv("MATCH_SCHEDULER_MAX_IDLE_TURNS", DEFAULT_MAX_IDLE_TURNS)),
+            retire_after=float(os.getenv("MATCH_SCHEDULER_RETIRE_AFTER_SECONDS", DEFAULT_RETIRE_AFTER_SECONDS)),
+        )
+        return cls(
+            match_registry, scheduler,
+            bucket_width=int(os.getenv("MATCHMAKING_BUCKET_WIDTH", DEFAULT_BUCKET_WIDTH)),
+            widen_after=float(os.getenv("MATCHMAKING_WIDEN_AFTER_SECONDS", DEFAULT_WIDEN_AFTER_SECONDS)),
+            npc_after=npc_after if npc_after > 0 else None,
+            npc_policy=POLICIES[os.getenv("MATCHMAKING_NPC_POLICY", DEFAULT_NPC_POLICY)],
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._tickets)
+
+    def join(self, player_id: str, rating: Optional[int] = None, deck: Optional[Dict[str, int]] = None,
+             secret: Optional[str] = None) -> Ticket:
+        """
+        待ち行列に参加し、チケットを返します。既に参加しているプレイヤーや、組み合わせが決まって
+        まだ claim していないプレイヤーには、secret がそのチケットのものであれば同じチケットを返し、
+        そうでなければ PermissionError を送出します。同じ帯に待っているプレイヤーがいれば、その場で組み合わせます。
+        """
+        ticket = self._tickets.get(player_id) or self._unclaimed.get(player_id)
+        if ticket is not None:
+            if not ticket.owned_by(secret):
+                raise PermissionError("Ticket secret does not match")
+            return ticket
+        bucket = rating // self.bucket_width if rating is not None else None
+        ticket = Ticket(player_id, rating, deck, bucket, self._clock(), asyncio.get_running_loop().create_future())
+        opponent = self._pop_head(bucket)
+        if opponent is not None:
+            self._create_match(opponent, ticket)
+            return ticket
+        self._tickets[player_id] = ticket
+        self._buckets.setdefault(bucket, deque()).append(ticket)
+        return ticket
+
+    def claim(self, ticket: Ticket) -> None:
+        """組み合わせの結果をプレイヤーに渡したことを記録します。以降の join は新しく参加します。"""
+        if self._unclaimed.get(ticket.player_id) is ticket:
+            del self._unclaimed[ticket.player_id]
+
+    def leave(self, player_id: str, secret: Optional[str]) -> bool:
+        """
+        待ち行列から抜けます。組み合わせが決まる前であれば True を返します。
+        secret がそのプレイヤーのチケットのものでなければ PermissionError を送出します。
+        """
+        ticket = self._tickets.get(player_id)
+        if ticket is None:
+            return False
+        if not ticket.owned_by(secret):
+            raise PermissionError("Ticket secret does not match")
+        del self._tickets[player_id]
+        ticket.cancelled = True
+        ticket.matched.cancel()
+        self.cancelled += 1
+        return True
+
+    def _pop_head(self, bucket: Optional[int]) -> Optional[Ticket]:
+        queue = self._buckets.get(bucket)
+        while queue:
+            ticket = queue.popleft()
+            if not ticket.cancelled:
+                del self._tickets[ticket.player_id]
+                if not queue:
+                    del self._buckets[bucket]
+                return ticket
+        self._buckets.pop(bucket, None)
+        return None
+
+    def _peek_head(self, bucket: Optional[int]) -> Optional[Ticket]:
+        queue = self._buckets.get(bucket)
+        while queue and queue[0].cancelled:
+            queue.popleft()
+        if queue:
+            return queue[0]
+        self._buckets.pop(bucket, None)
+        return None
+
+    def match_waiting(self) -> int:
+        """帯の拡大と NPC との対戦で組み合わせられるプレイヤーを組み合わせ、作成した試合数を返します。"""
+        now = self._clock()
+        created = 0
+        for bucket in sorted((b for b in self._buckets if b is not None)):
+            head = self._peek_head(bucket)
+            if head is None:
+                continue
+            span = int((now - head.enqueued_at) // self.widen_after) if self.widen_after > 0 else 0
+            for distance in range(1, span + 1):
+                for neighbor in (bucket - distance, bucket + distance):
+                    if self._peek_head(neighbor) is not None:
+                        first = self._pop_head(bucket)
+                        self._create_match(first, self._pop_head(neighbor))
+                        created += 1
+                        break
+                else:
+                    continue
+                break
+        if self.npc_after is not None:
+            for bucket in list(self._buckets):
+                head = self._peek_head(bucket)
+                while head is not None and now - head.enqueued_at >= self.npc_after:
+                    self._create_match(self._pop_head(bucket), None)
+                    created += 1
+                    head = self._peek_head(bucket)
+        return created
+
+    def _create_match(self, first: Ticket, second: Optional[Ticket]) -> None:
+        now = self._clock()
+        opponent_id = second.player_id if second is not None else NPC_PLAYER_ID
+        engine = GameEngine.new_match(first.player_id, opponent_id, self.card_templates(),
+                                      first.deck, second.deck if second is not None else None, instrumented=True)
+        match_id = engine.core.match_id
+        self.registry.put(match_id, engine)
+        if second is None:
+            self.scheduler.hub.register_npc(match_id, 1, self.npc_policy)
+            self.npc_matches += 1
+        self.scheduler.add(match_id, engine)
+        self.matches_created += 1
+        tokens = self.scheduler.hub.tokens
+        seats = tokens.issue(match_id)[1] if tokens is not None else [None, None]
+        for ticket, other, token in ((first, opponent_id, seats[0]), (second, first.player_id, seats[1])):
+            if ticket is None:
+                continue
+            waited = now - ticket.enqueued_at
+            self._waits.append(waited)
+            self._unclaimed[ticket.player_id] = ticket
+            if len(self._unclaimed) > _MAX_UNCLAIMED:
+                self._unclaimed.popitem(last=False)
+            if not ticket.matched.done():
+                ticket.matched.set_result(MatchAssignment(matchId=match_id, playerId=ticket.player_id,
+                                                          opponentId=other, npc=second is None,
+                                                          waitedSeconds=waited, token=token))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            self.match_waiting()
+            await self.scheduler.tick()
+
+    def start(self) -> None:
+        """組み合わせとスケジューラーを一定間隔で実行するタスクを開始します（アプリケーションの起動時に呼び出します）。"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> MatchmakingStats:
+        waits = sorted(self._waits)
+        return MatchmakingStats(
+            queued=len(self._tickets),
+            buckets=len(self._buckets),
+            activeMatches=len(self.scheduler),
+            matchesCreated=self.matches_created,
+            npcMatches=self.npc_matches,
+            cancelled=self.cancelled,
+            timeToMatchMean=sum(waits) / len(waits) if waits else 0.0,
+            timeToMatchP95=waits[int(len(waits) * 0.95)] if waits else 0.0,
+            turnTimeouts=self.scheduler.turn_timeouts,
+            retired=self.scheduler.retired,
+            abandoned=self.scheduler.abandoned,
+        )
+
+
+# アプリケーション全体で共有するマッチメイキングです。
+matchmaking = MatchmakingService.from_env()
+
+
+async def _benchmark(players: int, seed: int, bucket_width: int) -> Dict[str, float]:
+    # 1プロセスで players 人がそれぞれコルーチンとして参加して組み合わせを待ち、全員が組み合わされるまでの時間を計測します。
+    # その後、すべての試合のターンを期限切れにして、スケジューラーが1回の処理で全試合を進める時間を計測します。
+    rng = random.Random(seed)
+    clock = [0.0]
+    registry = MatchRegistry(max_matches=players)
+    scheduler = MatchScheduler(registry, MatchHub(registry), turn_timeout=1.0, clock=lambda: clock[0])
+    service = MatchmakingService(registry, scheduler, bucket_width=bucket_width, widen_after=1.0, npc_after=None,
+                                 clock=lambda: clock[0])
+    waits: List[float] = []
+
+    async def player(i: int) -> None:
+        ticket = service.join(f'player-{i}', rating=int(rng.gauss(1500, 300)))
+        waits.append((await ticket.matched).waitedSeconds)
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(player(i)) for i in range(players)]
+    await asyncio.sleep(0)
+    joined = time.perf_counter() - started
+    peak_queued = service.queued
+    while service.queued > 1:
+        clock[0] += 1.0 # 1秒ごとに帯を1つ広げます。
+        service.match_waiting()
+        await asyncio.sleep(0)
+    matched = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+
+    clock[0] += scheduler.turn_timeout
+    started = time.perf_counter()
+    await scheduler.tick()
+    tick = time.perf_counter() - started
+    return {
+        'players': players,
+        'joinSeconds': joined,
+        'peakQueued': peak_queued,
+        'matchedSeconds': matched,
+        'matches': service.matches_created,
+        'simulatedMeanWait': sum(waits) / len(waits) if waits else 0.0,
+        'activeMatches': len(scheduler),
+        'schedulerTickSeconds': tick,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the matchmaking queue in one process.")
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bucket-width', type=int, default=DEFAULT_BUCKET_WIDTH)
+    args = parser.parse_args()
+    for key, value in asyncio.run(_benchmark(args.players, args.seed, args.bucket_width)).items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,72 @@
+import asyncio
+from fastapi import APIRouter, Header, HTTPException, status
+from typing import Dict, Literal, Optional
+from pydantic import BaseModel, Field
+
+from ..game.decks import validate_deck
+from ..game.templates import card_template_registry
+from .matchmaking import MatchAssignment, MatchmakingStats, matchmaking
+
+router = APIRouter()
+
+# 待ち行列に参加し、組み合わせが決まるまで最大 waitSeconds 秒待ちます（ロングポーリング）。
+# 時間内に決まらなかった場合は status が 'queued' の応答を返し、同じ playerId で再度呼び出すと待ち続けられます。
+# 待っている間に決まった組み合わせは、次の呼び出しで返します。
+# 最初の参加の応答で ticketSecret を返します。再度の呼び出しと待ち行列からの離脱には、X-Ticket-Secret ヘッダーに
+# その値が必要です（他のプレイヤーの組み合わせ結果やトークンを受け取ったり、待ち行列から外したりできないようにします）。
+
+class JoinQueueRequest(BaseModel):
+    playerId: str
+    rating: Optional[int] = None
+    deck: Optional[Dict[str, int]] = None # Deck.cards と同じ形式
+    waitSeconds: float = Field(25.0, ge=0, le=60)
+
+class JoinQueueResponse(BaseModel):
+    status: Literal['matched', 'queued']
+    assignment: Optional[MatchAssignment] = None
+    ticketSecret: Optional[str] = None # 最初の参加の応答にだけ含めます
+
+def _ticket_denied(secret: Optional[str]) -> HTTPException:
+    if not secret:
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-Ticket-Secret header is required")
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ticket secret does not match")
+
+@router.post("/join", response_model=JoinQueueResponse, response_model_exclude_none=True)
+async def join_queue(request: JoinQueueRequest, x_ticket_secret: Optional[str] = Header(None)):
+    # 組み合わせが決まるとこのデッキから試合を作るため、待ち行列に入れる前にデッキの規定を確認します。
+    if request.deck is not None:
+        try:
+            validate_deck(request.deck, card_template_registry.current)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        ticket = matchmaking.join(request.playerId, request.rating, request.deck, x_ticket_secret)
+    except PermissionError:
+        raise _ticket_denied(x_ticket_secret)
+    # 既存のチケットは secret が一致した場合にだけ返るため、一致しなければ新しく作成したチケットです。
+    secret = None if ticket.owned_by(x_ticket_secret) else ticket.secret
+    try:
+        # shield により、待ち時間が過ぎてもチケット自体は取り消されません。
+        assignment = await asyncio.wait_for(asyncio.shield(ticket.matched), request.waitSeconds)
+    except asyncio.TimeoutError:
+        return JoinQueueResponse(status='queued', ticketSecret=secret)
+    except asyncio.CancelledError:
+        if ticket.matched.cancelled():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Left the queue")
+        raise
+    matchmaking.claim(ticket)
+    return JoinQueueResponse(status='matched', assignment=assignment, ticketSecret=secret)
+
+@router.delete("/queue/{player_id}", response_model=Dict[str, str])
+async def leave_queue(player_id: str, x_ticket_secret: Optional[str] = Header(None)):
+    try:
+        left = matchmaking.leave(player_id, x_ticket_secret)
+    except PermissionError:
+        raise _ticket_denied(x_ticket_secret)
+    if not left:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player is not queued")
+    return {"message": f"Player {player_id} left the queue"}
+
+@router.get("/stats", response_model=MatchmakingStats)
+async def get_matchmaking_stats():
+    return matchmaking.stats()
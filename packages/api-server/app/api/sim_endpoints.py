@@ -0,0 +1,117 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from ..game.deck_optimizer import (DEFAULT_BUDGET, DEFAULT_ETA, DEFAULT_TOP, OptimizationResult,
+                                   deck_optimizer, load_field)
+from ..game.equilibrium import DEFAULT_HORIZON, OpeningAnalysis, solver_for
+from ..game.simulation import DEFAULT_MAX_TURNS, BatchResult, simulate_batch
+from ..game.templates import card_template_registry
+from ..game.tournament import (DEFAULT_GAMES, TournamentConfig, TournamentResult, output_path,
+                               tournament_runner)
+
+router = APIRouter()
+
+class BatchSimulationRequest(BaseModel):
+    deck1: Dict[str, int] # Deck.cards と同じ形式（templateId -> 枚数）
+    deck2: Dict[str, int]
+    policy1: str = 'random'
+    policy2: str = 'random'
+    matches: int = Field(1000, ge=1, le=100000)
+    seed: int = 0
+    maxTurns: int = Field(DEFAULT_MAX_TURNS, ge=1, le=1000)
+
+@router.post("/batch", response_model=BatchResult)
+async def run_batch_simulation(request: BatchSimulationRequest):
+    # CPUを使う処理なので、イベントループを塞がないようにスレッド経由でプロセスプールに渡します。
+    try:
+        return await run_in_threadpool(
+            simulate_batch,
+            request.deck1,
+            request.deck2,
+            request.policy1,
+            request.policy2,
+            matches=request.matches,
+            seed=request.seed,
+            card_templates=card_template_registry.current,
+            max_turns=request.maxTurns,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+class EquilibriumRequest(BaseModel):
+    deck1: Dict[str, int]
+    deck2: Dict[str, int]
+    horizon: int = Field(DEFAULT_HORIZON, ge=1, le=5)
+
+# 両デッキで試合を始めたときの均衡での値（プレイヤー1から見た -1 〜 1）を求めます（バランス分析用）。
+# 解はカードテンプレートの集合ごとにメモ化され、同じ局面を含む2回目以降の分析は速くなります。
+@router.post("/equilibrium", response_model=OpeningAnalysis)
+async def analyze_equilibrium(request: EquilibriumRequest):
+    solver = solver_for(card_template_registry.current)
+    try:
+        return await run_in_threadpool(solver.analyze_opening, request.deck1, request.deck2, request.horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+class DeckOptimizationRequest(BaseModel):
+    field: Optional[Dict[str, Dict[str, int]]] = None # デッキ名 -> cards。省略すると public/decks のデッキ
+    candidates: Optional[List[Dict[str, int]]] = None # 省略すると全ての規定のデッキ
+    policy: str = 'random'
+    budget: int = Field(DEFAULT_BUDGET, ge=1, le=1000000)
+    eta: int = Field(DEFAULT_ETA, ge=2, le=10)
+    top: int = Field(DEFAULT_TOP, ge=1, le=100)
+    seed: int = 0
+
+# フィールドのデッキに対して勝率の高い規定のデッキを探し、信頼区間付きで順位を返します。
+# 同じ条件の問い合わせの成績はキャッシュされ、2回目以降はシミュレーションを行いません。
+@router.post("/optimize-deck", response_model=OptimizationResult)
+async def optimize_deck(request: DeckOptimizationRequest):
+    try:
+        return await run_in_threadpool(
+            deck_optimizer.optimize,
+            request.field if request.field is not None else load_field(),
+            card_template_registry.current,
+            candidates=request.candidates,
+            policy=request.policy,
+            budget=request.budget,
+            eta=request.eta,
+            top=request.top,
+            seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+class TournamentRequest(BaseModel):
+    format: Literal['round-robin', 'swiss'] = 'round-robin'
+    decks: Optional[Dict[str, Dict[str, int]]] = None # デッキ名 -> cards。省略すると public/decks のデッキ
+    policies: List[str] = Field(default_factory=lambda: ['random'])
+    games: int = Field(DEFAULT_GAMES, ge=1, le=10000) # 1つの対戦の試合数
+    rounds: Optional[int] = Field(None, ge=1, le=20) # スイス式のラウンド数
+    seed: int = 0
+    maxTurns: int = Field(DEFAULT_MAX_TURNS, ge=1, le=1000)
+    # 指定すると結果を TOURNAMENT_DIR/{runId}.jsonl に追記し、同じ runId で再実行すると中断した所から再開します。
+    runId: Optional[str] = Field(None, pattern=r'^[A-Za-z0-9_-]{1,64}$')
+
+# デッキとポリシーの組で総当たりまたはスイス式のトーナメントを行い、Elo レーティングと対戦成績の表を返します。
+@router.post("/tournament", response_model=TournamentResult)
+async def run_tournament(request: TournamentRequest):
+    try:
+        config = TournamentConfig(
+            format=request.format,
+            decks=request.decks if request.decks is not None else load_field(),
+            policies=request.policies,
+            games=request.games,
+            rounds=request.rounds,
+            seed=request.seed,
+            maxTurns=request.maxTurns,
+        )
+        return await run_in_threadpool(
+            tournament_runner.run,
+            config,
+            card_template_registry.current,
+            output_path(request.runId) if request.runId is not None else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
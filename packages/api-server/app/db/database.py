@@ -1,62 +1,79 @@
 # packages/api-server/app/config/firebase_config.py
 
-# Firebase Admin SDKのコアモジュールをインポートします。
-import firebase_admin
-# サービスアカウント認証情報を使用するためのモジュールをインポートします。
-from firebase_admin import credentials
-# Realtime Databaseにアクセスするためのモジュールをインポートします。
-from firebase_admin import db
 # オペレーティングシステム関連の機能（環境変数の読み込みなど）を扱うためのモジュールをインポートします。
 import os
 # JSONデータを扱うためのモジュールをインポートします。
 import json
-# .envファイルから環境変数をロードするためのライブラリをインポートします。
-from dotenv import load_dotenv
-
-# .envファイルから環境変数をロードします。
-# os.path.dirname(os.path.abspath(__file__)) は現在のファイルのディレクトリパスを取得し、
-# そこから '..' を2回上がってプロジェクトのルートディレクトリにある.envファイルを指定しています。
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.env'))
-
-# 環境変数からFirebaseサービスアカウントキーのJSON文字列を取得します。
-# このキーは、Firebaseプロジェクトへのアクセスを認証するために使用されます。
-firebase_service_account_key_json = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
-# 環境変数からFirebase Realtime DatabaseのURLを取得します。
-firebase_database_url = os.getenv("FIREBASE_DATABASE_URL")
-
-# firebase_service_account_key_json が設定されていない場合、エラーを発生させます。
-# これは、アプリケーションがFirebaseに接続するために必要な情報がないことを意味します。
-if not firebase_service_account_key_json:
-    raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set.")
-
-# firebase_database_url が設定されていない場合、エラーを発生させます。
-# これは、接続するデータベースのURLが指定されていないことを意味します。
-if not firebase_database_url:
-    raise ValueError("FIREBASE_DATABASE_URL environment variable not set.")
-
-try:
-    # 取得したJSON文字列をPythonの辞書にパース（解析）します。
-    service_account_info = json.loads(firebase_service_account_key_json)
-except json.JSONDecodeError:
-    # JSONのパースに失敗した場合、エラーを発生させます。
-    # 環境変数の値が正しいJSON形式ではないことを示します。
-    raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY is not a valid JSON string.")
-
-# パースしたサービスアカウント情報を使用して、Firebaseの認証情報を生成します。
-cred = credentials.Certificate(service_account_info)
-
-# Firebase Admin SDKを初期化します。
-# `firebase_admin._apps` をチェックして、すでに初期化されている場合はスキップします。
-# これにより、同じアプリケーションが複数回初期化されるのを防ぎます。
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': firebase_database_url # データベースURLを指定して初期化します。
-    })
+# 初期化を1回だけ行うためのロックに使用します。
+import threading
+
+from app.db.push_ids import generate_push_id
+
+# Firebase Admin SDK の初期化は、最初にデータベースへアクセスしたときに行います。
+# firebase_admin とその依存ライブラリのインポートは重く、認証情報が無い環境ではインポート自体が失敗するため、
+# このモジュールのインポート時には何も行いません（app.main のインポートや、Firebaseを使わない構成の起動を速くするため）。
+_db = None
+_init_lock = threading.Lock()
+
+
+def _initialize():
+    # Firebase Admin SDKのコアモジュールと、認証情報・Realtime Database のモジュールをインポートします。
+    import firebase_admin
+    from firebase_admin import credentials, db
+    # .envファイルから環境変数をロードするためのライブラリをインポートします。
+    from dotenv import load_dotenv
+
+    # .envファイルから環境変数をロードします。
+    # os.path.dirname(os.path.abspath(__file__)) は現在のファイルのディレクトリパスを取得し、
+    # そこから '..' を2回上がってプロジェクトのルートディレクトリにある.envファイルを指定しています。
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.env'))
+
+    # 環境変数からFirebaseサービスアカウントキーのJSON文字列を取得します。
+    # このキーは、Firebaseプロジェクトへのアクセスを認証するために使用されます。
+    firebase_service_account_key_json = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
+    # 環境変数からFirebase Realtime DatabaseのURLを取得します。
+    firebase_database_url = os.getenv("FIREBASE_DATABASE_URL")
+
+    # firebase_service_account_key_json が設定されていない場合、エラーを発生させます。
+    # これは、アプリケーションがFirebaseに接続するために必要な情報がないことを意味します。
+    if not firebase_service_account_key_json:
+        raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set.")
+
+    # firebase_database_url が設定されていない場合、エラーを発生させます。
+    # これは、接続するデータベースのURLが指定されていないことを意味します。
+    if not firebase_database_url:
+        raise ValueError("FIREBASE_DATABASE_URL environment variable not set.")
+
+    try:
+        # 取得したJSON文字列をPythonの辞書にパース（解析）します。
+        service_account_info = json.loads(firebase_service_account_key_json)
+    except json.JSONDecodeError:
+        # JSONのパースに失敗した場合、エラーを発生させます。
+        # 環境変数の値が正しいJSON形式ではないことを示します。
+        raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY is not a valid JSON string.")
+
+    # パースしたサービスアカウント情報を使用して、Firebaseの認証情報を生成します。
+    cred = credentials.Certificate(service_account_info)
+
+    # Firebase Admin SDKを初期化します。
+    # `firebase_admin._apps` をチェックして、すでに初期化されている場合はスキップします。
+    # これにより、同じアプリケーションが複数回初期化されるのを防ぎます。
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(cred, {
+            'databaseURL': firebase_database_url # データベースURLを指定して初期化します。
+        })
+    return db
 
 # Firebase Realtime Databaseの参照を返す関数です。
 # 他のモジュールからこの関数を呼び出すことで、データベースにアクセスできます。
+# 最初の呼び出しでFirebaseを初期化します（複数のスレッドから同時に呼ばれても初期化は1回だけです）。
 def get_db():
-    return db
+    global _db
+    if _db is None:
+        with _init_lock:
+            if _db is None:
+                _db = _initialize()
+    return _db
 
 # --- Deck CRUD Operations ---
 
@@ -64,37 +81,31 @@ def get_deck_from_db(client_id: str, deck_id: str):
     """指定されたクライアントIDとデッキIDに基づいて、データベースから特定のデッキを取得します。"""
     if not client_id or not deck_id:
         return None
-    ref = db.reference(f'users/{client_id}/decks/{deck_id}')
+    ref = get_db().reference(f'users/{client_id}/decks/{deck_id}')
     return ref.get()
 
 def get_decks_by_client_id_from_db(client_id: str):
     """指定されたクライアントIDに基づいて、そのユーザーのすべてのデッキをデータベースから取得します。"""
     if not client_id:
         return None
-    ref = db.reference(f'users/{client_id}/decks')
+    ref = get_db().reference(f'users/{client_id}/decks')
     return ref.get()
 
 def create_deck_in_db(client_id: str, deck_data: dict):
     """新しいデッキをデータベースに作成します。"""
     if not client_id:
         raise ValueError("Client ID is required to create a deck.")
-    ref = db.reference(f'users/{client_id}/decks')
-    new_deck_ref = ref.push(deck_data)
-    deck_id = new_deck_ref.key
-    
-    # 作成したデッキデータに、Firebaseが自動生成したユニークなIDを追加して更新します。
-    update_data = {'id': deck_id}
-    new_deck_ref.update(update_data)
-    
-    # 完全なデッキデータを返すために、元のデータにIDを追加します。
-    deck_data['id'] = deck_id
-    return deck_data
+    # push() と同じ形式のキーをこちらで生成し、IDを含めたデッキを1回の書き込みで保存します。
+    deck_id = generate_push_id()
+    deck = {**deck_data, 'id': deck_id}
+    get_db().reference(f'users/{client_id}/decks/{deck_id}').set(deck)
+    return deck
 
 def update_deck_in_db(client_id: str, deck_id: str, deck_data: dict):
     """既存のデッキをデータベースで更新します。"""
     if not client_id or not deck_id:
         raise ValueError("Client ID and Deck ID are required to update a deck.")
-    ref = db.reference(f'users/{client_id}/decks/{deck_id}')
+    ref = get_db().reference(f'users/{client_id}/decks/{deck_id}')
     ref.update(deck_data)
     # 更新後の完全なデータを返すために、IDをマージします。
     return {**deck_data, 'id': deck_id}
@@ -103,7 +114,33 @@ def delete_deck_from_db(client_id: str, deck_id: str):
     """データベースから特定のデッキを削除します。"""
     if not client_id or not deck_id:
         raise ValueError("Client ID and Deck ID are required to delete a deck.")
-    ref = db.reference(f'users/{client_id}/decks/{deck_id}')
+    ref = get_db().reference(f'users/{client_id}/decks/{deck_id}')
     ref.delete()
     # 削除が成功したことを示すために、削除したデッキのIDを返します。
     return {'id': deck_id}
+
+def apply_deck_updates_in_db(client_id: str, updates: dict):
+    """
+    users/{client_id}/decks 以下の複数のパスを1回の update で書き込みます。
+    updates のキーは deckId または deckId/フィールド名 の相対パスで、値が None のパスは削除されます。
+    """
+    if not client_id:
+        raise ValueError("Client ID is required to update decks.")
+    if updates:
+        get_db().reference(f'users/{client_id}/decks').update(updates)
+    return updates
+
+# --- Match state ---
+
+def apply_match_updates_in_db(updates: dict):
+    """matches 以下の複数のパス（matchId/... の相対パス）を1回の update で書き込みます。値が None のパスは削除されます。"""
+    if updates:
+        get_db().reference('matches').update(updates)
+    return updates
+
+def transact_match_in_db(match_id: str, update):
+    """
+    matches/{match_id} をトランザクションで更新します。update は現在の値（無い場合は None）を受け取り、書き込む値を返します。
+    他の書き込みと競合した場合は update を呼び出し直します。update が送出した例外はそのまま呼び出し元に伝わります。
+    """
+    return get_db().reference(f'matches/{match_id}').transaction(update)
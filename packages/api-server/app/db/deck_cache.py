@@ -0,0 +1,162 @@
+# packages/api-server/app/db/deck_cache.py
+# クライアントごとのデッキ一覧をメモリに保持する読み込みキャッシュです（AsyncDeckStore から使用します）。
+# デッキはほとんど変更されないため、users/{clientId}/decks の読み込み結果を TTL の間再利用し、
+# このサーバーを経由した作成・更新・削除ではキャッシュをその場で更新します。
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+# 既定の上限値です。環境変数で上書きできます。TTL を0以下にするとキャッシュを使用しません。
+DEFAULT_MAX_CLIENTS = 10000
+DEFAULT_TTL_SECONDS = 60.0
+
+Decks = Dict[str, Dict[str, Any]]
+
+
+class DeckCacheStats(BaseModel):
+    clients: int
+    maxClients: int
+    ttlSeconds: float
+    hits: int
+    misses: int
+    bypasses: int
+    hitRate: float
+    evictions: Dict[str, int]
+    invalidations: int
+
+
+class _Entry:
+    __slots__ = ('decks', 'expires_at')
+
+    def __init__(self, decks: Decks, expires_at: float):
+        self.decks = decks
+        self.expires_at = expires_at
+
+
+class DeckCache:
+    """
+    clientId -> そのクライアントの全デッキ（deckId -> デッキ）の LRU キャッシュです。
+    世代はキャッシュ全体の書き込みの通し番号で、読み込みの開始時の世代より後に書き込まれたクライアントの結果は保存しません。
+    クライアントごとの最後の書き込みの世代も max_clients 件の LRU で保持し、
+    破棄した世代より前に始まった読み込みの結果は、書き込みの有無が分からないため保存しません。
+    返すデッキはキャッシュと共有されるため、呼び出し側で変更しないでください。
+    """
+
+    def __init__(self, max_clients: int = DEFAULT_MAX_CLIENTS, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_clients = max_clients
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._generation = 0
+        self._written: 'OrderedDict[str, int]' = OrderedDict() # clientId -> 最後に書き込んだ世代
+        self._forgotten = 0 # _written から破棄した世代のうち最大のもの
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.invalidations = 0
+        self.evictions = {'lru': 0, 'ttl': 0}
+
+    @classmethod
+    def from_env(cls) -> Optional['DeckCache']:
+        ttl_seconds = float(os.getenv("DECK_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        if ttl_seconds <= 0:
+            return None
+        return cls(max_clients=int(os.getenv("DECK_CACHE_MAX_CLIENTS", DEFAULT_MAX_CLIENTS)), ttl_seconds=ttl_seconds)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, client_id: str) -> Tuple[Optional[Decks], int]:
+        """キャッシュされたデッキと、現在の世代を返します。キャッシュに無い場合のデッキは None です。"""
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(client_id)
+            if entry is not None and entry.expires_at <= self._clock():
+                del self._entries[client_id]
+                self.evictions['ttl'] += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, generation
+            self.hits += 1
+            self._entries.move_to_end(client_id)
+            return entry.decks, generation
+
+    def record_bypass(self, client_id: str) -> int:
+        """キャッシュを使わずに読み込む場合に呼び出し、現在の世代を返します。"""
+        with self._lock:
+            self.bypasses += 1
+            return self._generation
+
+    def put(self, client_id: str, decks: Optional[Decks], generation: int) -> Decks:
+        """
+        バックエンドから読み込んだデッキを保存します。読み込み中にそのクライアントへの書き込みがあった場合（generation より後の世代）は保存しません。
+        保存の有無に関わらず、読み込んだデッキを返します。
+        """
+        decks = decks or {}
+        with self._lock:
+            if self._written.get(client_id, self._forgotten) > generation:
+                return decks
+            self._entries[client_id] = _Entry(decks, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(client_id)
+            while len(self._entries) > self.max_clients:
+                self._entries.popitem(last=False)
+                self.evictions['lru'] += 1
+            return decks
+
+    def store_deck(self, client_id: str, deck_id: str, deck: Dict[str, Any], merge: bool = False) -> None:
+        """作成・更新したデッキをキャッシュに反映します。merge が真なら既存のフィールドに上書きします（RTDB の update と同じ）。"""
+        with self._lock:
+            self._bump(client_id)
+            entry = self._entries.get(client_id)
+            if entry is None:
+                return
+            # 他のリクエストに返したデッキを変更しないよう、新しい辞書に置き換えます。
+            decks = dict(entry.decks)
+            base = decks.get(deck_id, {}) if merge else {}
+            decks[deck_id] = {**base, **copy.deepcopy(deck), 'id': deck_id}
+            entry.decks = decks
+
+    def remove_deck(self, client_id: str, deck_id: str) -> None:
+        with self._lock:
+            self._bump(client_id)
+            entry = self._entries.get(client_id)
+            if entry is not None and deck_id in entry.decks:
+                entry.decks = {k: v for k, v in entry.decks.items() if k != deck_id}
+
+    def invalidate(self, client_id: str) -> None:
+        """クライアントのキャッシュを破棄します（書き込みが失敗した場合など、内容が不確かな場合に使用します）。"""
+        with self._lock:
+            self._bump(client_id)
+            if self._entries.pop(client_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> DeckCacheStats:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return DeckCacheStats(
+                clients=len(self._entries),
+                maxClients=self.max_clients,
+                ttlSeconds=self.ttl_seconds,
+                hits=self.hits,
+                misses=self.misses,
+                bypasses=self.bypasses,
+                hitRate=self.hits / lookups if lookups else 0.0,
+                evictions=dict(self.evictions),
+                invalidations=self.invalidations,
+            )
+
+    def _bump(self, client_id: str) -> None:
+        self._generation += 1
+        self._written[client_id] = self._generation
+        self._written.move_to_end(client_id)
+        while len(self._written) > self.max_clients:
+            # 世代は書き込みの順に増えるため、先頭が最も古い世代です。
+            _, self._forgotten = self._written.popitem(last=False)
@@ -0,0 +1,393 @@
+# packages/api-server/app/db/deck_store.py
+# デッキの読み書きを行う非同期のデータアクセス層です。
+# firebase_admin の db.reference(...).get() などは同期的に通信するため、async なハンドラから直接呼ぶと
+# 1回の往復の間イベントループ全体が止まります。ここでは同期的な呼び出しを上限付きのスレッドプールで実行し、
+# 同時実行数の上限と呼び出しごとのタイムアウトを設けます。
+# バックエンドは DECK_BACKEND 環境変数で切り替えられ、'memory' にするとFirebaseなしで負荷試験ができます。
+# 'sqlite' にすると組み込みの SQLite（SQLITE_PATH）に保存します（ローカル開発・CI・単一ノードでの運用向け）。
+# 読み込みはクライアントごとの DeckCache を経由し、書き込みはキャッシュをその場で更新します。
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.db.deck_cache import DeckCache
+from app.db.push_ids import generate_push_id
+from app.db.sqlite import SqliteDatabase, sqlite_database
+
+# 既定の上限値です。環境変数で上書きできます。
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+DeckData = Dict[str, Any]
+# 一括書き込みの1件分です: (操作, deckId, デッキ)。操作は 'create'・'update'・'delete' のいずれかです。
+DeckOperation = Tuple[str, Optional[str], Optional[DeckData]]
+
+
+class DeckStoreTimeout(Exception):
+    """バックエンドの呼び出しがタイムアウトした場合に発生します。"""
+
+
+class DeckBackend:
+    """デッキを保存するバックエンドの同期的なインターフェースです。users/{clientId}/decks/{deckId} の構造を前提とします。"""
+
+    def get_deck(self, client_id: str, deck_id: str) -> Optional[DeckData]:
+        raise NotImplementedError
+
+    def get_decks(self, client_id: str) -> Optional[Dict[str, DeckData]]:
+        raise NotImplementedError
+
+    def create_deck(self, client_id: str, deck_data: DeckData) -> DeckData:
+        raise NotImplementedError
+
+    def update_deck(self, client_id: str, deck_id: str, deck_data: DeckData) -> Optional[DeckData]:
+        raise NotImplementedError
+
+    def delete_deck(self, client_id: str, deck_id: str) -> Optional[Dict[str, str]]:
+        raise NotImplementedError
+
+    def apply_updates(self, client_id: str, updates: Dict[str, Any]) -> None:
+        """users/{clientId}/decks からの相対パス -> 値 を1回で書き込みます。値が None のパスは削除します。"""
+        raise NotImplementedError
+
+
+class FirebaseDeckBackend(DeckBackend):
+    """app.db.database の Realtime Database 用の関数を呼び出すバックエンドです。"""
+
+    def __init__(self) -> None:
+        self._database = None
+
+    @property
+    def database(self):
+        # Firebaseを使わない構成で読み込まないよう、最初の呼び出しまでインポートを遅らせます（初期化は get_db で行われます）。
+        if self._database is None:
+            from app.db import database
+            self._database = database
+        return self._database
+
+    def get_deck(self, client_id: str, deck_id: str) -> Optional[DeckData]:
+        return self.database.get_deck_from_db(client_id, deck_id)
+
+    def get_decks(self, client_id: str) -> Optional[Dict[str, DeckData]]:
+        return self.database.get_decks_by_client_id_from_db(client_id)
+
+    def create_deck(self, client_id: str, deck_data: DeckData) -> DeckData:
+        return self.database.create_deck_in_db(client_id, deck_data)
+
+    def update_deck(self, client_id: str, deck_id: str, deck_data: DeckData) -> Optional[DeckData]:
+        return self.database.update_deck_in_db(client_id, deck_id, deck_data)
+
+    def delete_deck(self, client_id: str, deck_id: str) -> Optional[Dict[str, str]]:
+        return self.database.delete_deck_from_db(client_id, deck_id)
+
+    def apply_updates(self, client_id: str, updates: Dict[str, Any]) -> None:
+        self.database.apply_deck_updates_in_db(client_id, updates)
+
+
+class InMemoryDeckBackend(DeckBackend):
+    """
+    プロセス内の辞書にデッキを保存するバックエンドです（ローカルでの負荷試験・テスト用）。
+    latency を指定すると、呼び出しごとにその秒数だけ同期的に待機し、Realtime Database の往復を模擬します。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._users: Dict[str, Dict[str, DeckData]] = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self) -> None:
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def get_deck(self, client_id: str, deck_id: str) -> Optional[DeckData]:
+        self._round_trip()
+        with self._lock:
+            deck = self._users.get(client_id, {}).get(deck_id)
+            return copy.deepcopy(deck)
+
+    def get_decks(self, client_id: str) -> Optional[Dict[str, DeckData]]:
+        self._round_trip()
+        with self._lock:
+            decks = self._users.get(client_id)
+            return copy.deepcopy(decks) if decks else None
+
+    def create_deck(self, client_id: str, deck_data: DeckData) -> DeckData:
+        if not client_id:
+            raise ValueError("Client ID is required to create a deck.")
+        self._round_trip()
+        deck_id = generate_push_id()
+        deck = {**deck_data, 'id': deck_id}
+        with self._lock:
+            self._users.setdefault(client_id, {})[deck_id] = copy.deepcopy(deck)
+        return deck
+
+    def update_deck(self, client_id: str, deck_id: str, deck_data: DeckData) -> Optional[DeckData]:
+        if not client_id or not deck_id:
+            raise ValueError("Client ID and Deck ID are required to update a deck.")
+        self._round_trip()
+        with self._lock:
+            # Realtime Database の update と同じく、存在しないパスにも書き込みます。
+            decks = self._users.setdefault(client_id, {})
+            decks[deck_id] = {**decks.get(deck_id, {}), **copy.deepcopy(deck_data)}
+        return {**deck_data, 'id': deck_id}
+
+    def delete_deck(self, client_id: str, deck_id: str) -> Optional[Dict[str, str]]:
+        if not client_id or not deck_id:
+            raise ValueError("Client ID and Deck ID are required to delete a deck.")
+        self._round_trip()
+        with self._lock:
+            self._users.get(client_id, {}).pop(deck_id, None)
+        return {'id': deck_id}
+
+    def apply_updates(self, client_id: str, updates: Dict[str, Any]) -> None:
+        if not client_id:
+            raise ValueError("Client ID is required to update decks.")
+        self._round_trip()
+        with self._lock:
+            decks = self._users.setdefault(client_id, {})
+            for path, value in updates.items():
+                set_path(decks, path.split('/'), copy.deepcopy(value))
+
+
+def set_path(root: Dict[str, Any], parts: List[str], value: Any) -> None:
+    """root の parts のパスに value を書き込みます。Realtime Database と同じく、None は削除として扱います。"""
+    *parents, key = parts
+    node = root
+    for part in parents:
+        child = node.get(part)
+        if not isinstance(child, dict):
+            if value is None:
+                return
+            child = node[part] = {}
+        node = child
+    if value is None:
+        node.pop(key, None)
+    else:
+        node[key] = value
+
+
+class SqliteDeckBackend(DeckBackend):
+    """組み込みの SQLite にデッキを保存するバックエンドです。デッキ1つを JSON の1行として保存します。"""
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS decks (client_id TEXT NOT NULL, deck_id TEXT NOT NULL, '
+              'data TEXT NOT NULL, PRIMARY KEY (client_id, deck_id)) WITHOUT ROWID')
+
+    def __init__(self, database: SqliteDatabase):
+        self.db = database
+        database.ensure_schema(self.SCHEMA)
+
+    @staticmethod
+    def _load(conn, client_id: str, deck_id: str) -> Optional[DeckData]:
+        row = conn.execute('SELECT data FROM decks WHERE client_id = ? AND deck_id = ?',
+                           (client_id, deck_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _save(conn, client_id: str, deck_id: str, deck: Optional[DeckData]) -> None:
+        if deck:
+            conn.execute('INSERT OR REPLACE INTO decks (client_id, deck_id, data) VALUES (?, ?, ?)',
+                         (client_id, deck_id, json.dumps(deck, ensure_ascii=False)))
+        else:
+            conn.execute('DELETE FROM decks WHERE client_id = ? AND deck_id = ?', (client_id, deck_id))
+
+    def get_deck(self, client_id: str, deck_id: str) -> Optional[DeckData]:
+        return self._load(self.db.connection(), client_id, deck_id)
+
+    def get_decks(self, client_id: str) -> Optional[Dict[str, DeckData]]:
+        rows = self.db.connection().execute('SELECT deck_id, data FROM decks WHERE client_id = ?',
+                                            (client_id,)).fetchall()
+        return {deck_id: json.loads(data) for deck_id, data in rows} or None
+
+    def create_deck(self, client_id: str, deck_data: DeckData) -> DeckData:
+        if not client_id:
+            raise ValueError("Client ID is required to create a deck.")
+        deck_id = generate_push_id()
+        deck = {**deck_data, 'id': deck_id}
+        with self.db.transaction() as conn:
+            self._save(conn, client_id, deck_id, deck)
+        return deck
+
+    def update_deck(self, client_id: str, deck_id: str, deck_data: DeckData) -> Optional[DeckData]:
+        if not client_id or not deck_id:
+            raise ValueError("Client ID and Deck ID are required to update a deck.")
+        with self.db.transaction() as conn:
+            # Realtime Database の update と同じく、存在しないパスにも書き込みます。
+            self._save(conn, client_id, deck_id, {**(self._load(conn, client_id, deck_id) or {}), **deck_data})
+        return {**deck_data, 'id': deck_id}
+
+    def delete_deck(self, client_id: str, deck_id: str) -> Optional[Dict[str, str]]:
+        if not client_id or not deck_id:
+            raise ValueError("Client ID and Deck ID are required to delete a deck.")
+        with self.db.transaction() as conn:
+            self._save(conn, client_id, deck_id, None)
+        return {'id': deck_id}
+
+    def apply_updates(self, client_id: str, updates: Dict[str, Any]) -> None:
+        if not client_id:
+            raise ValueError("Client ID is required to update decks.")
+        with self.db.transaction() as conn:
+            # 書き込むデッキを読み込んでパスを順に適用し、最後にまとめて保存します。
+            decks: Dict[str, Any] = {}
+            for path in updates:
+                deck_id = path.split('/', 1)[0]
+                if deck_id not in decks:
+                    decks[deck_id] = self._load(conn, client_id, deck_id)
+            root = {deck_id: deck for deck_id, deck in decks.items() if deck is not None}
+            for path, value in updates.items():
+                set_path(root, path.split('/'), value)
+            for deck_id in decks:
+                self._save(conn, client_id, deck_id, root.get(deck_id))
+
+
+BACKENDS: Dict[str, Callable[[], DeckBackend]] = {
+    'firebase': FirebaseDeckBackend,
+    'memory': lambda: InMemoryDeckBackend(latency=float(os.getenv("DECK_BACKEND_LATENCY", 0))),
+    'sqlite': lambda: SqliteDeckBackend(sqlite_database()),
+}
+
+
+class AsyncDeckStore:
+    """
+    DeckBackend の同期的な呼び出しを、専用のスレッドプールで実行する非同期のラッパーです。
+    max_concurrency を超える呼び出しはイベントループ上で順番を待ち、待ち時間を含めて timeout 秒を超えると
+    DeckStoreTimeout を発生させます（実行中のバックエンドの呼び出し自体は中断されません）。
+    cache を指定すると、読み込みはクライアントごとのデッキ一覧のキャッシュから返します。
+    """
+
+    def __init__(self, backend: DeckBackend, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                 cache: Optional[DeckCache] = None):
+        self.backend = backend
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls) -> 'AsyncDeckStore':
+        backend = os.getenv("DECK_BACKEND", "firebase")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown DECK_BACKEND: {backend}")
+        return cls(
+            BACKENDS[backend](),
+            max_workers=int(os.getenv("DECK_STORE_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+            max_concurrency=int(os.getenv("DECK_STORE_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            timeout=float(os.getenv("DECK_STORE_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+            cache=DeckCache.from_env(),
+        )
+
+    async def _call(self, fn: Callable, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='deck-store')
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run():
+            async with self._semaphore:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+        try:
+            return await asyncio.wait_for(run(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise DeckStoreTimeout(f"Deck store call {fn.__name__} timed out after {self.timeout}s")
+
+    async def get_deck(self, client_id: str, deck_id: str, bypass_cache: bool = False) -> Optional[DeckData]:
+        if not client_id or not deck_id:
+            return None
+        if self.cache is None:
+            return await self._call(self.backend.get_deck, client_id, deck_id)
+        # キャッシュはクライアント単位なので、1つのデッキの読み込みでもデッキ一覧を読み込んで保存します。
+        decks = await self.get_decks(client_id, bypass_cache)
+        return decks.get(deck_id) if decks else None
+
+    async def get_decks(self, client_id: str, bypass_cache: bool = False) -> Optional[Dict[str, DeckData]]:
+        if not client_id:
+            return None
+        if self.cache is None:
+            return await self._call(self.backend.get_decks, client_id)
+        # バイパスした場合もバックエンドから読み込んだ最新の内容でキャッシュを更新します。
+        if bypass_cache:
+            generation = self.cache.record_bypass(client_id)
+        else:
+            decks, generation = self.cache.get(client_id)
+            if decks is not None:
+                return decks
+        return self.cache.put(client_id, await self._call(self.backend.get_decks, client_id), generation)
+
+    async def create_deck(self, client_id: str, deck_data: DeckData) -> DeckData:
+        created = await self._write(client_id, self.backend.create_deck, client_id, deck_data)
+        if self.cache is not None:
+            self.cache.store_deck(client_id, created['id'], created)
+        return created
+
+    async def update_deck(self, client_id: str, deck_id: str, deck_data: DeckData) -> Optional[DeckData]:
+        updated = await self._write(client_id, self.backend.update_deck, client_id, deck_id, deck_data)
+        if self.cache is not None and updated is not None:
+            self.cache.store_deck(client_id, deck_id, deck_data, merge=True)
+        return updated
+
+    async def delete_deck(self, client_id: str, deck_id: str) -> Optional[Dict[str, str]]:
+        deleted = await self._write(client_id, self.backend.delete_deck, client_id, deck_id)
+        if self.cache is not None:
+            self.cache.remove_deck(client_id, deck_id)
+        return deleted
+
+    async def batch(self, client_id: str, operations: List[DeckOperation]) -> List[DeckData]:
+        """
+        作成・更新・削除をまとめて1回の複数パスの update で書き込み、操作ごとの結果を返します。
+        作成するデッキのキーはこちらで生成します。1つのデッキに対する操作は1件までにしてください
+        （Realtime Database は親子関係にあるパスを同時に書き込めません）。
+        """
+        updates: Dict[str, Any] = {}
+        results: List[DeckData] = []
+        for op, deck_id, deck_data in operations:
+            if op == 'create':
+                deck_id = generate_push_id()
+                results.append({**deck_data, 'id': deck_id})
+                updates[deck_id] = results[-1]
+            elif op == 'update':
+                # 単体の更新（ref.update）と同じく、指定したフィールドだけを書き換えます。
+                for field, value in deck_data.items():
+                    updates[f'{deck_id}/{field}'] = value
+                results.append({**deck_data, 'id': deck_id})
+            elif op == 'delete':
+                updates[deck_id] = None
+                results.append({'id': deck_id})
+            else:
+                raise ValueError(f"Unknown deck operation: {op}")
+        if updates:
+            await self._write(client_id, self.backend.apply_updates, client_id, updates)
+        if self.cache is not None:
+            for (op, _, deck_data), result in zip(operations, results):
+                if op == 'delete':
+                    self.cache.remove_deck(client_id, result['id'])
+                else:
+                    self.cache.store_deck(client_id, result['id'], result, merge=op == 'update')
+        return results
+
+    async def _write(self, client_id: str, fn: Callable, *args):
+        # 書き込みが失敗・タイムアウトした場合、バックエンドに反映されたか分からないためキャッシュを破棄します。
+        try:
+            return await self._call(fn, *args)
+        except BaseException:
+            if self.cache is not None:
+                self.cache.invalidate(client_id)
+            raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# アプリケーション全体で共有するデッキストアです。
+deck_store = AsyncDeckStore.from_env()
@@ -0,0 +1,478 @@
+# packages/api-server/app/db/match_store.py
+# 進行中の試合の状態を Realtime Database の matches/{matchId} に書き込む、ライトビハインド方式の永続化層です。
+# ターンごとに状態全体を書き込む代わりに、変更された試合（ダーティな試合）を記録しておき、
+# flush_interval 秒ごとに前回書き込んだ内容との差分だけを1回の複数パスの update にまとめて書き込みます。
+# 未書き込みの試合数には上限があり、上限に達すると書き込みが終わるまで呼び出し側を待たせます（バックプレッシャー）。
+# バックエンドは MATCH_STORE_BACKEND 環境変数で切り替えられ、'memory' にするとFirebaseなしで試験できます。
+# 'sqlite' にすると組み込みの SQLite（SQLITE_PATH）に保存します。
+# 試合ごとの書き込みは、保存されている試合のバージョンがこのプロセスの書き込んだバージョンと一致する場合だけ行います
+# （比較と更新を1つのトランザクションで行います）。他のプロセスが先に同じ試合を書き込んでいた場合は上書きせず、
+# その試合を競合として on_conflict に通知します。
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.db.deck_store import set_path
+from app.db.sqlite import SqliteDatabase, sqlite_database
+from app.game.engine import GameEngine
+
+# 既定の設定値です。環境変数で上書きできます。
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+DEFAULT_MAX_DIRTY = 1000
+DEFAULT_MAX_TRACKED = 10000
+DEFAULT_TIMEOUT_SECONDS = 10.0
+
+# 書き込んだバージョンは整数だけなので、書き込んだ内容（max_tracked 試合）よりも多くの試合の分を保持します。
+_VERSIONS_PER_TRACKED = 16
+# Firebase のトランザクションを並行して実行するスレッド数です。
+_FIREBASE_TRANSACTION_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+Document = Dict[str, Any]
+
+
+
+class VersionCheck(NamedTuple):
+    """
+    試合ごとの書き込みの条件です。保存されているバージョンが expected のいずれか（None は試合が無いこと）の場合だけ書き込みます。
+    expected が None の場合（保存されているバージョンを把握していない場合）は、保存されているバージョンが
+    書き込むバージョン version 以下であることだけを確認します。
+    """
+    expected: Optional[Tuple[Optional[int], ...]]
+    version: int
+
+    def accepts(self, node: Any) -> bool:
+        stored = node.get('version') if isinstance(node, dict) else None
+        if self.expected is not None:
+            return stored in self.expected
+        return stored is None or (isinstance(stored, int) and stored <= self.version)
+
+
+class VersionConflict(Exception):
+    """保存されているバージョンが書き込みの条件を満たさない場合に発生します。"""
+
+
+def diff_paths(old: Any, new: Any, prefix: str, updates: Dict[str, Any]) -> None:
+    """
+    old から new への変更を、prefix 以下の 相対パス -> 値 として updates に追加します（値 None は削除）。
+    リストは Realtime Database と同じくインデックスをキーとするオブジェクトとして扱い、要素ごとに比較します。
+    """
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            diff_paths(old.get(key), value, f'{prefix}/{key}', updates)
+        for key in old.keys() - new.keys():
+            updates[f'{prefix}/{key}'] = None
+    elif isinstance(old, list) and isinstance(new, list) and old and new:
+        for i, value in enumerate(new):
+            diff_paths(old[i] if i < len(old) else None, value, f'{prefix}/{i}', updates)
+        for i in range(len(new), len(old)):
+            updates[f'{prefix}/{i}'] = None
+    else:
+        updates[prefix] = new
+
+
+def _group(updates: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # matches からの相対パスを、matchId -> (試合からの相対パス -> 値) にまとめます。試合全体のパスは '' です。
+    groups: Dict[str, Dict[str, Any]] = {}
+    for path, value in updates.items():
+        match_id, _, rest = path.partition('/')
+        groups.setdefault(match_id, {})[rest] = value
+    return groups
+
+
+def _apply_paths(node: Any, paths: Dict[str, Any]) -> Any:
+    # 試合1つの木構造（配列はインデックスをキーとするオブジェクト）に、試合からの相対パス -> 値 を適用した木構造を返します。
+    root = {'match': node} if node else {}
+    for path, value in paths.items():
+        set_path(root, ['match'] + (path.split('/') if path else []), InMemoryMatchBackend._to_tree(value))
+    return root.get('match') or None
+
+
+class MatchBackend:
+    """試合の状態を保存するバックエンドの同期的なインターフェースです。matches/{matchId} の構造を前提とします。"""
+
+    def apply_updates(self, updates: Dict[str, Any], checks: Optional[Dict[str, VersionCheck]] = None) -> Set[str]:
+        """
+        matches からの相対パス -> 値 を書き込みます。値が None のパスは削除します。
+        checks に指定した試合は、条件の確認と書き込みを試合ごとに1つのトランザクションで行い、条件を満たさなかった
+        （他の書き込みが先にバージョンを進めていた）試合は書き込まずに、その matchId の集合を返します。
+        """
+        raise NotImplementedError
+
+
+class FirebaseMatchBackend(MatchBackend):
+    """app.db.database の Realtime Database 用の関数を呼び出すバックエンドです。"""
+
+    def __init__(self) -> None:
+        self._database = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def database(self):
+        # Firebaseを使わない構成で読み込まないよう、最初の書き込みまでインポートを遅らせます（初期化は get_db で行われます）。
+        if self._database is None:
+            from app.db import database
+            self._database = database
+        return self._database
+
+    def apply_updates(self, updates: Dict[str, Any], checks: Optional[Dict[str, VersionCheck]] = None) -> Set[str]:
+        # Realtime Database の複数パスの update は条件付きにできないため、条件付きの試合は試合のノードごとの
+        # トランザクションで確認と書き込みを行い（並行して実行します）、条件の無い試合だけを1回の update にまとめます。
+        checks = checks or {}
+        groups = _group(updates)
+        unconditional = {path: value for path, value in updates.items() if path.partition('/')[0] not in checks}
+        conditional = [match_id for match_id in groups if match_id in checks]
+        if conditional and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=_FIREBASE_TRANSACTION_WORKERS,
+                                                thread_name_prefix='match-store-firebase')
+        futures = {match_id: self._executor.submit(self._transact, match_id, groups[match_id], checks[match_id])
+                   for match_id in conditional}
+        self.database.apply_match_updates_in_db(unconditional)
+        conflicts = set()
+        for match_id, future in futures.items():
+            try:
+                future.result()
+            except VersionConflict:
+                conflicts.add(match_id)
+        return conflicts
+
+    def _transact(self, match_id: str, paths: Dict[str, Any], check: VersionCheck) -> None:
+        def update(node):
+            if not check.accepts(node):
+                raise VersionConflict(match_id)
+            return _apply_paths(InMemoryMatchBackend._to_tree(node), paths)
+        self.database.transact_match_in_db(match_id, update)
+
+
+class InMemoryMatchBackend(MatchBackend):
+    """
+    プロセス内の辞書に試合の状態を保存するバックエンドです（ローカルでの試験用）。
+    Realtime Database と同じく配列はインデックスをキーとするオブジェクトとして保存し、読み出し時に配列へ戻します。
+    latency を指定すると、書き込みごとにその秒数だけ同期的に待機します。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.updates = 0
+        self.paths = 0
+        self._root: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def apply_updates(self, updates: Dict[str, Any], checks: Optional[Dict[str, VersionCheck]] = None) -> Set[str]:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            conflicts = {match_id for match_id, check in (checks or {}).items()
+                         if not check.accepts(self._root.get(match_id))}
+            if conflicts:
+                updates = {path: value for path, value in updates.items() if path.partition('/')[0] not in conflicts}
+            for path, value in updates.items():
+                # Realtime Database と同じく、空のオブジェクトや配列の書き込みは削除として扱います。
+                set_path(self._root, path.split('/'), self._to_tree(value))
+            self.updates += 1
+            self.paths += len(updates)
+        return conflicts
+
+    def get(self, match_id: str) -> Optional[Document]:
+        with self._lock:
+            node = self._root.get(match_id)
+            return self._from_tree(node) if node is not None else None
+
+    @classmethod
+    def _to_tree(cls, value: Any) -> Any:
+        if isinstance(value, list):
+            value = {str(i): v for i, v in enumerate(value)}
+        if isinstance(value, dict):
+            tree = {str(k): cls._to_tree(v) for k, v in value.items()}
+            return {k: v for k, v in tree.items() if v is not None} or None
+        return copy.copy(value)
+
+    @classmethod
+    def _from_tree(cls, node: Any) -> Any:
+        if not isinstance(node, dict):
+            return node
+        if node and all(k.isdigit() for k in node) and sorted(map(int, node)) == list(range(len(node))):
+            return [cls._from_tree(node[str(i)]) for i in range(len(node))]
+        return {k: cls._from_tree(v) for k, v in node.items()}
+
+
+class SqliteMatchBackend(MatchBackend):
+    """
+    組み込みの SQLite に試合の状態を保存するバックエンドです。
+    試合ごとに InMemoryMatchBackend と同じ木構造（配列はインデックスをキーとするオブジェクト）を JSON の1行として保存し、
+    1回の書き込みに含まれる試合を1つのトランザクションで読み込み・更新します。
+    """
+
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS matches (match_id TEXT PRIMARY KEY, document TEXT NOT NULL) WITHOUT ROWID'
+
+    def __init__(self, database: SqliteDatabase):
+        self.db = database
+        database.ensure_schema(self.SCHEMA)
+
+    def apply_updates(self, updates: Dict[str, Any], checks: Optional[Dict[str, VersionCheck]] = None) -> Set[str]:
+        checks = checks or {}
+        conflicts = set()
+        with self.db.transaction() as conn:
+            for match_id, paths in _group(updates).items():
+                row = conn.execute('SELECT document FROM matches WHERE match_id = ?', (match_id,)).fetchone()
+                document = json.loads(row[0]) if row else None
+                if match_id in checks and not checks[match_id].accepts(document):
+                    conflicts.add(match_id)
+                    continue
+                tree = _apply_paths(document, paths)
+                if tree:
+                    conn.execute('INSERT OR REPLACE INTO matches (match_id, document) VALUES (?, ?)',
+                                 (match_id, json.dumps(tree, ensure_ascii=False)))
+                else:
+                    conn.execute('DELETE FROM matches WHERE match_id = ?', (match_id,))
+        return conflicts
+
+    def get(self, match_id: str) -> Optional[Document]:
+        row = self.db.connection().execute('SELECT document FROM matches WHERE match_id = ?',
+                                           (match_id,)).fetchone()
+        return InMemoryMatchBackend._from_tree(json.loads(row[0])) if row else None
+
+
+BACKENDS: Dict[str, Callable[[], MatchBackend]] = {
+    'firebase': FirebaseMatchBackend,
+    'memory': lambda: InMemoryMatchBackend(latency=float(os.getenv("MATCH_STORE_LATENCY", 0))),
+    'sqlite': lambda: SqliteMatchBackend(sqlite_database()),
+}
+
+
+class MatchStoreStats(BaseModel):
+    dirty: int
+    tracked: int
+    flushIntervalSeconds: float
+    maxDirty: int
+    flushes: int
+    updates: int
+    paths: int
+    failures: int
+    conflicts: int
+    backpressureWaits: int
+    lastFlushSeconds: float
+
+
+class MatchWriteBehind:
+    """
+    ダーティな試合をまとめて書き込むライトビハインドのキューです。
+    mark_dirty はエンジンへの参照だけを記録し、状態の取り出しと差分の計算は書き込み時に行うため、
+    書き込みまでの間に進んだ複数ターンの変更は1回の書き込みにまとめられます。
+    前回書き込んだ内容は max_tracked 試合まで保持し、破棄した試合は次回に状態全体を書き込みます。
+    書き込みは、保存されているバージョンがこのプロセスの書き込んだバージョンであることを条件とし、他のプロセスが
+    先に書き込んでいた試合は追跡をやめて on_conflict(matchId) を呼び出します（このプロセスのエンジンは古くなっているため）。
+    失敗（タイムアウトを含む）した書き込みは後から保存される場合があるため、その試合は次回に状態全体を書き込み、
+    失敗した書き込みのバージョンも自分の書き込みとして受け入れます。
+    """
+
+    def __init__(self, backend: MatchBackend, flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_dirty: int = DEFAULT_MAX_DIRTY, max_tracked: int = DEFAULT_MAX_TRACKED,
+                 timeout: float = DEFAULT_TIMEOUT_SECONDS, on_conflict: Optional[Callable[[str], Any]] = None):
+        self.backend = backend
+        self.on_conflict = on_conflict
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_tracked = max_tracked
+        self.timeout = timeout
+        self._dirty: Dict[str, GameEngine] = {}
+        self._persisted: 'OrderedDict[str, Document]' = OrderedDict()
+        # 保存されている可能性のある、このプロセスが書き込んだバージョンです（失敗した書き込みのバージョンを含みます）。
+        self._versions: 'OrderedDict[str, Tuple[int, ...]]' = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flushed: Optional[asyncio.Condition] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.updates = 0
+        self.paths = 0
+        self.failures = 0
+        self.conflicts = 0
+        self.backpressure_waits = 0
+        self.last_flush_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional['MatchWriteBehind']:
+        backend = os.getenv("MATCH_STORE_BACKEND", "none")
+        if backend == 'none':
+            return None
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown MATCH_STORE_BACKEND: {backend}")
+        return cls(
+            BACKENDS[backend](),
+            flush_interval=float(os.getenv("MATCH_STORE_FLUSH_INTERVAL_SECONDS", DEFAULT_FLUSH_INTERVAL_SECONDS)),
+            max_dirty=int(os.getenv("MATCH_STORE_MAX_DIRTY", DEFAULT_MAX_DIRTY)),
+            max_tracked=int(os.getenv("MATCH_STORE_MAX_TRACKED", DEFAULT_MAX_TRACKED)),
+            timeout=float(os.getenv("MATCH_STORE_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+        )
+
+    def _ensure_primitives(self) -> None:
+        # asyncio のプリミティブは実行中のイベントループで作成します。
+        if self._flushed is None:
+            self._flush_lock = asyncio.Lock()
+            self._flushed = asyncio.Condition()
+            self._wake = asyncio.Event()
+
+    @property
+    def dirty(self) -> int:
+        return len(self._dirty)
+
+    async def mark_dirty(self, match_id: str, engine: GameEngine) -> None:
+        """
+        試合の状態が変更されたことを記録します。既にダーティな試合は1件として扱います。
+        未書き込みの試合が max_dirty に達している場合は、すぐに書き込みを始め、空きができるまで待ちます。
+        """
+        self._ensure_primitives()
+        if match_id not in self._dirty and len(self._dirty) >= self.max_dirty:
+            self.backpressure_waits += 1
+        while match_id not in self._dirty and len(self._dirty) >= self.max_dirty:
+            if self._task is None:
+                # 書き込みのループが動いていない場合は、この呼び出しで書き込みます。
+                await self.flush()
+                continue
+            async with self._flushed:
+                self._wake.set()
+                await self._flushed.wait()
+        self._dirty[match_id] = engine
+
+    def forget(self, match_id: str) -> None:
+        """試合の追跡をやめます（試合を削除した場合など）。未書き込みの変更は書き込みません。"""
+        self._dirty.pop(match_id, None)
+        self._persisted.pop(match_id, None)
+        self._versions.pop(match_id, None)
+
+    async def flush(self) -> int:
+        """ダーティな試合の差分を1回の update で書き込み、書き込んだパスの数を返します。"""
+        self._ensure_primitives()
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            started = time.perf_counter()
+            dirty, self._dirty = self._dirty, {}
+            documents: Dict[str, Document] = {}
+            updates: Dict[str, Any] = {}
+            checks: Dict[str, VersionCheck] = {}
+            conflicts: Set[str] = set()
+            for match_id, engine in dirty.items():
+                document = engine.core.to_dict()
+                documents[match_id] = document
+                previous = self._persisted.get(match_id)
+                paths = len(updates)
+                if previous is None:
+                    updates[match_id] = document
+                else:
+                    diff_paths(previous, document, match_id, updates)
+                if len(updates) > paths:
+                    checks[match_id] = VersionCheck(self._versions.get(match_id), document['version'])
+            try:
+                if updates:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match-store')
+                    loop = asyncio.get_running_loop()
+                    conflicts = await asyncio.wait_for(
+                        loop.run_in_executor(self._executor, self.backend.apply_updates, updates, checks),
+                        self.timeout
+                    )
+            except Exception:
+                # 書き込めなかった試合はダーティに戻し、次回にまとめて書き込みます（その間に進んだ変更が優先されます）。
+                # 書き込みがタイムアウト後に保存される場合もあるため、保存されている内容は前回と今回のどちらか分かりません。
+                # 次回は状態全体を書き込み、今回のバージョンも自分の書き込みとして受け入れます。
+                self.failures += 1
+                for match_id, check in checks.items():
+                    self._persisted.pop(match_id, None)
+                    if check.expected is not None:
+                        self._versions[match_id] = tuple(dict.fromkeys(check.expected + (check.version,)))
+                for match_id, engine in dirty.items():
+                    self._dirty.setdefault(match_id, engine)
+                raise
+            finally:
+                async with self._flushed:
+                    self._flushed.notify_all()
+            for match_id in conflicts:
+                logger.warning("Match %s was written by another writer; dropping the local state", match_id)
+                documents.pop(match_id, None)
+                self._persisted.pop(match_id, None)
+                self._versions.pop(match_id, None)
+                self.conflicts += 1
+                if self.on_conflict is not None:
+                    self.on_conflict(match_id)
+            for match_id, document in documents.items():
+                self._persisted[match_id] = document
+                self._persisted.move_to_end(match_id)
+                if match_id in checks:
+                    self._versions[match_id] = (document['version'],)
+                    self._versions.move_to_end(match_id)
+            while len(self._persisted) > self.max_tracked:
+                self._persisted.popitem(last=False)
+            while len(self._versions) > self.max_tracked * _VERSIONS_PER_TRACKED:
+                self._versions.popitem(last=False)
+            self.flushes += 1
+            self.updates += 1 if updates else 0
+            self.paths += len(updates)
+            self.last_flush_seconds = time.perf_counter() - started
+            return len(updates)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # 失敗は failures に記録済みです。次の間隔で再試行します。
+                pass
+
+    def start(self) -> None:
+        """一定間隔で書き込むバックグラウンドのタスクを開始します（アプリケーションの起動時に呼び出します）。"""
+        self._ensure_primitives()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """バックグラウンドのタスクを停止し、未書き込みの変更をすべて書き込みます（アプリケーションの終了時に呼び出します）。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> MatchStoreStats:
+        return MatchStoreStats(
+            dirty=len(self._dirty),
+            tracked=len(self._persisted),
+            flushIntervalSeconds=self.flush_interval,
+            maxDirty=self.max_dirty,
+            flushes=self.flushes,
+            updates=self.updates,
+            paths=self.paths,
+            failures=self.failures,
+            conflicts=self.conflicts,
+            backpressureWaits=self.backpressure_waits,
+            lastFlushSeconds=self.last_flush_seconds,
+        )
+
+
+# アプリケーション全体で共有するライトビハインドのキューです。MATCH_STORE_BACKEND が 'none' の場合は None です。
+match_writer = MatchWriteBehind.from_env()
@@ -0,0 +1,39 @@
+# packages/api-server/app/db/push_ids.py
+# Firebase Realtime Database の push() と同じ形式のキーをクライアント側（このサーバー）で生成します。
+# キーを先に決めておけば、push() と id の書き込みの2回の往復を、1回の set() や複数パスの update() にまとめられます。
+# 形式: 先頭8文字がミリ秒のタイムスタンプ、残り12文字が乱数で、辞書順が作成順になります。
+import secrets
+import threading
+import time
+
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+_lock = threading.Lock()
+_last_time = 0
+_last_random = [0] * 12
+
+
+def generate_push_id() -> str:
+    """20文字の push キーを生成します。同じミリ秒内では乱数部分を1ずつ増やし、順序を保ちます。"""
+    global _last_time
+    with _lock:
+        now = int(time.time() * 1000)
+        if now == _last_time:
+            # 同じミリ秒内で生成した場合は、前回の乱数部分に1を加えます（繰り上がりを含む）。
+            i = 11
+            while i >= 0 and _last_random[i] == 63:
+                _last_random[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_random[i] += 1
+        else:
+            _last_time = now
+            for i in range(12):
+                _last_random[i] = secrets.randbelow(64)
+        random_part = ''.join(PUSH_CHARS[n] for n in _last_random)
+
+    timestamp = []
+    for _ in range(8):
+        timestamp.append(PUSH_CHARS[now % 64])
+        now //= 64
+    return ''.join(reversed(timestamp)) + random_part
@@ -0,0 +1,78 @@
+# packages/api-server/app/db/sqlite.py
+# デッキと試合の状態を組み込みの SQLite に保存するバックエンド（DECK_BACKEND / MATCH_STORE_BACKEND = 'sqlite'）が
+# 共有するデータベースです。ローカル開発・CI・単一ノードでの運用で、Firebaseなしで永続化するために使います。
+# WAL モードで開き、スレッドごとに接続を持つため、書き込み中も他のスレッドから読み込めます。
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set
+
+DEFAULT_SQLITE_PATH = 'landgrab.sqlite3'
+DEFAULT_BUSY_TIMEOUT_SECONDS = 5.0
+
+
+class SqliteDatabase:
+    def __init__(self, path: str, busy_timeout: float = DEFAULT_BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._schemas: Set[str] = set()
+
+    def connection(self) -> sqlite3.Connection:
+        """呼び出したスレッドの接続を返します（初回に開きます）。"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # トランザクションは transaction() で明示的に開始します。
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みのトランザクションです。読み込んでから書き込む処理が他の書き込みと交差しないよう、最初にロックを取ります。"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def ensure_schema(self, ddl: str) -> None:
+        # CREATE ... IF NOT EXISTS を想定しているため、同時に実行されても問題ありません。
+        if ddl not in self._schemas:
+            self.connection().execute(ddl)
+            self._schemas.add(ddl)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_databases: Dict[str, SqliteDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def sqlite_database(path: str = '') -> SqliteDatabase:
+    """パスごとに共有するデータベースを返します。省略すると SQLITE_PATH 環境変数のパスを使います。"""
+    path = path or os.getenv('SQLITE_PATH', DEFAULT_SQLITE_PATH)
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = _databases[path] = SqliteDatabase(path)
+        return database
@@ -3,8 +3,18 @@ from .acquire import apply_acquire
 from .defend import apply_defend
 from .fraud import apply_fraud
 from .gain_funds import apply_gain_funds
+from app.game.models import CardTemplate
+
+# 基本4種のカードテンプレートです。テンプレートが指定されない場合に使用します。
+BASE_CARD_TEMPLATES = {
+    'GAIN_FUNDS': CardTemplate(templateId='GAIN_FUNDS', name='資金集め', cost=0, type='GAIN_FUNDS'),
+    'ACQUIRE': CardTemplate(templateId='ACQUIRE', name='買収', cost=2, type='ACQUIRE'),
+    'DEFEND': CardTemplate(templateId='DEFEND', name='防衛', cost=0, type='DEFEND'),
+    'FRAUD': CardTemplate(templateId='FRAUD', name='詐欺', cost=1, type='FRAUD'),
+}
 
 __all__ = [
+    "BASE_CARD_TEMPLATES",
     "apply_acquire",
     "apply_defend",
     "apply_fraud",
@@ -1,11 +1,12 @@
 # packages/api-server/app/game/cards/acquire.py
-from app.game.models import PlayerState
+from app.game.state import CompactPlayer
 
-def apply_acquire(player: PlayerState, opponent: PlayerState) -> None:
+def apply_acquire(player: CompactPlayer, opponent: CompactPlayer, value: int = 1) -> None:
     """
     「買収」カードの効果を適用します。
-    相手の不動産を1つ奪います。
+    相手の不動産を value（既定は1）奪います。相手の不動産がそれより少ない場合は全て奪います。
     """
-    if opponent.properties > 0:
-        opponent.properties -= 1
-        player.properties += 1
+    amount = min(value, opponent.properties)
+    if amount > 0:
+        opponent.properties -= amount
+        player.properties += amount
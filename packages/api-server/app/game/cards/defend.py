@@ -1,7 +1,7 @@
 # packages/api-server/app/game/cards/defend.py
-from app.game.models import PlayerState
+from app.game.state import CompactPlayer
 
-def apply_defend(player: PlayerState) -> None:
+def apply_defend(player: CompactPlayer) -> None:
     """
     「防衛」カードの効果を適用します。
     実際の無効化ロジックはエンジンの解決フェーズで処理されます。
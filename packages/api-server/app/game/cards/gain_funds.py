@@ -1,9 +1,9 @@
 # packages/api-server/app/game/cards/gain_funds.py
-from app.game.models import PlayerState
+from app.game.state import CompactPlayer
 
-def apply_gain_funds(player: PlayerState) -> None:
+def apply_gain_funds(player: CompactPlayer, value: int = 2) -> None:
     """
     「資金集め」カードの効果を適用します。
-    資金が1増加します。
+    資金が value（既定は2）増加します。
     """
-    player.funds += 2
+    player.funds += value
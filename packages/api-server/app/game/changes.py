@@ -0,0 +1,41 @@
+# packages/api-server/app/game/changes.py
+# GameEngine が状態を変更する際に記録する変更セット（JSON Patch, RFC 6902 形式）の履歴です。
+# クライアントが持っている状態のバージョンから現在のバージョンまでのパッチを返すために使用します。
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# JSON Patch の1操作です（例: {"op": "replace", "path": "/players/0/funds", "value": 3}）。
+PatchOp = Dict[str, Any]
+
+# 保持するバージョン数の既定値です。これより古いバージョンからの差分はスナップショットで返します。
+DEFAULT_HISTORY_SIZE = 32
+
+
+class ChangeHistory:
+    """バージョンごとのパッチを新しい順に一定数だけ保持します。"""
+    __slots__ = ('_entries',)
+
+    def __init__(self, size: int = DEFAULT_HISTORY_SIZE):
+        # 各要素は (version, ops) で、ops はバージョン version - 1 から version への変更です。
+        self._entries: Deque[Tuple[int, List[PatchOp]]] = deque(maxlen=size)
+
+    def append(self, version: int, ops: List[PatchOp]) -> None:
+        self._entries.append((version, ops))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def since(self, base_version: int, current_version: int) -> Optional[List[PatchOp]]:
+        """
+        base_version から current_version までのパッチを連結して返します。
+        履歴に残っていない、または未来のバージョンが指定された場合は None を返します。
+        """
+        if base_version == current_version:
+            return []
+        if base_version > current_version or not self._entries or self._entries[0][0] > base_version + 1:
+            return None
+        ops: List[PatchOp] = []
+        for version, entry_ops in self._entries:
+            if version > base_version:
+                ops.extend(entry_ops)
+        return ops
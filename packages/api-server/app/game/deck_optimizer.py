@@ -0,0 +1,299 @@
+# packages/api-server/app/game/deck_optimizer.py
+# 対戦相手のデッキの集合（フィールド）に対して勝率の高いデッキを探すオプティマイザーです。
+# 候補は規定のデッキ（DECK_SIZE 枚、同じカードは MAX_COPIES 枚まで）の全体か、指定した一覧です。
+# シミュレーションの予算は逐次半減法（successive halving）で配分します。全候補を少ない試合数で評価し、
+# 成績の良い 1/eta だけを残して試合数を増やすことを繰り返すため、見込みの無い候補に予算を使いません。
+# 試合は共有のプロセスプール（simulation.simulation_pool）に分散し、デッキの指紋ごとの成績をキャッシュして同じ問い合わせでは再計算しません。
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app.game.decks import DECK_SIZE, MAX_COPIES, Deck, validate_deck
+from app.game.models import CardTemplate
+from app.game.simulation import DEFAULT_MAX_TURNS, POLICIES, run_match, simulation_pool
+from app.game.templates import card_template_registry, templates_fingerprint
+
+# 既定のフィールドのデッキのディレクトリです（リポジトリ内の web-game-client/public/decks）。
+DEFAULT_DECKS_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'web-game-client', 'public', 'decks'))
+
+# 既定の設定値です。
+DEFAULT_BUDGET = 100000 # 全体の試合数の目安
+DEFAULT_ETA = 3
+DEFAULT_TOP = 10
+DEFAULT_CACHE_SIZE = 100000
+
+# 1つのワーカーに渡す試合数の目安です（simulation と同じ）。
+_CHUNK_SIZE = 250
+
+# 信頼区間（95%）の z 値です。
+_Z = 1.96
+
+
+class DeckScore(BaseModel):
+    cards: Deck
+    score: float # フィールドに対する勝率（引き分けは 0.5 勝）
+    lower: float # score の 95% 信頼区間（Wilson）
+    upper: float
+    games: int
+
+
+class OptimizationResult(BaseModel):
+    ranked: List[DeckScore]
+    candidates: int
+    rounds: int
+    simulatedGames: int
+    cachedGames: int
+    elapsedMs: float
+
+
+def legal_decks(template_ids: Sequence[str], deck_size: int = DECK_SIZE, max_copies: int = MAX_COPIES) -> List[Deck]:
+    """規定を満たす全てのデッキを返します。"""
+    decks = []
+    for counts in itertools.product(range(max_copies + 1), repeat=len(template_ids)):
+        if sum(counts) == deck_size:
+            decks.append({tid: n for tid, n in zip(template_ids, counts) if n})
+    return decks
+
+
+def load_field(decks_dir: str = DEFAULT_DECKS_DIR) -> Dict[str, Deck]:
+    """ディレクトリのデッキ定義（public/decks と同じ形式の JSON）を id -> cards の辞書として読み込みます。"""
+    field = {}
+    for name in sorted(os.listdir(decks_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(decks_dir, name), encoding='utf-8') as f:
+                deck = json.load(f)
+            field[deck.get('id', name[:-5])] = deck['cards']
+    return field
+
+
+def fingerprint(deck: Deck) -> str:
+    """枚数が0のカードと並び順によらない、デッキの指紋です。"""
+    return json.dumps(sorted((tid, n) for tid, n in deck.items() if n), separators=(',', ':'))
+
+
+def wilson_interval(score: float, games: int) -> Tuple[float, float]:
+    if games == 0:
+        return 0.0, 1.0
+    center = (score + _Z * _Z / (2 * games)) / (1 + _Z * _Z / games)
+    margin = _Z * math.sqrt(score * (1 - score) / games + _Z * _Z / (4 * games * games)) / (1 + _Z * _Z / games)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class DeckScoreCache:
+    """
+    (条件, デッキの指紋) ごとに、評価済みの単位ごとの勝ち・引き分けの累計を保持する LRU キャッシュです。
+    条件はカードテンプレート・フィールド・ポリシー・シードなどで、単位 k の試合のシードは条件から決まるため、
+    キャッシュの先頭の n 単位は、n 単位を最初から計算した場合と同じ成績になります。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], List[Tuple[int, int]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, context: str, deck: str) -> List[Tuple[int, int]]:
+        """単位ごとの (勝ち, 引き分け) の累計の一覧を返します。"""
+        with self._lock:
+            entry = self._entries.get((context, deck))
+            if entry is None:
+                return []
+            self._entries.move_to_end((context, deck))
+            return entry
+
+    def put(self, context: str, deck: str, entry: List[Tuple[int, int]]) -> None:
+        with self._lock:
+            current = self._entries.get((context, deck))
+            # 並行した問い合わせが先に多くの単位を保存していれば、そちらを残します。
+            if current is None or len(current) < len(entry):
+                self._entries[(context, deck)] = entry
+                self._entries.move_to_end((context, deck))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _evaluate_chunk(tasks: Sequence[Tuple[Deck, int, int]], field: Sequence[Deck], policy: str, seed: int,
+                    card_templates: Mapping[str, CardTemplate], max_turns: int) -> List[List[Tuple[int, int]]]:
+    # ワーカープロセスで、各デッキの単位 [start, end) の試合を実行し、単位ごとの (勝ち, 引き分け) を返します。
+    # 1単位はフィールドの各デッキと先手・後手を1試合ずつで、全ての候補が同じシードの試合を使います（共通乱数）。
+    results = []
+    per_unit = 2 * len(field)
+    for deck, start, end in tasks:
+        units = []
+        for unit in range(start, end):
+            wins = draws = 0
+            for j, opponent in enumerate(field):
+                for seat in (0, 1):
+                    match_seed = seed + unit * per_unit + 2 * j + seat
+                    if seat == 0:
+                        winner = run_match(deck, opponent, policy, policy, match_seed, card_templates, max_turns).winner
+                    else:
+                        winner = run_match(opponent, deck, policy, policy, match_seed, card_templates, max_turns).winner
+                    if winner is None:
+                        draws += 1
+                    elif winner == seat:
+                        wins += 1
+            units.append((wins, draws))
+        results.append(units)
+    return results
+
+
+class DeckOptimizer:
+    """フィールドに対するデッキの探索を行います。キャッシュは問い合わせをまたいで共有します。"""
+
+    def __init__(self, cache: Optional[DeckScoreCache] = None, max_workers: Optional[int] = None):
+        self.cache = cache if cache is not None else DeckScoreCache()
+        self.max_workers = max_workers
+
+    def optimize(self, field: Mapping[str, Deck], card_templates: Mapping[str, CardTemplate],
+                 candidates: Optional[Sequence[Deck]] = None, policy: str = 'random',
+                 budget: int = DEFAULT_BUDGET, eta: int = DEFAULT_ETA, top: int = DEFAULT_TOP, seed: int = 0,
+                 max_turns: int = DEFAULT_MAX_TURNS) -> OptimizationResult:
+        """
+        候補（省略時は全ての規定のデッキ）をフィールドに対して評価し、成績の良い順に top 件を返します。
+        budget は全体の試合数の目安で、各ラウンドに均等に配分します（ただし各候補は最初のラウンドで少なくとも1単位を評価します）。
+        """
+        started = time.perf_counter()
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        if not field:
+            raise ValueError("Field must contain at least one deck.")
+        if eta < 2:
+            raise ValueError("eta must be at least 2.")
+        for deck in field.values():
+            if any(tid not in card_templates for tid in deck) or sum(deck.values()) <= 0:
+                raise ValueError("Field decks must be non-empty and use known card templates.")
+        if candidates is None:
+            candidates = legal_decks(list(card_templates))
+        for deck in candidates:
+            validate_deck(deck, card_templates)
+        # 同じ指紋の候補は1つにまとめます。
+        unique = {fingerprint(deck): {tid: n for tid, n in deck.items() if n} for deck in candidates}
+        if not unique:
+            raise ValueError("No candidate decks.")
+
+        field_decks = [field[name] for name in sorted(field)]
+        context = hashlib.sha256(json.dumps(
+            [templates_fingerprint(card_templates), [fingerprint(d) for d in field_decks], policy, seed, max_turns]
+        ).encode('utf-8')).hexdigest()[:16]
+        per_unit = 2 * len(field_decks)
+        survivors = list(unique)
+        rounds = max(1, math.ceil(math.log(max(len(survivors) / max(top, 1), 1), eta)) + 1)
+        round_units = max(1, budget // (rounds * per_unit))
+        target = 0
+        simulated = cached = 0
+        # この問い合わせで使う、候補ごとの単位の累計です。キャッシュから読んだ場合も先頭の target 単位だけを使うため、
+        # 結果はキャッシュの有無や以前の問い合わせの予算によらず同じになります。
+        totals: Dict[str, List[Tuple[int, int]]] = {}
+
+        for round_index in range(rounds):
+            # 各ラウンドの試合数を残った候補で分け、候補あたりの単位数は前のラウンドまでの累計に加えます。
+            previous = target
+            target += max(1, round_units // len(survivors))
+            pending = []
+            for key in survivors:
+                own = min(len(totals[key]), previous) if key in totals else 0
+                history = self.cache.get(context, key)
+                # 前のラウンドにこの問い合わせで計算した分は、キャッシュから読んでも数えません。
+                cached += max(0, min(len(history), target) - own) * per_unit
+                totals[key] = history
+                if len(history) < target:
+                    pending.append(key)
+            results = self._run([(unique[key], len(totals[key]), target) for key in pending],
+                                field_decks, policy, seed, card_templates, max_turns)
+            for key, units in zip(pending, results):
+                history = list(totals[key])
+                wins, draws = history[-1] if history else (0, 0)
+                for unit_wins, unit_draws in units:
+                    wins += unit_wins
+                    draws += unit_draws
+                    history.append((wins, draws))
+                simulated += len(units) * per_unit
+                totals[key] = history
+                self.cache.put(context, key, history)
+            survivors.sort(key=lambda k: _score(totals[k], target, per_unit), reverse=True)
+            if round_index < rounds - 1:
+                survivors = survivors[:max(top, math.ceil(len(survivors) / eta))]
+
+        ranked = []
+        for key in survivors[:top]:
+            games = target * per_unit
+            score = _score(totals[key], target, per_unit)
+            lower, upper = wilson_interval(score, games)
+            ranked.append(DeckScore(cards=unique[key], score=score, lower=lower, upper=upper, games=games))
+        return OptimizationResult(ranked=ranked, candidates=len(unique), rounds=rounds, simulatedGames=simulated,
+                                  cachedGames=cached, elapsedMs=(time.perf_counter() - started) * 1000.0)
+
+    def _run(self, tasks: List[Tuple[Deck, int, int]], field: List[Deck], policy: str, seed: int,
+             card_templates: Mapping[str, CardTemplate], max_turns: int) -> List[Tuple[int, int]]:
+        # 試合数が _CHUNK_SIZE 程度になるように候補をまとめ、ワーカーに分散します。
+        if not tasks:
+            return []
+        per_unit = 2 * len(field)
+        chunks: List[List[Tuple[Deck, int, int]]] = [[]]
+        size = 0
+        for task in tasks:
+            if size >= _CHUNK_SIZE:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(task)
+            size += (task[2] - task[1]) * per_unit
+        args = (field, policy, seed, card_templates, max_turns)
+        workers = self.max_workers or simulation_pool.workers
+        if workers == 1 or len(chunks) == 1:
+            return [result for chunk in chunks for result in _evaluate_chunk(chunk, *args)]
+        pool = simulation_pool.executor()
+        futures = [pool.submit(_evaluate_chunk, chunk, *args) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def _score(history: List[Tuple[int, int]], units: int, per_unit: int) -> float:
+    # 先頭の units 単位の勝率です（引き分けは 0.5 勝）。
+    wins, draws = history[units - 1]
+    return (wins + 0.5 * draws) / (units * per_unit)
+
+
+# アプリケーション全体で共有するオプティマイザーです（キャッシュを共有します）。
+deck_optimizer = DeckOptimizer()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search for the strongest legal decks against a field.")
+    parser.add_argument('--decks-dir', default=DEFAULT_DECKS_DIR, help="Directory of field decks (JSON)")
+    parser.add_argument('--policy', default='random', choices=sorted(POLICIES))
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET)
+    parser.add_argument('--eta', type=int, default=DEFAULT_ETA)
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.workers:
+        simulation_pool.max_workers = args.workers
+    optimizer = DeckOptimizer(max_workers=args.workers)
+    try:
+        result = optimizer.optimize(load_field(args.decks_dir), card_template_registry.current, policy=args.policy,
+                                    budget=args.budget, eta=args.eta, top=args.top, seed=args.seed)
+    finally:
+        simulation_pool.shutdown()
+    for rank, entry in enumerate(result.ranked, 1):
+        cards = ' '.join(f'{tid}x{n}' for tid, n in sorted(entry.cards.items()))
+        print(f'{rank:>3}. {entry.score:.3f} [{entry.lower:.3f}, {entry.upper:.3f}] ({entry.games} games) {cards}')
+    print(f'{result.candidates} candidates, {result.rounds} rounds, {result.simulatedGames} simulated, '
+          f'{result.cachedGames} cached, {result.elapsedMs / 1000:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
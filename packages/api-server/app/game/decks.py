@@ -0,0 +1,22 @@
+# packages/api-server/app/game/decks.py
+# デッキの規定（web-game-client の DeckEditForm と同じ）と、その検証です。
+# 試合の作成・マッチメイキング・デッキのオプティマイザーで共有し、規定外の枚数のデッキからエンジンを作らないようにします。
+from typing import Dict, Mapping
+
+from app.game.models import CardTemplate
+
+DECK_SIZE = 10
+MAX_COPIES = 4
+
+Deck = Dict[str, int]
+
+
+def validate_deck(deck: Deck, card_templates: Mapping[str, CardTemplate]) -> None:
+    """デッキが規定を満たさない場合は ValueError を送出します。"""
+    unknown = [tid for tid in deck if tid not in card_templates]
+    if unknown:
+        raise ValueError(f"Unknown card templates in deck: {', '.join(unknown)}")
+    if any(n < 0 or n > MAX_COPIES for n in deck.values()):
+        raise ValueError(f"Each card may appear at most {MAX_COPIES} times.")
+    if sum(deck.values()) != DECK_SIZE:
+        raise ValueError(f"Deck must contain exactly {DECK_SIZE} cards.")
@@ -0,0 +1,106 @@
+# packages/api-server/app/game/effects.py
+# カードの効果定義（CardTemplate.effect）を、テンプレートの組み合わせごとの解決手順の表にコンパイルします。
+# 効果定義は web-game-client/public/cards/*.json と同じ形式で、TS版とPython版のエンジンが同じ定義を共有します。
+# 解決時はプレイされたテンプレートの組で表を引き、記録された手順を順に実行するだけで済みます。
+#
+# 1組の解決は次の順に決まります。
+#   1. BLOCK_ACTION: 条件を満たすと、相手のカードの全てのアクション（打ち消しを含む）を無効にします。
+#   2. CANCEL_EFFECT: ブロックされていないカードの打ち消しを同時に適用し、相手のカードの効果を無効にします。
+#   3. 残ったカードの効果アクションを priority の大きい順（同じ場合はプレイヤー1が先）に適用します。
+# アクションの条件は相手がプレイしたカードに対して評価され、相手がプレイしていない場合は満たされません。
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.game.cards import apply_acquire, apply_gain_funds
+from app.game.models import CardEffect, CardTemplate
+from app.game.state import CompactPlayer, TemplateTable
+
+# 効果アクションのコードと、コード順に並べた適用関数（ディスパッチベクタ）です。
+# 関数は (行動するプレイヤー, 相手, 値) を受け取ります。
+ACTION_GAIN_FUNDS, ACTION_ACQUIRE_PROPERTY = range(2)
+ACTION_CODES: Dict[str, int] = {'GAIN_FUNDS': ACTION_GAIN_FUNDS, 'ACQUIRE_PROPERTY': ACTION_ACQUIRE_PROPERTY}
+ACTION_HANDLERS: Tuple[Callable[[CompactPlayer, CompactPlayer, int], None], ...] = (
+    lambda player, opponent, value: apply_gain_funds(player, value),
+    apply_acquire,
+)
+
+# value が省略されたアクションの値です（TS版と同じく、資金は0、不動産は1）。
+DEFAULT_VALUES = {ACTION_GAIN_FUNDS: 0, ACTION_ACQUIRE_PROPERTY: 1}
+
+# 解決手順の1ステップです: (行動するプレイヤーの位置 0/1, アクションコード, 値)。
+Step = Tuple[int, int, int]
+
+# 条件のキーと、相手のカードの効果定義から比較対象の値を取り出す関数です。
+_CONDITION_FIELDS: Dict[str, Callable[[CardTemplate], str]] = {
+    'opponentCardTemplateId': lambda template: template.templateId,
+    'opponentCardCategory': lambda template: template.effect.category,
+}
+
+
+def _conditions_met(effect: CardEffect, conditions: Optional[Dict], opponent: Optional[CardTemplate]) -> bool:
+    merged = {**(effect.conditions or {}), **(conditions or {})}
+    if not merged:
+        return True
+    if opponent is None:
+        return False
+    return all(_CONDITION_FIELDS[key](opponent) == expected for key, expected in merged.items())
+
+
+def compile_pair(first: Optional[CardTemplate], second: Optional[CardTemplate]) -> Tuple[Step, ...]:
+    """プレイヤー1と2がプレイしたテンプレート（プレイしない場合は None）の解決手順を求めます。"""
+    played = (first, second)
+
+    def active(side: int, name: str) -> bool:
+        # side のカードが name のアクションを、条件を満たした状態で持っているかを返します。
+        template = played[side]
+        if template is None:
+            return False
+        return any(a.name == name and _conditions_met(template.effect, a.conditions, played[1 - side])
+                   for a in template.effect.actions)
+
+    blocked = [active(1, 'BLOCK_ACTION'), active(0, 'BLOCK_ACTION')]
+    cancelled = [not blocked[1] and active(1, 'CANCEL_EFFECT'), not blocked[0] and active(0, 'CANCEL_EFFECT')]
+
+    # sorted は安定なので、priority が同じ場合はプレイヤー1が先になります。
+    sides = [side for side in (0, 1) if played[side] is not None and not blocked[side] and not cancelled[side]]
+    sides.sort(key=lambda side: -played[side].effect.priority)
+    steps: List[Step] = []
+    for side in sides:
+        effect = played[side].effect
+        for action in effect.actions:
+            code = ACTION_CODES.get(action.name)
+            if code is None or not _conditions_met(effect, action.conditions, played[1 - side]):
+                continue
+            value = DEFAULT_VALUES[code] if action.value is None else action.value
+            steps.append((side, code, value))
+    return tuple(steps)
+
+
+class ResolutionTable:
+    """
+    TemplateTable の全てのテンプレートの組（プレイしない場合を含む）について、解決手順を前計算した表です。
+    インデックス len(templates) は「プレイしない」を表します。
+    """
+    __slots__ = ('stride', 'plans')
+
+    def __init__(self, table: TemplateTable):
+        for template in table.templates:
+            for action in template.effect.actions:
+                unknown = set((template.effect.conditions or {}) | (action.conditions or {})) - set(_CONDITION_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unknown effect conditions in {template.templateId}: {', '.join(sorted(unknown))}")
+        candidates: List[Optional[CardTemplate]] = list(table.templates) + [None]
+        self.stride = len(candidates)
+        self.plans: List[Tuple[Step, ...]] = [compile_pair(a, b) for a in candidates for b in candidates]
+
+    @property
+    def no_play(self) -> int:
+        return self.stride - 1
+
+    def plan(self, first: int, second: int) -> Tuple[Step, ...]:
+        # first / second はテンプレートインデックスで、負の値はプレイしないことを表します。
+        if first < 0:
+            first = self.no_play
+        if second < 0:
+            second = self.no_play
+        return self.plans[first * self.stride + second]
+
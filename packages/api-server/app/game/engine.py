@@ -1,83 +1,231 @@
 # packages\api-server\app\game\engine.py
+# loggingモジュールをインポートします。試合の終了をログに記録します。
+import logging
 # randomモジュールをインポートします。デッキのシャッフルなどに使用されます。
 import random
-# timeモジュールをインポートします。試合IDの生成などに使用されます。
-import time
+# secretsモジュールをインポートします。試合のシードの生成に使用されます。
+import secrets
+# uuidモジュールをインポートします。試合IDの生成に使用されます。
+import uuid
+# フェーズごとの処理時間の計測に使用します。
+from time import perf_counter
 # 型ヒントのために、Pythonのtypingモジュールから必要な型をインポートします。
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
-# ゲームのカード効果を適用するためのヘルパー関数群をインポートします。
-# これらは、カードの種類に応じてプレイヤーの状態を変更するロジックを含んでいます。
-from app.game.cards import (apply_acquire, apply_defend, apply_fraud,
-                            apply_gain_funds)
+# カードの効果定義からコンパイルした解決手順の表と、効果アクションの適用関数をインポートします。
+from app.game.effects import ACTION_HANDLERS
+# 試合のログのイベントコードと、GameState.log に載せる直近のイベント数をインポートします。
+from app.game.event_log import (EVENT_OPPONENT_PLAYED, EVENT_PLAYER_PLAYED, EVENT_TURN_START,
+                                LOG_WINDOW)
 # ゲームの異なるエンティティ（アクション、カード、ゲーム状態、プレイヤー状態など）
 # のデータ構造を定義するモデルをインポートします。
 from app.game.models import (Action, Card, CardTemplate, GameState,
-                             PlayerState, ResolvedAction)
+                             PlayerState)
+# 状態の変更セット（JSON Patch）の履歴をインポートします。
+from app.game.changes import ChangeHistory, PatchOp
+# 試合の再現に使用するアクションジャーナルをインポートします。
+from app.game.replay import OP_PLAY, MatchJournal
+# エンジン内部で使用するコンパクトな状態表現をインポートします。
+from app.game.state import (PHASE_ACTION, PHASE_DRAW, PHASE_GAME_OVER,
+                            PHASE_RESOLUTION, PHASES, UNKNOWN_TEMPLATE, CompactPlayer,
+                            CompactState)
+# カードテンプレートの表を作成（共有されたテンプレート集合の場合は再利用）する関数をインポートします。
+from app.game.templates import compile_templates
+# プレイヤーごとのビュー（相手の手札と山札を伏せた射影）のキャッシュをインポートします。
+from app.game.views import ViewCache
+# フェーズごとの処理時間と終了した試合数のメトリクスです（/metrics で公開されます）。
+from app.metrics import (PHASE_TIMER_DRAW, PHASE_TIMER_EFFECTS, PHASE_TIMER_RESOLVE,
+                         PHASE_TIMER_STATE_COPY, PHASE_TIMER_WIN_CHECK, engine_phases,
+                         games_finished)
+
+logger = logging.getLogger(__name__)
+
+# プレイヤーが出すカードを (プレイヤー, CardTable上のカードインデックス) の組で表します。
+Play = Tuple[CompactPlayer, int]
 
 # GameEngineクラスは、ゲームのロジックと状態管理を担当します。
 class GameEngine:
     # コンストラクタ: ゲームの初期状態とカードテンプレートのマップを受け取ります。
-    def __init__(self, initial_state: GameState, card_templates: Dict[str, CardTemplate]):
-        # PythonのPydanticモデルは、初期化を内部で処理するため、
-        # ここで追加の「ハイドレーション」（データ変換）は不要です。
-        self.state = initial_state
+    # シャッフルには試合ごとの乱数生成器を使用します。rng を渡すとそれを、省略すると seed で初期化した乱数を使います。
+    # record_changes が真の場合、状態を変更するたびに変更セットを記録し、バージョンを進めます。
+    # record_journal が真の場合、適用した操作をジャーナルに記録し、試合を再現できるようにします。
+    # instrumented が真の場合、フェーズごとの処理時間と試合の終了をメトリクスとログに記録します。
+    # 実際の試合（APIやマッチメイキングで作成した試合）だけを記録し、探索やシミュレーションの仮想の試合は記録しません。
+    def __init__(self, initial_state: GameState, card_templates: Mapping[str, CardTemplate],
+                 rng: Optional[random.Random] = None, record_changes: bool = True,
+                 record_journal: bool = True, seed: Optional[int] = None, instrumented: bool = False):
         self.card_templates = card_templates
+        # テンプレートIDを整数にインターンした表と、テンプレートの組ごとの解決手順の表です。
+        # card_templates がレジストリの CardTemplateSet であれば、作成済みの表を共有します。
+        self.templates, self.resolution = compile_templates(card_templates)
+        # Pydanticモデルはここで一度だけ内部表現に変換し、以降はコンパクトな状態を直接更新します。
+        self._attach(CompactState.from_game_state(initial_state, self.templates),
+                     rng if rng is not None else random.Random(seed), record_changes, record_journal, seed,
+                     instrumented)
+
+    # 内部表現の状態から直接エンジンを作成します（リプレイでスナップショットから復元する場合に使用します）。
+    # core のカードは card_templates と同じ順序でインターンされている必要があります。
+    @classmethod
+    def from_compact(cls, core: CompactState, card_templates: Mapping[str, CardTemplate],
+                     rng: random.Random, record_changes: bool = False, record_journal: bool = False) -> 'GameEngine':
+        engine = cls.__new__(cls)
+        engine.card_templates = card_templates
+        engine.templates, engine.resolution = compile_templates(card_templates)
+        engine._attach(core, rng, record_changes, record_journal, None, False)
+        return engine
+
+    # 新しい試合を作成します。シードを省略すると新しいシードを生成します。
+    # 初期デッキのシャッフルとその後のドローは同じ乱数生成器を使うため、シードから試合全体が再現できます。
+    @classmethod
+    def new_match(cls, player1_id: str, player2_id: str, card_templates: Mapping[str, CardTemplate],
+                  player1_deck: Optional[Dict[str, int]] = None,
+                  player2_deck: Optional[Dict[str, int]] = None,
+                  seed: Optional[int] = None, instrumented: bool = False) -> 'GameEngine':
+        if seed is None:
+            seed = secrets.randbits(63)
+        rng = random.Random(seed)
+        initial_state = cls.create_initial_state(player1_id, player2_id, card_templates,
+                                                 player1_deck, player2_deck, rng=rng)
+        return cls(initial_state, card_templates, rng=rng, seed=seed, instrumented=instrumented)
+
+    # コンストラクタの共通部分です。
+    def _attach(self, core: CompactState, rng: random.Random, record_changes: bool,
+                record_journal: bool, seed: Optional[int], instrumented: bool) -> None:
+        self.core = core
+        self.rng = rng
+        self.instrumented = instrumented
+        # バージョンごとの変更セットの履歴と、記録中の変更セットです（記録しない場合は None）。
+        self.history = ChangeHistory() if record_changes else None
+        self._ops: Optional[List[PatchOp]] = None
+        # 操作のジャーナルです（記録しない場合は None）。現在の状態を起点として記録します。
+        self.journal: Optional[MatchJournal] = None
+        if record_journal:
+            self.journal = MatchJournal(seed)
+            self.journal.reset(core, rng)
+        # プレイヤーごとのビューのキャッシュです（最初にビューを要求された時に作成します）。
+        self.views: Optional[ViewCache] = None
 
-    # 現在のゲーム状態のディープコピーを返します。
-    # 外部からの状態の不意な変更を防ぐためにコピーを返します。
+    # 現在の状態をPydanticモデルとして参照・設定するためのプロパティです。
+    @property
+    def state(self) -> GameState:
+        return self.core.to_game_state()
+
+    @state.setter
+    def state(self, value: GameState) -> None:
+        # 状態を丸ごと置き換えた場合、以前のバージョンからの差分は作れないため履歴を破棄します。
+        # バージョンは置き換え前と value のどちらよりも小さくならないようにします。
+        version = max(self.core.version + 1, value.version)
+        self.core = CompactState.from_game_state(value, self.templates)
+        self.core.version = version
+        if self.history is not None:
+            self.history.clear()
+        if self.journal is not None:
+            self.journal.reset(self.core, self.rng)
+
+    # 現在の状態のバージョンです。
+    @property
+    def version(self) -> int:
+        return self.core.version
+
+    # base_version から現在までの変更セットを返します。履歴に無い場合は None を返します。
+    def changes_since(self, base_version: int) -> Optional[List[PatchOp]]:
+        if self.history is None:
+            return None
+        return self.history.since(base_version, self.core.version)
+
+    # 現在のゲーム状態を返します。
+    # 内部状態からその都度新しいGameStateを組み立てるため、ディープコピーは不要です。
     def get_state(self) -> GameState:
-        return self.state.model_copy(deep=True)
+        started = perf_counter()
+        state = self.core.to_game_state()
+        if self.instrumented:
+            engine_phases.add(PHASE_TIMER_STATE_COPY, perf_counter() - started)
+        return state
+
+    # プレイヤーの位置 viewer から見たビューを返します。同じバージョンの間は同じ辞書を返します（views.py）。
+    def view(self, viewer: int) -> Dict[str, Any]:
+        if self.views is None:
+            self.views = ViewCache()
+        return self.views.view(self.core, viewer)
+
+    # ビューを dumps でエンコードしたボディを返します。同じバージョンを見ている接続は同じボディを共有します。
+    def encoded_view(self, viewer: int, media_type: str, dumps: Callable[[Any], bytes]) -> bytes:
+        if self.views is None:
+            self.views = ViewCache()
+        return self.views.encoded(self.core, viewer, media_type, dumps)
 
     # プレイヤー1とプレイヤー2のアクションを適用し、新しいゲーム状態を返します。
     def apply_action(self, player1_action: Optional[Action], player2_action: Optional[Action]) -> GameState:
-        # ゲームが終了している場合、現在の状態をそのまま返します。
-        if self.state.phase == 'GAME_OVER':
-            return self.get_state()
-
-        # 現在の状態のコピーを作成し、この新しい状態に変更を適用します。
-        new_state = self.get_state()
-        
-        # プレイヤーのアクションを解決し、その結果をリストとして取得します。
-        resolved_actions = self._resolve_actions(new_state, player1_action, player2_action)
-        # 解決されたアクションのリストを新しい状態に記録します。
-        new_state.lastActions = resolved_actions
-        
-        # 勝利条件が満たされているかを確認し、必要であればゲームを終了状態に設定します。
-        self._check_win_condition(new_state)
-        
-        # 変更された新しい状態をエンジンの現在の状態として設定します。
-        self.state = new_state
-        # 更新されたゲーム状態のコピーを返します。
+        self.play_actions(player1_action, player2_action)
+        # 更新されたゲーム状態を返します。
         return self.get_state()
 
+    # apply_action と同じですが、GameState を組み立てずに状態の更新だけを行います。
+    def play_actions(self, player1_action: Optional[Action], player2_action: Optional[Action]) -> None:
+        # アクションを内部表現のプレイに変換してから解決します。
+        self.play(self._locate_play(player1_action), self._locate_play(player2_action))
+
     # ターンを進めます。ドローフェーズとアクションフェーズの準備が含まれます。
     def advance_turn(self) -> GameState:
-        # ゲームが終了している場合、現在の状態をそのまま返します。
-        if self.state.phase == 'GAME_OVER':
-            return self.get_state()
+        self.start_turn()
+        # 更新されたゲーム状態を返します。
+        return self.get_state()
+
+    # apply_action の内部表現版です。Pydanticモデルを経由せずに両プレイヤーのプレイを解決します。
+    def play(self, player1_play: Optional[Play], player2_play: Optional[Play]) -> None:
+        # ゲームが終了している場合は何もしません。
+        if self.core.phase == PHASE_GAME_OVER:
+            return
+
+        if self.journal is not None:
+            self.journal.append((OP_PLAY, *self._journal_play(player1_play), *self._journal_play(player2_play)))
+        snapshot = self._begin_changes()
+        # プレイヤーのアクションを解決し、その結果を記録します（resolve の時間には効果の適用も含まれます）。
+        started = perf_counter()
+        self.core.last_actions = self._resolve_actions(self.core, player1_play, player2_play)
+        resolved = perf_counter()
+        if self.instrumented:
+            engine_phases.add(PHASE_TIMER_RESOLVE, resolved - started)
 
+        # 勝利条件が満たされているかを確認し、必要であればゲームを終了状態に設定します。
+        self._check_win_condition(self.core)
+        if self.instrumented:
+            engine_phases.add(PHASE_TIMER_WIN_CHECK, perf_counter() - resolved)
+        self._commit_changes(snapshot)
+
+    # advance_turn の内部表現版です。
+    def start_turn(self) -> None:
+        state = self.core
+        # ゲームが終了している場合は何もしません。
+        if state.phase == PHASE_GAME_OVER:
+            return
+
+        if self.journal is not None:
+            self.journal.before_start_turn(state, self.rng)
+        snapshot = self._begin_changes()
         # ターン数をインクリメントします。
-        self.state.turn += 1
+        state.turn += 1
         # フェーズを「DRAW」（ドローフェーズ）に設定します。
-        self.state.phase = 'DRAW'
+        state.phase = PHASE_DRAW
         # 前のターンのアクション記録をクリアします。
-        self.state.lastActions = []
+        state.last_actions = []
         # ゲームログに新しいターンの開始を記録します。
-        self.state.log.append(f"--- ターン {self.state.turn} ---")
+        state.log.add(EVENT_TURN_START, state.turn)
 
         # 各プレイヤーに対してカードをドローする処理を実行します。
-        for player in self.state.players:
+        started = perf_counter()
+        for player in state.players:
             # 手札が3枚になるように必要なカードの枚数を計算します。
             cards_to_draw = 3 - len(player.hand)
             if cards_to_draw > 0:
                 # 必要な枚数だけカードをドローします。
                 self._draw_cards(player, cards_to_draw)
-        
+        if self.instrumented:
+            engine_phases.add(PHASE_TIMER_DRAW, perf_counter() - started)
+
         # ドローフェーズが完了したら、フェーズを「ACTION」（アクションフェーズ）に設定します。
-        self.state.phase = 'ACTION'
-        # 更新されたゲーム状態のコピーを返します。
-        return self.get_state()
+        state.phase = PHASE_ACTION
+        self._commit_changes(snapshot)
 
     # 指定されたテンプレートIDに対応するカードテンプレートを取得します。
     def get_card_template(self, template_id: str) -> Optional[CardTemplate]:
@@ -86,8 +234,14 @@ class GameEngine:
 
     # ゲームの初期状態を静的メソッドとして作成します。
     # インスタンスを生成せずに呼び出すことができます。
+    # player1_deck / player2_deck に Deck.cards 形式（templateId -> 枚数）を渡すと、そのデッキで開始します。
     @staticmethod
-    def create_initial_state(player1_id: str, player2_id: str, card_templates: Dict[str, CardTemplate]) -> GameState:
+    def create_initial_state(player1_id: str, player2_id: str, card_templates: Mapping[str, CardTemplate],
+                             player1_deck: Optional[Dict[str, int]] = None,
+                             player2_deck: Optional[Dict[str, int]] = None,
+                             rng: Optional[random.Random] = None) -> GameState:
+        # rng を省略した場合は、この呼び出し専用の乱数生成器でシャッフルします。
+        shuffler = rng if rng is not None else random.Random()
         initial_deck = []
         # 全てのカードテンプレートを反復処理して初期デッキを構築します。
         for t in card_templates.values():
@@ -96,13 +250,19 @@ class GameEngine:
             for _ in range(count):
                 initial_deck.append(t.templateId)
 
+        # Deck.cards 形式の枚数指定をテンプレートIDのリストに展開するヘルパー関数です。
+        def expand_deck(deck: Optional[Dict[str, int]]) -> List[str]:
+            if deck is None:
+                return initial_deck
+            return [tid for tid, count in deck.items() for _ in range(count)]
+
         # プレイヤーの状態を生成するためのネストされたヘルパー関数です。
-        def create_player(p_id: str) -> PlayerState:
-            # 初期デッキのテンプレートIDに基づいてCardオブジェクトのリストを作成します。
+        def create_player(p_id: str, deck: Optional[Dict[str, int]]) -> PlayerState:
+            # デッキのテンプレートIDに基づいてCardオブジェクトのリストを作成します。
             # 各カードにはユニークなIDが付与されます。
-            deck_cards = [Card(id=f"card{i}_{tid}", templateId=tid) for i, tid in enumerate(initial_deck)]
+            deck_cards = [Card(id=f"card{i}_{tid}", templateId=tid) for i, tid in enumerate(expand_deck(deck))]
             # デッキのカードをシャッフルします。
-            random.shuffle(deck_cards)
+            shuffler.shuffle(deck_cards)
             # PlayerStateオブジェクトを生成し、初期資金と資産、シャッフルされたデッキを設定します。
             return PlayerState(
                 playerId=p_id,
@@ -113,15 +273,93 @@ class GameEngine:
 
         # GameStateオブジェクトを生成し、初期設定を行います。
         return GameState(
-            matchId=f"match-{int(time.time())}", # 現在のタイムスタンプに基づいたユニークな試合ID
+            matchId=f"match-{uuid.uuid4().hex}", # 同時に作成しても衝突しないユニークな試合ID
             turn=0, # 初期ターンは0
-            players=[create_player(player1_id), create_player(player2_id)], # 2人のプレイヤーを作成
+            players=[create_player(player1_id, player1_deck), create_player(player2_id, player2_deck)], # 2人のプレイヤーを作成
             phase='DRAW', # 最初のフェーズは「DRAW」
             log=['ゲーム開始！'] # 初期ログメッセージ
         )
 
+    # アクションを (プレイヤー, 手札のカードインデックス) の組に変換するプライベートヘルパーメソッドです。
+    def _locate_play(self, action: Optional[Action]) -> Optional[Play]:
+        if not action:
+            return None
+        # アクションのプレイヤーIDに対応するプレイヤーを取得します。
+        player = self.core.player_by_id(action.playerId)
+        if not player:
+            return None
+        # 手札からアクションIDに対応するカードを見つけます。見つからない場合は -1 を返します。
+        ids = self.core.cards.ids
+        card = next((c for c in player.hand if ids[c] == action.cardId), -1)
+        return player, card
+
+    # プレイをジャーナルに記録する (プレイヤーの位置, カードインデックス) の組に変換するプライベートヘルパーメソッドです。
+    def _journal_play(self, play: Optional[Play]) -> Tuple[int, int]:
+        if not play:
+            return -1, -1
+        player, card = play
+        return self.core.players.index(player), card
+
+    # 変更セットの記録を開始し、差分の検出に使う値を控えておくプライベートヘルパーメソッドです。
+    # カードの移動は変更箇所で直接記録し、資金・資産などの数値は終了時に比較して記録します。
+    def _begin_changes(self):
+        if self.history is None:
+            return None
+        self._ops = []
+        state = self.core
+        return (state.turn, state.phase, state.last_actions, len(state.log),
+                [(p.funds, p.properties) for p in state.players])
+
+    # 記録した変更セットを確定し、バージョンを進めるプライベートヘルパーメソッドです。
+    def _commit_changes(self, snapshot) -> None:
+        state = self.core
+        state.version += 1
+        if snapshot is None:
+            return
+        ops, self._ops = self._ops, None
+        ops.append({'op': 'replace', 'path': '/version', 'value': state.version})
+        turn, phase, last_actions, log_length, numbers = snapshot
+        for i, (player, (funds, properties)) in enumerate(zip(state.players, numbers)):
+            if player.funds != funds:
+                ops.append({'op': 'replace', 'path': f'/players/{i}/funds', 'value': player.funds})
+            if player.properties != properties:
+                ops.append({'op': 'replace', 'path': f'/players/{i}/properties', 'value': player.properties})
+        if state.turn != turn:
+            ops.append({'op': 'replace', 'path': '/turn', 'value': state.turn})
+        if state.phase != phase:
+            ops.append({'op': 'replace', 'path': '/phase', 'value': PHASES[state.phase]})
+        if state.last_actions != last_actions:
+            ops.append({'op': 'replace', 'path': '/lastActions',
+                        'value': [{'playerId': pid, 'cardTemplateId': tid} for pid, tid in state.last_actions]})
+        # GameState.log は直近の LOG_WINDOW 行なので、増えた行を追加し、溢れた行を先頭から削除します。
+        # 1回の変更で LOG_WINDOW 行以上増えた場合は、行全体を置き換えます。
+        log = state.log
+        if len(log) != log_length:
+            if len(log) - log_length >= LOG_WINDOW:
+                ops.append({'op': 'replace', 'path': '/log', 'value': log.window()})
+            else:
+                shown = min(log_length - log.base, LOG_WINDOW)
+                for line in log.texts_since(log_length):
+                    if shown == LOG_WINDOW:
+                        ops.append({'op': 'remove', 'path': '/log/0'})
+                    else:
+                        shown += 1
+                    ops.append({'op': 'add', 'path': '/log/-', 'value': line})
+            if log.window_start != max(log_length - LOG_WINDOW, log.base):
+                ops.append({'op': 'replace', 'path': '/logCursor', 'value': log.window_start})
+        self.history.append(state.version, ops)
+
+    # 手札・山札・捨て札の変更を記録するプライベートヘルパーメソッドです。
+    def _record_cards(self, op: str, player: CompactPlayer, zone: str, suffix: str = '', value=None) -> None:
+        index = self.core.players.index(player)
+        change: PatchOp = {'op': op, 'path': f'/players/{index}/{zone}{suffix}'}
+        if op != 'remove':
+            change['value'] = value
+        self._ops.append(change)
+
     # プレイヤーにカードをドローさせるプライベートヘルパーメソッドです。
-    def _draw_cards(self, player: PlayerState, count: int) -> None:
+    def _draw_cards(self, player: CompactPlayer, count: int) -> None:
+        to_dict = self.core.cards.to_dict
         # 指定された枚数だけカードをドローします。
         for _ in range(count):
             # デッキが空の場合
@@ -132,142 +370,99 @@ class GameEngine:
                 # 捨て札をデッキに移動させ、捨て札を空にしてからデッキをシャッフルします。
                 player.deck = player.discard
                 player.discard = []
-                random.shuffle(player.deck)
-            
+                self.rng.shuffle(player.deck)
+                if self._ops is not None:
+                    self._record_cards('replace', player, 'deck', value=[to_dict(c) for c in player.deck])
+                    self._record_cards('replace', player, 'discard', value=[])
+
             # デッキの一番上のカード（最初の要素）を引きます。
             drawn_card = player.deck.pop(0)
             # 引いたカードを手札に追加します。
             player.hand.append(drawn_card)
-
-    # カードの効果を適用するプライベートヘルパーメソッドです。
-    def _apply_card_effect(self, state: GameState, player: PlayerState, card: Card, opponent: PlayerState) -> None:
-        # カードのテンプレート情報を取得します。
-        card_template = self.get_card_template(card.templateId)
-        # テンプレートが見つからない場合は処理を終了します。
-        if not card_template:
-            return
-
-        # カードのタイプに応じて、対応する効果適用関数を呼び出します。
-        if card_template.type == 'GAIN_FUNDS':
-            apply_gain_funds(player) # 資金獲得効果
-        elif card_template.type == 'ACQUIRE':
-            apply_acquire(player, opponent) # 買収効果
-        elif card_template.type == 'DEFEND':
-            apply_defend(player) # 防衛効果
-        elif card_template.type == 'FRAUD':
-            apply_fraud(player, opponent) # 詐欺効果
+            if self._ops is not None:
+                self._record_cards('remove', player, 'deck', '/0')
+                self._record_cards('add', player, 'hand', '/-', to_dict(drawn_card))
 
     # プレイヤーのアクションを解決し、その結果のリストを返すプライベートメソッドです。
-    def _resolve_actions(self, state: GameState, player1_action: Optional[Action], player2_action: Optional[Action]) -> List[ResolvedAction]:
+    def _resolve_actions(self, state: CompactState, player1_play: Optional[Play], player2_play: Optional[Play]) -> List[Tuple[str, str]]:
         # フェーズを「RESOLUTION」（解決フェーズ）に設定します。
-        state.phase = 'RESOLUTION'
-        # 解決されたアクションを格納するリストを初期化します。
+        state.phase = PHASE_RESOLUTION
+        # 解決されたアクションを (playerId, cardTemplateId) の組として格納するリストを初期化します。
         resolved = []
+        table = self.templates
+        cards = state.cards
 
-        # プレイヤー1とプレイヤー2のPlayerStateオブジェクトを取得します。
-        # アクションが提供されていない場合はNoneになります。
-        player1 = next((p for p in state.players if p.playerId == player1_action.playerId), None) if player1_action else None
-        player2 = next((p for p in state.players if p.playerId == player2_action.playerId), None) if player2_action else None
-
-        # プレイヤーとアクションに基づいてカードとテンプレート情報を取得するヘルパー関数です。
-        def get_card_info(player: Optional[PlayerState], action: Optional[Action]):
-            if not player or not action:
-                return None, None
-            # 手札からアクションIDに対応するカードを見つけます。
-            card = next((c for c in player.hand if c.id == action.cardId), None)
-            # カードが見つかれば、そのテンプレート情報を取得します。
-            template = self.get_card_template(card.templateId) if card else None
-            return card, template
+        # プレイとカードのテンプレートインデックスを取得するヘルパー関数です。
+        # カードが手札に無い、またはテンプレートが見つからない場合は UNKNOWN_TEMPLATE になります。
+        def get_card_info(play: Optional[Play]):
+            if not play or play[1] < 0:
+                return None, -1, UNKNOWN_TEMPLATE
+            player, card = play
+            return player, card, cards.templates[card]
 
         # 各プレイヤーのカードとテンプレート情報を取得します。
-        p1_card, p1_template = get_card_info(player1, player1_action)
-        p2_card, p2_template = get_card_info(player2, player2_action)
+        player1, p1_card, p1_template = get_card_info(player1_play)
+        player2, p2_card, p2_template = get_card_info(player2_play)
 
         # プレイヤー1がカードをプレイしたかどうかの条件をチェックします。
-        # カードが存在し、テンプレートが存在し、プレイヤーが存在し、かつ資金がコスト以上であること。
-        p1_played = p1_card and p1_template and player1 and player1.funds >= p1_template.cost
+        # テンプレートが存在し、かつ資金がコスト以上であること。
+        p1_played = p1_template != UNKNOWN_TEMPLATE and player1.funds >= table.costs[p1_template]
         # プレイヤー2がカードをプレイしたかどうかの条件をチェックします。
-        p2_played = p2_card and p2_template and player2 and player2.funds >= p2_template.cost
+        p2_played = p2_template != UNKNOWN_TEMPLATE and player2.funds >= table.costs[p2_template]
 
         # プレイヤー1がカードをプレイした場合の処理
         if p1_played:
-            player1.funds -= p1_template.cost # 資金を消費
-            player1.hand = [c for c in player1.hand if c.id != p1_card.id] # 手札からカードを削除
+            player1.funds -= table.costs[p1_template] # 資金を消費
+            p1_card_id = cards.ids[p1_card]
+            self._record_play(player1, p1_card) # 手札から捨て札への移動を変更セットに記録
+            player1.hand = [c for c in player1.hand if cards.ids[c] != p1_card_id] # 手札からカードを削除
             player1.discard.append(p1_card) # 捨て札にカードを追加
-            resolved.append(ResolvedAction(playerId=player1.playerId, cardTemplateId=p1_template.templateId)) # 解決済みアクションとして記録
-            state.log.append(f"プレイヤーは「{p1_template.name}」をプレイした") # ログに記録
+            resolved.append((player1.player_id, table.ids[p1_template])) # 解決済みアクションとして記録
+            state.log.add(EVENT_PLAYER_PLAYED, table.ids[p1_template], table.names[p1_template]) # ログに記録
 
         # プレイヤー2がカードをプレイした場合の処理（プレイヤー1と同様）
         if p2_played:
-            player2.funds -= p2_template.cost
-            player2.hand = [c for c in player2.hand if c.id != p2_card.id]
+            player2.funds -= table.costs[p2_template]
+            p2_card_id = cards.ids[p2_card]
+            self._record_play(player2, p2_card)
+            player2.hand = [c for c in player2.hand if cards.ids[c] != p2_card_id]
             player2.discard.append(p2_card)
-            resolved.append(ResolvedAction(playerId=player2.playerId, cardTemplateId=p2_template.templateId))
-            state.log.append(f"対戦相手は「{p2_template.name}」をプレイした")
-
-        # 各プレイヤーが実際に有効なカードをプレイしたかどうかを示す変数です。
-        p1_effective_template = p1_template if p1_played else None
-        p2_effective_template = p2_template if p2_played else None
-
-        # 各プレイヤーが特定のアクションタイプをプレイしたかどうかのフラグを設定します。
-        is_p1_acquire = p1_effective_template and p1_effective_template.type == 'ACQUIRE'
-        is_p2_acquire = p2_effective_template and p2_effective_template.type == 'ACQUIRE'
-        is_p1_defend = p1_effective_template and p1_effective_template.type == 'DEFEND'
-        is_p2_defend = p2_effective_template and p2_effective_template.type == 'DEFEND'
-        is_p1_fraud = p1_effective_template and p1_effective_template.type == 'FRAUD'
-        is_p2_fraud = p2_effective_template and p2_effective_template.type == 'FRAUD'
-
-        # 各プレイヤーのアクションが最終的に効果を発揮するかどうかのフラグを初期化します。
-        p1_effect = bool(p1_played)
-        p2_effect = bool(p2_played)
-
-        # カードの相殺ロジック
-        # プレイヤー1が「買収」とプレイヤー2が「買収」の場合、両方のアクションは無効になります。
-        if is_p1_acquire and is_p2_acquire:
-            p1_effect = p2_effect = False
-        # プレイヤー1が「買収」とプレイヤー2が「防衛」の場合、プレイヤー1の「買収」は無効になります。
-        elif is_p1_acquire and is_p2_defend:
-            p1_effect = False
-        # プレイヤー1が「買収」とプレイヤー2が「詐欺」の場合、プレイヤー1の「買収」は無効になり、
-        # プレイヤー2の「詐欺」が適用されます。
-        elif is_p1_acquire and is_p2_fraud:
-            p1_effect = False
-            # プレイヤー2の対戦相手を取得します。
-            opponent_of_p2 = next(p for p in state.players if p.playerId != player2.playerId)
-            # プレイヤー2のカード効果を適用します。
-            self._apply_card_effect(state, player2, p2_card, opponent_of_p2)
-        # プレイヤー2が「買収」とプレイヤー1が「防衛」の場合、プレイヤー2の「買収」は無効になります。
-        elif is_p2_acquire and is_p1_defend:
-            p2_effect = False
-        # プレイヤー2が「買収」とプレイヤー1が「詐欺」の場合、プレイヤー2の「買収」は無効になり、
-        # プレイヤー1の「詐欺」が適用されます。
-        elif is_p2_acquire and is_p1_fraud:
-            p2_effect = False
-            # プレイヤー1の対戦相手を取得します。
-            opponent_of_p1 = next(p for p in state.players if p.playerId != player1.playerId)
-            # プレイヤー1のカード効果を適用します。
-            self._apply_card_effect(state, player1, p1_card, opponent_of_p1)
-
-        # プレイヤー1のカード効果が有効で、かつそのカードが「詐欺」でも「防衛」でもない場合、効果を適用します。
-        # （「詐欺」と「防衛」は上記の相殺ロジックで既に処理されているか、特殊な効果を持つためここで除外されます）
-        if p1_effect and p1_effective_template and p1_effective_template.type not in ['FRAUD', 'DEFEND']:
-            # プレイヤー1の対戦相手を取得します。
-            opponent_of_p1 = next(p for p in state.players if p.playerId != player1.playerId)
-            # プレイヤー1のカード効果を適用します。
-            self._apply_card_effect(state, player1, p1_card, opponent_of_p1)
-        
-        # プレイヤー2のカード効果が有効で、かつそのカードが「詐欺」でも「防衛」でもない場合、効果を適用します。
-        if p2_effect and p2_effective_template and p2_effective_template.type not in ['FRAUD', 'DEFEND']:
-            # プレイヤー2の対戦相手を取得します。
-            opponent_of_p2 = next(p for p in state.players if p.playerId != player2.playerId)
-            # プレイヤー2のカード効果を適用します。
-            self._apply_card_effect(state, player2, p2_card, opponent_of_p2)
+            resolved.append((player2.player_id, table.ids[p2_template]))
+            state.log.add(EVENT_OPPONENT_PLAYED, table.ids[p2_template], table.names[p2_template])
+
+        # 相殺を含む解決手順は、プレイされたテンプレートの組ごとに ResolutionTable に前計算されています。
+        # 表を引き、手順に従って効果アクションを順に適用します。
+        plan = self.resolution.plan(p1_template if p1_played else UNKNOWN_TEMPLATE,
+                                    p2_template if p2_played else UNKNOWN_TEMPLATE)
+        players = (player1, player2)
+        started = perf_counter()
+        for side, code, value in plan:
+            player = players[side]
+            ACTION_HANDLERS[code](player, self._opponent_of(state, player), value)
+        if self.instrumented:
+            engine_phases.add(PHASE_TIMER_EFFECTS, perf_counter() - started)
 
         # 解決されたアクションのリストを返します。
         return resolved
 
+    # カードのプレイ（手札から捨て札への移動）を変更セットに記録するプライベートヘルパーメソッドです。
+    # 手札から取り除く前に呼び出し、同じIDのカードの位置を後ろから順に削除として記録します。
+    def _record_play(self, player: CompactPlayer, card: int) -> None:
+        if self._ops is None:
+            return
+        ids = self.core.cards.ids
+        for position in reversed(range(len(player.hand))):
+            if ids[player.hand[position]] == ids[card]:
+                self._record_cards('remove', player, 'hand', f'/{position}')
+        self._record_cards('add', player, 'discard', '/-', self.core.cards.to_dict(card))
+
+    # 指定されたプレイヤーの対戦相手を取得するプライベートヘルパーメソッドです。
+    @staticmethod
+    def _opponent_of(state: CompactState, player: CompactPlayer) -> CompactPlayer:
+        return next(p for p in state.players if p.player_id != player.player_id)
+
     # 勝利条件が満たされているかを確認するプライベートメソッドです。
-    def _check_win_condition(self, state: GameState) -> None:
+    def _check_win_condition(self, state: CompactState) -> None:
         # プレイヤー1が資産を全て失ったか（0以下になったか）をチェックします。
         p1_lost = state.players[0].properties <= 0
         # プレイヤー2が資産を全て失ったか（0以下になったか）をチェックします。
@@ -276,6 +471,9 @@ class GameEngine:
         # いずれかのプレイヤーが資産を全て失った場合
         if p1_lost or p2_lost:
             # ゲームのフェーズを「GAME_OVER」に設定します。
-            state.phase = 'GAME_OVER'
-            # コンソールにゲーム終了メッセージを出力します。
-            print('ゲーム終了')
+            state.phase = PHASE_GAME_OVER
+            # 実際の試合の場合は、試合の終了をログとメトリクスに記録します。
+            if self.instrumented:
+                result = 'draw' if p1_lost and p2_lost else 'player2' if p1_lost else 'player1'
+                games_finished.inc(result=result)
+                logger.info("Match %s finished on turn %d (winner: %s)", state.match_id, state.turn, result)
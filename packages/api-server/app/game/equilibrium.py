@@ -0,0 +1,551 @@
+# packages/api-server/app/game/equilibrium.py
+# 同時手番のターンを1つの行列ゲーム（各プレイヤーの手は「出さない」と支払える手札のテンプレート）とみなし、
+# 残りターン数 horizon までのゲームの均衡（ミニマックス）戦略と局面の値を求めるオフラインのソルバーです。
+# 局面は VectorizedEngine と同じく、カードの並び順を持たずにテンプレートごとの枚数で表した抽象状態にします
+# （シャッフル済みの山札の上から引くことと、山札の構成から非復元抽出することは同じ分布になります）。
+# 各ターンの行列ゲームは線形計画（単体法）で解き、解けない場合は仮想プレイ（fictitious play）で近似します。
+# 求めた値と戦略は抽象状態ごとに大きさを制限したメモ（LRU）に保存し、path を指定すると SQLite のファイルに保存して次回以降も再利用します。
+# horizon ターン以内に決着しない局面は引き分け（値 0）として扱います。
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.effects import ACTION_HANDLERS
+from app.game.engine import GameEngine
+from app.game.models import CardTemplate
+from app.game.state import PHASE_ACTION, UNKNOWN_TEMPLATE, CompactPlayer, CompactState
+from app.game.templates import card_template_registry, compile_templates, templates_fingerprint
+
+# 既定の設定値です。
+DEFAULT_HORIZON = 3
+DEFAULT_FICTITIOUS_PLAY_ITERATIONS = 5000
+DEFAULT_MEMO_SIZE = 500000 # メモに保持する解の数の上限（環境変数 EQUILIBRIUM_MEMO_SIZE で上書きできます）
+DEFAULT_DRAWS_CACHE_SIZE = 100000 # ドローの結果のキャッシュの大きさ
+DEFAULT_FLUSH_INTERVAL = 5.0 # 未保存の解を保存先に書き込むまでの最長の秒数（環境変数 EQUILIBRIUM_FLUSH_INTERVAL）
+
+# 現在のカードテンプレート以外（ホットリロード前の定義で続いている試合など）のソルバーを保持する数です。
+# これを超えた古いソルバーは閉じて破棄します。
+MAX_STALE_SOLVERS = 2
+
+# 手札の上限枚数です（GameEngine.start_turn と同じ）。
+HAND_SIZE = 3
+
+# 出さない手を表す名前です（戦略の辞書のキーに使います）。
+PASS = 'PASS'
+
+# 単体法の数値誤差の許容値です。
+_EPSILON = 1e-9
+
+# 1人分の抽象状態です: (資金, 不動産, 手札・山札・捨て札のテンプレートごとの枚数)。
+PlayerKey = Tuple[int, int, Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]]
+StateKey = Tuple[PlayerKey, PlayerKey]
+# 行列ゲームの解です: (プレイヤー1から見た値, プレイヤー1の混合戦略, プレイヤー2の混合戦略)。
+Solution = Tuple[float, Tuple[float, ...], Tuple[float, ...]]
+
+
+class EquilibriumResult(BaseModel):
+    value: float # 指定したプレイヤーから見た局面の値（-1 〜 1、勝ちが 1）
+    horizon: int
+    strategy: Dict[str, float] # templateId（出さない場合は PASS）-> 確率
+    opponentStrategy: Dict[str, float]
+
+
+class OpeningAnalysis(BaseModel):
+    value: float # 最初のドローについて平均した、プレイヤー1から見た値
+    horizon: int
+    openings: int # 最初のドローの組み合わせの数
+    statesSolved: int
+    tableHits: int
+    elapsedMs: float
+
+
+class SolverFailed(Exception):
+    pass
+
+
+def solve_matrix_game(payoff: Sequence[Sequence[float]], iterations: int = DEFAULT_FICTITIOUS_PLAY_ITERATIONS) -> Solution:
+    """
+    行プレイヤーが最大化するゼロ和の行列ゲームの値と両者の混合戦略を返します。
+    純粋戦略の鞍点があればそれを、無ければ線形計画を解き、失敗した場合は仮想プレイで近似します。
+    """
+    rows, cols = len(payoff), len(payoff[0])
+    lower = max(min(row) for row in payoff)
+    upper = min(max(payoff[i][j] for i in range(rows)) for j in range(cols))
+    if upper - lower <= _EPSILON:
+        i = max(range(rows), key=lambda r: min(payoff[r]))
+        j = min(range(cols), key=lambda c: max(payoff[r][c] for r in range(rows)))
+        return lower, _pure(rows, i), _pure(cols, j)
+    try:
+        return _solve_lp(payoff)
+    except SolverFailed:
+        return fictitious_play(payoff, iterations)
+
+
+def _pure(size: int, index: int) -> Tuple[float, ...]:
+    return tuple(1.0 if i == index else 0.0 for i in range(size))
+
+
+def _solve_lp(payoff: Sequence[Sequence[float]]) -> Solution:
+    # 全ての値が正になるよう shift を加えた行列 A について、列プレイヤーの問題
+    #   maximize sum(y)  subject to  A y <= 1, y >= 0
+    # を単体法（Bland の規則）で解きます。値は 1 / sum(y) - shift、列の戦略は y の正規化、
+    # 行の戦略は最終の表のスラック変数の被約費用（双対変数）の正規化です。
+    rows, cols = len(payoff), len(payoff[0])
+    shift = 1.0 - min(min(row) for row in payoff)
+    # 表の各行は [A の行, スラック変数, 右辺] で、最後の行は目的関数の行です。
+    table = [[payoff[i][j] + shift for j in range(cols)] + list(_pure(rows, i)) + [1.0] for i in range(rows)]
+    table.append([-1.0] * cols + [0.0] * (rows + 1))
+    basis = [cols + i for i in range(rows)]
+    width = cols + rows
+    for _ in range(50 * (rows + cols)):
+        objective = table[-1]
+        entering = next((j for j in range(width) if objective[j] < -_EPSILON), None)
+        if entering is None:
+            break
+        leaving, best = None, None
+        for i in range(rows):
+            coefficient = table[i][entering]
+            if coefficient > _EPSILON:
+                ratio = table[i][-1] / coefficient
+                if best is None or ratio < best - _EPSILON or (abs(ratio - best) <= _EPSILON and basis[i] < basis[leaving]):
+                    leaving, best = i, ratio
+        if leaving is None:
+            raise SolverFailed("Unbounded linear program")
+        pivot_row = table[leaving]
+        pivot = pivot_row[entering]
+        pivot_row[:] = [v / pivot for v in pivot_row]
+        for i, row in enumerate(table):
+            factor = row[entering]
+            if i != leaving and factor != 0.0:
+                row[:] = [v - factor * p for v, p in zip(row, pivot_row)]
+        basis[leaving] = entering
+    else:
+        raise SolverFailed("Simplex did not converge")
+
+    total = table[-1][-1]
+    if total <= _EPSILON:
+        raise SolverFailed("Degenerate solution")
+    y = [0.0] * cols
+    for i, variable in enumerate(basis):
+        if variable < cols:
+            y[variable] = table[i][-1]
+    x = [max(0.0, table[-1][cols + i]) for i in range(rows)]
+    column = _normalized(y)
+    row = _normalized(x)
+    if column is None or row is None:
+        raise SolverFailed("Invalid strategy")
+    return 1.0 / total - shift, row, column
+
+
+def _normalized(weights: Sequence[float]) -> Optional[Tuple[float, ...]]:
+    total = sum(weights)
+    if total <= _EPSILON:
+        return None
+    return tuple(max(0.0, w) / total for w in weights)
+
+
+def fictitious_play(payoff: Sequence[Sequence[float]], iterations: int = DEFAULT_FICTITIOUS_PLAY_ITERATIONS) -> Solution:
+    """両者が相手のこれまでの手の頻度に対する最適応答を繰り返し、頻度を近似的な均衡戦略として返します。"""
+    rows, cols = len(payoff), len(payoff[0])
+    row_counts, col_counts = [0] * rows, [0] * cols
+    # 相手のこれまでの手に対する各手の利得の合計です。
+    row_payoffs, col_payoffs = [0.0] * rows, [0.0] * cols
+    i, j = 0, 0
+    for _ in range(iterations):
+        row_counts[i] += 1
+        col_counts[j] += 1
+        for r in range(rows):
+            row_payoffs[r] += payoff[r][j]
+        for c in range(cols):
+            col_payoffs[c] += payoff[i][c]
+        i = max(range(rows), key=row_payoffs.__getitem__)
+        j = min(range(cols), key=col_payoffs.__getitem__)
+    # 値は、相手の頻度に対する最適応答の値（上界と下界）の中点です。
+    lower = min(col_payoffs) / iterations
+    upper = max(row_payoffs) / iterations
+    return (lower + upper) / 2, tuple(n / iterations for n in row_counts), tuple(n / iterations for n in col_counts)
+
+
+class EquilibriumStore:
+    """
+    解をカードテンプレートの集合ごとに保存する SQLite のファイルです。
+    書き込みは put でためて、batch_size 件たまるか、前回の書き込みから flush_interval 秒が過ぎるか、
+    flush を呼んだ時点でまとめて1つのトランザクションにします。
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._flushed_at = clock()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution TEXT NOT NULL)')
+        self._pending: Dict[str, str] = {}
+        self._closed = False
+
+    def get(self, key: str) -> Optional[Solution]:
+        with self._lock:
+            raw = self._pending.get(key)
+            if raw is None:
+                row = self._connection.execute('SELECT solution FROM solutions WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                raw = row[0]
+        value, row_strategy, column_strategy = json.loads(raw)
+        return value, tuple(row_strategy), tuple(column_strategy)
+
+    def put(self, key: str, solution: Solution) -> None:
+        with self._lock:
+            self._pending[key] = json.dumps(solution)
+            due = (len(self._pending) >= self.batch_size
+                   or self._clock() - self._flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = self._clock()
+            if pending and not self._closed:
+                with self._connection:
+                    self._connection.executemany('INSERT OR REPLACE INTO solutions VALUES (?, ?)', pending.items())
+        return len(pending)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0] + len(self._pending)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._connection.close()
+
+
+class EquilibriumSolver:
+    """
+    抽象状態ごとの行列ゲームを後ろ向きに解くソルバーです。
+    両者を入れ替えた局面の値は符号を反転した値になるため、プレイヤーの順序をそろえた鍵で1回だけ解きます。
+    """
+
+    def __init__(self, card_templates: Mapping[str, CardTemplate] = BASE_CARD_TEMPLATES,
+                 horizon: int = DEFAULT_HORIZON, store: Optional[EquilibriumStore] = None,
+                 iterations: int = DEFAULT_FICTITIOUS_PLAY_ITERATIONS, memo_size: int = DEFAULT_MEMO_SIZE):
+        self.card_templates = card_templates
+        self.templates, self.resolution = compile_templates(card_templates)
+        self.horizon = horizon
+        self.store = store
+        self.iterations = iterations
+        self.fingerprint = templates_fingerprint(card_templates)
+        self._max_cost = max(self.templates.costs, default=0)
+        self.memo_size = memo_size
+        self._memo: 'OrderedDict[Tuple[StateKey, int], Solution]' = OrderedDict()
+        # solve / analyze_opening / choose はスレッドプールからも呼ばれるため、メモの更新を直列にします。
+        self._lock = threading.RLock()
+        self.states_solved = 0
+        self.table_hits = 0
+        self._draws = lru_cache(maxsize=DEFAULT_DRAWS_CACHE_SIZE)(self._draw_outcomes)
+
+    @classmethod
+    def from_env(cls, card_templates: Mapping[str, CardTemplate] = BASE_CARD_TEMPLATES) -> 'EquilibriumSolver':
+        path = os.getenv("EQUILIBRIUM_STORE_PATH")
+        interval = float(os.getenv("EQUILIBRIUM_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        return cls(card_templates, horizon=int(os.getenv("EQUILIBRIUM_HORIZON", DEFAULT_HORIZON)),
+                   store=EquilibriumStore(path, flush_interval=interval) if path else None,
+                   memo_size=int(os.getenv("EQUILIBRIUM_MEMO_SIZE", DEFAULT_MEMO_SIZE)))
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    def flush(self) -> int:
+        """未保存の解を保存先に書き込み、書き込んだ件数を返します。"""
+        store = self.store
+        return store.flush() if store is not None else 0
+
+    def close(self) -> None:
+        """計算中の呼び出しが終わるのを待って保存先を閉じ、メモとキャッシュを破棄します。以降はメモだけで解きます。"""
+        with self._lock:
+            store, self.store = self.store, None
+            self._memo.clear()
+            self._draws.cache_clear()
+        if store is not None:
+            store.close()
+
+    # --- 抽象状態 ---
+
+    def abstract_key(self, state: CompactState) -> StateKey:
+        """アクションフェーズの状態を抽象状態に変換します。テンプレートが見つからないカードは数えません。"""
+        size = len(self.templates)
+        templates = state.cards.templates
+
+        def counts(cards: List[int]) -> Tuple[int, ...]:
+            result = [0] * size
+            for c in cards:
+                if templates[c] != UNKNOWN_TEMPLATE:
+                    result[templates[c]] += 1
+            return tuple(result)
+
+        first, second = (
+            (p.funds, p.properties, counts(p.hand), counts(p.deck), counts(p.discard)) for p in state.players)
+        return first, second
+
+    def moves(self, player: PlayerKey) -> List[int]:
+        """出さない手（UNKNOWN_TEMPLATE）と、支払える手札のテンプレートの一覧です。戦略はこの順に並びます。"""
+        funds, _, hand, _, _ = player
+        costs = self.templates.costs
+        return [UNKNOWN_TEMPLATE] + [t for t, n in enumerate(hand) if n and funds >= costs[t]]
+
+    # --- 解 ---
+
+    def solve(self, state: CompactState, me: int = 0, horizon: Optional[int] = None) -> EquilibriumResult:
+        """アクションフェーズの状態で、プレイヤー me の均衡戦略と局面の値を返します。"""
+        if state.phase != PHASE_ACTION:
+            raise ValueError("Equilibrium is only defined in the ACTION phase")
+        key = self.abstract_key(state)
+        horizon = self.horizon if horizon is None else horizon
+        with self._lock:
+            value, first, second = self.solution(key, horizon)
+        ids = self.templates.ids
+
+        def named(player: PlayerKey, strategy: Tuple[float, ...]) -> Dict[str, float]:
+            return {(ids[m] if m != UNKNOWN_TEMPLATE else PASS): p for m, p in zip(self.moves(player), strategy)}
+
+        strategies = [named(key[0], first), named(key[1], second)]
+        return EquilibriumResult(value=value if me == 0 else -value, horizon=horizon,
+                                 strategy=strategies[me], opponentStrategy=strategies[1 - me])
+
+    def solution(self, key: StateKey, horizon: int) -> Solution:
+        """抽象状態の解（プレイヤー1から見た値と両者の戦略）を返します。"""
+        # 残り horizon ターンで支払える資金は最大コスト × horizon までなので、それを超える資金は区別しません。
+        cap = self._max_cost * horizon
+        first, second = (player if player[0] <= cap else (cap,) + player[1:] for player in key)
+        if second < first:
+            value, row, column = self._canonical((second, first), horizon)
+            return -value, column, row
+        return self._canonical((first, second), horizon)
+
+    def _canonical(self, key: StateKey, horizon: int) -> Solution:
+        memo_key = (key, horizon)
+        cached = self._memo.get(memo_key)
+        if cached is not None:
+            self.table_hits += 1
+            self._memo.move_to_end(memo_key)
+            return cached
+        store_key = None
+        if self.store is not None:
+            store_key = f'{self.fingerprint}:{horizon}:{json.dumps(key, separators=(",", ":"))}'
+            cached = self.store.get(store_key)
+            if cached is not None:
+                self.table_hits += 1
+                self._remember(memo_key, cached)
+                return cached
+
+        rows, cols = self.moves(key[0]), self.moves(key[1])
+        payoff = [[self._after(key, a, b, horizon) for b in cols] for a in rows]
+        solution = solve_matrix_game(payoff, self.iterations)
+        self.states_solved += 1
+        self._remember(memo_key, solution)
+        if store_key is not None:
+            self.store.put(store_key, solution)
+        return solution
+
+    def _remember(self, memo_key: Tuple[StateKey, int], solution: Solution) -> None:
+        # 上限を超えたら、最も長く参照されていない解から捨てます（保存先があればそこから読み直せます）。
+        self._memo[memo_key] = solution
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def _after(self, key: StateKey, first: int, second: int, horizon: int) -> float:
+        # 両者の手を解決し、決着すれば ±1（両者とも不動産を失えば 0）、
+        # 残りターンがあれば次のターンのドローについて平均した値を返します。
+        players = []
+        for (funds, properties, hand, deck, discard), move in ((key[0], first), (key[1], second)):
+            if move != UNKNOWN_TEMPLATE:
+                funds -= self.templates.costs[move]
+                hand = _moved(hand, move, -1)
+                discard = _moved(discard, move, 1)
+            players.append((CompactPlayer('', funds, properties, [], [], []), hand, deck, discard))
+        (p1, hand1, deck1, discard1), (p2, hand2, deck2, discard2) = players
+        for side, code, value in self.resolution.plan(first, second):
+            actor, opponent = (p1, p2) if side == 0 else (p2, p1)
+            ACTION_HANDLERS[code](actor, opponent, value)
+        if p1.properties <= 0 or p2.properties <= 0:
+            return (p1.properties > 0) - (p2.properties > 0)
+        if horizon <= 1:
+            return 0.0
+
+        total = 0.0
+        for chance1, hand1_, deck1_, discard1_ in self._draws(hand1, deck1, discard1):
+            first_key = (p1.funds, p1.properties, hand1_, deck1_, discard1_)
+            for chance2, hand2_, deck2_, discard2_ in self._draws(hand2, deck2, discard2):
+                second_key = (p2.funds, p2.properties, hand2_, deck2_, discard2_)
+                total += chance1 * chance2 * self.solution((first_key, second_key), horizon - 1)[0]
+        return total
+
+    @staticmethod
+    def _draw_outcomes(hand: Tuple[int, ...], deck: Tuple[int, ...],
+                       discard: Tuple[int, ...]) -> Tuple[Tuple[float, Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]], ...]:
+        # 手札が HAND_SIZE 枚になるまで引いた結果の (確率, 手札, 山札, 捨て札) の一覧です。
+        # 山札が空になれば捨て札を山札に戻します（GameEngine._draw_cards と同じ）。
+        outcomes: Dict[Tuple, float] = {(hand, deck, discard): 1.0}
+        for _ in range(HAND_SIZE - sum(hand)):
+            drawn: Dict[Tuple, float] = {}
+            for (h, d, g), chance in outcomes.items():
+                if not any(d):
+                    d, g = g, tuple(0 for _ in g)
+                remaining = sum(d)
+                if remaining == 0:
+                    drawn[(h, d, g)] = drawn.get((h, d, g), 0.0) + chance
+                    continue
+                for t, n in enumerate(d):
+                    if n:
+                        outcome = (_moved(h, t, 1), _moved(d, t, -1), g)
+                        drawn[outcome] = drawn.get(outcome, 0.0) + chance * n / remaining
+            outcomes = drawn
+        return tuple((chance, h, d, g) for (h, d, g), chance in outcomes.items())
+
+    # --- 試合の開始時点の分析 ---
+
+    def analyze_opening(self, deck1: Dict[str, int], deck2: Dict[str, int],
+                        horizon: Optional[int] = None) -> OpeningAnalysis:
+        """両デッキで試合を始めたときの値を、最初のドローの全ての結果について平均して求めます（バランス分析用）。"""
+        with self._lock:
+            return self._analyze_opening(deck1, deck2, self.horizon if horizon is None else horizon)
+
+    def _analyze_opening(self, deck1: Dict[str, int], deck2: Dict[str, int], horizon: int) -> OpeningAnalysis:
+        started = time.perf_counter()
+        solved, hits = self.states_solved, self.table_hits
+        index = self.templates.index
+        empty = (0,) * len(self.templates)
+        openings = []
+        for deck in (deck1, deck2):
+            unknown = [tid for tid in deck if tid not in index]
+            if unknown:
+                raise ValueError(f"Unknown card templates in deck: {', '.join(unknown)}")
+            counts = [0] * len(self.templates)
+            for template_id, count in deck.items():
+                counts[index[template_id]] += count
+            openings.append(self._draws(empty, tuple(counts), empty))
+        value, count = 0.0, 0
+        for chance1, hand1, rest1, _ in openings[0]:
+            for chance2, hand2, rest2, _ in openings[1]:
+                key = ((2, 1, hand1, rest1, empty), (2, 1, hand2, rest2, empty))
+                value += chance1 * chance2 * self.solution(key, horizon)[0]
+                count += 1
+        if self.store is not None:
+            self.store.flush()
+        return OpeningAnalysis(value=value, horizon=horizon, openings=count,
+                               statesSolved=self.states_solved - solved, tableHits=self.table_hits - hits,
+                               elapsedMs=(time.perf_counter() - started) * 1000.0)
+
+    # --- NPC ---
+
+    def choose(self, engine: GameEngine, player: CompactPlayer, rng: random.Random) -> int:
+        """均衡戦略に従ってカードを1枚選び、そのインデックスを返します（出さない場合は -1）。"""
+        core = engine.core
+        me = core.players.index(player)
+        key = self.abstract_key(core)
+        with self._lock:
+            _, first, second = self.solution(key, self.horizon)
+        strategy = first if me == 0 else second
+        move = rng.choices(self.moves(key[me]), weights=strategy)[0]
+        if move == UNKNOWN_TEMPLATE:
+            return -1
+        templates = core.cards.templates
+        return next(c for c in player.hand if templates[c] == move)
+
+
+def _moved(counts: Tuple[int, ...], template: int, delta: int) -> Tuple[int, ...]:
+    return counts[:template] + (counts[template] + delta,) + counts[template + 1:]
+
+
+# カードテンプレートの集合ごとに1つ作成し、プロセス内でメモを共有するソルバーです（最近使った順）。
+_solvers: 'OrderedDict[str, EquilibriumSolver]' = OrderedDict()
+_solvers_lock = threading.Lock()
+
+
+def solver_for(card_templates: Mapping[str, CardTemplate]) -> EquilibriumSolver:
+    """
+    カードテンプレートの集合に対応する共有のソルバーを返します（環境変数の設定で作成します）。
+    現在のカードテンプレート（card_template_registry）以外のソルバーは MAX_STALE_SOLVERS 個まで残し、
+    それを超えたものは閉じて破棄します。
+    """
+    fingerprint = templates_fingerprint(card_templates)
+    current = card_template_registry.current.version
+    stale: List[EquilibriumSolver] = []
+    with _solvers_lock:
+        solver = _solvers.get(fingerprint)
+        if solver is None:
+            solver = _solvers[fingerprint] = EquilibriumSolver.from_env(card_templates)
+        _solvers.move_to_end(fingerprint)
+        old = [key for key in _solvers if key != current]
+        for key in old[:max(0, len(old) - MAX_STALE_SOLVERS)]:
+            stale.append(_solvers.pop(key))
+    for dropped in stale:
+        dropped.close()
+    return solver
+
+
+
+def flush_solvers() -> int:
+    """全ての共有のソルバーの未保存の解を保存先に書き込みます（定期的に呼び出します）。"""
+    with _solvers_lock:
+        solvers = list(_solvers.values())
+    return sum(solver.flush() for solver in solvers)
+
+
+def close_solvers() -> None:
+    """全ての共有のソルバーを閉じて破棄します（未保存の解は保存先に書き込みます）。"""
+    with _solvers_lock:
+        solvers = list(_solvers.values())
+        _solvers.clear()
+    for solver in solvers:
+        solver.close()
+
+
+def equilibrium_policy(engine: GameEngine, player: CompactPlayer, opponent: CompactPlayer, rng: random.Random) -> int:
+    """simulation.POLICIES に登録するための、均衡戦略でカードを選ぶ関数です（プロセスプールに渡せます）。"""
+    if engine.core.phase != PHASE_ACTION:
+        return -1
+    return solver_for(engine.card_templates).choose(engine, player, rng)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Solve the opening of a match between two decks.")
+    parser.add_argument('--deck1', default=None, help="Deck as JSON (templateId -> count); defaults to the initial deck")
+    parser.add_argument('--deck2', default=None)
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON)
+    parser.add_argument('--store', default=None, help="SQLite file to persist solutions")
+    args = parser.parse_args()
+
+    default_deck = {tid: (4 if t.name == '資金集め' else 2) for tid, t in BASE_CARD_TEMPLATES.items()}
+    deck1 = json.loads(args.deck1) if args.deck1 else default_deck
+    deck2 = json.loads(args.deck2) if args.deck2 else default_deck
+    store = EquilibriumStore(args.store) if args.store else None
+    solver = EquilibriumSolver(BASE_CARD_TEMPLATES, horizon=args.horizon, store=store)
+    print(solver.analyze_opening(deck1, deck2).model_dump_json(indent=2))
+    if store is not None:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
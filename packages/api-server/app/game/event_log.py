@@ -0,0 +1,120 @@
+# packages/api-server/app/game/event_log.py
+# 試合のログを、イベントコードとパラメーターの組として保持する上限付きのイベントログです。
+# GameState.log には直近の LOG_WINDOW 件だけを文字列として載せ、それより古いイベントは変更しないページ
+# （PAGE_SIZE 件ずつのタプル）に移して、カーソル（通し番号）で取得できるようにします。
+# 状態の複製や GameState の組み立てでは直近の件数分だけを扱うため、試合が長くなっても1ターンあたりの処理は増えません。
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+# イベントコードです。内部では小さな整数で保持し、API では名前に変換します。
+EVENT_CODES: Tuple[str, ...] = ('TEXT', 'TURN_START', 'PLAYER_PLAYED', 'OPPONENT_PLAYED')
+EVENT_TEXT, EVENT_TURN_START, EVENT_PLAYER_PLAYED, EVENT_OPPONENT_PLAYED = range(len(EVENT_CODES))
+
+# イベントコードごとの表示用の文字列です（パラメーターを format で埋め込みます）。
+# TEXT は GameState.log から読み込んだ、構造を持たない行です。
+EVENT_FORMATS: Tuple[str, ...] = (
+    '{0}',
+    '--- ターン {0} ---',
+    'プレイヤーは「{1}」をプレイした', # パラメーターは (templateId, カード名)
+    '対戦相手は「{1}」をプレイした',
+)
+
+# GameState.log に載せる直近のイベント数と、古いイベントを移すページの大きさです。
+LOG_WINDOW = 64
+PAGE_SIZE = 256
+
+# (イベントコード, パラメーター, 表示用の文字列) の組です。文字列は追加時に一度だけ組み立てます。
+Event = Tuple[int, tuple, str]
+
+# メモリ使用量の見積もりに使う、イベント1件あたりの文字列以外の概算バイト数です。
+_BYTES_PER_EVENT = 120
+
+
+def render(code: int, params: Sequence) -> str:
+    return EVENT_FORMATS[code].format(*params)
+
+
+def _event_bytes(event: Event) -> int:
+    return _BYTES_PER_EVENT + sys.getsizeof(event[2])
+
+
+class EventLog:
+    """
+    イベントの通し番号（seq）は試合の最初のイベントを 0 とします。
+    base より前のイベントは保持していません（GameState から読み込んだ場合など）。
+    pages には base から PAGE_SIZE 件ずつ、recent にはそれ以降のイベントが入っており、
+    recent は常に LOG_WINDOW 件以上（全体がそれより少なければ全て）を保持します。
+    """
+    __slots__ = ('base', 'pages', 'recent', 'page_bytes')
+
+    def __init__(self, base: int = 0, pages: Tuple[Tuple[Event, ...], ...] = (),
+                 recent: Optional[List[Event]] = None, page_bytes: int = 0):
+        self.base = base
+        self.pages = pages
+        self.recent: List[Event] = recent if recent is not None else []
+        # pages のおおよそのバイト数です（ページを移すときに加算します）。
+        self.page_bytes = page_bytes
+
+    @classmethod
+    def from_lines(cls, lines: Sequence[str], start: int = 0) -> 'EventLog':
+        """GameState.log の文字列（通し番号 start から）を TEXT イベントとして読み込みます。"""
+        log = cls(start, (), [(EVENT_TEXT, (line,), line) for line in lines])
+        log._spill()
+        return log
+
+    def add(self, code: int, *params) -> None:
+        self.recent.append((code, params, render(code, params)))
+        if len(self.recent) >= LOG_WINDOW + PAGE_SIZE:
+            self._spill()
+
+    def _spill(self) -> None:
+        # 直近の LOG_WINDOW 件を残して、古いイベントをページ単位で移します。
+        # ページはタプルなので、状態を複製しても共有したままにできます。
+        recent = self.recent
+        full = (len(recent) - LOG_WINDOW) // PAGE_SIZE
+        if full <= 0:
+            return
+        pages = tuple(tuple(recent[i * PAGE_SIZE:(i + 1) * PAGE_SIZE]) for i in range(full))
+        self.pages += pages
+        self.page_bytes += sum(_event_bytes(event) for page in pages for event in page)
+        self.recent = recent[full * PAGE_SIZE:]
+
+    def clone(self) -> 'EventLog':
+        return EventLog(self.base, self.pages, self.recent[:], self.page_bytes)
+
+    def __len__(self) -> int:
+        """試合の最初からのイベント数（次に追加するイベントの通し番号）です。"""
+        return self.base + len(self.pages) * PAGE_SIZE + len(self.recent)
+
+    @property
+    def window_start(self) -> int:
+        """GameState.log の最初の行の通し番号です。"""
+        return len(self) - min(len(self.recent), LOG_WINDOW)
+
+    def window(self) -> List[str]:
+        """GameState.log に載せる直近のイベントの文字列です。"""
+        return [event[2] for event in self.recent[-LOG_WINDOW:]]
+
+    def texts_since(self, seq: int) -> List[str]:
+        """通し番号 seq 以降のイベントの文字列です（recent に残っている範囲に限ります）。"""
+        offset = seq - (len(self) - len(self.recent))
+        return [event[2] for event in self.recent[max(offset, 0):]]
+
+    def page(self, cursor: int, limit: int) -> List[Tuple[int, Event]]:
+        """通し番号 cursor から最大 limit 件のイベントを (seq, イベント) の組で返します。"""
+        cursor = max(cursor, self.base)
+        end = min(cursor + limit, len(self))
+        spilled = self.base + len(self.pages) * PAGE_SIZE
+        events = []
+        for seq in range(cursor, end):
+            if seq < spilled:
+                offset = seq - self.base
+                event = self.pages[offset // PAGE_SIZE][offset % PAGE_SIZE]
+            else:
+                event = self.recent[seq - spilled]
+            events.append((seq, event))
+        return events
+
+    def estimate_bytes(self) -> int:
+        """保持しているイベントのおおよそのバイト数です。"""
+        return self.page_bytes + sum(_event_bytes(event) for event in self.recent)
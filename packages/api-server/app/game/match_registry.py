@@ -0,0 +1,175 @@
+# packages/api-server/app/game/match_registry.py
+# 進行中の試合の GameEngine を matchId ごとにメモリ上で保持するレジストリです。
+# クライアントは毎回 GameState 全体を送る代わりに matchId だけを送り、エンジンはターン間で使い回されます。
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.game.engine import GameEngine
+
+# 既定の上限値です。環境変数で上書きできます。
+DEFAULT_MAX_MATCHES = 10000
+DEFAULT_TTL_SECONDS = 30 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# メモリ使用量の見積もりに使う概算値です（CompactState 1つとカード1枚あたりのバイト数）。
+_BASE_ENGINE_BYTES = 2048
+_BYTES_PER_CARD = 120
+
+
+def estimate_engine_bytes(engine: GameEngine) -> int:
+    """エンジン1つが保持する状態のおおよそのバイト数を見積もります。"""
+    core = engine.core
+    log_bytes = core.log.estimate_bytes()
+    journal_bytes = engine.journal.estimate_bytes() if engine.journal is not None else 0
+    return _BASE_ENGINE_BYTES + _BYTES_PER_CARD * len(core.cards) + log_bytes + journal_bytes
+
+
+class RegistryStats(BaseModel):
+    matches: int
+    bytes: int
+    maxMatches: int
+    maxBytes: int
+    ttlSeconds: float
+    hits: int
+    misses: int
+    evictions: Dict[str, int]
+
+
+class _Entry:
+    __slots__ = ('engine', 'expires_at', 'size')
+
+    def __init__(self, engine: GameEngine, expires_at: float, size: int):
+        self.engine = engine
+        self.expires_at = expires_at
+        self.size = size
+
+
+class MatchRegistry:
+    """
+    LRU順に並べた matchId -> GameEngine の対応表です。
+    試合数の上限・最終アクセスからのTTL・メモリ使用量の上限のいずれかを超えると、古い試合から破棄します。
+    試合を破棄（削除・置き換え・期限切れ・上限による破棄）すると、on_remove で登録したリスナーを matchId で呼び出します。
+    """
+
+    def __init__(self, max_matches: int = DEFAULT_MAX_MATCHES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.max_matches = max_matches
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {'lru': 0, 'ttl': 0, 'memory': 0}
+        self._listeners: List[Callable[[str], None]] = []
+
+    @classmethod
+    def from_env(cls) -> 'MatchRegistry':
+        # 環境変数から上限値を読み込んでレジストリを作成します。
+        return cls(
+            max_matches=int(os.getenv("MATCH_REGISTRY_MAX_MATCHES", DEFAULT_MAX_MATCHES)),
+            ttl_seconds=float(os.getenv("MATCH_REGISTRY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            max_bytes=int(os.getenv("MATCH_REGISTRY_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, match_id: str) -> bool:
+        return match_id in self._entries
+
+    def put(self, match_id: str, engine: GameEngine) -> None:
+        """試合を登録（または置き換え）し、上限を超えた分を破棄します。"""
+        with self._lock:
+            self._discard(match_id)
+            entry = _Entry(engine, self._clock() + self.ttl_seconds, estimate_engine_bytes(engine))
+            self._entries[match_id] = entry
+            self._bytes += entry.size
+            self._enforce_limits(keep=match_id)
+
+    def get(self, match_id: str) -> Optional[GameEngine]:
+        """試合のエンジンを取得します。見つからないか期限切れの場合は None を返します。"""
+        with self._lock:
+            entry = self._entries.get(match_id)
+            if entry is not None and entry.expires_at <= self._clock():
+                self._discard(match_id)
+                self.evictions['ttl'] += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.expires_at = self._clock() + self.ttl_seconds
+            self._entries.move_to_end(match_id)
+            return entry.engine
+
+    def touch(self, match_id: str) -> None:
+        """エンジンの状態を更新した後に呼び出し、メモリ使用量の見積もりを更新します。"""
+        with self._lock:
+            entry = self._entries.get(match_id)
+            if entry is None:
+                return
+            size = estimate_engine_bytes(entry.engine)
+            self._bytes += size - entry.size
+            entry.size = size
+            self._enforce_limits(keep=match_id)
+
+    def on_remove(self, listener: Callable[[str], None]) -> None:
+        """試合を破棄した時に呼び出すリスナーを登録します。リスナーはロックを保持したまま同期的に呼び出されます。"""
+        self._listeners.append(listener)
+
+    def remove(self, match_id: str) -> bool:
+        with self._lock:
+            return self._discard(match_id)
+
+    def stats(self) -> RegistryStats:
+        with self._lock:
+            return RegistryStats(
+                matches=len(self._entries),
+                bytes=self._bytes,
+                maxMatches=self.max_matches,
+                maxBytes=self.max_bytes,
+                ttlSeconds=self.ttl_seconds,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=dict(self.evictions),
+            )
+
+    def _discard(self, match_id: str) -> bool:
+        entry = self._entries.pop(match_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        for listener in self._listeners:
+            listener(match_id)
+        return True
+
+    def _enforce_limits(self, keep: str) -> None:
+        # 期限切れの試合を先に破棄し、その後 LRU の古い順に上限まで破棄します。
+        # アクセスのたびに期限を延長して末尾へ移動するため、先頭ほど期限が早く、先頭から調べれば十分です。
+        # 直前に登録・更新した試合（keep）自体は破棄しません。
+        now = self._clock()
+        while self._entries:
+            oldest, entry = next(iter(self._entries.items()))
+            if oldest == keep or entry.expires_at > now:
+                break
+            self._discard(oldest)
+            self.evictions['ttl'] += 1
+        while len(self._entries) > self.max_matches or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            reason = 'lru' if len(self._entries) > self.max_matches else 'memory'
+            self._discard(oldest)
+            self.evictions[reason] += 1
+
+
+# アプリケーション全体で共有するレジストリです。
+match_registry = MatchRegistry.from_env()
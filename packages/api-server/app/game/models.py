@@ -1,7 +1,7 @@
 # packages/api-server/app/game/models.py
 
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict # Added Dict
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, List, Literal, Optional, Dict # Added Dict
 
 # --- ゲームロジックモデル（web-game-client/src/types.ts と同じものを反映） ---
 
@@ -9,13 +9,59 @@ class Card(BaseModel):
     id: str
     templateId: str
 
+class EffectAction(BaseModel):
+    name: Literal['ACQUIRE_PROPERTY', 'GAIN_FUNDS', 'BLOCK_ACTION', 'CANCEL_EFFECT']
+    value: Optional[int] = None
+    conditions: Optional[Dict[str, Any]] = None # e.g., { "opponentCardCategory": "ATTACK" }
+
+class CardEffect(BaseModel):
+    category: Literal['ATTACK', 'DEFENSE', 'SUPPORT']
+    priority: int # 大きいほど先に解決されます
+    target: Literal['SELF', 'OPPONENT', 'NONE']
+    actions: List[EffectAction]
+    conditions: Optional[Dict[str, Any]] = None # 全てのアクションに共通する条件
+
+# 旧形式のカード種別に対応する効果定義です。GameEngine の従来のルールと同じ結果になります。
+# 「買収」同士は互いに打ち消し合い、「防衛」は「買収」を、「詐欺」は「買収」を打ち消したうえで不動産を奪います。
+LEGACY_EFFECTS: Dict[str, CardEffect] = {
+    'GAIN_FUNDS': CardEffect(category='SUPPORT', priority=0, target='SELF', actions=[
+        EffectAction(name='GAIN_FUNDS', value=2),
+    ]),
+    'ACQUIRE': CardEffect(category='ATTACK', priority=5, target='OPPONENT', actions=[
+        EffectAction(name='ACQUIRE_PROPERTY', value=1),
+        EffectAction(name='CANCEL_EFFECT', conditions={'opponentCardTemplateId': 'ACQUIRE'}),
+    ]),
+    'DEFEND': CardEffect(category='DEFENSE', priority=10, target='SELF', actions=[
+        EffectAction(name='CANCEL_EFFECT', conditions={'opponentCardTemplateId': 'ACQUIRE'}),
+    ]),
+    'FRAUD': CardEffect(category='DEFENSE', priority=10, target='OPPONENT', actions=[
+        EffectAction(name='CANCEL_EFFECT', conditions={'opponentCardTemplateId': 'ACQUIRE'}),
+        EffectAction(name='ACQUIRE_PROPERTY', value=1, conditions={'opponentCardTemplateId': 'ACQUIRE'}),
+    ]),
+}
+
 class CardTemplate(BaseModel):
     templateId: str
     name: str
     cost: int
     description: str | None = None
-    type: Literal['GAIN_FUNDS', 'ACQUIRE', 'DEFEND', 'FRAUD']
+    # 旧形式のカード種別です。effect が無い場合はこの種別に対応する効果が使われます。
+    type: Optional[Literal['GAIN_FUNDS', 'ACQUIRE', 'DEFEND', 'FRAUD']] = None
     imageFile: str | None = None
+    # web-game-client/public/cards/*.json の形式のフィールドです。
+    serialId: str | None = None
+    illustPath: str | None = None
+    flavorText: str | None = None
+    effect: Optional[CardEffect] = None
+
+    @model_validator(mode='after')
+    def _fill_legacy_effect(self) -> 'CardTemplate':
+        # 旧形式（type のみ）のテンプレートには、同じルールになる効果定義を補います。
+        if self.effect is None:
+            if self.type is None:
+                raise ValueError("CardTemplate requires either 'effect' or 'type'")
+            self.effect = LEGACY_EFFECTS[self.type]
+        return self
 
 class PlayerState(BaseModel):
     playerId: str
@@ -39,7 +85,11 @@ class GameState(BaseModel):
     players: List[PlayerState]
     phase: Literal['DRAW', 'ACTION', 'RESOLUTION', 'GAME_OVER']
     lastActions: List[ResolvedAction] = Field(default_factory=list)
+    # 直近のログの行です。logCursor は最初の行の通し番号で、それより古い行は試合のログAPIで取得します。
     log: List[str] = Field(default_factory=list)
+    logCursor: int = 0
+    # 状態が変更されるたびに1ずつ増えるバージョンです。試合の更新では If-Match に指定して、同時の更新を検出します。
+    version: int = 0
 
 # Deckクラスを追加
 class Deck(BaseModel):
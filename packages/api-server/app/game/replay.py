@@ -0,0 +1,120 @@
+# packages/api-server/app/game/replay.py
+# 試合の再現（リプレイ）のためのアクションジャーナルです。
+# GameEngine は試合ごとのシード付き乱数を持つため、ある時点の状態と乱数の内部状態があれば、
+# それ以降に適用した操作を順に再適用するだけで同じ試合を再現できます。
+# ジャーナルは操作を整数のタプルで記録し、一定ターンごとに状態のスナップショットを取ります。
+# 任意のターンの状態は、直前のスナップショットから早送りすることで0ターン目から再実行せずに復元できます。
+import bisect
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.game.models import CardTemplate
+from app.game.state import CompactState
+
+if TYPE_CHECKING:
+    from app.game.engine import GameEngine
+
+# ジャーナルの操作コードです。
+# (OP_START_TURN,) はターン開始、(OP_PLAY, 側1, カード1, 側2, カード2) は両プレイヤーのプレイです。
+# 側はプレイヤーの位置（0 または 1）、カードは CardTable のインデックスで、プレイしない場合はどちらも -1 です。
+OP_START_TURN = 0
+OP_PLAY = 1
+
+JournalEntry = Tuple[int, ...]
+
+# スナップショットを取る間隔（ターン数）の既定値です。
+DEFAULT_SNAPSHOT_INTERVAL = 10
+
+# メモリ使用量の見積もりに使う概算値です（ジャーナル1操作とスナップショット1つあたりのバイト数）。
+_BYTES_PER_ENTRY = 96
+_BASE_SNAPSHOT_BYTES = 1024
+_BYTES_PER_SNAPSHOT_CARD = 8
+
+
+class Snapshot:
+    """ジャーナルの entry_index 番目の操作を適用する直前の状態と乱数の内部状態です。"""
+    __slots__ = ('entry_index', 'turn', 'state', 'rng_state')
+
+    def __init__(self, entry_index: int, state: CompactState, rng_state: tuple):
+        self.entry_index = entry_index
+        self.turn = state.turn
+        self.state = state
+        self.rng_state = rng_state
+
+
+class MatchJournal:
+    """1試合分の操作の記録と、定期的なスナップショットです。"""
+    __slots__ = ('seed', 'snapshot_interval', 'entries', 'snapshots', '_turns')
+
+    def __init__(self, seed: Optional[int] = None, snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL):
+        # seed は試合の乱数のシードです（記録用で、再現にはスナップショットの乱数状態を使用します）。
+        self.seed = seed
+        self.snapshot_interval = snapshot_interval
+        self.entries: List[JournalEntry] = []
+        self.snapshots: List[Snapshot] = []
+        # スナップショットのターン数の配列です（二分探索用）。
+        self._turns: List[int] = []
+
+    def reset(self, state: CompactState, rng: random.Random) -> None:
+        """記録を破棄し、現在の状態を起点のスナップショットとして記録し直します。"""
+        self.entries = []
+        self.snapshots = []
+        self._turns = []
+        self.snapshot(state, rng)
+
+    def snapshot(self, state: CompactState, rng: random.Random) -> None:
+        # 状態は以降も変更されるため複製して保持します（CardTable は不変なので共有されます）。
+        self.snapshots.append(Snapshot(len(self.entries), state.clone(), rng.getstate()))
+        self._turns.append(state.turn)
+
+    def before_start_turn(self, state: CompactState, rng: random.Random) -> None:
+        """ターン開始の直前に呼び出します。前回のスナップショットから間隔が空いていればスナップショットを取ります。"""
+        if not self.snapshots or state.turn - self.snapshots[-1].turn >= self.snapshot_interval:
+            self.snapshot(state, rng)
+        self.entries.append((OP_START_TURN,))
+
+    def append(self, entry: JournalEntry) -> None:
+        self.entries.append(entry)
+
+    def snapshot_for(self, turn: Optional[int]) -> Snapshot:
+        """turn ターン終了時点の状態の復元に使う、最も新しいスナップショットを返します。"""
+        if turn is None:
+            return self.snapshots[-1]
+        position = bisect.bisect_right(self._turns, turn) - 1
+        return self.snapshots[max(position, 0)]
+
+    def estimate_bytes(self) -> int:
+        cards = len(self.snapshots[0].state.cards) if self.snapshots else 0
+        return (_BYTES_PER_ENTRY * len(self.entries)
+                + (_BASE_SNAPSHOT_BYTES + _BYTES_PER_SNAPSHOT_CARD * cards) * len(self.snapshots))
+
+
+def apply_entry(engine: 'GameEngine', entry: JournalEntry) -> None:
+    """ジャーナルの1操作をエンジンに適用します。"""
+    if entry[0] == OP_START_TURN:
+        engine.start_turn()
+        return
+    _, side1, card1, side2, card2 = entry
+    players = engine.core.players
+    engine.play(None if side1 < 0 else (players[side1], card1),
+                None if side2 < 0 else (players[side2], card2))
+
+
+def replay(journal: MatchJournal, card_templates: Dict[str, CardTemplate],
+           turn: Optional[int] = None) -> 'GameEngine':
+    """
+    journal を turn ターン終了時点（次のターン開始の直前）まで再現したエンジンを返します。
+    turn を省略すると、記録されている最後の操作まで再現します。
+    返すエンジンは変更セットもジャーナルも記録しません。
+    """
+    from app.game.engine import GameEngine
+
+    snapshot = journal.snapshot_for(turn)
+    rng = random.Random()
+    rng.setstate(snapshot.rng_state)
+    engine = GameEngine.from_compact(snapshot.state.clone(), card_templates, rng=rng)
+    for entry in journal.entries[snapshot.entry_index:]:
+        if turn is not None and entry[0] == OP_START_TURN and engine.core.turn >= turn:
+            break
+        apply_entry(engine, entry)
+    return engine
@@ -0,0 +1,219 @@
+# packages/api-server/app/game/search.py
+# GameEngine の上で先読みを行う、サーバー側の NPC です。
+# 相手の手札と両者の山札の順番は NPC からは見えないため、見えないカードを並べ替えた「確定化」を複数作り、
+# それぞれで期待値探索（expectimax: 自分の手は最大化、相手の同時の手は一様な確率の分岐として平均）を行って平均します。
+# 深さ1から順に深くする反復深化で、決められた時間内に最後まで探索できた深さの結果を採用します。
+# 同じテンプレートのカードは同じ手として扱い、局面の値は状態を小さなタプルにした鍵で置換表に保存します。
+# 1つの NPC を複数のスレッドから同時に呼び出せるよう、探索ごとの状態は _Search に、探索用のエンジンはスレッドごとに持ちます。
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.game.engine import GameEngine
+from app.game.event_log import EventLog
+from app.game.state import PHASE_GAME_OVER, UNKNOWN_TEMPLATE, CompactPlayer, CompactState
+
+# 既定の設定値です。
+DEFAULT_TIME_BUDGET_MS = 5.0
+DEFAULT_DETERMINIZATIONS = 4
+DEFAULT_MAX_DEPTH = 6
+DEFAULT_TABLE_SIZE = 200000
+
+# 局面の評価で、資金1の価値を不動産1に対する比で表したものです。
+_FUNDS_WEIGHT = 0.15
+
+
+class SearchResult(BaseModel):
+    cardIndex: int # プレイするカードのインデックス（出さない場合は -1）
+    value: float # 選んだ手の評価値（-1 〜 1、自分の勝ちが 1）
+    depth: int # 最後まで探索できた深さ（ターン数）
+    nodes: int
+    elapsedMs: float
+    tableHits: int
+
+
+class _Timeout(Exception):
+    pass
+
+
+class _Search:
+    """1回の探索の状態です（期限・探索した局面の数・置換表のヒット数と、状態を差し替えて使うエンジン）。"""
+    __slots__ = ('deadline', 'nodes', 'hits', 'engine')
+
+    def __init__(self, deadline: float, engine: GameEngine):
+        self.deadline = deadline
+        self.nodes = 0
+        self.hits = 0
+        self.engine = engine
+
+
+class SearchNPC:
+    """
+    時間制限付きの期待値探索で手を選ぶ NPC です。simulation.Policy と同じ形式で呼び出せます。
+    置換表は呼び出しをまたいで（スレッド間でも）再利用し、table_size を超えたら空にします。
+    """
+
+    def __init__(self, time_budget_ms: float = DEFAULT_TIME_BUDGET_MS,
+                 determinizations: int = DEFAULT_DETERMINIZATIONS, max_depth: int = DEFAULT_MAX_DEPTH,
+                 table_size: int = DEFAULT_TABLE_SIZE):
+        self.time_budget_ms = time_budget_ms
+        self.determinizations = determinizations
+        self.max_depth = max_depth
+        self.table_size = table_size
+        self._table: Dict[Tuple, float] = {}
+        self._local = threading.local()
+
+    def __call__(self, engine: GameEngine, player: CompactPlayer, opponent: CompactPlayer,
+                 rng: random.Random) -> int:
+        return self.search(engine, player, rng).cardIndex
+
+    def search(self, engine: GameEngine, player: CompactPlayer, rng: random.Random,
+               time_budget_ms: Optional[float] = None) -> SearchResult:
+        """engine の現在の状態で player が出す手を探索します。engine の状態は変更しません。"""
+        started = time.perf_counter()
+        budget = self.time_budget_ms if time_budget_ms is None else time_budget_ms
+        if len(self._table) > self.table_size:
+            self._table.clear()
+
+        core = engine.core
+        me = core.players.index(player)
+        search = _Search(started + budget / 1000.0, self._scratch_engine(engine))
+        moves = self._moves(search.engine, core, me)
+        best_move, best_value, depth = moves[0], 0.0, 0
+        if len(moves) > 1 and core.phase != PHASE_GAME_OVER:
+            worlds = [self._determinize(core, me, rng) for _ in range(self.determinizations)]
+            keys = [self._key(world, me) for world in worlds]
+            for d in range(1, self.max_depth + 1):
+                totals = [0.0] * len(moves)
+                try:
+                    for world, key in zip(worlds, keys):
+                        for i, move in enumerate(moves):
+                            totals[i] += self._value_of(search, world, key, me, move, d)
+                except _Timeout:
+                    break
+                best = max(range(len(moves)), key=totals.__getitem__)
+                best_move, best_value, depth = moves[best], totals[best] / len(worlds), d
+        card = -1
+        if best_move != UNKNOWN_TEMPLATE:
+            # 手はテンプレートで表しているので、手札の中からそのテンプレートのカードを1枚選びます。
+            templates = core.cards.templates
+            card = next(c for c in player.hand if templates[c] == best_move)
+        return SearchResult(cardIndex=card, value=best_value, depth=depth, nodes=search.nodes,
+                            elapsedMs=(time.perf_counter() - started) * 1000.0, tableHits=search.hits)
+
+    def _scratch_engine(self, engine: GameEngine) -> GameEngine:
+        # 探索用のエンジンはスレッドごと・カードテンプレートの集合ごとに1つ作り、状態だけを差し替えて使います。
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None or scratch.card_templates is not engine.card_templates:
+            scratch = self._local.scratch = GameEngine.from_compact(engine.core.clone(), engine.card_templates,
+                                                                    random.Random(0))
+        return scratch
+
+    @staticmethod
+    def _moves(engine: GameEngine, state: CompactState, side: int) -> List[int]:
+        # 支払えるカードのテンプレートの一覧（重複なし）と、出さない手（UNKNOWN_TEMPLATE）を返します。
+        player = state.players[side]
+        costs = engine.templates.costs
+        templates = state.cards.templates
+        moves = [UNKNOWN_TEMPLATE]
+        for c in player.hand:
+            template = templates[c]
+            if template != UNKNOWN_TEMPLATE and template not in moves and player.funds >= costs[template]:
+                moves.append(template)
+        return moves
+
+    @staticmethod
+    def _determinize(state: CompactState, me: int, rng: random.Random) -> CompactState:
+        # 相手の手札と山札をまとめて並べ替えて配り直し、自分の山札も並べ替えた状態を作ります。
+        # ログは探索に使わないため複製しません。
+        players = [p.clone() for p in state.players]
+        own, opponent = players[me], players[1 - me]
+        rng.shuffle(own.deck)
+        pool = opponent.hand + opponent.deck
+        rng.shuffle(pool)
+        opponent.hand, opponent.deck = pool[:len(opponent.hand)], pool[len(opponent.hand):]
+        return CompactState(state.match_id, state.turn, state.phase, players, [], EventLog(), state.cards, state.version)
+
+    @staticmethod
+    def _key(state: CompactState, me: int) -> Tuple:
+        # 局面の鍵です。同じテンプレートのカードは区別せず、山札は引く順番が結果に影響するので順番どおりに並べます。
+        templates = state.cards.templates
+        key: List = [me]
+        for p in state.players:
+            key.append(p.funds)
+            key.append(p.properties)
+            key.append(tuple(sorted(templates[c] for c in p.hand)))
+            key.append(tuple(templates[c] for c in p.deck))
+            key.append(len(p.discard))
+        return tuple(key)
+
+    def _value_of(self, search: _Search, state: CompactState, state_key: Tuple, me: int, move: int,
+                  depth: int) -> float:
+        # 自分が move を出したときの値を、相手の手について平均して返します。置換表の鍵は (局面の鍵, 手, 深さ) です。
+        key = (state_key, move, depth)
+        cached = self._table.get(key)
+        if cached is not None:
+            search.hits += 1
+            return cached
+        search.nodes += 1
+        if time.perf_counter() > search.deadline:
+            raise _Timeout()
+        engine = search.engine
+
+        total = 0.0
+        replies = self._moves(engine, state, 1 - me)
+        for reply in replies:
+            child = self._play(engine, state, me, move, reply)
+            if child.phase == PHASE_GAME_OVER or depth <= 1:
+                total += self._evaluate(child, me)
+            else:
+                engine.core = child
+                engine.start_turn()
+                child_key = self._key(child, me)
+                total += max(self._value_of(search, child, child_key, me, m, depth - 1)
+                             for m in self._moves(engine, child, me))
+        value = total / len(replies)
+        self._table[key] = value
+        return value
+
+    @staticmethod
+    def _play(engine: GameEngine, state: CompactState, me: int, move: int, reply: int) -> CompactState:
+        # 状態を複製し、両者のテンプレートに対応する手札のカードを出して解決します。
+        child = CompactState(state.match_id, state.turn, state.phase, [p.clone() for p in state.players],
+                             [], EventLog(), state.cards, state.version)
+        templates = child.cards.templates
+        plays = [None, None]
+        for side, template in ((me, move), (1 - me, reply)):
+            player = child.players[side]
+            card = -1
+            if template != UNKNOWN_TEMPLATE:
+                card = next(c for c in player.hand if templates[c] == template)
+            plays[side] = (player, card)
+        engine.core = child
+        engine.play(plays[0], plays[1])
+        return child
+
+    @staticmethod
+    def _evaluate(state: CompactState, me: int) -> float:
+        # 終了した局面は勝ち 1・負け -1・引き分け 0、それ以外は不動産と資金の差から -1 〜 1 の値を返します。
+        own, opponent = state.players[me], state.players[1 - me]
+        if own.properties <= 0 or opponent.properties <= 0:
+            if own.properties > 0:
+                return 1.0
+            if opponent.properties > 0:
+                return -1.0
+            return 0.0
+        diff = (own.properties - opponent.properties) + _FUNDS_WEIGHT * (own.funds - opponent.funds)
+        return max(-0.99, min(0.99, diff / (own.properties + opponent.properties + 1)))
+
+
+# 既定の設定の NPC です（プロセスごとに1つで、置換表をプロセス内で共有します）。
+search_npc = SearchNPC()
+
+
+def search_policy(engine: GameEngine, player: CompactPlayer, opponent: CompactPlayer, rng: random.Random) -> int:
+    """simulation.POLICIES に登録するための、既定の SearchNPC を呼び出す関数です（プロセスプールに渡せます）。"""
+    return search_npc(engine, player, opponent, rng)
@@ -0,0 +1,288 @@
+# packages/api-server/app/game/simulation.py
+# 自己対戦シミュレーションをまとめて実行するためのモジュールです。
+# GameEngine の内部表現（start_turn / play）を直接駆動し、複数の試合を ProcessPoolExecutor に分散します。
+# プロセスプールはプロセス全体で1つ（simulation_pool）を共有し、デッキのオプティマイザーとトーナメントも同じプールを使います。
+import multiprocessing
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.equilibrium import equilibrium_policy
+from app.game.models import CardTemplate
+from app.game.search import search_policy
+from app.game.state import PHASE_GAME_OVER, UNKNOWN_TEMPLATE, CompactPlayer
+
+# ターン数の上限に達した試合は引き分けとして扱います。
+DEFAULT_MAX_TURNS = 100
+
+# 1つのワーカーに渡す試合数の目安です。小さすぎるとプロセス間通信のコストが目立ちます。
+_CHUNK_SIZE = 250
+
+# 共有のプロセスプールのワーカー数の既定値です（None は CPU 数）。環境変数 SIMULATION_POOL_WORKERS で上書きできます。
+DEFAULT_POOL_WORKERS: Optional[int] = None
+
+# ポリシーは (エンジン, 自分, 相手, 乱数) を受け取り、出すカードのインデックス（出さない場合は -1）を返します。
+Policy = Callable[[GameEngine, CompactPlayer, CompactPlayer, random.Random], int]
+
+
+def _affordable(engine: GameEngine, player: CompactPlayer) -> List[int]:
+    # 手札のうち、テンプレートが存在し資金で支払えるカードのインデックスを返します。
+    costs = engine.templates.costs
+    templates = engine.core.cards.templates
+    return [c for c in player.hand
+            if templates[c] != UNKNOWN_TEMPLATE and player.funds >= costs[templates[c]]]
+
+
+def random_policy(engine: GameEngine, player: CompactPlayer, opponent: CompactPlayer, rng: random.Random) -> int:
+    """支払えるカードの中から一様ランダムに1枚選びます。"""
+    playable = _affordable(engine, player)
+    return rng.choice(playable) if playable else -1
+
+
+def weighted_policy(engine: GameEngine, player: CompactPlayer, opponent: CompactPlayer, rng: random.Random) -> int:
+    """web-game-client の NPC（src/game/ai）と同じ考え方の重み付けでカードを選びます。"""
+    playable = _affordable(engine, player)
+    if not playable:
+        return -1
+    table = engine.templates
+    templates = engine.core.cards.templates
+    acquire_cost = table.costs[table.index['ACQUIRE']] if 'ACQUIRE' in table.index else 2
+    bribe_cost = table.costs[table.index['BRIBE']] if 'BRIBE' in table.index else 5
+    can_opponent_acquire = opponent.funds >= acquire_cost
+    can_opponent_attack = can_opponent_acquire or opponent.funds >= bribe_cost
+
+    weights = []
+    for card in playable:
+        template = templates[card]
+        category = table.categories[template]
+        template_id = table.ids[template]
+        weight = 1.0
+        if category == 'ATTACK':
+            # 相手に不動産があれば攻撃を優先します。「賄賂」は防御されないためさらに優先し、
+            # それ以外は相手も買収できる場合に少し控えます。
+            if opponent.properties <= 0:
+                weight = 0.0
+            elif template_id == 'BRIBE':
+                weight = 11.0
+            else:
+                weight = 5.0 if can_opponent_acquire else 6.0
+        elif category == 'DEFENSE':
+            # 相手が攻撃できる場合のみ防御を重視し、相手が買収できるなら「詐欺」をより重視します。
+            if player.properties > 0 and can_opponent_attack:
+                weight = 9.0 if template_id == 'FRAUD' and can_opponent_acquire else 7.0
+            else:
+                weight = 0.1
+        weights.append(weight)
+
+    if sum(weights) <= 0:
+        return -1
+    return rng.choices(playable, weights=weights)[0]
+
+
+POLICIES: Dict[str, Policy] = {
+    'random': random_policy,
+    'weighted': weighted_policy,
+    'search': search_policy,
+    'equilibrium': equilibrium_policy,
+}
+
+
+class MatchResult(BaseModel):
+    # 勝者のプレイヤー番号（0 または 1）。引き分けの場合は None です。
+    winner: Optional[int]
+    turns: int
+    cardPlays: List[Dict[str, int]]
+
+
+class BatchResult(BaseModel):
+    matches: int
+    wins: List[int]
+    draws: int
+    winRates: List[float]
+    drawRate: float
+    meanTurns: float
+    cardPlays: List[Dict[str, int]] = Field(default_factory=lambda: [{}, {}])
+
+
+def _validate(deck: Dict[str, int], card_templates: Dict[str, CardTemplate], policy: str) -> None:
+    # 未知のテンプレートやポリシー、空のデッキを事前に弾きます。
+    unknown = [tid for tid in deck if tid not in card_templates]
+    if unknown:
+        raise ValueError(f"Unknown card templates in deck: {', '.join(unknown)}")
+    if any(count < 0 for count in deck.values()) or sum(deck.values()) == 0:
+        raise ValueError("Deck must contain at least one card and no negative counts.")
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy: {policy}")
+
+
+def _add_plays(target: List[Dict[str, int]], source: List[Dict[str, int]]) -> None:
+    # プレイヤーごとのカードプレイ回数を target に加算します。
+    for side, counts in zip(target, source):
+        for template_id, count in counts.items():
+            side[template_id] = side.get(template_id, 0) + count
+
+
+def run_match(deck1: Dict[str, int], deck2: Dict[str, int], policy1: str, policy2: str, seed: int,
+              card_templates: Dict[str, CardTemplate] = BASE_CARD_TEMPLATES,
+              max_turns: int = DEFAULT_MAX_TURNS) -> MatchResult:
+    """1試合をシードに従って最後まで実行します。"""
+    rng = random.Random(seed)
+    initial_state = GameEngine.create_initial_state('player1', 'player2', card_templates, deck1, deck2, rng=rng)
+    engine = GameEngine(initial_state, card_templates, rng=rng, record_changes=False, record_journal=False)
+    policies = (POLICIES[policy1], POLICIES[policy2])
+    core = engine.core
+    p1, p2 = core.players
+    plays: List[Dict[str, int]] = [{}, {}]
+
+    while core.phase != PHASE_GAME_OVER and core.turn < max_turns:
+        engine.start_turn()
+        c1 = policies[0](engine, p1, p2, rng)
+        c2 = policies[1](engine, p2, p1, rng)
+        engine.play((p1, c1), (p2, c2))
+        for player_id, template_id in core.last_actions:
+            side = plays[0] if player_id == p1.player_id else plays[1]
+            side[template_id] = side.get(template_id, 0) + 1
+
+    winner = None
+    if core.phase == PHASE_GAME_OVER:
+        p1_alive, p2_alive = p1.properties > 0, p2.properties > 0
+        if p1_alive != p2_alive:
+            winner = 0 if p1_alive else 1
+    return MatchResult(winner=winner, turns=core.turn, cardPlays=plays)
+
+
+def _run_chunk(deck1: Dict[str, int], deck2: Dict[str, int], policy1: str, policy2: str,
+               seeds: Sequence[int], card_templates: Dict[str, CardTemplate], max_turns: int) -> Tuple:
+    # ワーカープロセスで複数試合を実行し、集計値だけを返します（結果の転送量を抑えるため）。
+    wins = [0, 0]
+    draws = 0
+    total_turns = 0
+    plays: List[Dict[str, int]] = [{}, {}]
+    for seed in seeds:
+        result = run_match(deck1, deck2, policy1, policy2, seed, card_templates, max_turns)
+        if result.winner is None:
+            draws += 1
+        else:
+            wins[result.winner] += 1
+        total_turns += result.turns
+        _add_plays(plays, result.cardPlays)
+    return wins, draws, total_turns, plays
+
+
+class SimulationPool:
+    """
+    シミュレーションで共有する ProcessPoolExecutor です。最初に使うときに作成し、shutdown で停止します（次に使うときに作り直します）。
+    同時に来たリクエストは同じワーカーを順に使うため、プロセス数は max_workers を超えません。
+    スレッドを持つサーバーのプロセスを fork しないよう、ワーカーは forkserver（使えない環境では spawn）で起動します。
+    """
+
+    def __init__(self, max_workers: Optional[int] = DEFAULT_POOL_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'SimulationPool':
+        workers = os.getenv("SIMULATION_POOL_WORKERS")
+        return cls(int(workers) if workers else DEFAULT_POOL_WORKERS)
+
+    @property
+    def workers(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# アプリケーション全体で共有するプロセスプールです。
+simulation_pool = SimulationPool.from_env()
+
+
+def simulate_batch(deck1: Dict[str, int], deck2: Dict[str, int], policy1: str = 'random', policy2: str = 'random',
+                   matches: int = 1000, seed: int = 0,
+                   card_templates: Dict[str, CardTemplate] = BASE_CARD_TEMPLATES,
+                   max_turns: int = DEFAULT_MAX_TURNS, max_workers: Optional[int] = None) -> BatchResult:
+    """
+    2つのデッキとポリシーで matches 試合を実行し、勝率・平均ターン数・カードごとのプレイ回数を集計します。
+    試合 k のシードは seed + k なので、ワーカー数に関わらず同じ結果になります。
+    max_workers が 1 の場合はこのプロセスで実行し、それ以外は共有のプロセスプール（simulation_pool）で実行します。
+    """
+    _validate(deck1, card_templates, policy1)
+    _validate(deck2, card_templates, policy2)
+    seeds = range(seed, seed + matches)
+    chunks = [seeds[i:i + _CHUNK_SIZE] for i in range(0, matches, _CHUNK_SIZE)]
+    args = (deck1, deck2, policy1, policy2)
+    workers = max_workers or simulation_pool.workers
+
+    if workers == 1 or len(chunks) == 1:
+        partials = [_run_chunk(*args, chunk, card_templates, max_turns) for chunk in chunks]
+    else:
+        pool = simulation_pool.executor()
+        futures = [pool.submit(_run_chunk, *args, chunk, card_templates, max_turns) for chunk in chunks]
+        partials = [f.result() for f in futures]
+
+    wins = [0, 0]
+    draws = 0
+    total_turns = 0
+    plays: List[Dict[str, int]] = [{}, {}]
+    for chunk_wins, chunk_draws, chunk_turns, chunk_plays in partials:
+        wins[0] += chunk_wins[0]
+        wins[1] += chunk_wins[1]
+        draws += chunk_draws
+        total_turns += chunk_turns
+        _add_plays(plays, chunk_plays)
+
+    return BatchResult(
+        matches=matches,
+        wins=wins,
+        draws=draws,
+        winRates=[w / matches for w in wins] if matches else [0.0, 0.0],
+        drawRate=draws / matches if matches else 0.0,
+        meanTurns=total_turns / matches if matches else 0.0,
+        cardPlays=plays,
+    )
+
+
+def simulate_vectorized(deck1: Dict[str, int], deck2: Dict[str, int], matches: int = 1000, seed: int = 0,
+                        card_templates: Dict[str, CardTemplate] = BASE_CARD_TEMPLATES,
+                        max_turns: int = DEFAULT_MAX_TURNS) -> BatchResult:
+    """
+    simulate_batch と同じ集計を VectorizedEngine で全試合同時に計算します。
+    ポリシーは両者とも 'random' のみ対応しています。
+    """
+    # NumPy はこの関数でしか使わないため、ワーカープロセスの起動を軽くするよう遅延インポートします。
+    from app.game.vectorized import VectorizedEngine
+
+    _validate(deck1, card_templates, 'random')
+    _validate(deck2, card_templates, 'random')
+    engine = VectorizedEngine(matches, card_templates, deck1, deck2, seed=seed)
+    engine.run(max_turns)
+    winners = engine.winners()
+    wins = [int((winners == 0).sum()), int((winners == 1).sum())]
+    draws = matches - sum(wins)
+    return BatchResult(
+        matches=matches,
+        wins=wins,
+        draws=draws,
+        winRates=[w / matches for w in wins],
+        drawRate=draws / matches,
+        meanTurns=float(engine.turn.mean()),
+        cardPlays=engine.card_plays(),
+    )
@@ -0,0 +1,196 @@
+# packages/api-server/app/game/state.py
+# GameEngine が内部で使用するコンパクトなゲーム状態の表現です。
+# Pydanticモデル（GameState / PlayerState / Card）はAPIの境界でのみ組み立て、
+# エンジン内部では __slots__ を持つ軽量オブジェクトと整数のインデックス配列で状態を保持します。
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from app.game.event_log import EventLog
+from app.game.models import Card, CardTemplate, GameState, PlayerState, ResolvedAction
+
+# フェーズは小さな整数で保持し、境界で文字列に変換します。
+PHASES: Tuple[str, ...] = ('DRAW', 'ACTION', 'RESOLUTION', 'GAME_OVER')
+PHASE_DRAW, PHASE_ACTION, PHASE_RESOLUTION, PHASE_GAME_OVER = range(len(PHASES))
+PHASE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(PHASES)}
+
+# テンプレートが見つからないカードに割り当てるインデックスです。
+UNKNOWN_TEMPLATE = -1
+
+
+class TemplateTable:
+    """カードテンプレートIDを小さな整数にインターンし、コストなどを配列で引けるようにした表です。"""
+    __slots__ = ('ids', 'index', 'templates', 'costs', 'categories', 'names')
+
+    def __init__(self, card_templates: Mapping[str, CardTemplate]):
+        # templateId -> 整数インデックスの対応表と、インデックス順に並べた各属性の配列を作成します。
+        self.ids: List[str] = list(card_templates.keys())
+        self.index: Dict[str, int] = {tid: i for i, tid in enumerate(self.ids)}
+        self.templates: List[CardTemplate] = [card_templates[tid] for tid in self.ids]
+        self.costs: List[int] = [t.cost for t in self.templates]
+        self.categories: List[str] = [t.effect.category for t in self.templates]
+        self.names: List[str] = [t.name for t in self.templates]
+
+    def intern(self, template_id: str) -> int:
+        # 未登録のテンプレートIDには UNKNOWN_TEMPLATE を返します。
+        return self.index.get(template_id, UNKNOWN_TEMPLATE)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class CardTable:
+    """1試合に登場するカード実体の表です。試合中に変化しないため、状態の複製間で共有されます。"""
+    __slots__ = ('ids', 'template_ids', 'templates')
+
+    def __init__(self) -> None:
+        # カードID、元のテンプレートID文字列、インターン済みテンプレートインデックスの並列配列です。
+        self.ids: List[str] = []
+        self.template_ids: List[str] = []
+        self.templates: List[int] = []
+
+    def add(self, card: Card, table: TemplateTable) -> int:
+        # カードを表に追加し、そのインデックスを返します。
+        self.ids.append(card.id)
+        self.template_ids.append(card.templateId)
+        self.templates.append(table.intern(card.templateId))
+        return len(self.ids) - 1
+
+    def to_dict(self, index: int) -> Dict[str, str]:
+        # JSONにそのまま載せられる形式でカードを返します（変更セットの記録に使用します）。
+        return {'id': self.ids[index], 'templateId': self.template_ids[index]}
+
+    def to_card(self, index: int) -> Card:
+        # 内部データは整合性が保証されているため、検証を省略してCardを組み立てます。
+        return Card.model_construct(id=self.ids[index], templateId=self.template_ids[index])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class CompactPlayer:
+    """プレイヤーの状態です。手札・山札・捨て札は CardTable へのインデックスのリストで保持します。"""
+    __slots__ = ('player_id', 'funds', 'properties', 'hand', 'deck', 'discard')
+
+    def __init__(self, player_id: str, funds: int, properties: int,
+                 hand: List[int], deck: List[int], discard: List[int]):
+        self.player_id = player_id
+        self.funds = funds
+        self.properties = properties
+        self.hand = hand
+        self.deck = deck
+        self.discard = discard
+
+    def clone(self) -> 'CompactPlayer':
+        # リストは整数のみなので、浅いコピーで完全な複製になります。
+        return CompactPlayer(self.player_id, self.funds, self.properties,
+                             self.hand[:], self.deck[:], self.discard[:])
+
+
+class CompactState:
+    """GameState に対応する内部状態です。"""
+    __slots__ = ('match_id', 'turn', 'phase', 'players', 'last_actions', 'log', 'cards', 'version')
+
+    def __init__(self, match_id: str, turn: int, phase: int, players: List[CompactPlayer],
+                 last_actions: List[Tuple[str, str]], log: EventLog, cards: CardTable, version: int = 0):
+        self.match_id = match_id
+        self.turn = turn
+        self.phase = phase
+        self.players = players
+        # 直前に解決されたアクションを (playerId, cardTemplateId) の組で保持します。
+        self.last_actions = last_actions
+        # 上限付きのイベントログです。複製では直近のイベントだけをコピーし、古いページは共有します。
+        self.log = log
+        self.cards = cards
+        # 状態が変更されるたびに1ずつ増えるバージョンです。
+        self.version = version
+
+    def clone(self) -> 'CompactState':
+        # CardTable は不変なので共有し、可変部分のみを複製します。
+        return CompactState(self.match_id, self.turn, self.phase,
+                            [p.clone() for p in self.players],
+                            self.last_actions[:], self.log.clone(), self.cards, self.version)
+
+    def player_by_id(self, player_id: str) -> Optional[CompactPlayer]:
+        for player in self.players:
+            if player.player_id == player_id:
+                return player
+        return None
+
+    @classmethod
+    def from_game_state(cls, state: GameState, table: TemplateTable) -> 'CompactState':
+        # Pydanticの GameState を内部表現に変換します。
+        cards = CardTable()
+
+        def convert(player: PlayerState) -> CompactPlayer:
+            return CompactPlayer(
+                player.playerId,
+                player.funds,
+                player.properties,
+                [cards.add(c, table) for c in player.hand],
+                [cards.add(c, table) for c in player.deck],
+                [cards.add(c, table) for c in player.discard],
+            )
+
+        players = [convert(p) for p in state.players]
+        return cls(
+            state.matchId,
+            state.turn,
+            PHASE_INDEX[state.phase],
+            players,
+            [(a.playerId, a.cardTemplateId) for a in state.lastActions],
+            EventLog.from_lines(state.log, state.logCursor),
+            cards,
+            state.version,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        # GameState.model_dump() と同じ形の辞書を、Pydanticモデルを経由せずに組み立てます。
+        # 内部状態は整合性が保証されているため、永続化や送信などの内部の往復で検証を省略するために使います。
+        to_dict = self.cards.to_dict
+
+        def convert(player: CompactPlayer) -> Dict[str, Any]:
+            return {
+                'playerId': player.player_id,
+                'funds': player.funds,
+                'properties': player.properties,
+                'hand': [to_dict(i) for i in player.hand],
+                'deck': [to_dict(i) for i in player.deck],
+                'discard': [to_dict(i) for i in player.discard],
+            }
+
+        return {
+            'matchId': self.match_id,
+            'turn': self.turn,
+            'players': [convert(p) for p in self.players],
+            'phase': PHASES[self.phase],
+            'lastActions': [{'playerId': pid, 'cardTemplateId': tid} for pid, tid in self.last_actions],
+            'log': self.log.window(),
+            'logCursor': self.log.window_start,
+            'version': self.version,
+        }
+
+    def to_game_state(self) -> GameState:
+        # 内部表現から新しい GameState を組み立てます。毎回新しいオブジェクトになるため、
+        # 呼び出し側が変更してもエンジンの状態には影響しません。
+        to_card = self.cards.to_card
+
+        def convert(player: CompactPlayer) -> PlayerState:
+            return PlayerState.model_construct(
+                playerId=player.player_id,
+                funds=player.funds,
+                properties=player.properties,
+                hand=[to_card(i) for i in player.hand],
+                deck=[to_card(i) for i in player.deck],
+                discard=[to_card(i) for i in player.discard],
+            )
+
+        return GameState.model_construct(
+            matchId=self.match_id,
+            turn=self.turn,
+            players=[convert(p) for p in self.players],
+            phase=PHASES[self.phase],
+            lastActions=[ResolvedAction.model_construct(playerId=pid, cardTemplateId=tid)
+                         for pid, tid in self.last_actions],
+            log=self.log.window(),
+            logCursor=self.log.window_start,
+            version=self.version,
+        )
@@ -0,0 +1,167 @@
+# packages/api-server/app/game/templates.py
+# web-game-client/public/cards のカード定義を読み込み、プロセス全体で共有するカードテンプレートのレジストリです。
+# 読み込んだテンプレートは変更しない CardTemplateSet にまとめ、TemplateTable と ResolutionTable も一度だけ作成します。
+# GameEngine はリクエストごとに辞書を作らず、この共有された参照をそのまま受け取ります。
+# ファイルが変更されると新しい CardTemplateSet を作成して参照を差し替えます（進行中の試合は元の定義のまま続行します）。
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+from app.game.effects import ResolutionTable
+from app.game.models import CardTemplate
+from app.game.state import TemplateTable
+
+logger = logging.getLogger(__name__)
+
+# 既定のカード定義のディレクトリです（リポジトリ内の web-game-client/public/cards）。
+DEFAULT_CARDS_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'web-game-client', 'public', 'cards'))
+
+# ファイルの変更を確認する間隔（秒）の既定値です。0以下にするとホットリロードを行いません。
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+MANIFEST_FILE = '_manifest.json'
+
+
+class CardTemplateSet(Mapping[str, CardTemplate]):
+    """
+    読み込み済みのカードテンプレートの変更できない集合です。templateId -> CardTemplate のマッピングとして使えます。
+    version はカード定義の内容のハッシュで、同じ内容なら同じ値になります。
+    """
+    __slots__ = ('_templates', 'version', 'table', 'resolution')
+
+    def __init__(self, templates: Dict[str, CardTemplate], version: str):
+        self._templates = dict(templates)
+        self.version = version
+        # エンジンが使うインターン済みの表と解決手順の表も、ここで一度だけ作成して共有します。
+        self.table = TemplateTable(self._templates)
+        self.resolution = ResolutionTable(self.table)
+
+    def __getitem__(self, template_id: str) -> CardTemplate:
+        return self._templates[template_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._templates)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __repr__(self) -> str:
+        return f"CardTemplateSet(version={self.version!r}, templates={list(self._templates)!r})"
+
+
+def compile_templates(card_templates: Mapping[str, CardTemplate]) -> Tuple[TemplateTable, ResolutionTable]:
+    """テンプレートの表と解決手順の表を返します。CardTemplateSet の場合は作成済みのものを再利用します。"""
+    if isinstance(card_templates, CardTemplateSet):
+        return card_templates.table, card_templates.resolution
+    table = TemplateTable(card_templates)
+    return table, ResolutionTable(table)
+
+
+def templates_fingerprint(card_templates: Mapping[str, CardTemplate]) -> str:
+    """カードテンプレートの内容の識別子です。CardTemplateSet の場合はそのバージョンを返します。"""
+    if isinstance(card_templates, CardTemplateSet):
+        return card_templates.version
+    digest = hashlib.sha256()
+    for template_id in card_templates:
+        digest.update(card_templates[template_id].model_dump_json().encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def load_template_set(cards_dir: str) -> CardTemplateSet:
+    """_manifest.json に列挙されたカード定義を読み込み、内容のハッシュをバージョンとする CardTemplateSet を作成します。"""
+    digest = hashlib.sha256()
+    with open(os.path.join(cards_dir, MANIFEST_FILE), 'rb') as f:
+        manifest = f.read()
+    digest.update(manifest)
+    templates: Dict[str, CardTemplate] = {}
+    for name in json.loads(manifest)['card_names']:
+        with open(os.path.join(cards_dir, f'{name}.json'), 'rb') as f:
+            raw = f.read()
+        digest.update(name.encode('utf-8'))
+        digest.update(raw)
+        template = CardTemplate.model_validate_json(raw)
+        templates[template.templateId] = template
+    return CardTemplateSet(templates, digest.hexdigest()[:16])
+
+
+class CardTemplateRegistry:
+    """
+    現在の CardTemplateSet への参照を保持します。参照は current で取得し、最初の参照時に読み込みます。
+    reload_interval 秒ごとにファイルの更新時刻を確認し、変更があれば読み込み直して参照を差し替えます。
+    読み込みに失敗した場合は、以前の定義を使い続けます。
+    """
+
+    def __init__(self, cards_dir: str = DEFAULT_CARDS_DIR, reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.cards_dir = cards_dir
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._current: Optional[CardTemplateSet] = None
+        self._signature: Optional[tuple] = None
+        self._next_check = 0.0
+        self.reloads = 0
+
+    @classmethod
+    def from_env(cls) -> 'CardTemplateRegistry':
+        return cls(
+            cards_dir=os.getenv("CARD_TEMPLATES_DIR", DEFAULT_CARDS_DIR),
+            reload_interval=float(os.getenv("CARD_TEMPLATES_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL)),
+        )
+
+    @property
+    def current(self) -> CardTemplateSet:
+        """現在のカードテンプレートの集合です。確認間隔が過ぎていれば、ファイルの変更を確認します。"""
+        current = self._current
+        if current is None or (self.reload_interval > 0 and self._clock() >= self._next_check):
+            self.reload()
+            current = self._current
+        return current
+
+    def reload(self, force: bool = False) -> bool:
+        """ファイルに変更があれば読み込み直します。参照を差し替えた場合は True を返します。"""
+        with self._lock:
+            self._next_check = self._clock() + self.reload_interval
+            try:
+                signature = self._file_signature()
+            except OSError:
+                if self._current is None:
+                    raise
+                logger.exception("Failed to stat card templates in %s", self.cards_dir)
+                return False
+            if not force and self._current is not None and signature == self._signature:
+                return False
+            try:
+                loaded = load_template_set(self.cards_dir)
+            except (OSError, ValueError, KeyError):
+                if self._current is None:
+                    raise
+                logger.exception("Failed to reload card templates from %s; keeping version %s",
+                                 self.cards_dir, self._current.version)
+                return False
+            self._signature = signature
+            if self._current is not None and loaded.version == self._current.version:
+                return False
+            # 新しい集合を完成させてから参照を1回の代入で差し替えるため、読み込み途中の状態は見えません。
+            self._current = loaded
+            self.reloads += 1
+            logger.info("Loaded card templates version %s (%d cards)", loaded.version, len(loaded))
+            return True
+
+    def _file_signature(self) -> tuple:
+        # マニフェストと各カード定義の更新時刻・サイズの組です。内容のハッシュより安く変更を検出できます。
+        entries = []
+        for entry in sorted(os.scandir(self.cards_dir), key=lambda e: e.name):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+
+# アプリケーション全体で共有するレジストリです。
+card_template_registry = CardTemplateRegistry.from_env()
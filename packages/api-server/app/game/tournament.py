@@ -0,0 +1,388 @@
+# packages/api-server/app/game/tournament.py
+# デッキとNPCのポリシーの組（参加者）で総当たり（round-robin）またはスイス式のトーナメントを行い、
+# Elo レーティングと対戦成績の表を求めます。
+#
+#   python -m app.game.tournament --policy random --policy weighted --games 200 --output runs/t1.jsonl
+#
+# 対戦（2人の参加者の games 試合）はシードを決めたバッチに分けて共有のプロセスプール（simulation.simulation_pool）に分散し、終わったバッチから
+# 結果を JSON Lines のファイルに追記します。同じ設定で再実行すると、ファイルにあるバッチは実行せずに続きから再開します。
+# 試合のシードは設定と対戦から決まり、レーティングは完了した順ではなく対戦の順に計算するため、
+# ワーカー数や中断の有無によらず同じ結果になります。
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import as_completed
+from typing import Dict, IO, List, Literal, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.game.deck_optimizer import DEFAULT_DECKS_DIR, Deck, load_field
+from app.game.models import CardTemplate
+from app.game.simulation import DEFAULT_MAX_TURNS, POLICIES, run_match, simulation_pool
+from app.game.templates import card_template_registry, templates_fingerprint
+
+# 既定の設定値です。
+DEFAULT_GAMES = 100 # 1つの対戦の試合数（先手・後手を交互に入れ替えます）
+DEFAULT_ELO = 1500.0
+DEFAULT_ELO_K = 16.0
+DEFAULT_TOURNAMENT_DIR = 'tournaments'
+
+# 1つのバッチの試合数の上限です（simulation と同じ）。
+_CHUNK_SIZE = 250
+
+# 試合の結果は、対戦の1人目の参加者から見た得点（勝ち 1、引き分け 0.5、負け 0）で記録します。
+Outcome = float
+
+
+class TournamentConfig(BaseModel):
+    format: Literal['round-robin', 'swiss'] = 'round-robin'
+    decks: Dict[str, Deck] # デッキ名 -> cards
+    policies: List[str] = Field(default_factory=lambda: ['random'])
+    games: int = Field(DEFAULT_GAMES, ge=1)
+    rounds: Optional[int] = None # スイス式のラウンド数。省略すると ceil(log2(参加者数))
+    seed: int = 0
+    maxTurns: int = Field(DEFAULT_MAX_TURNS, ge=1)
+
+
+class Standing(BaseModel):
+    name: str
+    deck: str
+    policy: str
+    elo: float
+    points: float # 対戦ごとの勝ち点（勝ち越し 1、五分 0.5、スイス式の不戦勝 1）
+    games: int
+    wins: int
+    draws: int
+    losses: int
+
+
+class TournamentResult(BaseModel):
+    format: str
+    entrants: List[str]
+    standings: List[Standing] # Elo の高い順
+    headToHead: List[List[Optional[float]]] # [i][j] は entrants[i] の entrants[j] に対する得点率（対戦が無ければ None）
+    headToHeadGames: List[List[int]]
+    rounds: int
+    simulatedGames: int
+    resumedGames: int # 結果のファイルから読み込んだ試合数
+    elapsedMs: float
+
+
+class Entrant(NamedTuple):
+    name: str
+    deck_name: str
+    deck: Deck
+    policy: str
+
+
+class _Batch(NamedTuple):
+    key: str
+    a: int # 参加者のインデックス
+    b: int
+    start: int # 対戦の中での試合の範囲 [start, end)
+    end: int
+
+
+def entrants_for(config: TournamentConfig) -> List[Entrant]:
+    """設定のデッキとポリシーの全ての組を、名前の順に返します。"""
+    return [Entrant(f'{deck_name}@{policy}', deck_name, config.decks[deck_name], policy)
+            for deck_name in sorted(config.decks) for policy in sorted(set(config.policies))]
+
+
+def _validate(config: TournamentConfig, card_templates: Mapping[str, CardTemplate]) -> None:
+    if not config.decks:
+        raise ValueError("Tournament needs at least one deck.")
+    unknown = [p for p in config.policies if p not in POLICIES]
+    if unknown:
+        raise ValueError(f"Unknown policies: {', '.join(unknown)}")
+    for name, deck in config.decks.items():
+        if any(tid not in card_templates for tid in deck) or any(n < 0 for n in deck.values()) \
+                or sum(deck.values()) <= 0:
+            raise ValueError(f"Deck {name} must be non-empty and use known card templates.")
+    if len(config.decks) * len(set(config.policies)) < 2:
+        raise ValueError("Tournament needs at least two entrants.")
+
+
+def _pairing_seed(seed: int, round_index: int, a: str, b: str) -> int:
+    # 対戦のシードです。対戦の順番やスイス式の組み合わせの結果によらず、同じ対戦には同じシードを使います。
+    digest = hashlib.sha256(f'{seed}:{round_index}:{a}:{b}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def _play_batch(a: Entrant, b: Entrant, pairing_seed: int, start: int, end: int,
+                card_templates: Mapping[str, CardTemplate], max_turns: int) -> List[Outcome]:
+    # ワーカープロセスで対戦の試合 [start, end) を実行します。偶数番目の試合は a が先手、奇数番目は b が先手です。
+    outcomes = []
+    for game in range(start, end):
+        if game % 2 == 0:
+            winner = run_match(a.deck, b.deck, a.policy, b.policy, pairing_seed + game, card_templates, max_turns).winner
+            a_seat = 0
+        else:
+            winner = run_match(b.deck, a.deck, b.policy, a.policy, pairing_seed + game, card_templates, max_turns).winner
+            a_seat = 1
+        outcomes.append(0.5 if winner is None else 1.0 if winner == a_seat else 0.0)
+    return outcomes
+
+
+def elo_ratings(games: Sequence[Tuple[int, int, Outcome]], players: int, k: float = DEFAULT_ELO_K,
+                initial: float = DEFAULT_ELO) -> List[float]:
+    """(a, b, a の得点) の試合を順に適用した Elo レーティングです。"""
+    ratings = [initial] * players
+    for a, b, score in games:
+        expected = 1.0 / (1.0 + 10 ** ((ratings[b] - ratings[a]) / 400.0))
+        delta = k * (score - expected)
+        ratings[a] += delta
+        ratings[b] -= delta
+    return ratings
+
+
+def swiss_pairings(order: Sequence[int], played: Set[Tuple[int, int]],
+                   byes: Set[int]) -> Tuple[List[Tuple[int, int]], Optional[int]]:
+    """
+    順位の順に並べた参加者を、上から順にまだ対戦していない相手と組み合わせます（全員と対戦済みなら次の順位と組みます）。
+    参加者が奇数の場合は、まだ不戦勝になっていない最も下位の参加者を不戦勝にします。
+    """
+    remaining = list(order)
+    bye = None
+    if len(remaining) % 2:
+        bye = next((i for i in reversed(remaining) if i not in byes), remaining[-1])
+        remaining.remove(bye)
+    pairings = []
+    while remaining:
+        a = remaining.pop(0)
+        b = next((i for i in remaining if (min(a, i), max(a, i)) not in played), remaining[0])
+        remaining.remove(b)
+        pairings.append((min(a, b), max(a, b)))
+    return pairings, bye
+
+
+class TournamentLog:
+    """
+    結果のファイル（JSON Lines）です。1行目は設定の見出しで、以降は完了したバッチの結果です。
+    書き込み中に中断されて途中で切れた最後の行は、読み込み時に取り除きます。
+    """
+
+    def __init__(self, path: str, header: Dict):
+        self.path = path
+        self.completed: Dict[str, List[Outcome]] = {}
+        self._file: Optional[IO[str]] = None
+        if os.path.exists(path):
+            self._load(header)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'type': 'header', **header}) + '\n')
+
+    def _load(self, header: Dict) -> None:
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].decode('utf-8').splitlines()
+        if not lines or json.loads(lines[0]).get('configHash') != header['configHash']:
+            raise ValueError(f"{self.path} was written for a different tournament configuration.")
+        if end < len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        for line in lines[1:]:
+            record = json.loads(line)
+            self.completed[record['key']] = record['outcomes']
+
+    def append(self, key: str, outcomes: List[Outcome]) -> None:
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps({'type': 'batch', 'key': key, 'outcomes': outcomes}) + '\n')
+        self._file.flush()
+        self.completed[key] = outcomes
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TournamentRunner:
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+
+    def run(self, config: TournamentConfig, card_templates: Mapping[str, CardTemplate],
+            output: Optional[str] = None) -> TournamentResult:
+        """トーナメントを行います。output を指定すると結果を追記し、既にあるファイルからは続きを再開します。"""
+        started = time.perf_counter()
+        _validate(config, card_templates)
+        entrants = entrants_for(config)
+        config_hash = hashlib.sha256(json.dumps(
+            [templates_fingerprint(card_templates), config.model_dump()], sort_keys=True
+        ).encode('utf-8')).hexdigest()[:16]
+        log = TournamentLog(output, {'configHash': config_hash, 'config': config.model_dump()}) if output else None
+        completed = log.completed if log is not None else {}
+        resumed = sum(len(outcomes) for outcomes in completed.values())
+        simulated = 0
+
+        # 対戦の順に並べた (a, b, 対戦の結果) と、参加者ごとの勝ち点です。
+        results: List[Tuple[int, int, List[Outcome]]] = []
+        points = [0.0] * len(entrants)
+        try:
+            if config.format == 'round-robin':
+                rounds = 1
+                pairings = [(a, b) for a in range(len(entrants)) for b in range(a + 1, len(entrants))]
+                round_results, simulated = self._play_round(0, pairings, entrants, config, card_templates,
+                                                            completed, log)
+                results += round_results
+                _add_points(points, results)
+            else:
+                rounds = config.rounds or max(1, math.ceil(math.log2(len(entrants))))
+                played: Set[Tuple[int, int]] = set()
+                byes: Set[int] = set()
+                for round_index in range(rounds):
+                    order = sorted(range(len(entrants)), key=lambda i: (-points[i], entrants[i].name))
+                    pairings, bye = swiss_pairings(order, played, byes)
+                    if bye is not None:
+                        byes.add(bye)
+                        points[bye] += 1.0
+                    played.update(pairings)
+                    round_results, round_simulated = self._play_round(round_index, pairings, entrants, config,
+                                                                      card_templates, completed, log)
+                    _add_points(points, round_results)
+                    results += round_results
+                    simulated += round_simulated
+        finally:
+            if log is not None:
+                log.close()
+        return _summarize(config, entrants, results, points, rounds, simulated, resumed, started)
+
+    def _play_round(self, round_index: int, pairings: List[Tuple[int, int]], entrants: List[Entrant],
+                    config: TournamentConfig, card_templates: Mapping[str, CardTemplate],
+                    completed: Dict[str, List[Outcome]],
+                    log: Optional[TournamentLog]) -> Tuple[List[Tuple[int, int, List[Outcome]]], int]:
+        # ラウンドの対戦をバッチに分け、結果のファイルに無いバッチだけを実行します。
+        # 対戦の順の (a, b, 対戦の結果) と、実行した試合数を返します。
+        batches = []
+        for a, b in pairings:
+            prefix = f'{round_index}:{entrants[a].name}:{entrants[b].name}'
+            for start in range(0, config.games, _CHUNK_SIZE):
+                batches.append(_Batch(f'{prefix}:{start}', a, b, start, min(start + _CHUNK_SIZE, config.games)))
+        outcomes = {key: completed[key] for key in (batch.key for batch in batches) if key in completed}
+        pending = [batch for batch in batches if batch.key not in outcomes]
+
+        def args(batch: _Batch):
+            a, b = entrants[batch.a], entrants[batch.b]
+            return (a, b, _pairing_seed(config.seed, round_index, a.name, b.name), batch.start, batch.end,
+                    card_templates, config.maxTurns)
+
+        def finish(batch: _Batch, result: List[Outcome]) -> None:
+            # 完了したバッチから結果のファイルに書き込みます。
+            outcomes[batch.key] = result
+            if log is not None:
+                log.append(batch.key, result)
+
+        workers = self.max_workers or simulation_pool.workers
+        if workers == 1 or len(pending) <= 1:
+            for batch in pending:
+                finish(batch, _play_batch(*args(batch)))
+        else:
+            pool = simulation_pool.executor()
+            futures = {pool.submit(_play_batch, *args(batch)): batch for batch in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+        results = []
+        for a, b in pairings:
+            pairing = [o for batch in batches if (batch.a, batch.b) == (a, b) for o in outcomes[batch.key]]
+            results.append((a, b, pairing))
+        return results, sum(batch.end - batch.start for batch in pending)
+
+
+def _add_points(points: List[float], results: Sequence[Tuple[int, int, List[Outcome]]]) -> None:
+    # 対戦で得点率が 0.5 を超えた参加者に 1 点、ちょうど 0.5 なら両者に 0.5 点を加えます。
+    for a, b, outcomes in results:
+        rate = sum(outcomes) / len(outcomes)
+        if rate > 0.5:
+            points[a] += 1.0
+        elif rate < 0.5:
+            points[b] += 1.0
+        else:
+            points[a] += 0.5
+            points[b] += 0.5
+
+
+def _summarize(config: TournamentConfig, entrants: List[Entrant], results: List[Tuple[int, int, List[Outcome]]],
+               points: List[float], rounds: int, simulated: int, resumed: int, started: float) -> TournamentResult:
+    n = len(entrants)
+    scores = [[0.0] * n for _ in range(n)]
+    games = [[0] * n for _ in range(n)]
+    records = [[0, 0, 0] for _ in range(n)] # 勝ち・引き分け・負け
+    for a, b, outcomes in results:
+        for score in outcomes:
+            scores[a][b] += score
+            scores[b][a] += 1.0 - score
+            records[a][0 if score == 1.0 else 1 if score == 0.5 else 2] += 1
+            records[b][2 if score == 1.0 else 1 if score == 0.5 else 0] += 1
+        games[a][b] += len(outcomes)
+        games[b][a] += len(outcomes)
+    ratings = elo_ratings([(a, b, score) for a, b, outcomes in results for score in outcomes], n)
+    standings = [Standing(name=e.name, deck=e.deck_name, policy=e.policy, elo=ratings[i], points=points[i],
+                          games=sum(records[i]), wins=records[i][0], draws=records[i][1], losses=records[i][2])
+                 for i, e in enumerate(entrants)]
+    standings.sort(key=lambda s: (-s.elo, s.name))
+    return TournamentResult(
+        format=config.format,
+        entrants=[e.name for e in entrants],
+        standings=standings,
+        headToHead=[[scores[i][j] / games[i][j] if games[i][j] else None for j in range(n)] for i in range(n)],
+        headToHeadGames=games,
+        rounds=rounds,
+        simulatedGames=simulated,
+        resumedGames=resumed,
+        elapsedMs=(time.perf_counter() - started) * 1000.0,
+    )
+
+
+def output_path(run_id: str) -> str:
+    """API から実行したトーナメントの結果のファイルのパスです（TOURNAMENT_DIR 環境変数のディレクトリに置きます）。"""
+    return os.path.join(os.getenv('TOURNAMENT_DIR', DEFAULT_TOURNAMENT_DIR), f'{run_id}.jsonl')
+
+
+# アプリケーション全体で共有するランナーです。
+tournament_runner = TournamentRunner()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a deck/policy tournament and report Elo ratings.")
+    parser.add_argument('--decks-dir', default=DEFAULT_DECKS_DIR, help="Directory of decks (JSON)")
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help="NPC policy of the entrants (repeatable, default: random)")
+    parser.add_argument('--format', default='round-robin', choices=['round-robin', 'swiss'])
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="Games per pairing")
+    parser.add_argument('--rounds', type=int, default=None, help="Swiss rounds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="JSON Lines file to stream results to and resume from")
+    args = parser.parse_args()
+
+    config = TournamentConfig(format=args.format, decks=load_field(args.decks_dir), policies=args.policy or ['random'],
+                              games=args.games, rounds=args.rounds, seed=args.seed, maxTurns=args.max_turns)
+    if args.workers:
+        simulation_pool.max_workers = args.workers
+    try:
+        result = TournamentRunner(max_workers=args.workers).run(config, card_template_registry.current, args.output)
+    finally:
+        simulation_pool.shutdown()
+    for rank, s in enumerate(result.standings, 1):
+        print(f'{rank:>3}. {s.elo:7.1f} {s.points:4.1f} pts  {s.wins}-{s.draws}-{s.losses}  {s.name}')
+    print()
+    width = max(len(name) for name in result.entrants)
+    print(' ' * width + ''.join(f'{i + 1:>7}' for i in range(len(result.entrants))))
+    for i, (name, row) in enumerate(zip(result.entrants, result.headToHead)):
+        print(f'{name:<{width}}' + ''.join(f'{v:7.3f}' if v is not None else '      -' for v in row) + f'  ({i + 1})')
+    print(f'{result.rounds} rounds, {result.simulatedGames} simulated, {result.resumedGames} resumed, '
+          f'{result.elapsedMs / 1000:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# packages/api-server/app/game/vectorized.py
+# N試合を NumPy の配列（struct-of-arrays）として保持し、全試合を1ターンずつ同時に進めるエンジンです。
+# バランス調整用の大量シミュレーション向けで、GameEngine と同じ ResolutionTable の解決手順を使用します。
+# カードの並び順は保持せず、山札・手札・捨て札をテンプレートごとの枚数で表します。
+# シャッフル済みの山札の上から引くことと、山札の構成から非復元抽出することは同じ分布になります。
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+
+from app.game.effects import ACTION_ACQUIRE_PROPERTY, ACTION_GAIN_FUNDS, ResolutionTable
+from app.game.models import CardTemplate
+from app.game.state import PHASE_ACTION, PHASE_DRAW, PHASE_GAME_OVER, PHASE_RESOLUTION
+from app.game.templates import compile_templates
+
+# 手札の上限枚数です（GameEngine.start_turn と同じ）。
+HAND_SIZE = 3
+
+# 何もプレイしないことを表すテンプレートインデックスです。
+NO_PLAY = -1
+
+
+class VectorizedEngine:
+    """
+    N試合分の状態を配列で保持します。funds / properties は (N, 2) で、1番目の次元が試合、2番目がプレイヤーです。
+    hand / deck / discard はテンプレートごとの枚数で (T, N, 2) です。テンプレートの次元を先頭に置くと、
+    枚数の合計や累積和が連続したメモリ上の加算になり、T が小さくても高速に計算できます。
+    """
+
+    def __init__(self, matches: int, card_templates: Mapping[str, CardTemplate],
+                 deck1: Dict[str, int], deck2: Dict[str, int], seed: Optional[int] = None,
+                 starting_funds: int = 2, starting_properties: int = 1):
+        self.templates, resolution = compile_templates(card_templates)
+        self.rng = np.random.default_rng(seed)
+        self.matches = matches
+        table = self.templates
+        self.costs = np.array(table.costs, dtype=np.int32)
+        self._compile_plans(resolution)
+
+        composition = np.zeros((2, len(table)), dtype=np.int32)
+        for side, deck in enumerate((deck1, deck2)):
+            for template_id, count in deck.items():
+                composition[side, table.index[template_id]] = count
+
+        self.funds = np.full((matches, 2), starting_funds, dtype=np.int32)
+        self.properties = np.full((matches, 2), starting_properties, dtype=np.int32)
+        self.deck = np.broadcast_to(composition.T[:, None, :], (len(table), matches, 2)).copy()
+        self.hand = np.zeros_like(self.deck)
+        self.discard = np.zeros_like(self.deck)
+        self.turn = np.zeros(matches, dtype=np.int32)
+        self.phase = np.full(matches, PHASE_DRAW, dtype=np.int8)
+        # テンプレートごとのプレイ回数です（プレイヤー別）。
+        self.plays = np.zeros((2, len(table)), dtype=np.int64)
+
+    def _compile_plans(self, resolution: ResolutionTable) -> None:
+        # 解決手順の表を、テンプレートの組 (T+1, T+1) とステップ番号で引ける配列に変換します。
+        # 最後のインデックスは「プレイしない」で、手順の無いステップのアクションコードは -1 です。
+        size = resolution.stride
+        depth = max((len(plan) for plan in resolution.plans), default=0)
+        self.plan_sides = np.zeros((size, size, depth), dtype=np.int8)
+        self.plan_codes = np.full((size, size, depth), -1, dtype=np.int8)
+        self.plan_values = np.zeros((size, size, depth), dtype=np.int32)
+        for i, plan in enumerate(resolution.plans):
+            for k, (side, code, value) in enumerate(plan):
+                self.plan_sides[i // size, i % size, k] = side
+                self.plan_codes[i // size, i % size, k] = code
+                self.plan_values[i // size, i % size, k] = value
+
+    @property
+    def active(self) -> np.ndarray:
+        return self.phase != PHASE_GAME_OVER
+
+    def _pick(self, weights: np.ndarray) -> np.ndarray:
+        # 先頭の次元の重み（枚数）に比例してテンプレートを1つずつ選びます。重みの合計が0なら NO_PLAY です。
+        cumulative = weights.cumsum(axis=0)
+        total = cumulative[-1]
+        threshold = self.rng.random(total.shape) * total
+        picked = (cumulative <= threshold).sum(axis=0, dtype=np.int32)
+        return np.where(total > 0, picked, NO_PLAY)
+
+    def _running(self, mask: Optional[np.ndarray]) -> np.ndarray:
+        # 終了していない試合のうち、mask で指定された試合のインデックスを返します。
+        # 以降の計算は該当する試合だけを取り出して行うため、終盤に残った少数の試合のコストも小さく済みます。
+        running = self.active if mask is None else self.active & mask
+        return np.nonzero(running)[0]
+
+    def start_turn(self, mask: Optional[np.ndarray] = None) -> None:
+        """進行中の試合（mask 指定時はその一部）でターンを進め、手札が3枚になるまでドローします。"""
+        idx = self._running(mask)
+        self.turn[idx] += 1
+        self.phase[idx] = PHASE_DRAW
+        hand, deck, discard = self.hand[:, idx], self.deck[:, idx], self.discard[:, idx]
+
+        for _ in range(HAND_SIZE):
+            need = hand.sum(axis=0) < HAND_SIZE
+            # 山札が空なら捨て札を山札に戻します（構成のみを持つのでシャッフルは不要です）。
+            refill = need & (deck.sum(axis=0) == 0)
+            deck[:, refill] += discard[:, refill]
+            discard[:, refill] = 0
+
+            drawn = np.where(need, self._pick(deck), NO_PLAY)
+            match_idx, side_idx = np.nonzero(drawn >= 0)
+            template_idx = drawn[match_idx, side_idx]
+            deck[template_idx, match_idx, side_idx] -= 1
+            hand[template_idx, match_idx, side_idx] += 1
+
+        self.hand[:, idx], self.deck[:, idx], self.discard[:, idx] = hand, deck, discard
+        self.phase[idx] = PHASE_ACTION
+
+    def random_choices(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """支払える手札から1枚を一様ランダムに選びます（simulation.random_policy と同じ分布）。"""
+        idx = self._running(mask)
+        choices = np.full((self.matches, 2), NO_PLAY, dtype=np.int32)
+        affordable = self.costs[:, None, None] <= self.funds[idx][None, :, :]
+        choices[idx] = self._pick(self.hand[:, idx] * affordable)
+        return choices
+
+    def play(self, choices: np.ndarray, mask: Optional[np.ndarray] = None) -> None:
+        """
+        各試合の両プレイヤーが出すテンプレートインデックス (N, 2) を解決します。NO_PLAY は何も出しません。
+        GameEngine と同じ解決手順の表を、試合ごとの分岐ではなく配列の参照とマスク演算で適用します。
+        """
+        idx = self._running(mask)
+        self.phase[idx] = PHASE_RESOLUTION
+        funds, properties = self.funds[idx], self.properties[idx]
+        hand, discard = self.hand[:, idx], self.discard[:, idx]
+        choices = choices[idx]
+        rows = np.arange(len(idx))[:, None]
+        sides = np.arange(2)[None, :]
+        safe = np.maximum(choices, 0)
+
+        # 手札にあり、資金が足りるカードだけがプレイされます。
+        played = (choices >= 0) & (hand[safe, rows, sides] > 0) & (funds >= self.costs[safe])
+        match_idx, side_idx = np.nonzero(played)
+        template_idx = choices[match_idx, side_idx]
+        funds[match_idx, side_idx] -= self.costs[template_idx]
+        hand[template_idx, match_idx, side_idx] -= 1
+        discard[template_idx, match_idx, side_idx] += 1
+        np.add.at(self.plays, (side_idx, template_idx), 1)
+
+        # 相殺を含む解決手順は GameEngine と同じ表から引きます。各ステップでは試合ごとに片方のプレイヤーだけが
+        # 行動するため、ステップ内はプレイヤーの順序に依存せず、ステップ間の順序だけを守れば同じ結果になります。
+        no_play = self.plan_codes.shape[0] - 1
+        pair = np.where(played, choices, no_play)
+        first, second = pair[:, 0], pair[:, 1]
+        for k in range(self.plan_codes.shape[2]):
+            codes = self.plan_codes[first, second, k]
+            actors = self.plan_sides[first, second, k]
+            values = self.plan_values[first, second, k]
+            for side in (0, 1):
+                acting = actors == side
+                funds[:, side] += np.where(acting & (codes == ACTION_GAIN_FUNDS), values, 0)
+                _steal(properties, acting & (codes == ACTION_ACQUIRE_PROPERTY), values, side)
+
+        self.funds[idx], self.properties[idx] = funds, properties
+        self.hand[:, idx], self.discard[:, idx] = hand, discard
+        # 勝利条件: いずれかのプレイヤーの不動産が0以下になった試合を終了します。
+        self.phase[idx[(properties <= 0).any(axis=1)]] = PHASE_GAME_OVER
+
+    def run(self, max_turns: int) -> None:
+        """全試合が終了するか、ターン数の上限に達するまでランダムポリシーで進めます。"""
+        while True:
+            running = self.active & (self.turn < max_turns)
+            if not running.any():
+                break
+            self.start_turn(running)
+            self.play(self.random_choices(running), running)
+
+    def winners(self) -> np.ndarray:
+        """各試合の勝者（0 または 1）を返します。引き分けや未終了の試合は -1 です。"""
+        alive = self.properties > 0
+        decided = (self.phase == PHASE_GAME_OVER) & (alive[:, 0] != alive[:, 1])
+        return np.where(decided, np.where(alive[:, 0], 0, 1), -1)
+
+    def card_plays(self) -> List[Dict[str, int]]:
+        ids = self.templates.ids
+        return [{ids[t]: int(n) for t, n in enumerate(row) if n} for row in self.plays]
+
+
+def _steal(properties: np.ndarray, mask: np.ndarray, values: np.ndarray, side: int) -> None:
+    # mask が真の試合で、side のプレイヤーが相手の不動産を values だけ奪います（相手の不動産が上限です）。
+    other = 1 - side
+    amount = np.where(mask, np.clip(np.minimum(values, properties[:, other]), 0, None), 0)
+    properties[:, other] -= amount
+    properties[:, side] += amount
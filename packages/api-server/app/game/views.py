@@ -0,0 +1,183 @@
+# packages/api-server/app/game/views.py
+# プレイヤーごとの状態の射影（ビュー）です。GameState は両プレイヤーの手札・山札の順番まで含むため、
+# クライアントにはプレイヤーから見える情報だけを送ります。
+#
+#   自分    手札はカードの一覧、山札は順番を伏せた構成（テンプレートIDごとの枚数）
+#   相手    手札と山札は枚数のみ
+#   両者    資金・資産・捨て札（公開されたカード）
+#
+# ビューは状態のバージョンごとにキャッシュし、同じ試合を見ている接続はエンコード済みの同じボディを共有します。
+# バージョンが進んだ場合も、変化したゾーンだけを作り直します。
+# WebSocket では、プレイヤーに前回送ったビューから現在のビューへの差分（JSON Patch）を view_patch で作ります。
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.game.changes import PatchOp
+from app.game.state import PHASES, CardTable, CompactPlayer, CompactState
+
+
+class _PlayerProjection:
+    """1人のプレイヤーの射影の部品です。前回射影したゾーンを控えておき、変化したゾーンだけを作り直します。"""
+    __slots__ = ('hand', 'deck', 'discard', 'hand_cards', 'composition', 'discard_cards')
+
+    def __init__(self) -> None:
+        self.hand: Optional[List[int]] = None
+        self.deck: Optional[List[int]] = None
+        self.discard: Optional[List[int]] = None
+        self.hand_cards: List[Dict[str, str]] = []
+        self.composition: Dict[str, int] = {}
+        self.discard_cards: List[Dict[str, str]] = []
+
+    def refresh(self, player: CompactPlayer, cards: CardTable) -> None:
+        # 以前のバージョンのビューが部品を参照しているため、部品は書き換えずに新しく作ります。
+        to_dict = cards.to_dict
+        if player.hand != self.hand:
+            self.hand = player.hand[:]
+            self.hand_cards = [to_dict(i) for i in player.hand]
+
+        # 捨て札は通常は末尾に追加されるだけなので、増えた分だけを変換します。
+        old = self.discard
+        if player.discard != old:
+            if old is not None and len(player.discard) > len(old) and player.discard[:len(old)] == old:
+                self.discard_cards = self.discard_cards + [to_dict(i) for i in player.discard[len(old):]]
+            else:
+                self.discard_cards = [to_dict(i) for i in player.discard]
+            self.discard = player.discard[:]
+
+        # 山札は先頭から引かれるだけなので、引かれた分だけ構成から減らします。
+        # 捨て札を戻してシャッフルした場合は数え直します。
+        old = self.deck
+        if player.deck != old:
+            drawn = len(old) - len(player.deck) if old is not None else -1
+            if drawn > 0 and old[drawn:] == player.deck:
+                composition = dict(self.composition)
+                for i in old[:drawn]:
+                    tid = cards.template_ids[i]
+                    composition[tid] -= 1
+                    if not composition[tid]:
+                        del composition[tid]
+            else:
+                counts: Dict[str, int] = {}
+                for i in player.deck:
+                    tid = cards.template_ids[i]
+                    counts[tid] = counts.get(tid, 0) + 1
+                composition = {tid: counts[tid] for tid in sorted(counts)}
+            self.composition = composition
+            self.deck = player.deck[:]
+
+    def public(self, player: CompactPlayer) -> Dict[str, Any]:
+        # 相手から見える部分です。
+        return {
+            'playerId': player.player_id,
+            'funds': player.funds,
+            'properties': player.properties,
+            'handCount': len(player.hand),
+            'deckCount': len(player.deck),
+            'discard': self.discard_cards,
+        }
+
+    def private(self, player: CompactPlayer) -> Dict[str, Any]:
+        # 本人から見える部分です。
+        view = self.public(player)
+        view['hand'] = self.hand_cards
+        view['deckComposition'] = self.composition
+        return view
+
+
+class ViewCache:
+    """
+    試合のプレイヤーごとのビューを、状態のバージョンごとにキャッシュします。
+    ビューの辞書と、エンコード済みのボディ（メディアタイプごと）は、バージョンが進むまで共有されます。
+    """
+    __slots__ = ('version', '_core', '_projections', '_public', '_views', '_encoded', 'hits', 'misses')
+
+    def __init__(self) -> None:
+        self.version = -1
+        self._core: Optional[CompactState] = None
+        self._projections: List[_PlayerProjection] = []
+        self._public: Optional[List[Dict[str, Any]]] = None # 現在のバージョンの公開部分（両者のビューで共有）
+        self._views: Dict[int, Dict[str, Any]] = {}
+        self._encoded: Dict[Tuple[int, str], bytes] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _sync(self, core: CompactState) -> None:
+        # バージョンが進んだ（または状態が置き換えられた）場合はキャッシュを破棄します。
+        if core.version == self.version and core is self._core:
+            return
+        if core is not self._core:
+            self._projections = [_PlayerProjection() for _ in core.players]
+        self.version = core.version
+        self._core = core
+        self._public = None
+        self._views = {}
+        self._encoded = {}
+
+    def view(self, core: CompactState, viewer: int) -> Dict[str, Any]:
+        """core.players[viewer] から見たビューを返します。返した辞書は共有されるため、変更しないでください。"""
+        self._sync(core)
+        view = self._views.get(viewer)
+        if view is not None:
+            self.hits += 1
+            return view
+        self.misses += 1
+        if self._public is None:
+            for projection, player in zip(self._projections, core.players):
+                projection.refresh(player, core.cards)
+            self._public = [projection.public(player) for projection, player in zip(self._projections, core.players)]
+        players = list(self._public)
+        players[viewer] = self._projections[viewer].private(core.players[viewer])
+        view = self._views[viewer] = {
+            'matchId': core.match_id,
+            'version': core.version,
+            'viewerId': core.players[viewer].player_id,
+            'turn': core.turn,
+            'phase': PHASES[core.phase],
+            'players': players,
+            'lastActions': [{'playerId': pid, 'cardTemplateId': tid} for pid, tid in core.last_actions],
+            'log': core.log.window(),
+            'logCursor': core.log.window_start,
+        }
+        return view
+
+    def encoded(self, core: CompactState, viewer: int, media_type: str, dumps: Callable[[Any], bytes]) -> bytes:
+        """ビューを dumps でエンコードしたボディを返します。同じバージョン・メディアタイプでは同じバイト列を返します。"""
+        self._sync(core)
+        key = (viewer, media_type)
+        body = self._encoded.get(key)
+        if body is None:
+            body = self._encoded[key] = dumps(self.view(core, viewer))
+        else:
+            self.hits += 1
+        return body
+
+
+def _pointer(key: Any) -> str:
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def view_patch(old: Any, new: Any, path: str = '') -> List[PatchOp]:
+    """
+    ビュー old から new への JSON Patch を返します。変化していない部分はビューの間で同じオブジェクトを共有するため、
+    同一性を先に比べます。リストは末尾への追加だけなら add、それ以外は丸ごと replace にします。
+    """
+    ops: List[PatchOp] = []
+    _diff(old, new, path, ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: List[PatchOp]) -> None:
+    if old is new or old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            child = f'{path}/{_pointer(key)}'
+            if key in old:
+                _diff(old[key], value, child, ops)
+            else:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+        for key in old.keys() - new.keys():
+            ops.append({'op': 'remove', 'path': f'{path}/{_pointer(key)}'})
+    elif isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[:len(old)] == old:
+        ops.extend({'op': 'add', 'path': f'{path}/-', 'value': value} for value in new[len(old):])
+    else:
+        ops.append({'op': 'replace', 'path': path, 'value': new})
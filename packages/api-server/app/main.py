@@ -1,9 +1,27 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+from typing import Optional
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 
 # 作成した deck_endpoints と既存の game_endpoints をインポート
-from .api import game_endpoints, deck_endpoints
-# Firebase Admin SDKはdatabaseモジュールのインポート時に自動的に初期化されます
+from .api import game_endpoints, deck_endpoints, sim_endpoints
+from .api import matchmaking_endpoints
+from .api.match_channel import MatchChannelError, match_hub
+from .api.matchmaking import matchmaking
+from .game.equilibrium import DEFAULT_FLUSH_INTERVAL, close_solvers, flush_solvers
+from .game.templates import card_template_registry
+from .game.match_registry import match_registry
+from .game.simulation import simulation_pool
+from .db.deck_store import deck_store
+from .db.match_store import match_writer
+from .metrics import MetricsMiddleware, metrics
+from .profiler import profiler
+# Firebase Admin SDKは、Firebaseのバックエンドが最初にデータベースへアクセスしたときに初期化されます（app/db/database.py）
 
 app = FastAPI(
     title="Landgrab Game API",
@@ -25,9 +43,112 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# リクエストごとのレイテンシ・ボディの大きさ・処理中の件数を記録します（GET /metrics で公開します）。
+# PROFILE_SLOW_REQUEST_MS を設定すると、遅いリクエストのスタックも書き出します（app/profiler.py を参照）。
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+metrics.gauge('matchmaking_queued', 'Tickets waiting in the matchmaking queue.',
+              function=lambda: matchmaking.queued)
+metrics.gauge('matchmaking_active_matches', 'Matches run by the match scheduler.',
+              function=lambda: len(matchmaking.scheduler))
+
 # APIルーターを登録
 app.include_router(game_endpoints.router, prefix="/api/v1/game", tags=["Game Logic"])
 app.include_router(deck_endpoints.router, prefix="/api/v1", tags=["Decks"]) # deck_endpoints を登録
+app.include_router(sim_endpoints.router, prefix="/api/v1/sim", tags=["Simulation"])
+app.include_router(matchmaking_endpoints.router, prefix="/api/v1/matchmaking", tags=["Matchmaking"])
+
+# 起動時にカードテンプレートを読み込みます（以降はファイルの変更時にのみ読み込み直します）。
+@app.on_event("startup")
+async def load_card_templates():
+    card_template_registry.current
+
+# 試合の状態の永続化が有効な場合は、一定間隔で書き込むタスクを開始します。
+# 他のプロセスが先に書き込んでいた試合は、このプロセスの古いエンジンをレジストリから取り除きます。
+@app.on_event("startup")
+async def start_match_writer():
+    if match_writer is not None:
+        match_writer.on_conflict = match_registry.remove
+        match_writer.start()
+
+# マッチメイキングと試合のスケジューラーを開始します。終了時には、WebSocket のハブの期限切れの解決も止めます。
+@app.on_event("startup")
+async def start_matchmaking():
+    matchmaking.start()
+
+@app.on_event("shutdown")
+async def stop_matchmaking():
+    await matchmaking.stop()
+    await match_hub.close()
+
+# 終了時にデッキストアのスレッドプールを停止します。
+@app.on_event("shutdown")
+async def shutdown_deck_store():
+    deck_store.shutdown()
+
+# 均衡のソルバーの未保存の解を一定間隔で保存先に書き込み、終了時には全て書き込んで閉じます。
+_solver_flusher: Optional[asyncio.Task] = None
+
+async def _flush_solvers_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(flush_solvers)
+
+@app.on_event("startup")
+async def start_solver_flusher():
+    global _solver_flusher
+    interval = float(os.getenv("EQUILIBRIUM_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+    if interval > 0:
+        _solver_flusher = asyncio.create_task(_flush_solvers_periodically(interval))
+
+@app.on_event("shutdown")
+async def close_equilibrium_solvers():
+    if _solver_flusher is not None:
+        _solver_flusher.cancel()
+    await run_in_threadpool(close_solvers)
+
+# 終了時にシミュレーションで共有するプロセスプールを停止します。
+@app.on_event("shutdown")
+async def shutdown_simulation_pool():
+    simulation_pool.shutdown()
+
+# 終了時に未書き込みの試合の状態をすべて書き込みます。
+@app.on_event("shutdown")
+async def flush_match_writer():
+    if match_writer is not None:
+        await match_writer.close()
+
+# 試合のリアルタイム通信用の WebSocket です。接続時に ?playerId= で自分のプレイヤーIDを、?token= でそのプレイヤーの
+# トークン（試合の作成時やマッチメイキングで受け取ったもの）を指定します。
+# クライアントは {"type": "action", "cardId": "..."}（cardId が null ならパス）を送り、
+# サーバーはターンを解決するたびに各プレイヤーへ {"type": "update", ...}（自分から見たビューの差分またはビュー全体）を送ります。
+@app.websocket("/ws/match/{match_id}")
+async def match_socket(websocket: WebSocket, match_id: str, playerId: str, token: Optional[str] = None):
+    await websocket.accept()
+    send = websocket.send_json
+    try:
+        index = await match_hub.join(match_id, playerId, send, token)
+    except MatchChannelError as e:
+        await websocket.close(code=e.code, reason=e.reason)
+        return
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict) or message.get('type') != 'action':
+                await send({'type': 'error', 'detail': "Expected a message of type 'action'"})
+                continue
+            await match_hub.submit(match_id, index, message.get('cardId'))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        match_hub.leave(match_id, index, send)
+
+# Prometheus のテキスト形式でメトリクスを返します。
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def read_root():
@@ -0,0 +1,292 @@
+# packages/api-server/app/metrics.py
+# Prometheus のテキスト形式（/metrics）で公開するメトリクスです。
+# 外部ライブラリを使わず、カウンター・ゲージ・ヒストグラムと、エンジンのフェーズごとの時間の合計だけを実装します。
+# HTTP のメトリクスは ASGI のミドルウェアで記録し、ルートのラベルにはパスではなくルートの定義（/matches/{match_id} など）を
+# 使うため、試合IDなどでラベルの種類が増え続けることはありません。
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# レイテンシ（秒）とペイロードの大きさ（バイト）のヒストグラムの既定のバケットです。
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# ルートに一致しなかったリクエストのラベルです。
+UNMATCHED_ROUTE = 'unmatched'
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}' for key, v in items]
+
+
+class Gauge(_Metric):
+    """値を set / inc / dec で変更するゲージです。function を渡すと、出力のたびに呼び出した値を使います。"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f'{self.name} {_format_value(self._function())}']
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}' for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # ラベルごとの [バケットごとの件数..., +Inf の件数, 合計] です。
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, **labels: str) -> int:
+        row = self._values.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, row[:]) for key, row in self._values.items()]
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), row):
+                cumulative += n
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(row[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class PhaseTimers(_Metric):
+    """
+    エンジンのフェーズごとの処理時間の合計と回数です（Prometheus の summary の _sum と _count）。
+    ターンごとに何度も呼ばれるため、ロックやバケットの探索を行わず、配列の要素に加算するだけにしています。
+    """
+    kind = 'summary'
+
+    def __init__(self, name: str, documentation: str, phases: Sequence[str]):
+        super().__init__(name, documentation, ('phase',))
+        self.phases = tuple(phases)
+        self.counts = [0] * len(phases)
+        self.sums = [0.0] * len(phases)
+
+    def add(self, phase: int, seconds: float) -> None:
+        self.counts[phase] += 1
+        self.sums[phase] += seconds
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for phase, count, total in zip(self.phases, self.counts, self.sums):
+            labels = _format_labels(self.labelnames, (phase,))
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（version 0.0.4）で全てのメトリクスを出力します。"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# アプリケーション全体で共有するレジストリです。
+metrics = MetricsRegistry()
+
+# エンジンのフェーズです（PhaseTimers のインデックス）。
+ENGINE_PHASES = ('draw', 'resolve', 'effects', 'win_check', 'state_copy')
+PHASE_TIMER_DRAW, PHASE_TIMER_RESOLVE, PHASE_TIMER_EFFECTS, PHASE_TIMER_WIN_CHECK, PHASE_TIMER_STATE_COPY = \
+    range(len(ENGINE_PHASES))
+engine_phases: PhaseTimers = metrics.register(PhaseTimers(
+    'engine_phase_seconds', 'Time spent in GameEngine phases.', ENGINE_PHASES))
+games_finished = metrics.counter('engine_games_finished_total', 'Matches that reached GAME_OVER.', ('result',))
+
+http_requests = metrics.counter('http_requests_total', 'HTTP requests.', ('method', 'route', 'status'))
+http_latency = metrics.histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+http_request_size = metrics.histogram('http_request_size_bytes', 'HTTP request body size.', ('method', 'route'),
+                                      SIZE_BUCKETS)
+http_response_size = metrics.histogram('http_response_size_bytes', 'HTTP response body size.', ('method', 'route'),
+                                       SIZE_BUCKETS)
+http_in_flight = metrics.gauge('http_requests_in_flight', 'HTTP requests being processed.', ('method',))
+
+
+def route_template(scope) -> str:
+    """
+    リクエストが一致したルートの定義（プレフィックスを含む）を返します。
+    include_router したルートの path がプレフィックスを含まないバージョンの FastAPI もあるため、
+    実際のパスのうちルートの正規表現に一致しない先頭部分をプレフィックスとして補います。
+    """
+    route = scope.get('route')
+    template = getattr(route, 'path', None)
+    if not template:
+        return UNMATCHED_ROUTE
+    path = scope.get('path', '')
+    regex = getattr(route, 'path_regex', None)
+    if regex is None or regex.match(path):
+        return template
+    for index, char in enumerate(path):
+        if char == '/' and index and regex.match(path[index:]):
+            return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    HTTP リクエストのレイテンシ・ボディの大きさ・処理中の件数を記録する ASGI ミドルウェアです。
+    profiler を渡すと、処理中のリクエストのスタックを採取し、遅いリクエストのスタックをファイルに書き出します。
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        sizes = [0, 0] # リクエストとレスポンスのボディのバイト数
+        status = [500]
+
+        async def counting_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                sizes[0] += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            elif message['type'] == 'http.response.body':
+                sizes[1] += len(message.get('body', b''))
+            await send(message)
+
+        http_in_flight.inc(method=method)
+        token = self.profiler.begin() if self.profiler is not None else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec(method=method)
+            # ルーティングの後は scope['route'] に一致したルートが入っています。
+            route = route_template(scope)
+            http_requests.inc(method=method, route=route, status=str(status[0]))
+            http_latency.observe(elapsed, method=method, route=route)
+            http_request_size.observe(sizes[0], method=method, route=route)
+            http_response_size.observe(sizes[1], method=method, route=route)
+            if token is not None:
+                self.profiler.end(token, elapsed, f'{method} {route}')
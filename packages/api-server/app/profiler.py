@@ -0,0 +1,105 @@
+# packages/api-server/app/profiler.py
+# 遅いリクエストのスタックを採取するサンプリングプロファイラーです（既定では無効）。
+#
+#   PROFILE_SLOW_REQUEST_MS=200 uvicorn app.main:app   # 200ms 以上かかったリクエストのスタックを書き出します
+#
+# 処理中のリクエストがある間だけ、別スレッドで一定間隔ごとに全スレッドのスタック（sys._current_frames）を採取し、
+# リクエストの完了時に閾値以上かかっていれば、flamegraph.pl や speedscope で読める collapsed 形式
+# （"関数;関数;... 回数" の行）で PROFILE_DIR に書き出します。
+# イベントループとスレッドプールのスタックを区別せずに数えるため、同時に処理中のリクエストがあれば
+# それらのスタックも含まれます。
+import collections
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Counter, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_PROFILE_DIR = 'profiles'
+
+
+def _fold(frame) -> str:
+    """フレームから呼び出し元を先頭にした collapsed 形式のスタックを作成します。"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, slow_threshold_ms: float, output_dir: str = DEFAULT_PROFILE_DIR,
+                 interval_ms: float = DEFAULT_INTERVAL_MS):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        # 処理中のリクエストごとの、スタックごとの採取回数です。
+        self._active: Dict[int, Counter[str]] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional['SamplingProfiler']:
+        """PROFILE_SLOW_REQUEST_MS が設定されている場合だけプロファイラーを作成します。"""
+        threshold = os.environ.get('PROFILE_SLOW_REQUEST_MS')
+        if not threshold:
+            return None
+        return cls(float(threshold), os.environ.get('PROFILE_DIR', DEFAULT_PROFILE_DIR),
+                   float(os.environ.get('PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)))
+
+    def begin(self) -> int:
+        """リクエストの採取を開始し、end に渡すトークンを返します。"""
+        with self._lock:
+            self._next_token += 1
+            token = self._next_token
+            self._active[token] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return token
+
+    def end(self, token: int, elapsed: float, label: str) -> Optional[str]:
+        """採取を終了し、elapsed（秒）が閾値以上であればスタックを書き出してそのパスを返します。"""
+        with self._lock:
+            stacks = self._active.pop(token)
+        if elapsed < self.slow_threshold or not stacks:
+            return None
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_')
+        path = os.path.join(self.output_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{token}-{name}.folded')
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        except OSError:
+            logger.exception("Failed to write profile %s", path)
+            return None
+        logger.warning("Slow request %s took %.0f ms; stacks written to %s", label, elapsed * 1000, path)
+        return path
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            # 処理中のリクエストが無い間は採取せずに待機します。
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            stacks = [_fold(frame) for ident, frame in sys._current_frames().items() if ident != me]
+            with self._lock:
+                for counter in self._active.values():
+                    counter.update(stacks)
+            time.sleep(self.interval)
+
+
+# アプリケーションで使用するプロファイラーです（無効な場合は None）。
+profiler = SamplingProfiler.from_env()
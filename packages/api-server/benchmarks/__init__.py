@@ -0,0 +1,3 @@
+# packages/api-server/benchmarks/__init__.py
+# エンジン・シリアライズ・API の性能を計測するベンチマークスイートです。
+# 実行方法は benchmarks/runner.py を参照してください（python -m benchmarks）。
@@ -0,0 +1,6 @@
+# packages/api-server/benchmarks/__main__.py
+import sys
+
+from benchmarks.runner import main
+
+sys.exit(main())
@@ -0,0 +1,302 @@
+# packages/api-server/benchmarks/cases.py
+# ベンチマークのケースの定義です。各ケースは準備を行い、計測対象の1回分の処理を行う関数を返します。
+# 状態は固定したシードから作成し、実際の長い試合に近い大きさ（長いログ、大きなデッキ）にそろえます。
+# micro は1つの操作、macro は API の往復や試合全体などの複数の処理をまとめたものです。
+import asyncio
+import itertools
+import json
+import random
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import Action, GameState
+
+# 状態の大きさです。
+LOG_LINES = 2000
+DECK_COPIES = 20 # テンプレートごとの枚数（4種で80枚）
+SEED = 20240601
+
+# 任意の依存関係が無いケースは、setup が None を返して実行を省略します。
+Setup = Callable[[], Optional[Callable[[], object]]]
+
+
+class Case(NamedTuple):
+    name: str
+    kind: str # 'micro' または 'macro'
+    setup: Setup
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str, kind: str = 'micro') -> Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        CASES[name] = Case(name, kind, setup)
+        return setup
+    return register
+
+
+def large_deck() -> Dict[str, int]:
+    return {tid: DECK_COPIES for tid in BASE_CARD_TEMPLATES}
+
+
+def large_state(seed: int = SEED) -> GameState:
+    """山札の大きいデッキで、LOG_LINES 行のログが残るまで進めたアクションフェーズの状態です。"""
+    rng = random.Random(seed)
+    initial = GameEngine.create_initial_state('player1', 'player2', BASE_CARD_TEMPLATES, large_deck(), large_deck(),
+                                              rng=rng)
+    # 決着しないよう不動産を多くしておきます。
+    for player in initial.players:
+        player.properties = 1000
+    engine = GameEngine(initial, BASE_CARD_TEMPLATES, rng=rng, record_changes=False, record_journal=False)
+    core = engine.core
+    while len(core.log) < LOG_LINES:
+        engine.start_turn()
+        engine.play(*((p, rng.choice(p.hand)) for p in core.players))
+    engine.start_turn()
+    return engine.get_state()
+
+
+def _first_actions(state: GameState) -> List[Action]:
+    return [Action(playerId=p.playerId, cardId=p.hand[0].id) for p in state.players]
+
+
+# --- micro ---
+
+@case('engine.create_initial_state')
+def bench_create_initial_state():
+    deck = large_deck()
+    rng = random.Random(SEED)
+    return lambda: GameEngine.create_initial_state('player1', 'player2', BASE_CARD_TEMPLATES, deck, deck, rng=rng)
+
+
+@case('engine.apply_action')
+def bench_apply_action():
+    # 毎回同じ状態に戻してから解決します（戻す処理は CompactState.clone で、engine.clone_state として別に計測します）。
+    state = large_state()
+    engine = GameEngine(state, BASE_CARD_TEMPLATES, seed=SEED)
+    snapshot = engine.core.clone()
+    actions = _first_actions(state)
+
+    def run():
+        engine.core = snapshot.clone()
+        return engine.apply_action(*actions)
+    return run
+
+
+@case('engine.advance_turn')
+def bench_advance_turn():
+    state = large_state()
+    engine = GameEngine(state, BASE_CARD_TEMPLATES, seed=SEED)
+    engine.play_actions(*_first_actions(state))
+    snapshot = engine.core.clone()
+
+    def run():
+        engine.core = snapshot.clone()
+        return engine.advance_turn()
+    return run
+
+
+@case('engine.clone_state')
+def bench_clone_state():
+    snapshot = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED).core
+    return snapshot.clone
+
+
+@case('engine.get_state')
+def bench_get_state():
+    engine = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED)
+    return engine.get_state
+
+
+@case('models.validate_apply_action_request')
+def bench_validate_request():
+    from app.api.game_endpoints import ApplyActionRequest
+
+    state = large_state()
+    payload = ApplyActionRequest(game_state=state, action=_first_actions(state)[0]).model_dump_json()
+    return lambda: ApplyActionRequest.model_validate_json(payload)
+
+
+@case('models.dump_game_state')
+def bench_dump_state():
+    state = large_state()
+    return state.model_dump_json
+
+
+# 状態を返す応答のエンコードです。default は FastAPI の既定の経路（GameState を組み立て、応答モデルで
+# シリアライズして json.dumps）で、orjson / msgpack は codecs.py で内部状態から直接エンコードします。
+@case('codecs.state_default')
+def bench_state_default():
+    engine = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED)
+    return lambda: json.dumps(engine.get_state().model_dump(mode='json'), ensure_ascii=False).encode('utf-8')
+
+
+@case('codecs.state_orjson')
+def bench_state_orjson():
+    from app.api.codecs import json_codec
+
+    core = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED).core
+    return lambda: json_codec.dumps(core)
+
+
+@case('codecs.state_msgpack')
+def bench_state_msgpack():
+    from app.api.codecs import msgpack_codec
+
+    if msgpack_codec is None:
+        return None
+    core = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED).core
+    return lambda: msgpack_codec.dumps(core)
+
+
+@case('codecs.request_msgpack')
+def bench_request_msgpack():
+    # models.validate_apply_action_request の MessagePack 版です（読み込み後の検証を含みます）。
+    from app.api.codecs import msgpack_codec
+    from app.api.game_endpoints import ApplyActionRequest
+
+    if msgpack_codec is None:
+        return None
+    state = large_state()
+    payload = msgpack_codec.dumps({'game_state': state, 'action': _first_actions(state)[0]})
+    return lambda: ApplyActionRequest.model_validate(msgpack_codec.loads(payload))
+
+
+# プレイヤーごとのビュー（views.py）のエンコードです。fresh はバージョンが変わった直後に射影から作る場合、
+# cached は同じバージョンを見ている2つ目以降の接続が、エンコード済みのボディを共有する場合です。
+@case('views.encode_fresh')
+def bench_view_fresh():
+    from app.api.codecs import json_codec
+    from app.game.views import ViewCache
+
+    core = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED).core
+    return lambda: ViewCache().encoded(core, 0, json_codec.media_type, json_codec.dumps)
+
+
+@case('views.encode_cached')
+def bench_view_cached():
+    from app.api.codecs import json_codec
+
+    engine = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED)
+    return lambda: engine.encoded_view(0, json_codec.media_type, json_codec.dumps)
+
+
+# --- macro ---
+
+@case('api.apply_action', kind='macro')
+def bench_api_apply_action():
+    # FastAPI のアプリ全体（ルーティング・検証・シリアライズ）を通した1リクエストです。
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    state = large_state()
+    body = {'game_state': state.model_dump(), 'action': _first_actions(state)[0].model_dump()}
+
+    def run():
+        response = client.post('/api/v1/game/game/apply_action', json=body)
+        response.raise_for_status()
+        return response
+    return run
+
+
+@case('api.match_turn', kind='macro')
+def bench_api_match_turn():
+    # matchId で参照する試合の1ターン分（ターンの開始とアクションの送信）を、差分の取得を含めて行います。
+    # 試合が終わらないよう、両者ともパスします。デッキは API が受け付ける規定の枚数（DECK_SIZE）です。
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    from app.game.decks import DECK_SIZE, MAX_COPIES
+    from app.game.templates import card_template_registry
+
+    client = TestClient(app)
+    deck, remaining = {}, DECK_SIZE
+    for tid in card_template_registry.current:
+        deck[tid] = min(MAX_COPIES, remaining)
+        remaining -= deck[tid]
+    match = client.post('/api/v1/game/matches', json={
+        'player1Id': 'p1', 'player2Id': 'p2', 'player1Deck': deck, 'player2Deck': deck, 'seed': SEED}).json()
+    match_id, version = match['matchId'], match['version']
+    client.headers['X-Match-Token'] = match['hostToken']
+
+    def run():
+        nonlocal version
+        update = client.post(f'/api/v1/game/matches/{match_id}/advance', params={'sinceVersion': version}).json()
+        update = client.post(f'/api/v1/game/matches/{match_id}/actions', params={'sinceVersion': update['version']},
+                             json={}).json()
+        version = update['version']
+        return update
+    return run
+
+
+def _get_large_match(accept: str):
+    # 長い試合の状態を matchId で取得する1リクエストです（Accept で応答の形式を選びます）。
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.api.match_tokens import match_tokens
+    from app.game.match_registry import match_registry
+
+    client = TestClient(app)
+    engine = GameEngine(large_state(), BASE_CARD_TEMPLATES, seed=SEED)
+    match_registry.put(engine.core.match_id, engine)
+    host_token, _ = match_tokens.issue(engine.core.match_id)
+    url = f'/api/v1/game/matches/{engine.core.match_id}'
+    headers = {'accept': accept, 'X-Match-Token': host_token}
+
+    def run():
+        response = client.get(url, headers=headers)
+        response.raise_for_status()
+        return response
+    return run
+
+
+@case('api.get_match_json', kind='macro')
+def bench_api_get_match_json():
+    return _get_large_match('application/json')
+
+
+@case('api.get_match_msgpack', kind='macro')
+def bench_api_get_match_msgpack():
+    from app.api.codecs import msgpack_codec
+
+    # msgpack が無い場合は JSON で応答されるため、計測しません。
+    if msgpack_codec is None:
+        return None
+    return _get_large_match('application/msgpack')
+
+
+@case('simulation.run_match', kind='macro')
+def bench_run_match():
+    from app.game.simulation import run_match
+
+    # 同じ50個のシードを順に繰り返し、計測ごとに同じ試合の集合になるようにします。
+    seeds = itertools.cycle(range(SEED, SEED + 50))
+    deck = {'GAIN_FUNDS': 4, 'ACQUIRE': 2, 'DEFEND': 2, 'FRAUD': 2}
+    return lambda: run_match(deck, deck, 'weighted', 'random', next(seeds))
+
+
+@case('matchmaking.pair_2000', kind='macro')
+def bench_matchmaking():
+    from app.api.matchmaking import _benchmark
+
+    return lambda: asyncio.run(_benchmark(2000, SEED, 100))
+
+
+@case('startup.import_app_main', kind='macro')
+def bench_import_app_main():
+    # 新しいインタプリタで app.main をインポートする時間です（インタプリタ自体の起動を含みます）。
+    # コールドスタートの時間の目安で、Firebase などの重いモジュールをインポート時に読み込むと遅くなります。
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    command = [sys.executable, '-c', 'import app.main']
+
+    def run():
+        return subprocess.run(command, cwd=root, env=env, check=True)
+    return run
@@ -0,0 +1,172 @@
+# packages/api-server/benchmarks/runner.py
+# ベンチマークを実行し、結果を履歴（JSON Lines）に追記して、基準（baseline）と比較します。
+#
+#   python -m benchmarks                      # 全ケースを実行して履歴に追記し、基準があれば比較します
+#   python -m benchmarks --filter engine.     # 名前に engine. を含むケースだけを実行します
+#   python -m benchmarks --save-baseline      # 今回の結果を基準として保存します
+#   python -m benchmarks --fail-on-regression # 基準より threshold 以上遅いケースがあれば終了コード 1 にします
+#
+# 各ケースは1回の計測が min_time 秒以上になるように繰り返し回数（loops）を決め、repeat 回計測した
+# 1回あたりの時間の中央値・最小値・p95 を記録します。比較には外れ値の影響を受けにくい中央値を使います。
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.cases import CASES
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+DEFAULT_REPEAT = 7
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_THRESHOLD = 0.2 # 基準の中央値より 20% 以上遅ければ回帰とみなします
+
+Result = Dict[str, float]
+
+
+def measure(fn: Callable[[], object], repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME) -> Result:
+    """fn の1回あたりの時間（マイクロ秒）を計測します。計測中は GC を止め、ばらつきを抑えます。"""
+    fn() # ウォームアップ（遅延インポートやキャッシュの作成を計測に含めないため）
+    loops = 1
+    while True:
+        elapsed = _timed(fn, loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed * 1.2) + 1))
+    samples = sorted(_timed(fn, loops) / loops * 1e6 for _ in range(repeat))
+    return {
+        'medianUs': statistics.median(samples),
+        'minUs': samples[0],
+        'p95Us': samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def _timed(fn: Callable[[], object], loops: int) -> float:
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - started
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def run(names: List[str], repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME,
+        log: Callable[[str], None] = print) -> Dict[str, Result]:
+    results = {}
+    for name in names:
+        fn = CASES[name].setup()
+        if fn is None:
+            log(f"{name:<40} {'skipped':>12}")
+            continue
+        results[name] = measure(fn, repeat, min_time)
+        log(f"{name:<40} {results[name]['medianUs']:>12.1f} us")
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5, cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def record(results: Dict[str, Result]) -> Dict[str, object]:
+    """実行環境の情報を付けた1回分の記録を作成します。"""
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def append_history(path: str, entry: Dict[str, object]) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def load_history(path: str) -> List[Dict[str, object]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, object]]:
+    """
+    基準にもあるケースについて、中央値の比（今回 / 基準）を返します。
+    status は比が 1 + threshold を超えれば 'slower'、1 / (1 + threshold) 未満なら 'faster'、それ以外は 'same' です。
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['medianUs'] / base['medianUs'] if base['medianUs'] > 0 else float('inf')
+        status = 'slower' if ratio > 1 + threshold else 'faster' if ratio < 1 / (1 + threshold) else 'same'
+        rows.append({'name': name, 'baselineUs': base['medianUs'], 'currentUs': result['medianUs'],
+                     'ratio': ratio, 'status': status})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the api-server benchmark suite.")
+    parser.add_argument('--filter', default='', help="Run only cases whose name contains this string")
+    parser.add_argument('--kind', choices=['micro', 'macro'], default=None)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument('--quick', action='store_true', help="repeat=3, min-time=0.05 (for smoke runs)")
+    parser.add_argument('--history', default=os.path.join(DEFAULT_RESULTS_DIR, 'history.jsonl'))
+    parser.add_argument('--baseline', default=os.path.join(DEFAULT_RESULTS_DIR, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--list', action='store_true', help="List cases and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name, c in CASES.items()
+             if args.filter in name and (args.kind is None or c.kind == args.kind)]
+    if args.list:
+        for name in names:
+            print(f"{CASES[name].kind:<6} {name}")
+        return 0
+    repeat, min_time = (3, 0.05) if args.quick else (args.repeat, args.min_time)
+    results = run(names, repeat, min_time)
+    entry = record(results)
+    append_history(args.history, entry)
+
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with baseline {baseline.get('commit')} ({baseline.get('timestamp')}):")
+        for row in compare(results, baseline['results'], args.threshold):
+            print(f"{row['name']:<40} {row['baselineUs']:>12.1f} -> {row['currentUs']:>12.1f} us "
+                  f"x{row['ratio']:.2f} {row['status']}")
+            if row['status'] == 'slower' and args.fail_on_regression:
+                status = 1
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
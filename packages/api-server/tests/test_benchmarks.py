@@ -0,0 +1,22 @@
+# packages/api-server/tests/test_benchmarks.py
+
+from benchmarks.runner import compare, load_history, main, measure
+
+# 中央値の比で、基準より遅い・速い・変わらないを判定することをテストします。
+def test_compare_flags_regressions():
+    baseline = {'a': {'medianUs': 100.0}, 'b': {'medianUs': 100.0}, 'c': {'medianUs': 100.0}}
+    results = {'a': {'medianUs': 130.0}, 'b': {'medianUs': 70.0}, 'c': {'medianUs': 105.0}, 'new': {'medianUs': 1.0}}
+    rows = {row['name']: row['status'] for row in compare(results, baseline, threshold=0.2)}
+    assert rows == {'a': 'slower', 'b': 'faster', 'c': 'same'}
+
+# 実行結果が履歴に追記され、保存した基準と比較できることをテストします。
+def test_main_appends_history_and_saves_baseline(tmp_path):
+    history = str(tmp_path / 'history.jsonl')
+    baseline = str(tmp_path / 'baseline.json')
+    args = ['--filter', 'engine.clone_state', '--quick', '--history', history, '--baseline', baseline]
+    assert main(args + ['--save-baseline']) == 0
+    assert main(args) == 0
+    entries = load_history(history)
+    assert len(entries) == 2
+    assert set(entries[0]['results']) == {'engine.clone_state'}
+    assert measure(lambda: None, repeat=3, min_time=0.001)['loops'] >= 1
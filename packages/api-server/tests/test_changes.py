@@ -0,0 +1,82 @@
+# packages/api-server/tests/test_changes.py
+
+import random
+
+import pytest
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.event_log import LOG_WINDOW
+from app.game.models import Action
+
+# テスト用の最小限の JSON Patch (RFC 6902) 適用関数です。
+def apply_patch(document, ops):
+    for op in ops:
+        *parents, last = op['path'].lstrip('/').split('/')
+        target = document
+        for key in parents:
+            target = target[int(key)] if isinstance(target, list) else target[key]
+        if isinstance(target, list):
+            if op['op'] == 'add':
+                target.append(op['value']) if last == '-' else target.insert(int(last), op['value'])
+            elif op['op'] == 'remove':
+                del target[int(last)]
+            else:
+                target[int(last)] = op['value']
+        elif op['op'] == 'remove':
+            del target[last]
+        else:
+            target[last] = op['value']
+    return document
+
+@pytest.fixture
+def engine():
+    rng = random.Random(3)
+    deck = {'GAIN_FUNDS': 2, 'ACQUIRE': 1, 'DEFEND': 1, 'FRAUD': 1}
+    state = GameEngine.create_initial_state('player1-id', 'player2-id', BASE_CARD_TEMPLATES, deck, deck, rng=rng)
+    return GameEngine(state, BASE_CARD_TEMPLATES, rng=rng)
+
+# 記録された変更セットを古い状態に適用すると、現在の状態と一致することをテストします（山札の再シャッフルを含む）。
+def test_patches_reproduce_engine_state(engine):
+    client_state = engine.get_state().model_dump()
+    client_version = engine.version
+    for turn in range(8):
+        engine.advance_turn()
+        state = engine.get_state()
+        actions = [Action(playerId=p.playerId, cardId=p.hand[turn % len(p.hand)].id) if p.hand else None
+                   for p in state.players]
+        engine.apply_action(*actions)
+
+        patch = engine.changes_since(client_version)
+        assert patch is not None
+        client_state = apply_patch(client_state, patch)
+        client_version = engine.version
+        assert client_state == engine.get_state().model_dump()
+        if engine.get_state().phase == 'GAME_OVER':
+            break
+
+# 履歴に無いバージョンや未来のバージョンを指定すると None（スナップショットへのフォールバック）になることをテストします。
+def test_unknown_versions_fall_back_to_snapshot(engine):
+    for _ in range(40):
+        engine.advance_turn()
+        engine.apply_action(None, None)
+    assert engine.changes_since(engine.version) == []
+    assert engine.changes_since(engine.version + 1) is None
+    assert engine.changes_since(0) is None
+    assert engine.changes_since(engine.version - 2) is not None
+
+# ログが GameState.log に載る行数（LOG_WINDOW）を超えても、変更セットを適用すると現在の状態と一致することをテストします。
+def test_patches_track_log_window(engine):
+    for player in engine.core.players:
+        player.properties = 1000 # 決着しないようにします
+    for _ in range(LOG_WINDOW - 4):
+        engine.advance_turn()
+        engine.apply_action(None, None)
+    client_state = engine.get_state().model_dump()
+    client_version = engine.version
+    for _ in range(6):
+        engine.advance_turn()
+        engine.apply_action(None, None)
+        client_state = apply_patch(client_state, engine.changes_since(client_version))
+        client_version = engine.version
+        assert client_state == engine.get_state().model_dump()
+    assert len(client_state['log']) == LOG_WINDOW and client_state['logCursor'] > 0
@@ -0,0 +1,72 @@
+# packages/api-server/tests/test_codecs.py
+
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.codecs import (MEDIA_JSON, MEDIA_MSGPACK, codec_for_accept, json_codec, msgpack_codec,
+                            pack_state, unpack_state)
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import Action
+
+def played_engine(turns=5):
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=7)
+    rng = random.Random(7)
+    for _ in range(turns):
+        engine.start_turn()
+        engine.play(*((p, rng.choice(p.hand)) for p in engine.core.players))
+    return engine
+
+# 詰めた形式は内部状態からでも GameState からでも元の状態に戻り、JSON は GameState.model_dump と一致することをテストします。
+def test_pack_round_trip():
+    engine = played_engine()
+    expected = engine.get_state().model_dump()
+    assert unpack_state(pack_state(engine.core)) == expected
+    assert unpack_state(pack_state(engine.get_state())) == expected
+    assert json_codec.loads(json_codec.dumps({'state': engine.core})) == {'state': expected}
+
+    assert codec_for_accept(None).media_type == MEDIA_JSON
+    assert codec_for_accept('text/html, */*;q=0.1').media_type == MEDIA_JSON
+    if msgpack_codec is not None:
+        assert codec_for_accept(f'{MEDIA_JSON};q=0.5, {MEDIA_MSGPACK}').media_type == MEDIA_MSGPACK
+        assert msgpack_codec.loads(msgpack_codec.dumps({'state': engine.core})) == {'state': expected}
+
+# Accept で MessagePack を指定すると試合の応答が MessagePack になり、JSON の応答と同じ内容になることをテストします。
+def test_match_responses_follow_accept():
+    pytest.importorskip('msgpack')
+    client = TestClient(app)
+    body = {'player1Id': 'p1', 'player2Id': 'p2', 'seed': 11}
+    as_json = client.post('/api/v1/game/matches', json=body)
+    as_msgpack = client.post('/api/v1/game/matches', json=body, headers={'Accept': MEDIA_MSGPACK})
+    assert as_json.headers['content-type'] == MEDIA_JSON
+    assert as_msgpack.status_code == 201 and as_msgpack.headers['content-type'] == MEDIA_MSGPACK
+    decoded = msgpack_codec.loads(as_msgpack.content)
+    assert len(as_msgpack.content) < len(as_json.content)
+    assert decoded['state'] == {**as_json.json()['state'], 'matchId': decoded['matchId']}
+
+    # encode_response を使わないエンドポイントも、JSON の応答を変換して返します。
+    templates = client.get('/api/v1/game/templates', headers={'Accept': MEDIA_MSGPACK})
+    assert templates.headers['content-type'] == MEDIA_MSGPACK
+    assert msgpack_codec.loads(templates.content) == client.get('/api/v1/game/templates').json()
+
+# MessagePack のリクエストボディを読み込んで検証し、対応しない形式や壊れたボディを拒否することをテストします。
+def test_request_bodies_follow_content_type():
+    pytest.importorskip('msgpack')
+    client = TestClient(app)
+    state = played_engine(0).get_state()
+    payload = {'game_state': state, 'action': Action(playerId='p1', cardId='missing')}
+    response = client.post('/api/v1/game/game/advance_turn', content=msgpack_codec.dumps(payload),
+                           headers={'Content-Type': MEDIA_MSGPACK})
+    assert response.status_code == 200 and response.json()['turn'] == 1
+
+    broken = dict(state.model_dump(), turn='not-a-number')
+    response = client.post('/api/v1/game/game/advance_turn', content=msgpack_codec.dumps({'game_state': broken}),
+                           headers={'Content-Type': MEDIA_MSGPACK})
+    assert response.status_code == 422
+    assert client.post('/api/v1/game/game/advance_turn', content=b'\xc1',
+                       headers={'Content-Type': MEDIA_MSGPACK}).status_code == 400
+    assert client.post('/api/v1/game/game/advance_turn', content=b'x',
+                       headers={'Content-Type': 'text/plain'}).status_code == 415
@@ -0,0 +1,98 @@
+# packages/api-server/tests/test_concurrency.py
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import GameState
+from app.db.match_store import InMemoryMatchBackend, MatchWriteBehind
+
+def create_match(client):
+    response = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 7})
+    client.headers['X-Match-Token'] = response.json()['hostToken']
+    return response.json()['matchId'], response.headers['ETag']
+
+# 応答の ETag が状態のバージョンを表し、古いバージョンを If-Match に指定した変更は 409 になることをテストします。
+def test_if_match_rejects_stale_version():
+    client = TestClient(app)
+    match_id, tag = create_match(client)
+    response = client.post(f'/api/v1/game/matches/{match_id}/advance', headers={'If-Match': tag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{response.json()["version"]}"' != tag
+
+    stale = client.post(f'/api/v1/game/matches/{match_id}/advance', headers={'If-Match': tag})
+    assert stale.status_code == 409
+    assert stale.headers['ETag'] == response.headers['ETag']
+    assert stale.json()['detail']['currentVersion'] == response.json()['version']
+    assert client.get(f'/api/v1/game/matches/{match_id}').headers['ETag'] == response.headers['ETag']
+    assert client.post(f'/api/v1/game/matches/{match_id}/advance', headers={'If-Match': 'abc'}).status_code == 400
+
+# 同じ Idempotency-Key で再送したリクエストは保存した応答を返して2回適用されず、
+# 別の内容のリクエストに同じキーを使うと 422 になることをテストします。
+def test_idempotency_key_replays_response():
+    client = TestClient(app)
+    match_id, _ = create_match(client)
+    headers = {'Idempotency-Key': f'advance-{match_id}'}
+    first = client.post(f'/api/v1/game/matches/{match_id}/advance', headers=headers)
+    again = client.post(f'/api/v1/game/matches/{match_id}/advance', headers=headers)
+    assert again.status_code == 200 and again.headers['Idempotent-Replayed'] == 'true'
+    assert again.content == first.content and again.headers['ETag'] == first.headers['ETag']
+    assert client.get(f'/api/v1/game/matches/{match_id}').json()['version'] == first.json()['version']
+
+    other = client.post(f'/api/v1/game/matches/{match_id}/actions', headers=headers,
+                        json={'player1Action': None, 'player2Action': None})
+    assert other.status_code == 422
+
+# 他の書き込みが先に保存されたバージョンを進めていた試合は上書きせず、競合として通知することをテストします。
+def test_writer_detects_version_conflict():
+    backend = InMemoryMatchBackend()
+    conflicts = []
+    writer = MatchWriteBehind(backend, on_conflict=conflicts.append)
+    engines = {f'match-{i}': GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=i) for i in range(2)}
+
+    async def scenario():
+        for match_id, engine in engines.items():
+            await writer.mark_dirty(match_id, engine)
+        await writer.flush()
+        # 別のプロセスが match-0 を先に進めて書き込んだ状態にします。
+        backend.apply_updates({'match-0/version': 100, 'match-0/turn': 9})
+        for match_id, engine in engines.items():
+            engine.start_turn()
+            await writer.mark_dirty(match_id, engine)
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert conflicts == ['match-0'] and writer.stats().conflicts == 1
+    assert backend.get('match-0')['version'] == 100 and backend.get('match-0')['turn'] == 9
+    assert GameState.model_validate(backend.get('match-1')) == engines['match-1'].get_state()
+
+# タイムアウトした書き込みが後から保存されても、次回の書き込みで自分の書き込みとして扱い、競合にしないことをテストします。
+def test_timed_out_write_is_not_a_conflict():
+    backend = InMemoryMatchBackend()
+    conflicts = []
+    writer = MatchWriteBehind(backend, timeout=0.05, on_conflict=conflicts.append)
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=1)
+
+    async def scenario():
+        await writer.mark_dirty('match-0', engine)
+        await writer.flush()
+        backend.latency = 0.2
+        for _ in range(2):
+            engine.start_turn()
+            await writer.mark_dirty('match-0', engine)
+            try:
+                await writer.flush()
+            except asyncio.TimeoutError:
+                pass
+        assert writer.failures == 2
+        # タイムアウトした書き込みが保存されるのを待ってから、遅延なしで書き込み直します。
+        await asyncio.sleep(0.5)
+        backend.latency = 0
+        await writer.flush()
+
+    asyncio.run(scenario())
+    assert conflicts == [] and writer.conflicts == 0
+    assert GameState.model_validate(backend.get('match-0')) == engine.get_state()
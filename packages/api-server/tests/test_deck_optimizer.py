@@ -0,0 +1,44 @@
+# packages/api-server/tests/test_deck_optimizer.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.deck_optimizer import DECK_SIZE, MAX_COPIES, DeckOptimizer, legal_decks, load_field
+
+FIELD = {'balanced': {'GAIN_FUNDS': 4, 'ACQUIRE': 2, 'DEFEND': 2, 'FRAUD': 2}}
+
+# 規定のデッキが全て列挙され、public/decks のデッキをフィールドとして読み込めることをテストします。
+def test_legal_decks_and_field():
+    decks = legal_decks(list(BASE_CARD_TEMPLATES))
+    assert all(sum(d.values()) == DECK_SIZE and max(d.values()) <= MAX_COPIES for d in decks)
+    assert len(decks) == len({tuple(sorted(d.items())) for d in decks}) == 68 # 4種を各4枚までで10枚
+    field = load_field()
+    assert {'recommended_1', 'npc_default'} <= set(field)
+
+# 順位が信頼区間付きで並び、同じ問い合わせはキャッシュだけで同じ結果を返すことをテストします。
+def test_optimize_ranks_and_caches():
+    optimizer = DeckOptimizer(max_workers=1)
+    first = optimizer.optimize(FIELD, BASE_CARD_TEMPLATES, budget=2000, top=3, seed=1)
+    assert len(first.ranked) == 3
+    assert [r.score for r in first.ranked] == sorted((r.score for r in first.ranked), reverse=True)
+    assert all(r.lower <= r.score <= r.upper for r in first.ranked)
+    assert first.simulatedGames > 0 and first.cachedGames == 0
+
+    second = optimizer.optimize(FIELD, BASE_CARD_TEMPLATES, budget=2000, top=3, seed=1)
+    assert second.simulatedGames == 0
+    assert second.cachedGames == first.simulatedGames
+    assert second.ranked == first.ranked
+
+# 規定を満たさない候補を指定すると 400 になり、候補を指定した最適化がAPIから実行できることをテストします。
+def test_optimize_route():
+    client = TestClient(app)
+    response = client.post('/api/v1/sim/optimize-deck', json={'candidates': [{'ACQUIRE': 11}]})
+    assert response.status_code == 400
+    candidates = [{'ACQUIRE': 4, 'DEFEND': 4, 'FRAUD': 2}, {'DEFEND': 4, 'FRAUD': 4, 'INVEST': 2}]
+    response = client.post('/api/v1/sim/optimize-deck', json={'candidates': candidates, 'budget': 64, 'top': 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['candidates'] == 2
+    assert sorted(map(str, (r['cards'] for r in body['ranked']))) == sorted(map(str, candidates))
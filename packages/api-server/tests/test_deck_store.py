@@ -0,0 +1,174 @@
+# packages/api-server/tests/test_deck_store.py
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import deck_endpoints
+from app.db.deck_cache import DeckCache
+from app.db.deck_store import AsyncDeckStore, DeckStoreTimeout, InMemoryDeckBackend
+
+DECKS_DIR = Path(__file__).resolve().parents[2] / 'web-game-client' / 'public' / 'decks'
+
+# 遅いバックエンドの呼び出し中もイベントループが止まらず、呼び出しがワーカー数だけ並列に実行されることをテストします。
+def test_slow_backend_does_not_block_event_loop():
+    store = AsyncDeckStore(InMemoryDeckBackend(latency=0.05), max_workers=8, max_concurrency=16, timeout=5)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(store.get_decks(f'client-{i}') for i in range(32)))
+        elapsed = time.perf_counter() - started
+        task.cancel()
+        return elapsed, ticks
+
+    elapsed, ticks = asyncio.run(scenario())
+    store.shutdown()
+    # 32回 × 50ms を8並列で実行するので約0.2秒です（直列なら1.6秒）。
+    assert elapsed < 0.8
+    assert ticks >= 10
+
+# 呼び出しがタイムアウトを超えると DeckStoreTimeout になることをテストします。
+def test_timeout_raises():
+    store = AsyncDeckStore(InMemoryDeckBackend(latency=0.2), max_workers=1, timeout=0.05)
+    with pytest.raises(DeckStoreTimeout):
+        asyncio.run(store.get_decks('client'))
+    assert store.timeouts == 1
+    store.shutdown()
+
+# インメモリのバックエンドでデッキのCRUDがエンドポイント経由で動作することをテストします。
+def test_deck_endpoints_with_memory_backend(monkeypatch):
+    monkeypatch.setattr(deck_endpoints, 'deck_store', AsyncDeckStore(InMemoryDeckBackend()))
+    app = FastAPI()
+    app.include_router(deck_endpoints.router, prefix="/api/v1")
+    client = TestClient(app)
+    headers = {'X-Client-Id': 'client-1'}
+
+    created = client.post('/api/v1/decks/', json={'name': 'deck', 'cards': {'ACQUIRE': 2}}, headers=headers).json()
+    assert created['id']
+    assert client.get(f"/api/v1/decks/{created['id']}", headers=headers).json() == created
+    client.put(f"/api/v1/decks/{created['id']}", json={'name': 'renamed', 'cards': {'DEFEND': 1}}, headers=headers)
+    assert [d['name'] for d in client.get('/api/v1/decks/', headers=headers).json()] == ['renamed']
+    assert client.delete(f"/api/v1/decks/{created['id']}", headers=headers).status_code == 200
+    assert client.get('/api/v1/decks/', headers=headers).json() == []
+    assert client.get('/api/v1/decks/', headers={}).status_code == 400
+
+class CountingBackend(InMemoryDeckBackend):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get_decks(self, client_id):
+        self.reads += 1
+        return super().get_decks(client_id)
+
+# 読み込みはキャッシュから返され、書き込みはキャッシュをその場で更新し、バイパスと TTL で読み直すことをテストします。
+def test_read_through_cache_with_write_updates():
+    clock = [0.0]
+    backend = CountingBackend()
+    store = AsyncDeckStore(backend, cache=DeckCache(max_clients=2, ttl_seconds=30, clock=lambda: clock[0]))
+
+    async def scenario():
+        created = await store.create_deck('client', {'name': 'a', 'cards': {'ACQUIRE': 1}})
+        assert (await store.get_decks('client'))[created['id']]['name'] == 'a'
+        assert (await store.get_deck('client', created['id']))['name'] == 'a'
+        assert backend.reads == 1
+
+        await store.update_deck('client', created['id'], {'name': 'b'})
+        second = await store.create_deck('client', {'name': 'c', 'cards': {}})
+        decks = await store.get_decks('client')
+        assert decks[created['id']] == {'name': 'b', 'cards': {'ACQUIRE': 1}, 'id': created['id']}
+        assert second['id'] in decks
+        await store.delete_deck('client', second['id'])
+        assert second['id'] not in await store.get_decks('client')
+        assert backend.reads == 1
+
+        await store.get_decks('client', bypass_cache=True)
+        clock[0] = 31
+        await store.get_decks('client')
+        assert backend.reads == 3
+        # クライアント数の上限を超えると古いクライアントから破棄されます。
+        for other in ('x', 'y'):
+            await store.get_decks(other)
+        await store.get_decks('client')
+        assert backend.reads == 6
+
+    asyncio.run(scenario())
+    stats = store.cache.stats()
+    assert stats.hits == 3 and stats.misses == 5 and stats.bypasses == 1
+    assert stats.evictions == {'lru': 2, 'ttl': 1}
+    store.shutdown()
+
+# 書き込んだクライアントの世代も上限の件数までしか保持せず、破棄した世代より前に始まった読み込みは保存しないことをテストします。
+def test_cache_generations_are_bounded():
+    cache = DeckCache(max_clients=2, ttl_seconds=30)
+    _, before = cache.get('client-0')
+    for i in range(100):
+        cache.store_deck(f'client-{i}', 'deck', {'name': 'a'})
+    assert len(cache._written) == 2
+    cache.put('client-0', {'deck': {'name': 'stale'}}, before)
+    assert cache.get('client-0')[0] is None
+    _, after = cache.get('client-0')
+    cache.put('client-0', {'deck': {'name': 'a'}}, after)
+    assert cache.get('client-0')[0] == {'deck': {'name': 'a'}}
+    # 読み込み中に書き込みがあったクライアントの結果は保存しません。
+    _, during = cache.get('client-1')
+    cache.remove_deck('client-1', 'deck')
+    cache.put('client-1', {'deck': {'name': 'stale'}}, during)
+    assert cache.get('client-1')[0] is None
+
+class RoundTripCountingBackend(InMemoryDeckBackend):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def apply_updates(self, client_id, updates):
+        self.writes += 1
+        return super().apply_updates(client_id, updates)
+
+# 推奨デッキの取り込みと更新・削除を1回の書き込みで行い、不正な操作だけがエラーになることをテストします。
+def test_batch_endpoint_writes_once_with_per_item_results(monkeypatch):
+    backend = RoundTripCountingBackend()
+    monkeypatch.setattr(deck_endpoints, 'deck_store', AsyncDeckStore(backend, cache=DeckCache()))
+    app = FastAPI()
+    app.include_router(deck_endpoints.router, prefix="/api/v1")
+    client = TestClient(app)
+    headers = {'X-Client-Id': 'client-1'}
+
+    existing = client.post('/api/v1/decks/', json={'name': 'old', 'cards': {'ACQUIRE': 2}}, headers=headers).json()
+    doomed = client.post('/api/v1/decks/', json={'name': 'doomed', 'cards': {}}, headers=headers).json()
+    recommended = sorted(DECKS_DIR.glob('recommended_deck_*.json'))
+    operations = [{'op': 'create', 'deck': json.loads(path.read_text(encoding='utf-8'))} for path in recommended]
+    operations += [
+        {'op': 'update', 'deckId': existing['id'], 'deck': {'name': 'new', 'cards': {'DEFEND': 1}}},
+        {'op': 'delete', 'deckId': doomed['id']},
+        {'op': 'delete', 'deckId': doomed['id']},
+        {'op': 'update', 'deckId': 'missing-deck'},
+    ]
+    response = client.post('/api/v1/decks:batch', json={'operations': operations}, headers=headers)
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert backend.writes == 1
+    assert [r['status'] for r in results] == ['ok'] * (len(recommended) + 2) + ['error', 'error']
+    # 作成したデッキには、作成順に並ぶ20文字のキーが割り当てられます。
+    created_ids = [r['deckId'] for r in results[:len(recommended)]]
+    assert created_ids == sorted(created_ids) and all(len(i) == 20 for i in created_ids)
+
+    decks = {d['id']: d for d in client.get('/api/v1/decks/', headers=headers).json()}
+    assert doomed['id'] not in decks
+    assert decks[existing['id']] == {'id': existing['id'], 'name': 'new', 'cards': {'DEFEND': 1}}
+    backend_decks = backend.get_decks('client-1')
+    assert {i: backend_decks[i] for i in decks} == decks
@@ -0,0 +1,29 @@
+# packages/api-server/tests/test_decks.py
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.decks import DECK_SIZE, MAX_COPIES
+from app.game.templates import card_template_registry
+
+def legal_deck():
+    deck, remaining = {}, DECK_SIZE
+    for tid in card_template_registry.current:
+        deck[tid] = min(MAX_COPIES, remaining)
+        remaining -= deck[tid]
+    return deck
+
+# 試合の作成で、枚数の上限を超える・負の枚数・合計が規定と異なるデッキを、エンジンを作る前に拒否することをテストします。
+def test_create_match_rejects_illegal_decks():
+    client = TestClient(app)
+    legal = legal_deck()
+    first, second = list(legal)[:2]
+    for deck in ({first: 200000}, {**legal, second: -3}, {first: MAX_COPIES}, {**legal, 'UNKNOWN': 1}):
+        response = client.post('/api/v1/game/matches', json={
+            'player1Id': 'p1', 'player2Id': 'p2', 'player1Deck': legal, 'player2Deck': deck})
+        assert response.status_code == 400
+    response = client.post('/api/v1/game/matches', json={
+        'player1Id': 'p1', 'player2Id': 'p2', 'player1Deck': legal, 'player2Deck': legal})
+    assert response.status_code == 201
+    player = response.json()['state']['players'][1]
+    assert len(player['hand']) + len(player['deck']) == DECK_SIZE
@@ -0,0 +1,55 @@
+# packages/api-server/tests/test_effects.py
+
+import os
+
+import pytest
+from app.game.effects import ResolutionTable
+from app.game.engine import GameEngine
+from app.game.models import Action, Card, CardEffect, CardTemplate, EffectAction
+from app.game.state import TemplateTable
+from app.game.templates import load_template_set
+
+CARDS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'web-game-client', 'public', 'cards')
+
+@pytest.fixture(scope='module')
+def card_templates():
+    return load_template_set(CARDS_DIR)
+
+# 両プレイヤーが1枚ずつプレイしたときの (資金, 不動産) を返すヘルパー関数です。
+def resolve(card_templates, p1_card, p2_card, funds=(5, 5), properties=(1, 1)):
+    state = GameEngine.create_initial_state('player1-id', 'player2-id', card_templates)
+    actions = []
+    for player, template_id, f, p in zip(state.players, (p1_card, p2_card), funds, properties):
+        player.funds, player.properties = f, p
+        player.hand = [Card(id='c', templateId=template_id)] if template_id else []
+        actions.append(Action(playerId=player.playerId, cardId='c') if template_id else None)
+    result = GameEngine(state, card_templates).apply_action(*actions)
+    return [(p.funds, p.properties) for p in result.players]
+
+# web-game-client のカード定義が読み込まれ、Python のエンジンで「賄賂」「投資」がプレイできることをテストします。
+def test_json_cards_resolve(card_templates):
+    assert set(card_templates) == {'ACQUIRE', 'BRIBE', 'COLLECT_FUNDS', 'DEFEND', 'FRAUD', 'INVEST'}
+    # 賄賂は防衛・詐欺（DEFENSE）を無効にして不動産を奪います。
+    assert resolve(card_templates, 'BRIBE', 'DEFEND') == [(0, 2), (5, 0)]
+    assert resolve(card_templates, 'FRAUD', 'BRIBE') == [(4, 0), (0, 2)]
+    # 賄賂同士・買収同士は打ち消し合います。
+    assert resolve(card_templates, 'BRIBE', 'BRIBE') == [(0, 1), (0, 1)]
+    assert resolve(card_templates, 'ACQUIRE', 'ACQUIRE') == [(3, 1), (3, 1)]
+    # 買収は防衛で無効になり、詐欺では逆に不動産を奪われます。
+    assert resolve(card_templates, 'ACQUIRE', 'DEFEND') == [(3, 1), (5, 1)]
+    assert resolve(card_templates, 'ACQUIRE', 'FRAUD') == [(3, 0), (4, 2)]
+    # 投資と資金集めは定義どおりの資金を得ます。
+    assert resolve(card_templates, 'INVEST', 'COLLECT_FUNDS') == [(7, 1), (6, 1)]
+    assert resolve(card_templates, 'INVEST', None) == [(7, 1), (5, 1)]
+
+# 旧形式（type のみ）のテンプレートには効果定義が補われ、未知の条件はコンパイル時に拒否されることをテストします。
+def test_legacy_templates_and_unknown_conditions():
+    legacy = CardTemplate(templateId='ACQUIRE', name='買収', cost=2, type='ACQUIRE')
+    assert legacy.effect.category == 'ATTACK'
+    with pytest.raises(ValueError):
+        CardTemplate(templateId='X', name='X', cost=0)
+
+    effect = CardEffect(category='SUPPORT', priority=0, target='SELF',
+                        actions=[EffectAction(name='GAIN_FUNDS', value=1, conditions={'opponentFunds': 3})])
+    with pytest.raises(ValueError):
+        ResolutionTable(TemplateTable({'X': CardTemplate(templateId='X', name='X', cost=0, effect=effect)}))
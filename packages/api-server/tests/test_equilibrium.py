@@ -0,0 +1,110 @@
+# packages/api-server/tests/test_equilibrium.py
+
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game import equilibrium
+from app.game.equilibrium import EquilibriumSolver, EquilibriumStore, fictitious_play, solve_matrix_game, solver_for
+from app.game.templates import card_template_registry
+
+DECK = {'GAIN_FUNDS': 4, 'ACQUIRE': 2, 'DEFEND': 2, 'FRAUD': 2}
+
+# 線形計画の解が両者の保証値と一致し、仮想プレイの近似がそれに近いことをテストします。
+def test_matrix_game_solutions():
+    value, row, column = solve_matrix_game([[0, -1, 1], [1, 0, -1], [-1, 1, 0]])
+    assert value == pytest.approx(0.0)
+    assert row == pytest.approx((1 / 3,) * 3)
+    assert column == pytest.approx((1 / 3,) * 3)
+
+    rng = random.Random(0)
+    for _ in range(50):
+        payoff = [[rng.uniform(-1, 1) for _ in range(4)] for _ in range(3)]
+        value, row, column = solve_matrix_game(payoff)
+        assert min(sum(row[i] * payoff[i][j] for i in range(3)) for j in range(4)) == pytest.approx(value)
+        assert max(sum(column[j] * payoff[i][j] for j in range(4)) for i in range(3)) == pytest.approx(value)
+        assert fictitious_play(payoff)[0] == pytest.approx(value, abs=0.05)
+
+# 保存した解を別のソルバーが読み込み、解き直さずに同じ値を返すことをテストします。
+def test_store_persists_solutions(tmp_path):
+    path = str(tmp_path / 'equilibrium.sqlite')
+    store = EquilibriumStore(path)
+    first = EquilibriumSolver(BASE_CARD_TEMPLATES, horizon=2, store=store).analyze_opening(DECK, DECK)
+    store.close()
+    assert first.statesSolved > 0
+    assert first.value == pytest.approx(0.0) # 同じデッキどうしは対称です
+
+    store = EquilibriumStore(path)
+    second = EquilibriumSolver(BASE_CARD_TEMPLATES, horizon=2, store=store).analyze_opening(DECK, DECK)
+    store.close()
+    assert second.statesSolved == 0
+    assert second.value == pytest.approx(first.value)
+
+# バランス分析と試合の均衡戦略のエンドポイントをテストします。
+def test_equilibrium_routes():
+    client = TestClient(app)
+    response = client.post('/api/v1/sim/equilibrium', json={'deck1': {'ACQUIRE': 10}, 'deck2': {'COLLECT_FUNDS': 10}, 'horizon': 1})
+    assert response.status_code == 200
+    assert response.json()['value'] == pytest.approx(1.0) # 防御できない相手からは最初のターンで奪えます
+    response = client.post('/api/v1/sim/equilibrium', json={'deck1': {'UNKNOWN': 10}, 'deck2': DECK, 'horizon': 1})
+    assert response.status_code == 400
+
+    match = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 4}).json()
+    match_id = match['matchId']
+    client.headers['X-Match-Token'] = match['hostToken']
+    assert client.get(f'/api/v1/game/matches/{match_id}/equilibrium', params={'playerId': 'p1'}).status_code == 409
+    client.post(f'/api/v1/game/matches/{match_id}/advance')
+    result = client.get(f'/api/v1/game/matches/{match_id}/equilibrium', params={'playerId': 'p2'}).json()
+    assert -1.0 <= result['value'] <= 1.0
+    assert sum(result['strategy'].values()) == pytest.approx(1.0)
+    assert 'PASS' in result['opponentStrategy']
+
+# メモの大きさが上限を超えず、上限が小さくても同じ値になることと、
+# 現在のカードテンプレート以外のソルバーは上限を超えると閉じて破棄されることをテストします。
+def test_memo_and_solvers_are_bounded(monkeypatch, tmp_path):
+    unbounded = EquilibriumSolver(BASE_CARD_TEMPLATES, horizon=2).analyze_opening(DECK, DECK)
+    solver = EquilibriumSolver(BASE_CARD_TEMPLATES, horizon=2, memo_size=50)
+    assert solver.analyze_opening(DECK, DECK).value == pytest.approx(unbounded.value)
+    assert len(solver) <= 50
+
+    monkeypatch.setattr(equilibrium, '_solvers', equilibrium.OrderedDict())
+    monkeypatch.setattr(equilibrium, 'MAX_STALE_SOLVERS', 1)
+    monkeypatch.setenv('EQUILIBRIUM_STORE_PATH', str(tmp_path / 'equilibrium.sqlite'))
+    current = solver_for(card_template_registry.current)
+    reloaded = [{**BASE_CARD_TEMPLATES, 'GAIN_FUNDS': BASE_CARD_TEMPLATES['GAIN_FUNDS'].model_copy(update={'cost': cost})}
+                for cost in (1, 2)]
+    first = solver_for(reloaded[0])
+    second = solver_for(reloaded[1])
+    assert list(equilibrium._solvers.values()) == [current, second]
+    assert first.store is None and second.store is not None
+
+# 未保存の解が一定時間で書き込まれ、アプリの終了時には全てのソルバーの解が書き込まれて閉じられることをテストします。
+def test_solutions_are_flushed_on_interval_and_shutdown(monkeypatch, tmp_path):
+    now = [0.0]
+    store = EquilibriumStore(str(tmp_path / 'interval.sqlite'), flush_interval=5.0, clock=lambda: now[0])
+    store.put('a', (0.0, (1.0,), (1.0,)))
+    assert store.pending == 1
+    now[0] = 6.0
+    store.put('b', (0.0, (1.0,), (1.0,)))
+    assert store.pending == 0 and len(store) == 2
+    store.close()
+
+    path = str(tmp_path / 'shutdown.sqlite')
+    monkeypatch.setattr(equilibrium, '_solvers', equilibrium.OrderedDict())
+    monkeypatch.setenv('EQUILIBRIUM_STORE_PATH', path)
+    with TestClient(main.app) as client:
+        match = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 4}).json()
+        client.headers['X-Match-Token'] = match['hostToken']
+        client.post(f"/api/v1/game/matches/{match['matchId']}/advance")
+        response = client.get(f"/api/v1/game/matches/{match['matchId']}/equilibrium", params={'playerId': 'p1'})
+        assert response.status_code == 200
+        solver = next(iter(equilibrium._solvers.values()))
+        assert solver.store.pending > 0
+    assert len(equilibrium._solvers) == 0 and solver.store is None
+    store = EquilibriumStore(path)
+    assert len(store) > 0
+    store.close()
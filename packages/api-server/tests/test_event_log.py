@@ -0,0 +1,63 @@
+# packages/api-server/tests/test_event_log.py
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.event_log import LOG_WINDOW, PAGE_SIZE, EventLog
+from app.game.templates import card_template_registry
+
+def long_match(turns):
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=5)
+    for player in engine.core.players:
+        player.properties = 1000 # 決着しないようにします
+    for _ in range(turns):
+        engine.advance_turn()
+        engine.apply_action(None, None)
+    return engine
+
+# GameState.log は直近の行だけになり、古いイベントはページに移っても通し番号で取得できることをテストします。
+def test_window_and_pages():
+    engine = long_match(LOG_WINDOW + 2 * PAGE_SIZE)
+    log = engine.core.log
+    state = engine.get_state()
+    assert len(log) == 1 + LOG_WINDOW + 2 * PAGE_SIZE # 「ゲーム開始！」と各ターンの開始
+    assert len(state.log) == LOG_WINDOW and state.logCursor == len(log) - LOG_WINDOW
+    assert state.log[-1] == f'--- ターン {engine.core.turn} ---'
+    assert len(log.pages) >= 1 and len(log.recent) < LOG_WINDOW + PAGE_SIZE
+
+    events = log.page(0, len(log))
+    assert [seq for seq, _ in events] == list(range(len(log)))
+    assert [text for _, (_, _, text) in events] == \
+        ['ゲーム開始！'] + [f'--- ターン {t} ---' for t in range(1, engine.core.turn + 1)]
+    # 複製は古いページを共有し、複製に追加しても元のログは変わりません。
+    clone = engine.core.clone()
+    clone.log.add(0, 'extra')
+    assert clone.log.pages is log.pages and len(log) == len(clone.log) - 1
+
+    # GameState から読み込むと、logCursor より前のイベントは持たずに続きから数えます。
+    restored = EventLog.from_lines(state.log, state.logCursor)
+    assert len(restored) == len(log) and restored.window() == state.log
+    assert restored.page(0, 2)[0][0] == state.logCursor
+
+# 試合のログAPIがカーソルで古い順にページを返すことをテストします。
+def test_log_route():
+    client = TestClient(app)
+    # 規定の10枚になるよう、先頭のテンプレートから2枚ずつ入れます。
+    deck = {tid: 2 for tid in list(card_template_registry.current)[:5]}
+    match = client.post('/api/v1/game/matches', json={
+        'player1Id': 'p1', 'player2Id': 'p2', 'player1Deck': deck, 'player2Deck': deck, 'seed': 3}).json()
+    match_id = match['matchId']
+    client.headers['X-Match-Token'] = match['hostToken']
+    for _ in range(3):
+        client.post(f'/api/v1/game/matches/{match_id}/advance')
+        client.post(f'/api/v1/game/matches/{match_id}/actions', json={})
+
+    first = client.get(f'/api/v1/game/matches/{match_id}/log', params={'limit': 2}).json()
+    assert first['total'] == 4 and first['nextCursor'] == 2
+    assert [e['code'] for e in first['events']] == ['TEXT', 'TURN_START']
+    assert first['events'][1] == {'seq': 1, 'code': 'TURN_START', 'params': [1], 'text': '--- ターン 1 ---'}
+    rest = client.get(f'/api/v1/game/matches/{match_id}/log', params={'cursor': 2}).json()
+    assert [e['seq'] for e in rest['events']] == [2, 3] and rest['nextCursor'] is None
+    assert client.get('/api/v1/game/matches/missing/log').status_code == 404
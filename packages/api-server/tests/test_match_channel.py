@@ -0,0 +1,191 @@
+# packages/api-server/tests/test_match_channel.py
+
+import asyncio
+import copy
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app.main as main
+from app.api.match_channel import MatchHub
+from app.api.match_tokens import MatchTokens
+from app.api.matchmaking import MatchScheduler
+from app.db.match_store import InMemoryMatchBackend, MatchWriteBehind
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.match_registry import MatchRegistry
+
+@pytest.fixture
+def hub(monkeypatch):
+    registry = MatchRegistry()
+    registry.put('match-1', GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=3))
+    hub = MatchHub(registry, turn_timeout=5)
+    monkeypatch.setattr(main, 'match_hub', hub)
+    return hub
+
+def apply_patch(document, ops):
+    document = copy.deepcopy(document)
+    for op in ops:
+        *parents, key = [p.replace('~1', '/').replace('~0', '~') for p in op['path'].split('/')[1:]]
+        node = document
+        for part in parents:
+            node = node[int(part)] if isinstance(node, list) else node[part]
+        if isinstance(node, list):
+            if op['op'] == 'remove':
+                del node[int(key)]
+            elif key == '-':
+                node.append(op['value'])
+            else:
+                node[int(key)] = op['value']
+        elif op['op'] == 'remove':
+            del node[key]
+        else:
+            node[key] = op['value']
+    return document
+
+# 両プレイヤーのアクションがそろった時点でターンが解決され、各プレイヤーには自分から見たビューとその差分だけが
+# 送られること、トークンの無い接続は拒否されることをテストします。
+def test_turn_resolves_when_both_actions_arrive(hub):
+    hub.tokens = MatchTokens(hub.registry)
+    _, seats = hub.tokens.issue('match-1')
+    # 2つの接続が同じイベントループで処理されるよう、TestClient をコンテキストとして使います。
+    with TestClient(main.app) as client:
+        with client.websocket_connect('/ws/match/match-1?playerId=p1') as ws:
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                ws.receive_json()
+            assert excinfo.value.code == 4403
+        with client.websocket_connect(f'/ws/match/match-1?playerId=p1&token={seats[0]}') as ws1, \
+                client.websocket_connect(f'/ws/match/match-1?playerId=p2&token={seats[1]}') as ws2:
+            initial = ws1.receive_json()['view'] # 接続時のビューです。
+            assert initial['turn'] == 0 and initial['viewerId'] == 'p1'
+            first = ws1.receive_json() # 相手の接続でターン1が始まり、差分が送られます。
+            view = ws2.receive_json()['view']
+            assert first['patch'] and view['turn'] == 1 and view['phase'] == 'ACTION'
+            assert 'hand' not in view['players'][0] and len(view['players'][1]['hand']) == 3
+            mine = apply_patch(initial, first['patch'])
+            assert mine == hub.registry.get('match-1').view(0)
+            assert all('/players/1/hand' not in op['path'] and '/players/1/deck' not in op['path']
+                       for op in first['patch'])
+
+            ws1.send_json({'type': 'action', 'cardId': mine['players'][0]['hand'][0]['id']})
+            assert ws1.receive_json() == {'type': 'accepted', 'turn': 1}
+            ws2.send_json({'type': 'action', 'cardId': 'not-in-hand'})
+            assert ws2.receive_json()['type'] == 'error'
+            ws2.send_json({'type': 'action', 'cardId': None})
+
+            updates = [ws1.receive_json(), ws2.receive_json()]
+            for update in updates:
+                assert update['type'] == 'update' and update['version'] > first['version']
+            assert updates[0]['baseVersion'] == first['version'] and updates[0]['patch']
+            engine = hub.registry.get('match-1')
+            assert apply_patch(mine, updates[0]['patch']) == engine.view(0)
+            assert apply_patch(view, updates[1]['patch']) == engine.view(1)
+    assert hub.turns_resolved == 1 and len(hub) == 0
+
+# 相手がアクションを出さないまま待ち時間を過ぎると、相手をパス扱いにして解決することをテストします。
+def test_deadline_resolves_with_missing_action(hub):
+    hub.turn_timeout = 0.05
+    received = [[], []]
+
+    async def scenario():
+        senders = [lambda m, i=i: asyncio.sleep(0, received[i].append(m)) for i in range(2)]
+        await hub.join('match-1', 'p1', senders[0])
+        await hub.join('match-1', 'p2', senders[1])
+        await hub.submit('match-1', 0, None)
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert hub.timeouts == 1 and hub.turns_resolved == 1
+    assert hub.registry.get('match-1').core.turn == 2
+    assert received[1][-1]['type'] == 'update'
+
+# 期限切れで開始した解決のタスクをハブが保持し、終了時にキャンセルすることをテストします。
+def test_deadline_tasks_are_tracked_and_cancelled_on_close(hub):
+    hub.turn_timeout = 0.01
+    started = []
+
+    async def slow_resolve(room):
+        started.append(room.match_id)
+        await asyncio.sleep(60)
+
+    hub._resolve = slow_resolve
+
+    async def scenario():
+        send = lambda m: asyncio.sleep(0)
+        await hub.join('match-1', 'p1', send)
+        await hub.join('match-1', 'p2', send)
+        await hub.submit('match-1', 0, None)
+        await asyncio.sleep(0.05)
+        tasks = set(hub._tasks)
+        await hub.close()
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert started == ['match-1'] and len(tasks) == 1
+    assert all(task.cancelled() for task in tasks) and not hub._tasks
+
+# 存在しない試合や、試合に参加していないプレイヤーの接続が拒否されることをテストします。
+def test_rejects_unknown_match_and_player(hub):
+    client = TestClient(main.app)
+    for path, code in (('/ws/match/missing?playerId=p1', 4404), ('/ws/match/match-1?playerId=p3', 4403)):
+        with client.websocket_connect(path) as ws:
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                ws.receive_json()
+            assert excinfo.value.code == code
+    assert len(hub) == 0
+
+# 試合がレジストリから削除されるとルームとスケジューラーから外れ、以降のアクションでターンが解決・永続化されないことをテストします。
+def test_removed_match_is_not_resolved_or_persisted():
+    registry = MatchRegistry()
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=3)
+    registry.put('match-1', engine)
+    writer = MatchWriteBehind(InMemoryMatchBackend())
+    hub = MatchHub(registry, writer, turn_timeout=5)
+    scheduler = MatchScheduler(registry, hub)
+    scheduler.add('match-1', engine)
+    received = []
+
+    async def scenario():
+        send = lambda m: asyncio.sleep(0, received.append(m))
+        await hub.join('match-1', 'p1', send)
+        await hub.join('match-1', 'p2', send)
+        await writer.flush()
+        registry.remove('match-1')
+        writer.forget('match-1')
+        await hub.submit('match-1', 0, None)
+        await hub.submit('match-1', 1, None)
+
+    asyncio.run(scenario())
+    assert len(hub) == 0 and len(scheduler) == 0
+    assert hub.turns_resolved == 0 and engine.core.turn == 1
+    assert writer.dirty == 0
+
+# NPC のポリシーが（均衡のソルバーのロック待ちなどで）止まっている間もイベントループが応答し、
+# ロックが外れるとアクションが出されてターンが解決されることをテストします。
+def test_npc_policy_does_not_block_event_loop(hub):
+    solver_lock = threading.Lock()
+
+    def blocked_policy(engine, player, opponent, rng):
+        with solver_lock:
+            return -1
+
+    hub.register_npc('match-1', 1, blocked_policy)
+    ticks = []
+
+    async def scenario():
+        send = lambda m: asyncio.sleep(0)
+        await hub.join('match-1', 'p1', send)
+        solver_lock.acquire()
+        submitted = asyncio.ensure_future(hub.submit('match-1', 0, None))
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks.append(submitted.done())
+        solver_lock.release()
+        await asyncio.wait_for(submitted, 5)
+
+    asyncio.run(scenario())
+    assert ticks == [False] * 5
+    assert hub.turns_resolved == 1 and hub.registry.get('match-1').core.turn == 2
+    assert hub._rooms['match-1'].submitted == [False, True]
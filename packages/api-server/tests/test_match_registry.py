@@ -0,0 +1,64 @@
+# packages/api-server/tests/test_match_registry.py
+
+import pytest
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.event_log import EVENT_TEXT
+from app.game.match_registry import MatchRegistry, estimate_engine_bytes
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def new_engine():
+    state = GameEngine.create_initial_state('player1-id', 'player2-id', BASE_CARD_TEMPLATES)
+    return GameEngine(state, BASE_CARD_TEMPLATES)
+
+# 試合数の上限を超えると、最も長く使われていない試合から破棄されることをテストします。
+def test_lru_eviction_and_counters():
+    registry = MatchRegistry(max_matches=2)
+    registry.put('a', new_engine())
+    registry.put('b', new_engine())
+    assert registry.get('a') is not None # 'a' を最近使った状態にします
+    registry.put('c', new_engine())
+
+    assert 'b' not in registry
+    assert registry.get('b') is None
+    stats = registry.stats()
+    assert stats.matches == 2
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert stats.evictions['lru'] == 1
+
+# 最終アクセスからTTLを過ぎた試合が破棄されることをテストします。
+def test_ttl_eviction():
+    clock = FakeClock()
+    registry = MatchRegistry(ttl_seconds=10, clock=clock)
+    registry.put('a', new_engine())
+    clock.now = 5
+    assert registry.get('a') is not None # アクセスで期限が延長されます
+    clock.now = 14
+    assert registry.get('a') is not None
+    clock.now = 30
+    assert registry.get('a') is None
+    assert registry.stats().evictions['ttl'] == 1
+
+# メモリ使用量の上限を超えると古い試合から破棄され、状態の更新後も見積もりが追従することをテストします。
+def test_memory_cap_eviction():
+    engine = new_engine()
+    size = estimate_engine_bytes(engine)
+    registry = MatchRegistry(max_bytes=size * 2)
+    registry.put('a', engine)
+    registry.put('b', new_engine())
+    assert len(registry) == 2
+
+    # 'b' の状態が大きくなると、上限に収まるよう 'a' が破棄されます。
+    for _ in range(10):
+        registry.get('b').core.log.add(EVENT_TEXT, 'x' * 100)
+    registry.touch('b')
+    assert 'a' not in registry
+    stats = registry.stats()
+    assert stats.evictions['memory'] == 1
+    assert stats.bytes == estimate_engine_bytes(registry.get('b'))
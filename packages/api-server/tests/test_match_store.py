@@ -0,0 +1,80 @@
+# packages/api-server/tests/test_match_store.py
+
+import asyncio
+import random
+
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import Action, GameState
+from app.db.match_store import InMemoryMatchBackend, MatchWriteBehind
+
+def new_engine(seed):
+    return GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, seed=seed)
+
+def play_turn(engine, rng):
+    engine.start_turn()
+    state = engine.get_state()
+    if state.phase == 'GAME_OVER':
+        return
+    actions = [None, None]
+    for i, player in enumerate(state.players):
+        if player.hand:
+            actions[i] = Action(playerId=player.playerId, cardId=rng.choice(player.hand).id)
+    engine.apply_action(*actions)
+
+def persisted_state(backend, match_id):
+    return GameState.model_validate(backend.get(match_id))
+
+# 複数の試合の複数ターン分の変更が1回の書き込みにまとめられ、差分だけで状態が再現できることをテストします。
+def test_flush_coalesces_turns_into_one_update():
+    backend = InMemoryMatchBackend()
+    writer = MatchWriteBehind(backend)
+    engines = {f'match-{i}': new_engine(i) for i in range(3)}
+    rng = random.Random(0)
+
+    async def scenario():
+        for match_id, engine in engines.items():
+            await writer.mark_dirty(match_id, engine)
+        full_paths = await writer.flush()
+        for _ in range(3):
+            for match_id, engine in engines.items():
+                play_turn(engine, rng)
+                await writer.mark_dirty(match_id, engine)
+        assert writer.dirty == 3
+        return full_paths, await writer.flush()
+
+    full_paths, diff_paths = asyncio.run(scenario())
+    assert full_paths == 3 and diff_paths > 3
+    assert backend.updates == 2
+    for match_id, engine in engines.items():
+        assert persisted_state(backend, match_id) == engine.get_state()
+    assert writer.stats().dirty == 0
+
+# 未書き込みの試合が上限に達すると、新しい試合の登録が書き込みの完了まで待たされることをテストします。
+def test_backpressure_flushes_before_accepting_more():
+    backend = InMemoryMatchBackend(latency=0.01)
+    writer = MatchWriteBehind(backend, max_dirty=2)
+
+    async def scenario():
+        for i in range(5):
+            await writer.mark_dirty(f'match-{i}', new_engine(i))
+            assert writer.dirty <= 2
+
+    asyncio.run(scenario())
+    assert writer.stats().backpressureWaits == 2
+    assert backend.updates == 2 and backend.get('match-4') is None
+
+# 終了時に、書き込み間隔を待たずに未書き込みの変更がすべて書き込まれることをテストします。
+def test_close_flushes_pending_changes():
+    backend = InMemoryMatchBackend()
+    writer = MatchWriteBehind(backend, flush_interval=60)
+    engine = new_engine(7)
+
+    async def scenario():
+        writer.start()
+        await writer.mark_dirty('match', engine)
+        play_turn(engine, random.Random(1))
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert persisted_state(backend, 'match') == engine.get_state()
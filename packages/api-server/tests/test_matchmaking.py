@@ -0,0 +1,134 @@
+# packages/api-server/tests/test_matchmaking.py
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import matchmaking_endpoints
+from app.api.match_channel import MatchHub
+from app.api.matchmaking import MatchmakingService, MatchScheduler
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.match_registry import MatchRegistry
+from app.game.templates import card_template_registry
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def new_service(clock, **kwargs):
+    registry = MatchRegistry()
+    scheduler = MatchScheduler(registry, MatchHub(registry), turn_timeout=10, max_idle_turns=2, retire_after=30,
+                               clock=clock)
+    return MatchmakingService(registry, scheduler, card_templates=lambda: BASE_CARD_TEMPLATES,
+                              widen_after=5, npc_after=20, clock=clock, **kwargs)
+
+# 同じレーティング帯はすぐに組み合わされ、離れた帯は待ち時間に応じて広げた範囲で、残りは NPC と組み合わされることをテストします。
+def test_buckets_widen_then_fall_back_to_npc():
+    clock = FakeClock()
+    service = new_service(clock)
+
+    async def scenario():
+        a = service.join('a', rating=1510)
+        b = service.join('b', rating=1590)
+        assert a.matched.done() and b.matched.result().opponentId == 'a'
+
+        c = service.join('c', rating=1500)
+        d = service.join('d', rating=1720)
+        e = service.join('e')
+        clock.now = 5
+        service.match_waiting()
+        assert not c.matched.done() # 隣の帯（14・16）までしか探しません。
+        clock.now = 10
+        service.match_waiting()
+        assert c.matched.result().opponentId == 'd'
+
+        clock.now = 20
+        service.match_waiting()
+        assignment = e.matched.result()
+        assert assignment.npc and assignment.waitedSeconds == 20
+        return service.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats.queued, stats.matchesCreated, stats.npcMatches, stats.activeMatches) == (0, 3, 1, 3)
+
+# 誰もアクションを出さない試合はターンの期限切れで進み、続けば放棄として破棄され、終了した試合は猶予の後に破棄されることをテストします。
+def test_scheduler_expires_idle_turns_and_retires_matches():
+    clock = FakeClock()
+    service = new_service(clock)
+    scheduler = service.scheduler
+
+    async def scenario():
+        idle = service.join('idle')
+        clock.now = 20
+        service.match_waiting()
+        idle_match = idle.matched.result().matchId
+        finished = service.join('x'), service.join('y')
+        finished_match = finished[0].matched.result().matchId
+        service.registry.get(finished_match).core.phase = 3 # GAME_OVER
+
+        for step in range(1, 5):
+            clock.now = 20 + 10 * step
+            await scheduler.tick()
+            if step == 1:
+                # 最初の期限切れで NPC 戦の1ターン目が始まります。
+                assert service.registry.get(idle_match).core.turn == 1
+        return idle_match, finished_match
+
+    idle_match, finished_match = asyncio.run(scenario())
+    assert idle_match not in service.registry and finished_match not in service.registry
+    assert (scheduler.abandoned, scheduler.retired, len(scheduler)) == (1, 1, 0)
+    assert scheduler.turn_timeouts == 2
+
+# ロングポーリングの参加エンドポイントで、待ち時間内に決まらなければ queued を返し、相手の参加後に組み合わせを返すことをテストします。
+def test_join_endpoint_long_poll(monkeypatch):
+    service = new_service(FakeClock())
+    monkeypatch.setattr(matchmaking_endpoints, 'matchmaking', service)
+    app = FastAPI()
+    app.include_router(matchmaking_endpoints.router, prefix="/api/v1/matchmaking")
+    with TestClient(app) as client:
+        first = client.post('/api/v1/matchmaking/join', json={'playerId': 'p1', 'waitSeconds': 0}).json()
+        assert first['status'] == 'queued' and first['ticketSecret']
+        secret = {'X-Ticket-Secret': first['ticketSecret']}
+        second = client.post('/api/v1/matchmaking/join', json={'playerId': 'p2'}).json()
+        again = client.post('/api/v1/matchmaking/join', json={'playerId': 'p1'}, headers=secret).json()
+        assert second['assignment']['matchId'] == again['assignment']['matchId']
+        assert again['assignment']['opponentId'] == 'p2' and 'ticketSecret' not in again
+        assert client.delete('/api/v1/matchmaking/queue/p1', headers=secret).status_code == 404
+        assert client.get('/api/v1/matchmaking/stats').json()['matchesCreated'] == 1
+
+# チケットの secret が無い・一致しない場合は、他のプレイヤーの再参加（組み合わせ結果の受け取り）と離脱を拒否することをテストします。
+def test_join_and_leave_require_ticket_secret(monkeypatch):
+    service = new_service(FakeClock())
+    monkeypatch.setattr(matchmaking_endpoints, 'matchmaking', service)
+    app = FastAPI()
+    app.include_router(matchmaking_endpoints.router, prefix="/api/v1/matchmaking")
+    with TestClient(app) as client:
+        first = client.post('/api/v1/matchmaking/join', json={'playerId': 'p1', 'waitSeconds': 0}).json()
+        wrong = {'X-Ticket-Secret': 'guess'}
+        for headers, code in (({}, 401), (wrong, 403)):
+            response = client.post('/api/v1/matchmaking/join', json={'playerId': 'p1', 'waitSeconds': 0},
+                                   headers=headers)
+            assert response.status_code == code
+            assert client.delete('/api/v1/matchmaking/queue/p1', headers=headers).status_code == code
+        # 組み合わせが決まった後も、結果（プレイヤーのトークンを含む）は secret を持つ本人にだけ返します。
+        client.post('/api/v1/matchmaking/join', json={'playerId': 'p2'})
+        assert client.post('/api/v1/matchmaking/join', json={'playerId': 'p1'}, headers=wrong).status_code == 403
+        secret = {'X-Ticket-Secret': first['ticketSecret']}
+        assert client.post('/api/v1/matchmaking/join', json={'playerId': 'p1'}, headers=secret).json()['status'] == 'matched'
+
+# 規定外のデッキ（負の枚数や上限を超える枚数）では待ち行列に入れず、400 を返すことをテストします。
+def test_join_rejects_illegal_deck(monkeypatch):
+    service = new_service(FakeClock())
+    monkeypatch.setattr(matchmaking_endpoints, 'matchmaking', service)
+    app = FastAPI()
+    app.include_router(matchmaking_endpoints.router, prefix="/api/v1/matchmaking")
+    tid = next(iter(card_template_registry.current))
+    with TestClient(app) as client:
+        for deck in ({tid: -3}, {tid: 200000}):
+            response = client.post('/api/v1/matchmaking/join', json={'playerId': 'p1', 'deck': deck, 'waitSeconds': 0})
+            assert response.status_code == 400
+        assert client.get('/api/v1/matchmaking/stats').json()['queued'] == 0
@@ -0,0 +1,73 @@
+# packages/api-server/tests/test_metrics.py
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.metrics import (ENGINE_PHASES, MetricsRegistry, engine_phases, games_finished,
+                         http_latency, http_requests)
+from app.profiler import SamplingProfiler
+
+# リクエストの件数とレイテンシがルートの定義をラベルにして記録され、/metrics に出力されることをテストします。
+def test_http_metrics_endpoint():
+    client = TestClient(app)
+    route = '/api/v1/game/matches/{match_id}'
+    before = http_requests.value(method='GET', route=route, status='404')
+    assert client.get('/api/v1/game/matches/no-such-match').status_code == 404
+    assert http_requests.value(method='GET', route=route, status='404') == before + 1
+    assert http_latency.count(method='GET', route=route) >= 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    body = response.text
+    assert f'http_requests_total{{method="GET",route="{route}",status="404"}}' in body
+    assert f'http_request_duration_seconds_bucket{{method="GET",route="{route}",le="+Inf"}}' in body
+    assert '# TYPE http_response_size_bytes histogram' in body
+    assert 'engine_phase_seconds_count{phase="draw"}' in body
+
+# 実際の試合を進めるとエンジンの各フェーズの計測回数が増えて決着すると終了した試合数が数えられ、仮想の試合は数えられないことをテストします。
+def test_engine_phase_timers():
+    before = list(engine_phases.counts)
+    finished = sum(games_finished.value(result=r) for r in ('player1', 'player2', 'draw'))
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=1, instrumented=True)
+    engine.advance_turn()
+    engine.core.players[1].properties = 0
+    engine.apply_action(None, None)
+    assert all(after > b for after, b in zip(engine_phases.counts, before)), ENGINE_PHASES
+    assert games_finished.value(result='player1') + games_finished.value(result='player2') \
+        + games_finished.value(result='draw') == finished + 1
+
+    # 探索やシミュレーションで使う仮想の試合は記録しません。
+    before = list(engine_phases.counts)
+    scratch = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=1)
+    scratch.advance_turn()
+    scratch.core.players[0].properties = 0
+    scratch.apply_action(None, None)
+    assert engine_phases.counts == before
+    assert games_finished.value(result='player1') + games_finished.value(result='player2') \
+        + games_finished.value(result='draw') == finished + 1
+
+    # 独立したレジストリでも同じ形式で出力できます。
+    registry = MetricsRegistry()
+    registry.counter('demo_total', 'Demo.', ('kind',)).inc(kind='a"b')
+    assert 'demo_total{kind="a\\"b"} 1' in registry.render()
+
+# 閾値以上かかったリクエストのスタックが collapsed 形式で書き出されることをテストします。
+def test_profiler_writes_slow_stacks(tmp_path):
+    profiler = SamplingProfiler(slow_threshold_ms=10, output_dir=str(tmp_path), interval_ms=1)
+    fast = profiler.begin()
+    assert profiler.end(fast, 0.001, 'GET /fast') is None
+
+    token = profiler.begin()
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.05:
+        sum(range(1000))
+    path = profiler.end(token, time.perf_counter() - started, 'GET /slow/{id}')
+    assert path is not None and path.endswith('GET_slow_id.folded')
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('test_profiler_writes_slow_stacks' in line for line in lines)
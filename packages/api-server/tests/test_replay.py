@@ -0,0 +1,54 @@
+# packages/api-server/tests/test_replay.py
+
+import random
+
+import pytest
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import Action
+from app.game.replay import replay
+
+# ランダムに選んだ手札で試合を進め、各ターン終了時点の状態を記録するヘルパー関数です。
+def play_match(engine, turns, chooser):
+    states = {engine.core.turn: engine.get_state()}
+    for _ in range(turns):
+        state = engine.advance_turn()
+        if state.phase == 'GAME_OVER':
+            break
+        actions = [Action(playerId=p.playerId, cardId=chooser.choice(p.hand).id) if p.hand else None
+                   for p in state.players]
+        states[engine.core.turn] = engine.apply_action(*actions)
+    return states
+
+# 同じシードで作成した試合は、試合IDを除いて同じ初期状態になることをテストします。
+def test_new_match_is_reproducible_from_seed():
+    first = GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, seed=42)
+    second = GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, seed=42)
+    assert first.journal.seed == 42
+    assert first.core.match_id != second.core.match_id
+    first_state, second_state = first.get_state(), second.get_state()
+    first_state.matchId = second_state.matchId
+    assert first_state == second_state
+    # 同じ操作を適用すると、以降のドロー（山札の再シャッフルを含む）も一致します。
+    first_states = play_match(first, 12, random.Random(0))
+    second_states = play_match(second, 12, random.Random(0))
+    assert first_states.keys() == second_states.keys()
+    for turn in first_states:
+        assert (first_states[turn].model_dump(exclude={'matchId'})
+                == second_states[turn].model_dump(exclude={'matchId'}))
+
+# ジャーナルから任意のターンの状態を、スナップショットからの早送りで再現できることをテストします。
+@pytest.mark.parametrize("deck", [{'GAIN_FUNDS': 3, 'DEFEND': 2}, None])
+def test_replay_rebuilds_every_turn(deck):
+    engine = GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, deck, deck, seed=7)
+    states = play_match(engine, 45, random.Random(1))
+
+    for turn, expected in states.items():
+        replayed = replay(engine.journal, BASE_CARD_TEMPLATES, turn)
+        assert replayed.get_state() == expected
+    assert replay(engine.journal, BASE_CARD_TEMPLATES).get_state() == engine.get_state()
+
+    if deck is not None:
+        # 長い試合では、途中のスナップショットから再現を始めます。
+        snapshot = engine.journal.snapshot_for(40)
+        assert snapshot.turn == 40 and snapshot.entry_index > 0
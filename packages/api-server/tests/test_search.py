@@ -0,0 +1,110 @@
+# packages/api-server/tests/test_search.py
+
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import app.api.game_endpoints as game_endpoints
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.search import SearchNPC
+
+def started_engine(seed):
+    engine = GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, seed=seed)
+    engine.start_turn()
+    return engine
+
+# 時間制限内に手札のカードを選び、状態を変更せず、同じ局面の再探索で置換表が使われることをテストします。
+def test_search_respects_budget_and_reuses_table():
+    engine = started_engine(3)
+    before = engine.get_state()
+    player = engine.core.players[0]
+    npc = SearchNPC(time_budget_ms=5.0)
+
+    first = npc.search(engine, player, random.Random(1))
+    assert first.cardIndex == -1 or first.cardIndex in player.hand
+    assert first.depth >= 1
+    assert first.elapsedMs < 100
+    assert engine.get_state() == before
+
+    second = npc.search(engine, player, random.Random(1))
+    assert second.tableHits > 0
+
+# 相手が防げない場面では、確実に勝てる買収（ACQUIRE）を選ぶことをテストします。
+def test_search_takes_certain_win():
+    engine = started_engine(5)
+    core = engine.core
+    me, opponent = core.players
+    templates = engine.templates
+    acquire = next(c for c in me.hand + me.deck if templates.ids[core.cards.templates[c]] == 'ACQUIRE')
+    if acquire in me.deck:
+        me.deck.remove(acquire)
+        me.hand.append(acquire)
+    me.funds = templates.costs[templates.index['ACQUIRE']]
+    opponent.deck.extend(opponent.hand)
+    opponent.hand = []
+
+    result = SearchNPC(time_budget_ms=20.0).search(engine, me, random.Random(0))
+    assert core.cards.ids[result.cardIndex] == core.cards.ids[acquire]
+    assert result.value == 1.0
+
+# 複数のスレッドから同じ NPC で同時に探索しても、1つずつ探索した場合と同じ結果になることをテストします。
+def test_concurrent_searches_do_not_interfere():
+    engines = [started_engine(seed) for seed in range(8)]
+    expected = [SearchNPC(time_budget_ms=10000.0, max_depth=2).search(e, e.core.players[0], random.Random(1))
+                for e in engines]
+    npc = SearchNPC(time_budget_ms=10000.0, max_depth=2)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda e: npc.search(e, e.core.players[0], random.Random(1)), engines * 3))
+    assert [(r.cardIndex, r.value, r.depth) for r in results] == \
+        [(r.cardIndex, r.value, r.depth) for r in expected] * 3
+
+# API から探索 NPC の手を取得でき、npcPolicy を指定したアクションでプレイヤー2の手が補われることをテストします。
+def test_npc_routes():
+    client = TestClient(app)
+    match = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 9}).json()
+    match_id = match['matchId']
+    client.headers['X-Match-Token'] = match['hostToken']
+    client.post(f'/api/v1/game/matches/{match_id}/advance')
+
+    # プレイヤーは自分のトークンで自分の助言だけを取得できます。
+    params = {'playerId': 'p2', 'budgetMs': 5}
+    seat = {'X-Match-Token': match['playerTokens'][1]}
+    response = client.get(f'/api/v1/game/matches/{match_id}/npc-decision', params=params, headers=seat)
+    assert response.status_code == 200
+    assert client.get(f'/api/v1/game/matches/{match_id}/npc-decision', params={**params, 'playerId': 'p1'},
+                      headers=seat).status_code == 403
+    decision = response.json()
+    hand = [card['id'] for card in client.get(f'/api/v1/game/matches/{match_id}').json()['state']['players'][1]['hand']]
+    assert decision['cardId'] is None or decision['cardId'] in hand
+    assert client.get(f'/api/v1/game/matches/{match_id}/npc-decision', params={'playerId': 'x'}).status_code == 404
+
+    response = client.post(f'/api/v1/game/matches/{match_id}/actions', json={'npcPolicy': 'search'})
+    assert response.status_code == 200
+    assert response.json()['version'] > match['version']
+    response = client.post(f'/api/v1/game/matches/{match_id}/actions', json={'npcPolicy': 'unknown'})
+    assert response.status_code == 400
+
+# 助言の探索がイベントループのスレッドではなく、ワーカースレッドで行われることをテストします。
+def test_npc_decision_searches_off_event_loop(monkeypatch):
+    client = TestClient(app)
+    match = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 9}).json()
+    client.headers['X-Match-Token'] = match['hostToken']
+    client.post(f"/api/v1/game/matches/{match['matchId']}/advance")
+    loops = []
+    search = game_endpoints.search_npc.search
+
+    def recording_search(*args, **kwargs):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(game_endpoints.search_npc, 'search', recording_search)
+    response = client.get(f"/api/v1/game/matches/{match['matchId']}/npc-decision", params={'playerId': 'p1'})
+    assert response.status_code == 200
+    assert loops == [None]
@@ -0,0 +1,49 @@
+# packages/api-server/tests/test_simulation.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app.game import simulation
+from app.game.simulation import SimulationPool, run_match, simulate_batch
+
+DECK = {'GAIN_FUNDS': 4, 'ACQUIRE': 3, 'DEFEND': 2, 'FRAUD': 1}
+
+# 同じシードの試合は同じ結果になることをテストします。
+def test_run_match_is_reproducible():
+    first = run_match(DECK, DECK, 'random', 'weighted', seed=42)
+    second = run_match(DECK, DECK, 'random', 'weighted', seed=42)
+    assert first == second
+    assert first.turns > 0
+
+# 集計結果が試合数と整合し、ワーカー数によらず同じになることをテストします。
+def test_simulate_batch_aggregates_independent_of_workers():
+    serial = simulate_batch(DECK, DECK, 'weighted', 'random', matches=300, seed=7, max_workers=1)
+    parallel = simulate_batch(DECK, DECK, 'weighted', 'random', matches=300, seed=7, max_workers=2)
+    assert serial == parallel
+    assert sum(serial.wins) + serial.draws == 300
+    assert serial.meanTurns > 0
+    assert sum(serial.cardPlays[0].values()) > 0
+
+# 同時に実行したバッチが1つの共有プールを使い、ワーカー数が上限を超えず、fork せずに起動することをテストします。
+def test_concurrent_batches_share_bounded_pool(monkeypatch):
+    pool = SimulationPool(max_workers=2)
+    monkeypatch.setattr(simulation, 'simulation_pool', pool)
+    expected = simulate_batch(DECK, DECK, 'weighted', 'random', matches=600, seed=7, max_workers=1)
+    try:
+        with ThreadPoolExecutor(4) as threads:
+            results = list(threads.map(
+                lambda _: simulate_batch(DECK, DECK, 'weighted', 'random', matches=600, seed=7), range(4)))
+        executor = pool.executor()
+        assert results == [expected] * 4
+        assert len(executor._processes) <= 2
+        assert executor._mp_context.get_start_method() != 'fork'
+    finally:
+        pool.shutdown()
+    assert pool.executor() is not executor
+    pool.shutdown()
+
+# 未知のカードやポリシーを指定するとValueErrorになることをテストします。
+@pytest.mark.parametrize('deck, policy', [({'BRIBE': 2}, 'random'), (DECK, 'unknown')])
+def test_simulate_batch_rejects_invalid_input(deck, policy):
+    with pytest.raises(ValueError):
+        simulate_batch(deck, DECK, policy, 'random', matches=1)
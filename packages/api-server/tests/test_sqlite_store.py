@@ -0,0 +1,87 @@
+# packages/api-server/tests/test_sqlite_store.py
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+
+from app.db.deck_store import AsyncDeckStore, InMemoryDeckBackend, SqliteDeckBackend
+from app.db.match_store import MatchWriteBehind, SqliteMatchBackend
+from app.db.sqlite import SqliteDatabase
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.models import Action, GameState
+
+def play_turn(engine, rng):
+    engine.start_turn()
+    state = engine.get_state()
+    if state.phase == 'GAME_OVER':
+        return
+    actions = [None, None]
+    for i, player in enumerate(state.players):
+        if player.hand:
+            actions[i] = Action(playerId=player.playerId, cardId=rng.choice(player.hand).id)
+    engine.apply_action(*actions)
+
+# SQLite のデッキのバックエンドが WAL モードで開かれ、メモリ上のバックエンドと同じ結果になることをテストします。
+def test_sqlite_deck_backend_matches_memory(tmp_path):
+    database = SqliteDatabase(str(tmp_path / 'store.sqlite3'))
+    sqlite_backend, memory_backend = SqliteDeckBackend(database), InMemoryDeckBackend()
+    assert database.connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    for backend in (sqlite_backend, memory_backend):
+        first = backend.create_deck('client', {'name': 'first', 'cards': {'ACQUIRE': 2}})
+        second = backend.create_deck('client', {'name': 'second', 'cards': {'DEFEND': 1}})
+        backend.update_deck('client', first['id'], {'name': 'renamed'})
+        backend.update_deck('client', 'new-deck', {'name': 'upserted', 'cards': {}})
+        backend.apply_updates('client', {f"{second['id']}/cards/FRAUD": 3, 'new-deck': None,
+                                         'batch': {'name': 'batch', 'cards': {'INVEST': 1}}})
+        backend.delete_deck('client', 'missing')
+
+    decks = sqlite_backend.get_decks('client')
+    assert {d['name'] for d in decks.values()} == {'renamed', 'second', 'batch'}
+    # ID は生成されるため、ID を除いた内容で比べます。
+    def contents(backend):
+        return sorted((d['name'], d.get('cards')) for d in backend.get_decks('client').values())
+    assert contents(sqlite_backend) == contents(memory_backend)
+    second_id = next(k for k, v in decks.items() if v['name'] == 'second')
+    assert sqlite_backend.get_deck('client', second_id)['cards'] == {'DEFEND': 1, 'FRAUD': 3}
+    assert sqlite_backend.get_decks('nobody') is None
+
+    # 非同期のデッキストアからも使え、別の接続（再起動後）でも同じ内容が読めます。
+    store = AsyncDeckStore(SqliteDeckBackend(database))
+    created = asyncio.run(store.create_deck('client', {'name': 'async', 'cards': {}}))
+    store.shutdown()
+    database.close()
+    reopened = SqliteDeckBackend(SqliteDatabase(database.path))
+    assert reopened.get_deck('client', created['id'])['name'] == 'async'
+
+# 試合の状態のライトビハインドが SQLite に書き込み、差分の書き込み後も状態全体が再現できることをテストします。
+def test_sqlite_match_backend(tmp_path):
+    backend = SqliteMatchBackend(SqliteDatabase(str(tmp_path / 'store.sqlite3')))
+    writer = MatchWriteBehind(backend)
+    engine = GameEngine.new_match('player1-id', 'player2-id', BASE_CARD_TEMPLATES, seed=3)
+    rng = random.Random(3)
+
+    async def scenario():
+        await writer.mark_dirty('match-1', engine)
+        await writer.flush()
+        for _ in range(4):
+            play_turn(engine, rng)
+        await writer.mark_dirty('match-1', engine)
+        return await writer.flush()
+
+    assert asyncio.run(scenario()) > 0
+    assert GameState.model_validate(backend.get('match-1')) == engine.get_state()
+    backend.apply_updates({'match-1': None})
+    assert backend.get('match-1') is None
+
+# app.main のインポートでは Firebase Admin SDK を読み込まず、認証情報が無くてもインポートできることをテストします。
+def test_import_does_not_initialize_firebase():
+    env = {k: v for k, v in os.environ.items() if not k.startswith('FIREBASE_')}
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, app.main; print('firebase_admin' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False'
@@ -0,0 +1,46 @@
+# packages/api-server/tests/test_state.py
+
+import pytest
+from app.game.engine import GameEngine
+from app.game.models import Card, CardTemplate, GameState, ResolvedAction
+from app.game.state import PHASE_DRAW, UNKNOWN_TEMPLATE, CompactState, TemplateTable
+
+@pytest.fixture
+def mock_card_templates():
+    return {
+        'GAIN_FUNDS': CardTemplate(templateId='GAIN_FUNDS', name='資金集め', cost=0, type='GAIN_FUNDS'),
+        'ACQUIRE': CardTemplate(templateId='ACQUIRE', name='買収', cost=2, type='ACQUIRE'),
+        'DEFEND': CardTemplate(templateId='DEFEND', name='防衛', cost=0, type='DEFEND'),
+        'FRAUD': CardTemplate(templateId='FRAUD', name='詐欺', cost=1, type='FRAUD'),
+    }
+
+# GameState -> 内部表現 -> GameState の往復で内容が変わらないことをテストします。
+def test_round_trip_preserves_game_state(mock_card_templates):
+    state = GameEngine.create_initial_state('player1-id', 'player2-id', mock_card_templates)
+    state.players[0].hand = [Card(id='x', templateId='ACQUIRE'), Card(id='y', templateId='UNKNOWN')]
+    state.players[1].discard = [Card(id='z', templateId='FRAUD')]
+    state.lastActions = [ResolvedAction(playerId='player1-id', cardTemplateId='ACQUIRE')]
+
+    table = TemplateTable(mock_card_templates)
+    core = CompactState.from_game_state(state, table)
+
+    # テンプレートIDは整数にインターンされ、未登録のものは UNKNOWN_TEMPLATE になります。
+    hand = core.players[0].hand
+    assert core.cards.templates[hand[0]] == table.index['ACQUIRE']
+    assert core.cards.templates[hand[1]] == UNKNOWN_TEMPLATE
+    assert core.phase == PHASE_DRAW
+
+    assert core.to_game_state().model_dump() == state.model_dump()
+
+# 返された状態を変更しても、エンジン内部の状態に影響しないことをテストします。
+def test_returned_state_is_detached(mock_card_templates):
+    initial_state = GameEngine.create_initial_state('player1-id', 'player2-id', mock_card_templates)
+    engine = GameEngine(initial_state, mock_card_templates)
+    state = engine.advance_turn()
+    state.players[0].hand.clear()
+    state.players[0].funds = 99
+
+    fresh = engine.get_state()
+    assert len(fresh.players[0].hand) == 3
+    assert fresh.players[0].funds == 2
+    assert isinstance(fresh, GameState)
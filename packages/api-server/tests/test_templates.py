@@ -0,0 +1,60 @@
+# packages/api-server/tests/test_templates.py
+
+import json
+import os
+import pickle
+import shutil
+
+import pytest
+from app.game.engine import GameEngine
+from app.game.templates import DEFAULT_CARDS_DIR, CardTemplateRegistry
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def cards_dir(tmp_path):
+    target = tmp_path / 'cards'
+    shutil.copytree(DEFAULT_CARDS_DIR, target)
+    return target
+
+# 読み込んだテンプレートの集合がエンジン間で共有され、プロセスプールに渡せることをテストします。
+def test_registry_shares_one_frozen_set(cards_dir):
+    registry = CardTemplateRegistry(str(cards_dir), reload_interval=0)
+    card_templates = registry.current
+    assert registry.current is card_templates
+    assert 'BRIBE' in card_templates and len(card_templates) == 6
+    with pytest.raises(TypeError):
+        card_templates['BRIBE'] = card_templates['ACQUIRE']
+
+    engines = [GameEngine.new_match('p1', 'p2', card_templates, seed=i) for i in range(2)]
+    assert engines[0].templates is engines[1].templates is card_templates.table
+    assert engines[0].resolution is card_templates.resolution
+    assert pickle.loads(pickle.dumps(card_templates)).version == card_templates.version
+
+# ファイルが変更されると確認間隔の経過後に読み込み直し、壊れたファイルでは以前の定義を使い続けることをテストします。
+def test_hot_reload_swaps_version_atomically(cards_dir):
+    clock = FakeClock()
+    registry = CardTemplateRegistry(str(cards_dir), reload_interval=5, clock=clock)
+    before = registry.current
+
+    invest = cards_dir / 'INVEST.json'
+    definition = json.loads(invest.read_text(encoding='utf-8'))
+    definition['cost'] = 3
+    invest.write_text(json.dumps(definition, ensure_ascii=False), encoding='utf-8')
+    os.utime(invest, ns=(1, 1))
+    assert registry.current is before # 確認間隔が経過するまでは読み込みません。
+
+    clock.now = 5
+    after = registry.current
+    assert after is not before and after.version != before.version
+    assert after['INVEST'].cost == 3 and before['INVEST'].cost == 2
+
+    invest.write_text('{', encoding='utf-8')
+    clock.now = 10
+    assert registry.current is after
+    assert registry.reloads == 2
@@ -0,0 +1,67 @@
+# packages/api-server/tests/test_tournament.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.tournament import TournamentConfig, TournamentRunner, swiss_pairings
+
+DECKS = {
+    'balanced': {'GAIN_FUNDS': 4, 'ACQUIRE': 2, 'DEFEND': 2, 'FRAUD': 2},
+    'aggro': {'GAIN_FUNDS': 4, 'ACQUIRE': 4, 'FRAUD': 2},
+    'turtle': {'GAIN_FUNDS': 4, 'DEFEND': 4, 'FRAUD': 2},
+}
+
+# 総当たりで全ての対戦が行われ、対戦成績の表が対称になり、ワーカー数によらず同じ結果になることをテストします。
+def test_round_robin_is_reproducible():
+    config = TournamentConfig(decks=DECKS, policies=['random', 'weighted'], games=6, seed=1)
+    result = TournamentRunner(max_workers=1).run(config, BASE_CARD_TEMPLATES)
+    n = len(result.entrants)
+    assert n == 6 and result.simulatedGames == 6 * n * (n - 1) // 2
+    for i in range(n):
+        assert result.headToHead[i][i] is None
+        for j in range(i + 1, n):
+            assert result.headToHead[i][j] + result.headToHead[j][i] == pytest.approx(1.0)
+    assert [s.elo for s in result.standings] == sorted((s.elo for s in result.standings), reverse=True)
+    assert sum(s.elo for s in result.standings) == pytest.approx(1500.0 * n)
+
+    parallel = TournamentRunner(max_workers=2).run(config, BASE_CARD_TEMPLATES)
+    assert parallel.standings == result.standings and parallel.headToHead == result.headToHead
+
+# 結果のファイルから中断したトーナメントを再開し、中断しなかった場合と同じ結果になることをテストします。
+def test_resume_from_results_file(tmp_path):
+    config = TournamentConfig(format='swiss', decks=DECKS, policies=['random'], games=4, rounds=2, seed=2)
+    path = str(tmp_path / 'runs' / 'swiss.jsonl')
+    full = TournamentRunner(max_workers=1).run(config, BASE_CARD_TEMPLATES, path)
+    assert full.resumedGames == 0
+
+    # 2つ目のバッチを書き込んでいる途中で中断された状態にします。
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:2])
+        f.write(lines[2][:10])
+    resumed = TournamentRunner(max_workers=1).run(config, BASE_CARD_TEMPLATES, path)
+    assert resumed.resumedGames == 4 and resumed.simulatedGames == full.simulatedGames - 4
+    assert resumed.standings == full.standings
+    with open(path, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(lines)
+
+    with pytest.raises(ValueError):
+        TournamentRunner(max_workers=1).run(config.model_copy(update={'seed': 3}), BASE_CARD_TEMPLATES, path)
+
+# スイス式の組み合わせが再戦を避けて不戦勝を1人に割り当て、APIからトーナメントを実行できることをテストします。
+def test_swiss_pairings_and_route():
+    pairings, bye = swiss_pairings([0, 1, 2, 3, 4], played={(0, 1)}, byes={4})
+    assert bye == 3
+    assert pairings == [(0, 2), (1, 4)]
+
+    client = TestClient(app)
+    response = client.post('/api/v1/sim/tournament', json={'decks': DECKS, 'policies': ['nope']})
+    assert response.status_code == 400
+    # デッキを省略すると public/decks のデッキで行います。
+    response = client.post('/api/v1/sim/tournament', json={'format': 'swiss', 'games': 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['rounds'] == 2 and {'npc_default@random', 'recommended_1@random'} <= set(body['entrants'])
@@ -0,0 +1,69 @@
+# packages/api-server/tests/test_vectorized.py
+
+import itertools
+import math
+import os
+
+import numpy as np
+import pytest
+from app.game.engine import GameEngine
+from app.game.models import Action, Card
+from app.game.simulation import BASE_CARD_TEMPLATES, simulate_batch, simulate_vectorized
+from app.game.state import PHASE_GAME_OVER
+from app.game.templates import load_template_set
+from app.game.vectorized import NO_PLAY, VectorizedEngine
+
+DECK1 = {'GAIN_FUNDS': 4, 'ACQUIRE': 3, 'DEFEND': 2, 'FRAUD': 1}
+DECK2 = {'GAIN_FUNDS': 3, 'ACQUIRE': 4, 'FRAUD': 3}
+
+CARDS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'web-game-client', 'public', 'cards')
+
+# 全てのカードの組み合わせ・資金・資産について、1ターンの解決結果が GameEngine と一致することをテストします。
+# 旧形式の基本4種と、web-game-client のカード定義（賄賂・投資を含む）の両方で確認します。
+@pytest.mark.parametrize("templates", [BASE_CARD_TEMPLATES, load_template_set(CARDS_DIR)], ids=['base', 'json'])
+def test_resolution_matches_scalar_engine(templates):
+    template_ids = list(templates)
+    choices = [None] + template_ids
+    cases = list(itertools.product(choices, choices, range(6), range(6), [(1, 1), (1, 2), (2, 1)]))
+
+    deck = {template_ids[0]: 1}
+    vector = VectorizedEngine(len(cases), templates, deck, deck)
+    vector.deck[:] = 0
+    picks = np.full((len(cases), 2), NO_PLAY)
+    for i, (c1, c2, f1, f2, props) in enumerate(cases):
+        vector.funds[i] = (f1, f2)
+        vector.properties[i] = props
+        for side, choice in enumerate((c1, c2)):
+            if choice is not None:
+                t = template_ids.index(choice)
+                vector.hand[t, i, side] = 1
+                picks[i, side] = t
+    vector.play(picks)
+
+    for i, (c1, c2, f1, f2, props) in enumerate(cases):
+        state = GameEngine.create_initial_state('player1-id', 'player2-id', templates)
+        actions = []
+        for player, choice, funds, prop in zip(state.players, (c1, c2), (f1, f2), props):
+            player.funds, player.properties = funds, prop
+            player.hand = [Card(id='c', templateId=choice)] if choice else []
+            actions.append(Action(playerId=player.playerId, cardId='c') if choice else None)
+        result = GameEngine(state, templates).apply_action(*actions)
+
+        assert [p.funds for p in result.players] == list(vector.funds[i]), cases[i]
+        assert [p.properties for p in result.players] == list(vector.properties[i]), cases[i]
+        assert (result.phase == 'GAME_OVER') == (vector.phase[i] == PHASE_GAME_OVER), cases[i]
+
+# シード付きの多数の試合で、勝率と平均ターン数の分布が GameEngine と一致することをテストします。
+def test_outcome_distribution_matches_scalar_engine():
+    scalar = simulate_batch(DECK1, DECK2, 'random', 'random', matches=3000, seed=11, max_workers=1)
+    vector = simulate_vectorized(DECK1, DECK2, matches=30000, seed=11)
+
+    for a, b in zip(scalar.winRates + [scalar.drawRate], vector.winRates + [vector.drawRate]):
+        stderr = math.sqrt(max(a * (1 - a), 1e-4) / scalar.matches)
+        assert abs(a - b) < 4 * stderr
+    assert abs(scalar.meanTurns - vector.meanTurns) < 0.15
+    # プレイされたカードの割合も一致することを確認します。
+    for side in (0, 1):
+        s_total, v_total = sum(scalar.cardPlays[side].values()), sum(vector.cardPlays[side].values())
+        for template_id, count in vector.cardPlays[side].items():
+            assert abs(scalar.cardPlays[side].get(template_id, 0) / s_total - count / v_total) < 0.02
@@ -0,0 +1,71 @@
+# packages/api-server/tests/test_views.py
+
+import random
+from collections import Counter
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.codecs import json_codec
+from app.game.cards import BASE_CARD_TEMPLATES
+from app.game.engine import GameEngine
+from app.game.views import ViewCache
+
+# 自分の手札と山札の構成だけが見え、相手の手札と山札は枚数だけになることと、
+# 差分で更新したビューが毎回作り直したビューと一致することをテストします（山札の再シャッフルを含みます）。
+def test_incremental_view_matches_fresh_projection():
+    deck = {'GAIN_FUNDS': 3, 'DEFEND': 1, 'FRAUD': 1}
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, deck, deck, seed=5)
+    rng = random.Random(5)
+    for _ in range(12):
+        engine.start_turn()
+        for viewer in (0, 1):
+            assert engine.view(viewer) == ViewCache().view(engine.core, viewer)
+        engine.play(*((p, rng.choice(p.hand)) if p.hand else None for p in engine.core.players))
+        assert engine.view(1) == ViewCache().view(engine.core, 1)
+
+    state = engine.get_state()
+    view = engine.view(0)
+    me, opponent = view['players']
+    assert view['viewerId'] == 'p1' and view['version'] == engine.version
+    assert me['hand'] == [c.model_dump() for c in state.players[0].hand]
+    assert me['deckComposition'] == dict(Counter(c.templateId for c in state.players[0].deck))
+    assert me['discard'] == [c.model_dump() for c in state.players[0].discard]
+    assert 'hand' not in opponent and 'deckComposition' not in opponent and 'deck' not in opponent
+    assert (opponent['handCount'], opponent['deckCount']) == (len(state.players[1].hand), len(state.players[1].deck))
+
+# 同じバージョンの間はビューとエンコード済みのボディを共有し、バージョンが進むと作り直すことをテストします。
+def test_views_are_cached_per_version():
+    engine = GameEngine.new_match('p1', 'p2', BASE_CARD_TEMPLATES, seed=1)
+    engine.start_turn()
+    body = engine.encoded_view(1, json_codec.media_type, json_codec.dumps)
+    assert engine.encoded_view(1, json_codec.media_type, json_codec.dumps) is body
+    assert engine.view(1) is engine.view(1)
+    assert engine.views.misses == 1
+
+    engine.play(None, None)
+    assert engine.encoded_view(1, json_codec.media_type, json_codec.dumps) != body
+    assert json_codec.loads(engine.encoded_view(1, json_codec.media_type, json_codec.dumps)) == engine.view(1)
+
+# ビューのエンドポイントがプレイヤーのトークンでそのプレイヤーのビューだけを返し、試合にいないプレイヤーは 404、
+# 状態全体はホストのトークンでだけ取得できることをテストします。
+def test_view_endpoint():
+    client = TestClient(app)
+    match = client.post('/api/v1/game/matches', json={'player1Id': 'p1', 'player2Id': 'p2', 'seed': 3}).json()
+    match_id = match['matchId']
+    host = {'X-Match-Token': match['hostToken']}
+    seat = {'X-Match-Token': match['playerTokens'][1]}
+    client.post(f'/api/v1/game/matches/{match_id}/advance', headers=host)
+
+    url = f'/api/v1/game/matches/{match_id}/view'
+    assert client.get(url, params={'playerId': 'p2'}).status_code == 401
+    assert client.get(url, params={'playerId': 'p1'}, headers=seat).status_code == 403
+    assert client.get(f'/api/v1/game/matches/{match_id}', headers=seat).status_code == 403
+    response = client.get(url, params={'playerId': 'p2'}, headers=seat)
+    assert response.status_code == 200
+    view = response.json()
+    assert view['viewerId'] == 'p2'
+    assert 'hand' not in view['players'][0] and len(view['players'][1]['hand']) == view['players'][1]['handCount']
+    full = client.get(f'/api/v1/game/matches/{match_id}', headers=host).content
+    assert len(response.content) < len(full)
+    assert client.get(url, params={'playerId': 'p3'}, headers=host).status_code == 404